@@ -0,0 +1,27 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# cli.py
+import os
+import sys
+
+if __name__ == "__main__":
+    # Wajib untuk process pool persiapan pada executable Windows
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from src.cli import main
+    sys.exit(main())
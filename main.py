@@ -56,4 +56,7 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Wajib untuk process pool persiapan pada executable Windows
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -1,5 +1,5 @@
-import requests
 from .gemini_api import get_api_endpoint, DEFAULT_MODEL
+from .http_client import http_post
 
 def check_api_keys_status(api_keys, model=None):
     """
@@ -31,7 +31,7 @@ def check_api_keys_status(api_keys, model=None):
     for key in api_keys:
         api_url = f"{api_endpoint}?key={key}"
         try:
-            resp = requests.post(api_url, headers=headers, json=payload, timeout=20)
+            resp = http_post(api_url, headers=headers, json=payload, timeout=20)
             try:
                 resp_json = resp.json()
             except Exception:
@@ -0,0 +1,287 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/async_client.py
+import asyncio
+import concurrent.futures
+import threading
+
+from src.utils.logging import log_message
+from src.api.http_client import http_post, get_http_pool_settings, warm_up_http_pool, GEMINI_BASE_URL, WARMUP_TIMEOUT, HTTP_WARMUP_MAX
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+class RequestCancelled(Exception):
+    """Request dibatalkan karena stop diminta sebelum response diterima."""
+
+# Satu event loop di thread latar memegang semua request Gemini yang sedang berjalan
+_LOOP_LOCK = threading.Lock()
+_LOOP = None
+
+# Hanya diakses dari thread event loop
+_ASYNC_CLIENT = None
+_ASYNC_SETTINGS = None
+_EXECUTOR = None
+
+# Future yang sedang menunggu response, dikelompokkan per stop_event (None = tanpa stop_event)
+_PENDING_LOCK = threading.Lock()
+_PENDING = {}
+_STOP_WATCHERS = {}
+# Selang pengawas stop_event memeriksa apakah sudah dilepas (detik)
+STOP_WATCH_INTERVAL = 0.5
+
+def _ensure_loop():
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is not None and not _LOOP.is_closed():
+            return _LOOP
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        threading.Thread(target=run_loop, name="gemini-async-loop", daemon=True).start()
+        ready.wait()
+        _LOOP = loop
+        if httpx is not None:
+            log_message("Event loop request Gemini dimulai (httpx)", "info")
+        else:
+            log_message("Warning: httpx tidak terpasang, request Gemini memakai requests lewat thread pool (satu thread terblokir per request). Pasang httpx untuk request async penuh.", "warning")
+        return _LOOP
+
+async def _get_backend():
+    """
+    Mengembalikan httpx.AsyncClient (atau None untuk fallback thread pool) yang sesuai
+    dengan pengaturan pool HTTP saat ini. Klien dibuat ulang jika ukuran pool atau
+    transport berubah lewat configure_http_pool.
+    """
+    global _ASYNC_CLIENT, _ASYNC_SETTINGS, _EXECUTOR
+    settings = get_http_pool_settings()
+    if settings == _ASYNC_SETTINGS:
+        return _ASYNC_CLIENT
+    pool_size, use_http2 = settings
+    old_client, old_executor = _ASYNC_CLIENT, _EXECUTOR
+    if httpx is not None:
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        transport = httpx.AsyncHTTPTransport(http2=use_http2, retries=1, limits=limits)
+        _ASYNC_CLIENT = httpx.AsyncClient(transport=transport, http2=use_http2)
+        _EXECUTOR = None
+    else:
+        # Tanpa httpx request tetap blocking, tetapi hanya di pool thread seukuran batas
+        # request bersamaan, bukan satu thread tambahan per upaya
+        _ASYNC_CLIENT = None
+        _EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="gemini-http")
+    _ASYNC_SETTINGS = settings
+    if old_client is not None:
+        try:
+            await old_client.aclose()
+        except Exception:
+            pass
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+    return _ASYNC_CLIENT
+
+async def post_json_async(url, headers=None, json=None, timeout=None):
+    """
+    POST JSON dari dalam event loop. Pembatalan task langsung melepas request.
+
+    Returns:
+        Response dengan status_code, json() dan text.
+    """
+    client = await _get_backend()
+    if client is not None:
+        return await client.post(url, headers=headers, json=json, timeout=timeout)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, lambda: http_post(url, headers=headers, json=json, timeout=timeout))
+
+def _cancel_pending(stop_event):
+    with _PENDING_LOCK:
+        futures = _PENDING.pop(stop_event, set())
+        _STOP_WATCHERS.pop(stop_event, None)
+    for future in futures:
+        future.cancel()
+
+def _watch_stop_event(stop_event, released):
+    # stop_event milik pemanggil tidak bisa dibangunkan tanpa di-set, jadi thread ini
+    # bangun berkala untuk melihat apakah engine sudah melepasnya lewat release_stop_event
+    while not stop_event.wait(STOP_WATCH_INTERVAL):
+        if released.is_set():
+            return
+    _cancel_pending(stop_event)
+
+def _register(future, stop_event, should_stop):
+    with _PENDING_LOCK:
+        _PENDING.setdefault(stop_event, set()).add(future)
+        if stop_event is not None and stop_event not in _STOP_WATCHERS:
+            released = threading.Event()
+            watcher = threading.Thread(target=_watch_stop_event, args=(stop_event, released), name="gemini-stop-watch", daemon=True)
+            _STOP_WATCHERS[stop_event] = (watcher, released)
+            watcher.start()
+    # Diperiksa setelah terdaftar agar stop yang datang bersamaan tidak terlewat
+    if (stop_event is not None and stop_event.is_set()) or (should_stop is not None and should_stop()):
+        future.cancel()
+
+def _unregister(future, stop_event):
+    with _PENDING_LOCK:
+        futures = _PENDING.get(stop_event)
+        if futures is not None:
+            futures.discard(future)
+
+def release_stop_event(stop_event):
+    """
+    Melepas pengawas stop_event setelah engine selesai, agar thread pengawas berhenti
+    dan stop_event tidak tertahan di registry modul ini.
+
+    Args:
+        stop_event: threading.Event yang dipakai selama proses (None diabaikan).
+    """
+    if stop_event is None:
+        return
+    with _PENDING_LOCK:
+        watcher = _STOP_WATCHERS.pop(stop_event, None)
+        if not _PENDING.get(stop_event):
+            _PENDING.pop(stop_event, None)
+    if watcher is not None:
+        watcher[1].set()
+
+def post_json(url, headers=None, json=None, timeout=None, stop_event=None, should_stop=None):
+    """
+    Fasad sinkron untuk worker berbasis thread: request dijalankan di event loop
+    bersama dan thread pemanggil tidur sampai response datang atau stop diminta.
+
+    Args:
+        url, headers, json, timeout: Sama seperti http_post
+        stop_event: threading.Event yang membatalkan request begitu di-set
+        should_stop: Callable tambahan yang diperiksa saat request didaftarkan
+
+    Returns:
+        Response dengan status_code, json() dan text.
+
+    Raises:
+        RequestCancelled jika stop diminta sebelum response diterima; exception
+        transport (requests/httpx) diteruskan apa adanya.
+    """
+    loop = _ensure_loop()
+    future = asyncio.run_coroutine_threadsafe(post_json_async(url, headers=headers, json=json, timeout=timeout), loop)
+    _register(future, stop_event, should_stop)
+    try:
+        return future.result()
+    except concurrent.futures.CancelledError:
+        raise RequestCancelled()
+    finally:
+        _unregister(future, stop_event)
+
+def post_json_hedged(url, headers=None, json=None, timeout=None, hedge_after=None, hedge=None, hedge_accept=None, stop_event=None, should_stop=None):
+    """
+    Seperti post_json, tetapi jika response belum datang setelah hedge_after detik,
+    request cadangan dikirim dan jawaban yang lebih dulu datang dipakai. Request yang
+    kalah dibatalkan.
+
+    Args:
+        hedge_after: Detik menunggu sebelum request cadangan
+        hedge: Callable() -> (url, json) request cadangan, atau None jika tidak jadi dikirim
+        hedge_accept: Callable(response) -> True jika response cadangan boleh dipakai; jika
+            False (misal 429), request utama tetap ditunggu
+        stop_event, should_stop: Sama seperti post_json
+
+    Returns:
+        Tuple (response, winner) dengan winner 0 = request utama, 1 = request cadangan.
+
+    Raises:
+        RequestCancelled jika stop diminta; exception transport request utama diteruskan
+        jika request cadangan juga tidak menghasilkan jawaban yang bisa dipakai.
+    """
+    loop = _ensure_loop()
+    futures = [asyncio.run_coroutine_threadsafe(post_json_async(url, headers=headers, json=json, timeout=timeout), loop)]
+    _register(futures[0], stop_event, should_stop)
+    try:
+        done, _ = concurrent.futures.wait(futures, timeout=hedge_after)
+        if not done and hedge is not None:
+            hedge_request = hedge()
+            if hedge_request is not None:
+                hedge_url, hedge_json = hedge_request
+                futures.append(asyncio.run_coroutine_threadsafe(post_json_async(hedge_url, headers=headers, json=hedge_json, timeout=timeout), loop))
+                _register(futures[1], stop_event, should_stop)
+
+        pending = set(futures)
+        primary_error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in sorted(done, key=futures.index):
+                if future.cancelled():
+                    raise RequestCancelled()
+                winner = futures.index(future)
+                error = future.exception()
+                if winner == 0:
+                    if error is None:
+                        return future.result(), 0
+                    primary_error = error
+                elif error is None and (hedge_accept is None or hedge_accept(future.result())):
+                    return future.result(), 1
+        if primary_error is not None:
+            raise primary_error
+        # Request utama selalu selesai dengan hasil atau exception; baris ini tidak tercapai
+        raise RequestCancelled()
+    finally:
+        for future in futures:
+            if not future.done():
+                future.cancel()
+            _unregister(future, stop_event)
+
+def cancel_all_requests():
+    """
+    Membatalkan semua request yang sedang menunggu response (force stop).
+
+    Returns:
+        Jumlah request yang dibatalkan.
+    """
+    with _PENDING_LOCK:
+        futures = [future for group in _PENDING.values() for future in group]
+    for future in futures:
+        future.cancel()
+    return len(futures)
+
+def warm_up_request_pool(connections, base_url=GEMINI_BASE_URL):
+    """
+    Membuka koneksi di pool yang benar-benar dipakai request Gemini: klien async httpx
+    bila tersedia, atau pool requests bersama.
+
+    Returns:
+        Jumlah koneksi yang berhasil dibuka.
+    """
+    if httpx is None:
+        return warm_up_http_pool(connections, base_url)
+    pool_size, use_http2 = get_http_pool_settings()
+    count = 1 if use_http2 else max(1, min(int(connections), pool_size, HTTP_WARMUP_MAX))
+
+    async def open_all():
+        client = await _get_backend()
+        results = await asyncio.gather(
+            *(client.head(f"{base_url}/", timeout=WARMUP_TIMEOUT) for _ in range(count)),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+    try:
+        return asyncio.run_coroutine_threadsafe(open_all(), _ensure_loop()).result(WARMUP_TIMEOUT + 1)
+    except Exception:
+        return 0
@@ -0,0 +1,197 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/batch_api.py
+import os
+import json
+
+from src.api.http_client import http_request, http_download, GEMINI_BASE_URL
+
+BATCH_STATE_PENDING = "BATCH_STATE_PENDING"
+BATCH_STATE_RUNNING = "BATCH_STATE_RUNNING"
+BATCH_STATE_SUCCEEDED = "BATCH_STATE_SUCCEEDED"
+BATCH_STATE_FAILED = "BATCH_STATE_FAILED"
+BATCH_STATE_CANCELLED = "BATCH_STATE_CANCELLED"
+BATCH_STATE_EXPIRED = "BATCH_STATE_EXPIRED"
+BATCH_TERMINAL_STATES = (BATCH_STATE_SUCCEEDED, BATCH_STATE_FAILED, BATCH_STATE_CANCELLED, BATCH_STATE_EXPIRED)
+
+# File input Batch API maksimum 2 GB; sisakan ruang agar satu baris terakhir tidak melewati batas
+MAX_BATCH_FILE_BYTES = 1_900_000_000
+REQUEST_TIMEOUT = 60
+UPLOAD_TIMEOUT = 600
+DOWNLOAD_TIMEOUT = 600
+
+class BatchApiError(Exception):
+    """Request ke Batch API/Files API ditolak atau jawabannya tidak bisa dibaca."""
+    def __init__(self, message, http_status=None):
+        super().__init__(message)
+        self.http_status = http_status
+
+def _error_message(response):
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    message = ((data.get("error") or {}).get("message") if isinstance(data, dict) else None)
+    return message or f"HTTP {response.status_code}: {response.text[:200]}"
+
+def _json_or_raise(response, action):
+    if response.status_code != 200:
+        raise BatchApiError(f"{action} gagal: {_error_message(response)}", response.status_code)
+    try:
+        return response.json()
+    except ValueError:
+        raise BatchApiError(f"{action}: jawaban bukan JSON valid", response.status_code)
+
+def _batch_state(data):
+    metadata = data.get("metadata") or {}
+    return metadata.get("state") or data.get("state") or BATCH_STATE_PENDING
+
+def _responses_file(data):
+    # Operasi selesai menaruh hasil di response; sebagian versi API juga di metadata.output
+    for container in (data.get("response"), (data.get("metadata") or {}).get("output"), data.get("output"), data.get("dest")):
+        if isinstance(container, dict):
+            name = container.get("responsesFile") or container.get("fileName") or container.get("file_name")
+            if name:
+                return name
+    return None
+
+class BatchClient:
+    """
+    Klien Gemini Batch API: upload file request JSONL lewat Files API, membuat batch job
+    (batchGenerateContent), membaca statusnya, dan mengunduh file hasil. base_url bisa
+    diarahkan ke server tiruan lokal (src/api/batch_mock_server.py) untuk pengujian.
+    """
+    def __init__(self, api_key, base_url=GEMINI_BASE_URL):
+        self.api_key = api_key
+        self.base_url = (base_url or GEMINI_BASE_URL).rstrip("/")
+
+    def upload_jsonl(self, path, display_name):
+        """
+        Upload file request lewat protokol resumable Files API.
+
+        Returns:
+            Nama file di server (misal "files/abc").
+        """
+        size = os.path.getsize(path)
+        start = http_request(
+            "POST", f"{self.base_url}/upload/v1beta/files?key={self.api_key}",
+            headers={
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(size),
+                "X-Goog-Upload-Header-Content-Type": "application/jsonl",
+                "Content-Type": "application/json",
+            },
+            json={"file": {"display_name": display_name}},
+            timeout=REQUEST_TIMEOUT
+        )
+        if start.status_code != 200:
+            raise BatchApiError(f"Upload file request gagal dimulai: {_error_message(start)}", start.status_code)
+        upload_url = start.headers.get("x-goog-upload-url")
+        if not upload_url:
+            raise BatchApiError("Upload file request: server tidak memberi x-goog-upload-url", start.status_code)
+        with open(path, "rb") as f:
+            response = http_request(
+                "POST", upload_url,
+                headers={
+                    "Content-Length": str(size),
+                    "X-Goog-Upload-Offset": "0",
+                    "X-Goog-Upload-Command": "upload, finalize",
+                },
+                content=f,
+                timeout=UPLOAD_TIMEOUT
+            )
+        data = _json_or_raise(response, "Upload file request")
+        name = (data.get("file") or {}).get("name")
+        if not name:
+            raise BatchApiError("Upload file request: nama file tidak ada di jawaban", response.status_code)
+        return name
+
+    def create_batch(self, model, file_name, display_name):
+        """
+        Returns:
+            Nama batch job (misal "batches/123").
+        """
+        response = http_request(
+            "POST", f"{self.base_url}/v1beta/models/{model}:batchGenerateContent?key={self.api_key}",
+            headers={"Content-Type": "application/json"},
+            json={"batch": {"display_name": display_name, "input_config": {"file_name": file_name}}},
+            timeout=REQUEST_TIMEOUT
+        )
+        data = _json_or_raise(response, "Membuat batch job")
+        name = data.get("name")
+        if not name:
+            raise BatchApiError("Membuat batch job: nama batch tidak ada di jawaban", response.status_code)
+        return name
+
+    def get_batch(self, name):
+        """
+        Returns:
+            Dictionary {"name", "state", "responses_file", "error"}.
+        """
+        response = http_request("GET", f"{self.base_url}/v1beta/{name}?key={self.api_key}", timeout=REQUEST_TIMEOUT)
+        data = _json_or_raise(response, f"Status {name}")
+        error = data.get("error")
+        return {
+            "name": data.get("name", name),
+            "state": _batch_state(data),
+            "responses_file": _responses_file(data),
+            "error": error.get("message") if isinstance(error, dict) else None,
+        }
+
+    def download_file(self, file_name, dest_path):
+        """
+        Mengunduh file hasil batch ke dest_path (lewat file sementara, lalu diganti atomik).
+        """
+        temp_path = dest_path + ".part"
+        status = http_download(f"{self.base_url}/download/v1beta/{file_name}:download?alt=media&key={self.api_key}", temp_path, timeout=DOWNLOAD_TIMEOUT)
+        if status != 200:
+            raise BatchApiError(f"Unduh {file_name} gagal: HTTP {status}", status)
+        os.replace(temp_path, dest_path)
+
+def batch_request_line(key, request):
+    """
+    Satu baris file request JSONL: {"key": ..., "request": GenerateContentRequest}.
+    """
+    return json.dumps({"key": key, "request": request}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def iter_batch_results(path):
+    """
+    Membaca file hasil batch baris demi baris.
+
+    Yields:
+        Tuple (key, response, error); response adalah GenerateContentResponse atau None
+        jika request tersebut gagal (error berisi pesannya).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or record.get("key") is None:
+                continue
+            error = record.get("error") or record.get("status")
+            response = record.get("response")
+            if isinstance(response, dict) and not error:
+                yield record["key"], response, None
+            else:
+                message = error.get("message") if isinstance(error, dict) else error
+                yield record["key"], None, str(message or "Tidak ada response")
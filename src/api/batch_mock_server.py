@@ -0,0 +1,224 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/batch_mock_server.py
+# Server tiruan Gemini Batch API untuk menguji mode bulk tanpa kuota/biaya:
+#   python -m src.api.batch_mock_server --port 8765 --delay 10
+# lalu jalankan dengan engine "bulk_mode": true, "batch_base_url": "http://127.0.0.1:8765"
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from src.api.batch_api import BATCH_STATE_PENDING, BATCH_STATE_RUNNING, BATCH_STATE_SUCCEEDED
+
+_CREATE_RE = re.compile(r"^/v1beta/models/([^/:]+):batchGenerateContent$")
+_BATCH_RE = re.compile(r"^/v1beta/(batches/\d+)$")
+_DOWNLOAD_RE = re.compile(r"^/download/v1beta/(files/[\w-]+):download$")
+
+def _mock_metadata(key, structured):
+    """
+    Metadata deterministik dari key request, dalam format yang diminta request
+    (JSON responseSchema atau teks "Title: ...").
+    """
+    stem = re.sub(r"[^A-Za-z0-9]+", " ", key.rsplit("/", 1)[-1].rsplit(".", 1)[0]).strip() or "image"
+    title = f"Mock stock photo of {stem}"
+    keywords = ["mock", "stock", "photo"] + [word.lower() for word in stem.split()][:10]
+    if structured:
+        return json.dumps({
+            "title": title,
+            "description": f"Generated by the local batch mock server for {key}.",
+            "keywords": keywords,
+            "adobe_stock_category": "8. Graphic Resources",
+            "shutterstock_category": "Abstract",
+        })
+    return (
+        f"Title: {title}\nDescription: Generated by the local batch mock server for {key}.\n"
+        f"Keywords: {', '.join(keywords)}\nAdobeStockCategory: 8. Graphic Resources\nShutterstockCategory: Abstract\n"
+    )
+
+class MockBatchServer:
+    """
+    Tiruan minimal Files API + Batch API Gemini di atas http.server: upload resumable,
+    batchGenerateContent, status batch, dan unduh file hasil. Batch selesai setelah
+    `delay` detik; key yang ada di fail_keys dijawab dengan error per baris.
+    """
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, fail_keys=()):
+        self.delay = float(delay)
+        self.fail_keys = set(fail_keys)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._uploads = {}
+        self._batches = {}
+        self._counter = 0
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="batch-mock-server", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _next_id(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _send(self, handler, status, body=None, headers=None, raw=None):
+        payload = raw if raw is not None else json.dumps(body or {}).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _handle(self, handler, method):
+        url = urlsplit(handler.path)
+        query = parse_qs(url.query)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        with self._lock:
+            self.requests.append((method, url.path))
+        if not query.get("key") and "upload_id" not in query:
+            return self._send(handler, 403, {"error": {"code": 403, "message": "API key tidak ada"}})
+
+        if method == "POST" and url.path == "/upload/v1beta/files":
+            command = handler.headers.get("X-Goog-Upload-Command", "")
+            if command == "start":
+                upload_id = str(self._next_id())
+                with self._lock:
+                    self._uploads[upload_id] = json.loads(body or b"{}").get("file", {})
+                return self._send(handler, 200, {}, headers={"X-Goog-Upload-URL": f"{self.base_url}/upload/v1beta/files?upload_id={upload_id}"})
+            upload_id = (query.get("upload_id") or [""])[0]
+            with self._lock:
+                info = self._uploads.pop(upload_id, None)
+            if info is None or "finalize" not in command:
+                return self._send(handler, 400, {"error": {"code": 400, "message": "Upload tidak dikenal"}})
+            name = f"files/input-{upload_id}"
+            with self._lock:
+                self._files[name] = body
+            return self._send(handler, 200, {"file": {"name": name, "displayName": info.get("display_name"), "sizeBytes": str(len(body))}})
+
+        match = _CREATE_RE.match(url.path)
+        if method == "POST" and match:
+            config = json.loads(body or b"{}").get("batch", {})
+            file_name = (config.get("input_config") or {}).get("file_name")
+            with self._lock:
+                content = self._files.get(file_name)
+            if content is None:
+                return self._send(handler, 400, {"error": {"code": 400, "message": f"File {file_name} tidak ditemukan"}})
+            name = f"batches/{self._next_id()}"
+            with self._lock:
+                self._batches[name] = {"model": match.group(1), "input": content, "created": time.monotonic(), "output": None}
+            return self._send(handler, 200, {"name": name, "metadata": {"name": name, "state": BATCH_STATE_PENDING}})
+
+        match = _BATCH_RE.match(url.path)
+        if method == "GET" and match:
+            name = match.group(1)
+            with self._lock:
+                batch = self._batches.get(name)
+            if batch is None:
+                return self._send(handler, 404, {"error": {"code": 404, "message": f"{name} tidak ditemukan"}})
+            if time.monotonic() - batch["created"] < self.delay:
+                return self._send(handler, 200, {"name": name, "metadata": {"name": name, "state": BATCH_STATE_RUNNING}, "done": False})
+            output_name = self._finish(name, batch)
+            return self._send(handler, 200, {
+                "name": name,
+                "metadata": {"name": name, "state": BATCH_STATE_SUCCEEDED, "output": {"responsesFile": output_name}},
+                "done": True,
+                "response": {"responsesFile": output_name},
+            })
+
+        match = _DOWNLOAD_RE.match(url.path)
+        if method == "GET" and match:
+            with self._lock:
+                content = self._files.get(match.group(1))
+            if content is None:
+                return self._send(handler, 404, {"error": {"code": 404, "message": "File tidak ditemukan"}})
+            return self._send(handler, 200, raw=content)
+
+        return self._send(handler, 404, {"error": {"code": 404, "message": f"Endpoint {method} {url.path} tidak ada di server tiruan"}})
+
+    def _finish(self, name, batch):
+        with self._lock:
+            if batch["output"] is not None:
+                return batch["output"]
+        lines = []
+        for raw_line in batch["input"].decode("utf-8").splitlines():
+            if not raw_line.strip():
+                continue
+            record = json.loads(raw_line)
+            key = record.get("key")
+            if key in self.fail_keys:
+                lines.append(json.dumps({"key": key, "error": {"code": 400, "message": "Mock failure"}}))
+                continue
+            config = (record.get("request") or {}).get("generationConfig") or {}
+            text = _mock_metadata(key, config.get("responseMimeType") == "application/json")
+            lines.append(json.dumps({"key": key, "response": {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 120, "totalTokenCount": 420},
+                "modelVersion": batch["model"],
+            }}))
+        output_name = f"files/output-{name.split('/')[-1]}"
+        with self._lock:
+            self._files[output_name] = ("\n".join(lines) + "\n").encode("utf-8")
+            batch["output"] = output_name
+        return output_name
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server tiruan Gemini Batch API untuk menguji mode bulk secara lokal.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=5.0, help="Detik sampai batch dinyatakan selesai")
+    args = parser.parse_args(argv)
+    server = MockBatchServer(args.host, args.port, args.delay)
+    print(f"Server tiruan Batch API berjalan di {server.base_url} (Ctrl+C untuk berhenti)", flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/circuit_breaker.py
+import time
+import threading
+
+from src.utils.logging import log_message
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+# Kelas error transport (dari classify_request_error) yang menandakan jaringan/DNS bermasalah
+TRANSPORT_ERRORS = ("timeout", "connection_error")
+# Jumlah error transport beruntun (dari semua worker) sebelum sirkuit terbuka
+DEFAULT_FAILURE_THRESHOLD = 5
+# Jeda awal sebelum request uji; digandakan setiap kali request uji gagal
+DEFAULT_PROBE_SECONDS = 5.0
+MAX_PROBE_SECONDS = 30.0
+# Request uji yang tidak pernah dilaporkan (misal dihentikan) dianggap hilang setelah ini
+PROBE_TIMEOUT = 150.0
+
+class CircuitBreaker:
+    """
+    Circuit breaker bersama untuk semua worker API. Setelah `threshold` error transport
+    beruntun (timeout/gagal koneksi, tanpa satu pun jawaban HTTP di antaranya) sirkuit
+    terbuka: worker berhenti mengirim dan menunggu di wait_until_closed() alih-alih
+    menghabiskan retry. Setelah jeda, satu worker mengirim request uji (canary); jika
+    server menjawab, sirkuit tertutup dan semua worker lanjut, jika tidak, jeda digandakan.
+    """
+    def __init__(self, threshold=DEFAULT_FAILURE_THRESHOLD, probe_seconds=DEFAULT_PROBE_SECONDS, max_probe_seconds=MAX_PROBE_SECONDS):
+        self.threshold = max(1, int(threshold))
+        self._base_probe = max(0.1, float(probe_seconds))
+        self._max_probe = max(self._base_probe, float(max_probe_seconds))
+        self._cond = threading.Condition()
+        self.state = CIRCUIT_CLOSED
+        self._consecutive = 0
+        self._probe_delay = self._base_probe
+        self._next_probe = 0.0
+        self._probe_owner = None
+        self._probe_started = 0.0
+        self._opened_at = None
+        self.opened_count = 0
+        self.paused_seconds = 0.0
+
+    def is_open(self):
+        with self._cond:
+            return self.state != CIRCUIT_CLOSED
+
+    def wait_until_closed(self, stop_event=None, should_stop=None):
+        """
+        Dipanggil sebelum setiap upaya request. Saat sirkuit terbuka, thread ini menunggu;
+        thread pertama yang menunggu setelah jeda habis menjadi request uji.
+
+        Returns:
+            "ok" jika sirkuit tertutup, "waited" jika thread ini sempat ditahan (atau
+            menjadi request uji), "stopped" jika stop diminta selama menunggu.
+        """
+        waited = False
+        with self._cond:
+            while True:
+                if (stop_event is not None and stop_event.is_set()) or (should_stop is not None and should_stop()):
+                    return "stopped"
+                if self.state == CIRCUIT_CLOSED:
+                    return "waited" if waited else "ok"
+                now = time.monotonic()
+                if self._probe_owner is not None and now - self._probe_started > PROBE_TIMEOUT:
+                    self._probe_owner = None
+                if self._probe_owner is None and now >= self._next_probe:
+                    self.state = CIRCUIT_HALF_OPEN
+                    self._probe_owner = threading.get_ident()
+                    self._probe_started = now
+                    log_message("Sirkuit API setengah terbuka: mengirim satu request uji", "info")
+                    return "waited"
+                waited = True
+                timeout = self._next_probe - now if self._probe_owner is None else 1.0
+                self._cond.wait(min(max(0.05, timeout), 0.5))
+
+    def record(self, http_status, error_type=None):
+        """
+        Melaporkan hasil satu upaya request.
+
+        Args:
+            http_status: Status HTTP upaya tersebut, atau None jika request tidak dikirim
+            error_type: Jenis error dari _attempt_gemini_request (None jika sukses)
+        """
+        now = time.monotonic()
+        with self._cond:
+            is_probe = self._probe_owner == threading.get_ident()
+            if error_type in TRANSPORT_ERRORS:
+                if is_probe:
+                    self._probe_owner = None
+                    self.state = CIRCUIT_OPEN
+                    self._probe_delay = min(self._max_probe, self._probe_delay * 2)
+                    self._next_probe = now + self._probe_delay
+                    log_message(f"Request uji gagal ({error_type}), koneksi belum pulih; dicoba lagi dalam {self._probe_delay:.0f} detik", "warning")
+                elif self.state == CIRCUIT_CLOSED:
+                    self._consecutive += 1
+                    if self._consecutive >= self.threshold:
+                        self._open_locked(now, error_type)
+            elif isinstance(http_status, int) and http_status >= 100:
+                # Jawaban HTTP apa pun (termasuk 4xx/5xx) berarti server bisa dijangkau
+                self._consecutive = 0
+                if self.state != CIRCUIT_CLOSED:
+                    self._close_locked(now)
+            elif is_probe:
+                # Request uji tidak terkirim (dihentikan, file tidak terbaca, kuota lokal):
+                # worker lain boleh langsung mencoba
+                self._probe_owner = None
+                self.state = CIRCUIT_OPEN
+                self._next_probe = now
+                self._cond.notify_all()
+
+    def _open_locked(self, now, error_type):
+        self.state = CIRCUIT_OPEN
+        self.opened_count += 1
+        self._opened_at = now
+        self._probe_delay = self._base_probe
+        self._next_probe = now + self._probe_delay
+        log_message(
+            f"Sirkuit API terbuka: {self._consecutive} error transport beruntun ({error_type}). "
+            f"Pengiriman dijeda, file yang sedang berjalan diantrekan ulang", "warning"
+        )
+
+    def _close_locked(self, now):
+        paused = now - self._opened_at if self._opened_at is not None else 0.0
+        self.paused_seconds += paused
+        self.state = CIRCUIT_CLOSED
+        self._opened_at = None
+        self._probe_owner = None
+        self._probe_delay = self._base_probe
+        log_message(f"Sirkuit API tertutup: koneksi pulih setelah {paused:.0f} detik, pengiriman dilanjutkan", "success")
+        self._cond.notify_all()
+
+    def summary(self):
+        """
+        Returns:
+            Dictionary {"opened": jumlah sirkuit terbuka, "paused_seconds": total jeda}.
+        """
+        with self._cond:
+            paused = self.paused_seconds
+            if self._opened_at is not None:
+                paused += time.monotonic() - self._opened_at
+            return {"opened": self.opened_count, "paused_seconds": round(paused, 1)}
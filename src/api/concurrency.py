@@ -0,0 +1,209 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/concurrency.py
+import math
+import time
+import threading
+from collections import deque
+
+from src.utils.logging import log_message
+
+DEFAULT_MAX_INFLIGHT_PER_KEY = 3
+DEFAULT_LATENCY_TARGET = 30.0
+MULTIPLICATIVE_DECREASE = 0.5
+LATENCY_WINDOW = 20
+# Interval polling saat menunggu slot model kosong
+SLOT_POLL_INTERVAL = 0.1
+
+def percentile(values, fraction):
+    """
+    Persentil nearest-rank, dipakai bersama oleh konkurensi adaptif, hedging dan router model.
+
+    Args:
+        values: Kumpulan angka (misalnya latensi dalam detik)
+        fraction: Persentil sebagai pecahan 0..1 (0.95 = p95)
+
+    Returns:
+        Nilai pada persentil tersebut, atau 0.0 jika values kosong.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def is_overload_status(http_status):
+    """
+    HTTP 429 dan 5xx dianggap tanda server kelebihan beban (sinyal turunkan batas).
+    """
+    return http_status == 429 or (isinstance(http_status, int) and 500 <= http_status < 600)
+
+class AimdLimit:
+    """
+    Batas request bersamaan dengan aturan AIMD (additive increase, multiplicative decrease):
+    naik 1 setiap satu "jendela" request sukses selama p95 latensi sehat, dan dipotong
+    setengah saat menerima 429/5xx. Penurunan hanya dilakukan sekali per jeda latensi,
+    agar beberapa 429 dari request yang sudah terkirim bersamaan tidak memotong berkali-kali.
+    """
+    def __init__(self, name, initial, max_limit, min_limit=1, latency_target=DEFAULT_LATENCY_TARGET):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.inflight = 0
+        self.latency_target = float(latency_target)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._last_decrease = 0.0
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+    def has_capacity(self):
+        return self.inflight < self.current
+
+    def p95_latency(self):
+        return percentile(self._latencies, 0.95)
+
+    def on_success(self, latency):
+        """
+        Returns:
+            True jika batas bulat berubah.
+        """
+        before = self.current
+        self._latencies.append(max(0.0, latency))
+        if self.p95_latency() <= self.latency_target:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / max(1.0, self.limit))
+        return self.current != before
+
+    def on_overload(self):
+        """
+        Returns:
+            True jika batas bulat berubah.
+        """
+        now = time.monotonic()
+        hold = percentile(self._latencies, 0.5) if self._latencies else 1.0
+        if now - self._last_decrease < hold:
+            return False
+        self._last_decrease = now
+        before = self.current
+        self.limit = max(float(self.min_limit), self.limit * MULTIPLICATIVE_DECREASE)
+        return self.current != before
+
+class ConcurrencyController:
+    """
+    Pengatur konkurensi adaptif: satu AimdLimit per API key dan satu per model.
+
+    Slot key diambil oleh scheduler saat API key dialokasikan ke pekerjaan; slot model
+    diambil tepat sebelum setiap upaya request di get_gemini_metadata. Hasil setiap upaya
+    (status HTTP dan latensi) dilaporkan ke keduanya lewat record().
+    """
+    def __init__(self, api_keys, models, initial_per_key=1, max_per_key=DEFAULT_MAX_INFLIGHT_PER_KEY, latency_target=DEFAULT_LATENCY_TARGET):
+        self._lock = threading.Lock()
+        keys = list(dict.fromkeys(api_keys))
+        total_initial = max(1, initial_per_key * len(keys))
+        total_max = max(1, max_per_key * len(keys))
+        self._keys = {key: AimdLimit(f"key ...{key[-5:]}", initial_per_key, max_per_key, latency_target=latency_target) for key in keys}
+        self._models = {model: AimdLimit(f"model {model}", total_initial, total_max, latency_target=latency_target) for model in models}
+
+    def try_acquire_key(self, api_key):
+        with self._lock:
+            limit = self._keys.get(api_key)
+            if limit is None:
+                return True
+            if not limit.has_capacity():
+                return False
+            limit.inflight += 1
+            return True
+
+    def release_key(self, api_key):
+        with self._lock:
+            limit = self._keys.get(api_key)
+            if limit is not None and limit.inflight > 0:
+                limit.inflight -= 1
+
+    def model_has_capacity(self, model):
+        with self._lock:
+            limit = self._models.get(model)
+            return limit is None or limit.has_capacity()
+
+    def acquire_model(self, model, should_stop=None):
+        """
+        Menunggu sampai model punya slot kosong.
+
+        Returns:
+            True jika slot didapat, False jika stop diminta saat menunggu.
+        """
+        while True:
+            with self._lock:
+                limit = self._models.get(model)
+                if limit is None:
+                    return True
+                if limit.has_capacity():
+                    limit.inflight += 1
+                    return True
+            if should_stop and should_stop():
+                return False
+            time.sleep(SLOT_POLL_INTERVAL)
+
+    def release_model(self, model):
+        with self._lock:
+            limit = self._models.get(model)
+            if limit is not None and limit.inflight > 0:
+                limit.inflight -= 1
+
+    def record(self, api_key, model, http_status, latency):
+        """
+        Melaporkan hasil satu upaya request: 200 menaikkan batas, 429/5xx menurunkannya.
+        Status lain (error klien, gagal koneksi) tidak mengubah batas.
+        """
+        changes = []
+        with self._lock:
+            for limit in (self._keys.get(api_key), self._models.get(model)):
+                if limit is None:
+                    continue
+                before = limit.current
+                if http_status == 200:
+                    changed = limit.on_success(latency)
+                elif is_overload_status(http_status):
+                    changed = limit.on_overload()
+                else:
+                    changed = False
+                if changed:
+                    changes.append((limit.name, before, limit.current))
+        for name, before, after in changes:
+            reason = f"HTTP {http_status}" if http_status != 200 else "latensi sehat"
+            log_message(f"Batas konkurensi {name}: {before} → {after} ({reason})", "info")
+
+    def total_key_limit(self):
+        with self._lock:
+            return sum(limit.current for limit in self._keys.values())
+
+    def snapshot(self):
+        """
+        Returns:
+            Dictionary {"keys": {...}, "models": {...}} berisi limit, inflight, dan p95 latensi.
+        """
+        with self._lock:
+            def describe(limits):
+                return {
+                    name: {"limit": limit.current, "inflight": limit.inflight, "p95_latency": round(limit.p95_latency(), 2)}
+                    for name, limit in limits.items()
+                }
+            keys = describe({f"...{key[-5:]}": limit for key, limit in self._keys.items()})
+            models = describe(self._models)
+        return {"keys": keys, "models": models}
@@ -0,0 +1,197 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/context_cache.py
+import time
+import hashlib
+import threading
+
+from src.utils.logging import log_message
+from src.api.http_client import get_http_client, GEMINI_BASE_URL
+from src.api.async_client import post_json, RequestCancelled
+
+DEFAULT_CONTEXT_CACHE_TTL = 3600
+# Cache dibuat ulang jika sisa umurnya kurang dari ini, agar request yang sedang berjalan
+# tidak mereferensikan cache yang kedaluwarsa di tengah jalan
+REFRESH_MARGIN_SECONDS = 120
+# Setelah error sementara (429/5xx/jaringan) pembuatan cache dicoba lagi setelah jeda ini
+CREATE_RETRY_SECONDS = 300
+CREATE_TIMEOUT = 30
+DELETE_TIMEOUT = 10
+# Pesan error Gemini yang berarti handle cachedContent tidak berlaku lagi
+CACHED_CONTENT_ERROR_MARKERS = ("cachedcontent", "cached content")
+
+def is_cached_content_error(http_status, error_detail):
+    """
+    Returns:
+        True jika request ditolak karena cachedContent tidak ditemukan/kedaluwarsa.
+    """
+    if http_status not in (400, 403, 404):
+        return False
+    detail = str(error_detail or "").lower()
+    return any(marker in detail for marker in CACHED_CONTENT_ERROR_MARKERS)
+
+def _prompt_digest(prompt_text):
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+class ContextCache:
+    """
+    Handle cachedContents Gemini untuk teks prompt statis, per (API key, model, teks prompt).
+    Cached content terikat pada project API key dan pada model, jadi setiap pasangan
+    memiliki handle sendiri. Handle dibuat saat pertama dibutuhkan, dibuat ulang sebelum
+    kedaluwarsa, dan dihapus di akhir proses.
+
+    Jika cache tidak bisa dibuat (prompt di bawah batas minimum token model, model tidak
+    mendukung caching, key tanpa akses) pemanggil mendapat None dan mengirim prompt
+    inline seperti biasa; penolakan permanen diingat agar tidak dicoba ulang setiap request.
+    """
+    def __init__(self, ttl_seconds=DEFAULT_CONTEXT_CACHE_TTL, base_url=GEMINI_BASE_URL):
+        self.ttl_seconds = max(REFRESH_MARGIN_SECONDS * 2, int(ttl_seconds))
+        self._base_url = base_url.rstrip("/")
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._creating = set()
+        self._retry_after = {}
+        self._rejected = {}
+        self.created = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    def handle(self, api_key, model, prompt_text, stop_event=None):
+        """
+        Args:
+            api_key: API key yang akan dipakai request
+            model: Model yang akan dipakai request (harus sama dengan model cache)
+            prompt_text: Teks prompt yang ingin dikirim lewat cache
+            stop_event: threading.Event yang membatalkan pembuatan cache
+        Returns:
+            Nama cachedContent (misal "cachedContents/abc") atau None (kirim prompt inline).
+        """
+        if not api_key or not model or not prompt_text:
+            return None
+        digest = _prompt_digest(prompt_text)
+        entry_key = (api_key, model, digest)
+        now = time.monotonic()
+        with self._lock:
+            if (model, digest) in self._rejected or entry_key in self._rejected:
+                return None
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry["expires"] - now > REFRESH_MARGIN_SECONDS:
+                self.hits += 1
+                return entry["name"]
+            # Worker lain sedang membuat cache ini, atau pembuatan sebelumnya baru saja gagal
+            if entry_key in self._creating or self._retry_after.get(entry_key, 0) > now:
+                return None
+            self._creating.add(entry_key)
+        try:
+            name = self._create(api_key, model, prompt_text, entry_key, stop_event)
+        finally:
+            with self._lock:
+                self._creating.discard(entry_key)
+        if name is not None:
+            with self._lock:
+                self.hits += 1
+        return name
+
+    def _create(self, api_key, model, prompt_text, entry_key, stop_event):
+        payload = {
+            "model": f"models/{model}",
+            "displayName": "rj-auto-metadata-prompt",
+            "contents": [{"role": "user", "parts": [{"text": prompt_text}]}],
+            "ttl": f"{self.ttl_seconds}s"
+        }
+        url = f"{self._base_url}/v1beta/cachedContents?key={api_key}"
+        headers = {"Content-Type": "application/json", "User-Agent": "MetadataProcessor/1.0"}
+        key_label = f"...{api_key[-5:]}"
+        try:
+            response = post_json(url, headers=headers, json=payload, timeout=CREATE_TIMEOUT, stop_event=stop_event)
+            status = response.status_code
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+        except RequestCancelled:
+            return None
+        except Exception as e:
+            with self._lock:
+                self._retry_after[entry_key] = time.monotonic() + CREATE_RETRY_SECONDS
+            log_message(f"Warning: Context cache untuk {model} gagal dibuat (API key {key_label}): {e}; prompt dikirim inline", "warning")
+            return None
+
+        name = data.get("name") if isinstance(data, dict) else None
+        if status == 200 and name:
+            with self._lock:
+                previous = self._entries.get(entry_key)
+                self._entries[entry_key] = {"name": name, "api_key": api_key, "expires": time.monotonic() + self.ttl_seconds}
+                self.created += 1
+            tokens = (data.get("usageMetadata") or {}).get("totalTokenCount")
+            token_text = f"{tokens} token, " if tokens else ""
+            action = "diperbarui" if previous is not None else "dibuat"
+            log_message(f"Context cache prompt {action} untuk {model} (API key {key_label}, {token_text}berlaku {self.ttl_seconds}s)", "info")
+            return name
+
+        message = ((data.get("error") or {}).get("message") if isinstance(data, dict) else None) or f"HTTP {status}"
+        with self._lock:
+            if status == 429 or (isinstance(status, int) and status >= 500):
+                self._retry_after[entry_key] = time.monotonic() + CREATE_RETRY_SECONDS
+                permanent = False
+            else:
+                # 400/404 (prompt terlalu pendek, model tidak mendukung) berlaku untuk semua key;
+                # 401/403 hanya untuk key ini
+                self._rejected[entry_key if status in (401, 403) else entry_key[1:]] = message
+                permanent = True
+        if permanent:
+            log_message(f"Context cache tidak dipakai untuk {model} (API key {key_label}): {message}; prompt dikirim inline", "warning")
+        else:
+            log_message(f"Warning: Context cache untuk {model} belum bisa dibuat (HTTP {status}), dicoba lagi nanti; prompt dikirim inline", "warning")
+        return None
+
+    def invalidate(self, name):
+        """
+        Melupakan handle yang ditolak server (kedaluwarsa/terhapus); request berikutnya
+        membuat cache baru.
+        """
+        with self._lock:
+            for entry_key, entry in list(self._entries.items()):
+                if entry["name"] == name:
+                    del self._entries[entry_key]
+            self.fallbacks += 1
+        log_message(f"Context cache {name} tidak berlaku lagi, prompt dikirim inline dan cache dibuat ulang", "warning")
+
+    def close(self):
+        """
+        Menghapus semua cachedContent yang dibuat selama proses (agar tidak terus ditagih
+        biaya penyimpanan sampai TTL habis). Kegagalan diabaikan.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        if not entries:
+            return
+        client = get_http_client()
+        for entry in entries:
+            try:
+                client.delete(f"{self._base_url}/v1beta/{entry['name']}?key={entry['api_key']}", timeout=DELETE_TIMEOUT)
+            except Exception:
+                pass
+
+    def summary(self):
+        """
+        Returns:
+            Dictionary jumlah request yang memakai cache, cache yang dibuat, dan fallback inline.
+        """
+        with self._lock:
+            return {"hits": self.hits, "created": self.created, "fallbacks": self.fallbacks}
@@ -18,7 +18,6 @@
 import os
 import sys
 import random
-import requests
 import base64
 import json
 import time
@@ -27,10 +26,22 @@ import threading
 from collections import defaultdict
 
 from src.utils.logging import log_message
+from src.api.response_cache import compute_cache_key
+from src.api.http_client import classify_request_error
+from src.api.async_client import post_json, post_json_hedged, cancel_all_requests, RequestCancelled
+from src.api.rate_limiter import estimate_request_tokens, parse_quota_error, MAX_OUTPUT_TOKENS_PER_IMAGE
+from src.api.key_health import format_key_health, classify_attempt
+from src.api.context_cache import is_cached_content_error
+from src.api.circuit_breaker import TRANSPORT_ERRORS
 from src.api.gemini_prompts import (
     PROMPT_TEXT, PROMPT_TEXT_PNG, PROMPT_TEXT_VIDEO,
     PROMPT_TEXT_BALANCED, PROMPT_TEXT_PNG_BALANCED, PROMPT_TEXT_VIDEO_BALANCED,
-    PROMPT_TEXT_FAST, PROMPT_TEXT_PNG_FAST, PROMPT_TEXT_VIDEO_FAST
+    PROMPT_TEXT_FAST, PROMPT_TEXT_PNG_FAST, PROMPT_TEXT_VIDEO_FAST,
+    PROMPT_TEXT_VARIATION, PROMPT_TEXT_PACKED, PROMPT_TEXT_PACKED_JSON
+)
+from src.api.response_schema import (
+    METADATA_SCHEMA, PACKED_METADATA_SCHEMA, VARIATION_SCHEMA,
+    to_json_prompt, parse_json_response, metadata_from_json, packed_metadata_from_json
 )
 
 # Constants
@@ -50,11 +61,12 @@ FALLBACK_MODELS = [
     "gemini-1.5-flash-8b",
     "gemini-1.5-flash"
 ]
+# Header blok per gambar pada jawaban request paket; toleran terhadap markdown (###, **)
+PACKED_IMAGE_HEADER_RE = re.compile(r"^[\s#*=\-]*Image\s+(\d+)\s*[:#*=\-\s]*$", re.MULTILINE | re.IGNORECASE)
 MODEL_LAST_USED = defaultdict(float)
 MODEL_LOCK = threading.Lock()
 API_KEY_LAST_USED = defaultdict(float) 
 API_KEY_LOCK = threading.Lock() 
-API_KEY_MIN_INTERVAL = 2.0 
 API_TIMEOUT = 90
 API_MAX_RETRIES = 3
 API_RETRY_DELAY = 10
@@ -62,10 +74,32 @@ API_RETRY_DELAY = 10
 # Global state for stop flags
 FORCE_STOP_FLAG = False
 
+# Response cache (None = nonaktif), diatur oleh batch_process_files
+RESPONSE_CACHE = None
+CONCURRENCY_CONTROLLER = None
+RATE_LIMITER = None
+KEY_HEALTH = None
+# Snapshot registry kesehatan key dari run terakhir, untuk UI/CLI setelah proses selesai
+LAST_KEY_HEALTH_SNAPSHOT = None
+# Jawaban diminta sebagai JSON (responseMimeType + responseSchema), bukan teks "Title: ..."
+STRUCTURED_OUTPUT = True
+# Handle cachedContents untuk prompt statis (None = prompt selalu dikirim inline)
+CONTEXT_CACHE = None
+# Kebijakan hedged request (None = tanpa request cadangan)
+HEDGE_POLICY = None
+# Router model Auto Rotasi berbasis statistik (None = model paling lama tidak dipakai)
+MODEL_ROUTER = None
+# Circuit breaker koneksi bersama semua worker (None = setiap file retry sendiri)
+CIRCUIT_BREAKER = None
+
 def select_smart_api_key(api_keys_list: list) -> str | None:
     if not api_keys_list:
         return None
 
+    registry = KEY_HEALTH
+    if registry is not None:
+        api_keys_list = registry.usable_keys(api_keys_list) or api_keys_list
+
     with API_KEY_LOCK:
         key_statuses = []
         for key in api_keys_list:
@@ -81,9 +115,10 @@ def select_smart_api_key(api_keys_list: list) -> str | None:
         API_KEY_LAST_USED[selected_key] = time.time() 
         return selected_key
 
-def select_best_fallback_model(fallback_models_list: list, excluded_model_name: str | None = None) -> str | None:
+def select_best_fallback_model(fallback_models_list: list, excluded_model_name: str | None = None, api_key: str | None = None) -> str | None:
     if not fallback_models_list:
         return None
+    limiter = RATE_LIMITER
 
     model_statuses = []
     for model_name in fallback_models_list:
@@ -94,14 +129,16 @@ def select_best_fallback_model(fallback_models_list: list, excluded_model_name:
             log_message(f"Model fallback '{model_name}' tidak ada di daftar GEMINI_MODELS, dilewati.", "warning")
             continue
         last_used_time = MODEL_LAST_USED.get(model_name, 0)
-        model_statuses.append((last_used_time, model_name))
+        # Dengan rate limiter, model yang kuotanya untuk key ini paling cepat tersedia didahulukan
+        wait_seconds = limiter.time_until_ready(api_key, model_name) if limiter is not None and api_key else 0.0
+        model_statuses.append((wait_seconds, last_used_time, model_name))
 
     if not model_statuses:
         return None
 
-    model_statuses.sort(key=lambda x: x[0])
+    model_statuses.sort(key=lambda x: (x[0], x[1]))
         
-    return model_statuses[0][1]
+    return model_statuses[0][2]
 
 def is_stop_requested():
     global FORCE_STOP_FLAG
@@ -110,6 +147,7 @@ def is_stop_requested():
 def set_force_stop():
     global FORCE_STOP_FLAG
     FORCE_STOP_FLAG = True
+    cancel_all_requests()
     log_message("Force stop flag telah diaktifkan. Semua proses akan segera berhenti.", "warning")
 
 def reset_force_stop():
@@ -133,56 +171,29 @@ def check_stop_event(stop_event, message=None):
 def get_api_endpoint(model_name):
     return f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent"
 
-def select_next_model():
+def select_next_model(api_key=None):
     with MODEL_LOCK:
         sorted_models = sorted(GEMINI_MODELS, key=lambda m: MODEL_LAST_USED.get(m, 0))
-        
-        selected_model = sorted_models[0]
+        # Dengan konkurensi adaptif, utamakan model yang masih punya slot kosong
+        controller = CONCURRENCY_CONTROLLER
+        if controller is not None:
+            sorted_models = [m for m in sorted_models if controller.model_has_capacity(m)] or sorted_models
+        limiter = RATE_LIMITER
+        router = MODEL_ROUTER
+        if router is not None:
+            # Model dengan perkiraan file berhasil per detik tertinggi untuk kuota key ini
+            quota_wait = (lambda m, tokens: limiter.time_until_ready(api_key, m, tokens)) if limiter is not None and api_key else None
+            selected_model = router.choose(sorted_models, quota_wait)
+        else:
+            # Dengan rate limiter, utamakan model yang kuotanya untuk key ini tersedia paling cepat
+            if limiter is not None and api_key:
+                sorted_models.sort(key=lambda m: limiter.time_until_ready(api_key, m))
+            selected_model = sorted_models[0]
         
         MODEL_LAST_USED[selected_model] = time.time()
         return selected_model
 
-def wait_for_model_cooldown(model_name, stop_event=None):
-    # IMPORTANT: This function is intentionally empty to bypass local rate limiting.
-    # The application now relies solely on server-side API rate limits,
-    # which are much more permissive than the previous local limits.
-    # This helps prevent false rate limit errors reported to users.
-    return
-
-def wait_for_api_key_cooldown(api_key, stop_event=None):
-    # IMPORTANT: This function is intentionally empty to bypass local rate limiting.
-    # The application now relies solely on server-side API rate limits,
-    # which are much more permissive than the previous local limits.
-    # This helps prevent false rate limit errors reported to users.
-    return
-
-def _attempt_gemini_request(
-    image_paths,
-    current_api_key: str,
-    model_to_use: str,
-    stop_event,
-    use_png_prompt: bool,
-    use_video_prompt: bool,
-    priority: str,
-    image_basename: str
-) -> tuple:
-
-    if check_stop_event(stop_event, f"API request dibatalkan sebelum cooldown model: {image_basename}"):
-        return -2, None, "stopped", "Process stopped before model cooldown"
-
-    wait_for_model_cooldown(model_to_use, stop_event)
-
-    if check_stop_event(stop_event, f"API request dibatalkan setelah cooldown model: {image_basename}"):
-        return -2, None, "stopped", "Process stopped after model cooldown"
-
-    api_endpoint = get_api_endpoint(model_to_use)
-    
-    if isinstance(image_paths, str):
-        image_paths = [image_paths]
-        log_message(f"Mengirim {image_basename} ke model {model_to_use} (API Key: ...{current_api_key[-5:]})", "info")
-    else:
-        log_message(f"Mengirim {len(image_paths)} frame dari {image_basename} ke model {model_to_use} (API Key: ...{current_api_key[-5:]})", "info")
-
+def _select_prompt_text(priority, use_png_prompt, use_video_prompt):
     selected_prompt_text = PROMPT_TEXT
     if priority == "Cepat":
         if use_video_prompt: selected_prompt_text = PROMPT_TEXT_VIDEO_FAST
@@ -195,36 +206,136 @@ def _attempt_gemini_request(
     else:
         if use_video_prompt: selected_prompt_text = PROMPT_TEXT_VIDEO
         elif use_png_prompt: selected_prompt_text = PROMPT_TEXT_PNG
+    return selected_prompt_text
 
-    parts = [{"text": selected_prompt_text}]
-    
-    for img_path in image_paths:
-        try:
-            with open(img_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode("utf-8")
-            
-            _, ext = os.path.splitext(img_path)
-            mime_type = f"image/{ext.lower().replace('.', '')}"
-            if mime_type == "image/jpg": mime_type = "image/jpeg"
-            if mime_type not in ["image/png", "image/jpeg", "image/webp", "image/heic", "image/heif"]:
-                mime_type = "image/jpeg"
-                
-            parts.append({"inline_data": {"mime_type": mime_type, "data": image_data}})
+def _build_image_parts(image_paths, image_labels=None):
+    """
+    Membaca gambar menjadi parts inline_data (base64) untuk generateContent.
+
+    Raises:
+        OSError jika salah satu file tidak bisa dibaca.
+    """
+    parts = []
+    for index, img_path in enumerate(image_paths):
+        if image_labels:
+            # Label teks sebelum setiap gambar agar jawaban bisa dipetakan kembali per file
+            parts.append({"text": image_labels[index]})
+        with open(img_path, "rb") as image_file:
+            image_data = base64.b64encode(image_file.read()).decode("utf-8")
+        
+        _, ext = os.path.splitext(img_path)
+        mime_type = f"image/{ext.lower().replace('.', '')}"
+        if mime_type == "image/jpg": mime_type = "image/jpeg"
+        if mime_type not in ["image/png", "image/jpeg", "image/webp", "image/heic", "image/heif"]:
+            mime_type = "image/jpeg"
             
-        except Exception as e:
-            log_message(f"Error membaca file gambar ({os.path.basename(img_path)}): {e}", "error")
-            return -3, None, "file_read", str(e)
+        parts.append({"inline_data": {"mime_type": mime_type, "data": image_data}})
+    return parts
 
+def _build_request_payload(prompt_text, parts, max_output_tokens=MAX_OUTPUT_TOKENS_PER_IMAGE, response_schema=None):
     payload = {
-        "contents": [{"parts": parts}],
+        "contents": [{"parts": [{"text": prompt_text}] + parts}],
         "safetySettings": [
             {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
             {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
             {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
             {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
         ],
-        "generationConfig": {"temperature": 0.2, "maxOutputTokens": 500, "topP": 0.8, "topK": 40}
+        "generationConfig": {"temperature": 0.2, "maxOutputTokens": max_output_tokens, "topP": 0.8, "topK": 40}
     }
+    if response_schema is not None:
+        payload["generationConfig"]["responseMimeType"] = "application/json"
+        payload["generationConfig"]["responseSchema"] = response_schema
+    return payload
+
+def build_metadata_request(image_path, use_png_prompt=False, use_video_prompt=False, priority="Kualitas"):
+    """
+    Menyusun body generateContent untuk satu file (prompt + gambar/frame) tanpa
+    mengirimnya, misalnya untuk file request Batch API. Formatnya sama dengan request
+    interaktif: JSON responseSchema jika structured output aktif.
+
+    Raises:
+        OSError jika gambar tidak bisa dibaca.
+    """
+    prompt_text = _select_prompt_text(priority, use_png_prompt, use_video_prompt)
+    response_schema = None
+    if STRUCTURED_OUTPUT:
+        prompt_text = to_json_prompt(prompt_text)
+        response_schema = METADATA_SCHEMA
+    image_paths = [image_path] if isinstance(image_path, str) else list(image_path)
+    return _build_request_payload(prompt_text, _build_image_parts(image_paths), MAX_OUTPUT_TOKENS_PER_IMAGE, response_schema)
+
+def metadata_from_response(response_data, keyword_count="49"):
+    """
+    Membaca metadata dari satu GenerateContentResponse (misal baris hasil Batch API).
+
+    Returns:
+        Dictionary metadata, atau {"error": ...} jika jawaban diblokir/kosong/tidak terbaca.
+    """
+    if not isinstance(response_data, dict):
+        return {"error": "Respons kosong"}
+    block_reason = (response_data.get("promptFeedback") or {}).get("blockReason")
+    if block_reason:
+        return {"error": f"Content blocked: {block_reason}"}
+    candidates = response_data.get("candidates") or []
+    parts = (candidates[0].get("content") or {}).get("parts", []) if candidates else []
+    generated_text = "".join(part.get("text", "") for part in parts)
+    if not generated_text:
+        return {"error": "Respons tanpa teks"}
+    if STRUCTURED_OUTPUT:
+        metadata = _extract_structured_metadata(generated_text, keyword_count)
+    else:
+        metadata = _extract_metadata_from_text(generated_text, keyword_count)
+    if not metadata or not metadata.get("title") or not metadata.get("tags"):
+        return {"error": "Gagal mengekstrak metadata dari respons"}
+    return metadata
+
+def _attempt_gemini_request(
+    image_paths,
+    current_api_key: str,
+    model_to_use: str,
+    stop_event,
+    use_png_prompt: bool,
+    use_video_prompt: bool,
+    priority: str,
+    image_basename: str,
+    prompt_text: str | None = None,
+    image_labels: list | None = None,
+    max_output_tokens: int = MAX_OUTPUT_TOKENS_PER_IMAGE,
+    response_schema: dict | None = None,
+    cached_content: str | None = None
+) -> tuple:
+
+    # Kuota per (key, model) sudah diatur src/api/rate_limiter.py sebelum fungsi ini dipanggil
+    if check_stop_event(stop_event, f"API request dibatalkan sebelum dikirim: {image_basename}"):
+        return -2, None, "stopped", "Process stopped before API request"
+
+    api_endpoint = get_api_endpoint(model_to_use)
+    requested_image_paths = image_paths
+    
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+        log_message(f"Mengirim {image_basename} ke model {model_to_use} (API Key: ...{current_api_key[-5:]})", "info")
+    elif not image_paths:
+        log_message(f"Mengirim permintaan teks untuk {image_basename} ke model {model_to_use} (API Key: ...{current_api_key[-5:]})", "info")
+    elif image_labels:
+        log_message(f"Mengirim {len(image_paths)} gambar dalam satu request ({image_basename}) ke model {model_to_use} (API Key: ...{current_api_key[-5:]})", "info")
+    else:
+        log_message(f"Mengirim {len(image_paths)} frame dari {image_basename} ke model {model_to_use} (API Key: ...{current_api_key[-5:]})", "info")
+
+    selected_prompt_text = prompt_text if prompt_text is not None else _select_prompt_text(priority, use_png_prompt, use_video_prompt)
+
+    try:
+        parts = _build_image_parts(image_paths, image_labels)
+    except OSError as e:
+        log_message(f"Error membaca file gambar ({image_basename}): {e}", "error")
+        return -3, None, "file_read", str(e)
+
+    payload = _build_request_payload(selected_prompt_text, parts, max_output_tokens, response_schema)
+    if cached_content:
+        # Prompt sudah ada di cachedContent; yang dikirim hanya gambar (dan labelnya)
+        payload["contents"] = [{"role": "user", "parts": parts}]
+        payload["cachedContent"] = cached_content
 
     headers = {"Content-Type": "application/json", "User-Agent": "MetadataProcessor/1.0"}
     api_url = f"{api_endpoint}?key={current_api_key}"
@@ -232,42 +343,76 @@ def _attempt_gemini_request(
     if check_stop_event(stop_event, f"API request dibatalkan sebelum POST: {image_basename}"):
         return -2, None, "stopped", "Process stopped before API POST"
 
-    session = requests.Session()
-    session.mount('https://', requests.adapters.HTTPAdapter(
-        max_retries=requests.adapters.Retry(total=1, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], allowed_methods=["POST"], respect_retry_after_header=True)
-    ))
-    
-    response_event = threading.Event()
-    response_container = {'response': None, 'error': None}
+    # Hedging: jika belum ada jawaban setelah p95 latensi model ini, kirim request cadangan
+    # lewat key lain yang masih punya kuota dan pakai jawaban yang lebih dulu datang
+    hedge_policy = HEDGE_POLICY
+    hedge_after = hedge_policy.hedge_delay(model_to_use) if hedge_policy is not None else None
+    hedge_state = {}
+
+    def start_hedge():
+        hedge_key = hedge_policy.start_hedge(current_api_key, model_to_use, estimate_request_tokens(selected_prompt_text, len(image_paths), max_output_tokens))
+        if hedge_key is None:
+            return None
+        hedge_state["key"] = hedge_key
+        log_message(f"Request cadangan untuk {image_basename} lewat API key ...{hedge_key[-5:]} (belum ada jawaban dari ...{current_api_key[-5:]} setelah {hedge_after:.1f}s)", "info")
+        # cachedContent terikat pada project key utama, jadi request cadangan membawa prompt inline
+        hedge_payload = dict(payload, contents=[{"parts": [{"text": selected_prompt_text}] + parts}])
+        hedge_payload.pop("cachedContent", None)
+        return f"{api_endpoint}?key={hedge_key}", hedge_payload
 
-    def perform_api_request_in_thread():
+    def accept_hedge(hedge_response):
+        hedge_key = hedge_state["key"]
+        hedge_latency = time.monotonic() - request_started
+        registry = KEY_HEALTH
+        if hedge_response.status_code == 200:
+            if registry is not None:
+                registry.record(hedge_key, 200, hedge_latency)
+            return True
+        # Jawaban cadangan yang gagal dicatat untuk key cadangan; request utama tetap ditunggu
         try:
-            resp = session.post(api_url, headers=headers, json=payload, timeout=API_TIMEOUT, verify=True)
-            response_container['response'] = resp
-        except Exception as e_req:
-            response_container['error'] = e_req
-        finally:
-            response_event.set()
-
-    api_thread = threading.Thread(target=perform_api_request_in_thread)
-    api_thread.daemon = True
-    api_thread.start()
-
-    while not response_event.is_set():
-        if check_stop_event(stop_event, f"API request dibatalkan saat menunggu response: {image_basename}"):
-            return -2, None, "stopped", "Process stopped while waiting for API response"
-        response_event.wait(0.1)
-    
-    if response_container['error']:
-        e = response_container['error']
+            hedge_data = hedge_response.json()
+        except ValueError:
+            hedge_data = None
+        limiter = RATE_LIMITER
+        if hedge_response.status_code == 429 and limiter is not None:
+            quota = parse_quota_error(hedge_data)
+            limiter.on_rate_limited(hedge_key, model_to_use, retry_delay=quota["retry_delay"], per_day=quota["per_day"])
+        if registry is not None:
+            hedge_error = ((hedge_data or {}).get("error") or {}).get("message") if isinstance(hedge_data, dict) else None
+            registry.record(hedge_key, hedge_response.status_code, hedge_latency, "api_error", hedge_error)
+        return False
+
+    # Request dijalankan di event loop bersama; thread ini tidur sampai response datang
+    # atau stop diminta (tanpa thread tambahan dan tanpa polling)
+    request_started = time.monotonic()
+    hedge_won = False
+    try:
+        if hedge_after is None:
+            response = post_json(api_url, headers=headers, json=payload, timeout=API_TIMEOUT, stop_event=stop_event, should_stop=is_stop_requested)
+        else:
+            response, winner = post_json_hedged(
+                api_url, headers=headers, json=payload, timeout=API_TIMEOUT,
+                hedge_after=hedge_after, hedge=start_hedge, hedge_accept=accept_hedge,
+                stop_event=stop_event, should_stop=is_stop_requested
+            )
+            hedge_won = winner == 1
+    except RequestCancelled:
+        log_message(f"API request dibatalkan saat menunggu response: {image_basename}")
+        return -2, None, "stopped", "Process stopped while waiting for API response"
+    except Exception as e:
         err_msg = f"RequestException ({type(e).__name__}): {str(e)}"
         log_message(f"Error request API untuk {image_basename} ke {model_to_use}: {err_msg}", "error")
-        error_type = "timeout" if isinstance(e, requests.exceptions.Timeout) else "connection_error" if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.SSLError)) else "request_exception"
+        error_type = classify_request_error(e)
         return -4, None, error_type, str(e)
 
-    response = response_container['response']
+    if hedge_won:
+        hedge_policy.record_win()
+        log_message(f"Request cadangan lewat API key ...{hedge_state['key'][-5:]} menjawab lebih dulu untuk {image_basename}", "info")
+    elif hedge_policy is not None and response is not None and response.status_code == 200:
+        hedge_policy.record_latency(model_to_use, time.monotonic() - request_started)
+
     if response is None:
-        log_message(f"Error: Response dari API adalah None tanpa error di container ({image_basename}, {model_to_use}). Ini tidak seharusnya terjadi.", "error")
+        log_message(f"Error: Response dari API adalah None tanpa error ({image_basename}, {model_to_use}). Ini tidak seharusnya terjadi.", "error")
         return -1, None, "internal_null_response", "Response object was None without explicit error."
     
     http_status_code = response.status_code
@@ -292,6 +437,17 @@ def _attempt_gemini_request(
         error_details = response_data.get("error", {})
         api_error_code = error_details.get("code", "UNKNOWN_API_ERR_CODE")
         api_error_message = error_details.get("message", "No specific error message from API.")
+        context_cache = CONTEXT_CACHE
+        if cached_content and is_cached_content_error(http_status_code, api_error_message):
+            # Handle kedaluwarsa/terhapus: kirim ulang langsung dengan prompt inline
+            if context_cache is not None:
+                context_cache.invalidate(cached_content)
+            return _attempt_gemini_request(
+                requested_image_paths, current_api_key, model_to_use, stop_event,
+                use_png_prompt, use_video_prompt, priority, image_basename,
+                prompt_text=selected_prompt_text, image_labels=image_labels,
+                max_output_tokens=max_output_tokens, response_schema=response_schema
+            )
         log_message(f"  API Error [{model_to_use}] untuk {image_basename}: HTTP {http_status_code}, Code API: {api_error_code} - {api_error_message}", "error")
         return http_status_code, response_data, "api_error", api_error_message
 
@@ -335,10 +491,225 @@ def _extract_metadata_from_text(generated_text: str, keyword_count: str) -> dict
         "ss_category": ss_category
     }
 
-def get_gemini_metadata(image_path, api_key, stop_event, use_png_prompt=False, use_video_prompt=False, selected_model_input=None, keyword_count="49", priority="Kualitas"):
+def _extract_structured_metadata(generated_text: str, keyword_count: str, image_count: int | None = None):
+    """
+    Membaca jawaban JSON (responseSchema) dengan satu decode plus validasi. JSON yang rusak
+    atau terpotong melewati satu perbaikan toleran; jika tetap gagal, jawaban dibaca
+    sebagai teks "Title: ..." seperti mode lama.
+
+    Args:
+        image_count: Jumlah gambar untuk request paket, None untuk satu gambar
+    Returns:
+        Dictionary metadata atau None (satu gambar); list per gambar (paket).
+    """
+    data = parse_json_response(generated_text)
+    if image_count is None:
+        metadata = metadata_from_json(data, keyword_count) if data is not None else None
+        if metadata is None:
+            metadata = _extract_metadata_from_text(generated_text, keyword_count)
+            if not metadata or not metadata.get("title") or not metadata.get("tags"):
+                return None
+        return metadata
+    if data is None:
+        return _extract_packed_metadata(generated_text, image_count, keyword_count)
+    return packed_metadata_from_json(data, image_count, keyword_count)
+
+def _extract_packed_metadata(generated_text: str, image_count: int, keyword_count: str) -> list:
+    """
+    Memecah jawaban request paket menjadi metadata per gambar berdasarkan header
+    "=== Image N ===".
+
+    Returns:
+        List sepanjang image_count berisi dictionary metadata, atau None untuk gambar
+        yang bloknya hilang/tidak lengkap (gambar itu dikirim ulang sendiri).
+    """
+    results = [None] * image_count
+    headers = list(PACKED_IMAGE_HEADER_RE.finditer(generated_text))
+    for position, header in enumerate(headers):
+        index = int(header.group(1)) - 1
+        if index < 0 or index >= image_count or results[index] is not None:
+            continue
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(generated_text)
+        metadata = _extract_metadata_from_text(generated_text[header.end():end], keyword_count)
+        if metadata and metadata.get("title") and metadata.get("tags"):
+            results[index] = metadata
+    return results
+
+def set_response_cache(cache):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) response cache untuk get_gemini_metadata.
+    """
+    global RESPONSE_CACHE
+    RESPONSE_CACHE = cache
+
+def set_concurrency_controller(controller):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) batas konkurensi adaptif per API key dan per model.
+    """
+    global CONCURRENCY_CONTROLLER
+    CONCURRENCY_CONTROLLER = controller
+
+def set_rate_limiter(limiter):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) rate limiter RPM/TPM/RPD per key dan model.
+    """
+    global RATE_LIMITER
+    RATE_LIMITER = limiter
+
+def set_structured_output(enabled):
+    """
+    Mengatur apakah jawaban Gemini diminta sebagai JSON lewat responseSchema (True) atau
+    sebagai teks "Title: ..." yang dibaca dengan regex (False).
+    """
+    global STRUCTURED_OUTPUT
+    STRUCTURED_OUTPUT = bool(enabled)
+
+def set_context_cache(cache):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) context cache Gemini untuk teks prompt.
+    """
+    global CONTEXT_CACHE
+    CONTEXT_CACHE = cache
+
+def set_hedge_policy(policy):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) hedged request: request cadangan lewat
+    key lain jika jawaban belum datang setelah p95 latensi model.
+    """
+    global HEDGE_POLICY
+    HEDGE_POLICY = policy
+
+def set_model_router(router):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) router model untuk mode Auto Rotasi.
+    """
+    global MODEL_ROUTER
+    MODEL_ROUTER = router
+
+def set_circuit_breaker(breaker):
+    """
+    Mengaktifkan (atau menonaktifkan dengan None) circuit breaker: saat koneksi putus,
+    pengiriman dijeda untuk semua worker sampai satu request uji berhasil.
+    """
+    global CIRCUIT_BREAKER
+    CIRCUIT_BREAKER = breaker
+
+def _record_model_attempt(model, http_status, latency, succeeded, response_data):
+    router = MODEL_ROUTER
+    if router is None:
+        return
+    usage = response_data.get("usageMetadata") if isinstance(response_data, dict) else None
+    router.record(model, http_status, latency, succeeded, usage)
+
+def set_key_health_registry(registry):
+    """
+    Mengaktifkan registry kesehatan API key. Saat dinonaktifkan (None), snapshot terakhir
+    disimpan agar tetap bisa dilihat dari UI/CLI setelah proses selesai.
+    """
+    global KEY_HEALTH, LAST_KEY_HEALTH_SNAPSHOT
+    if registry is None and KEY_HEALTH is not None:
+        LAST_KEY_HEALTH_SNAPSHOT = get_key_health_snapshot()
+    KEY_HEALTH = registry
+
+def get_key_health_snapshot():
+    """
+    Returns:
+        List kesehatan per API key (sukses/gagal, EWMA latensi, error terakhir, kuota,
+        eviksi) dari run yang sedang berjalan, atau dari run terakhir, atau None.
+    """
+    registry = KEY_HEALTH
+    if registry is None:
+        return LAST_KEY_HEALTH_SNAPSHOT
+    limiter = RATE_LIMITER
+    return registry.snapshot(limiter.key_quota_state if limiter is not None else None)
+
+def format_key_health_snapshot(snapshot):
+    """
+    Returns:
+        List baris teks (satu per key) untuk log dan GUI.
+    """
+    return [format_key_health(row) for row in snapshot or []]
+
+def get_concurrency_snapshot():
+    """
+    Returns:
+        Dictionary batas konkurensi saat ini per key dan per model, atau None jika tidak aktif.
+    """
+    controller = CONCURRENCY_CONTROLLER
+    return controller.snapshot() if controller is not None else None
+
+def get_gemini_metadata(image_path, api_key, stop_event, use_png_prompt=False, use_video_prompt=False, selected_model_input=None, keyword_count="49", priority="Kualitas", reroute_key=None):
+    """
+    Meminta metadata ke Gemini dengan retry (lewat response cache jika aktif).
+
+    Args:
+        reroute_key: Callable(failed_key, tried_keys, model, wait=False) -> API key lain atau
+            None, dari scheduler; jika diberikan, retry setelah 429/key ditolak/error server
+            dikirim ke key lain yang paling lapang, bukan ke key yang sama
+    """
+    def fetch():
+        return _get_gemini_metadata_uncached(image_path, api_key, stop_event, use_png_prompt, use_video_prompt, selected_model_input, keyword_count, priority, reroute_key)
+
+    cache = RESPONSE_CACHE
+    if cache is None:
+        return fetch()
+
+    prompt_variant = f"{priority}:{'video' if use_video_prompt else 'png' if use_png_prompt else 'default'}"
+    model_key = selected_model_input or "Auto Rotasi"
+    cache_key = compute_cache_key(image_path, prompt_variant, model_key, keyword_count)
+    result, from_cache = cache.get_or_fetch(cache_key, fetch, should_stop=lambda: check_stop_event(stop_event))
+    if from_cache:
+        image_basename = os.path.basename(image_path[0] if isinstance(image_path, list) else image_path)
+        log_message(f"Metadata diambil dari cache untuk {image_basename} (tanpa request API)", "success")
+    return result
+
+def get_gemini_metadata_packed(image_paths, api_key, stop_event, use_png_prompt=False, selected_model_input=None, keyword_count="49", priority="Kualitas", reroute_key=None):
+    """
+    Meminta metadata beberapa gambar kecil dalam satu request generateContent, untuk key
+    free tier yang dibatasi RPM (bukan token). Gambar yang sudah ada di response cache
+    tidak ikut dikirim; hasil per gambar disimpan ke cache dengan kunci yang sama seperti
+    request satu gambar.
+
+    Args:
+        image_paths: List path gambar yang sudah disiapkan (JPG/PNG) dengan prompt yang sama
+        Lainnya: Sama seperti get_gemini_metadata
+    Returns:
+        List sepanjang image_paths berisi dictionary metadata, atau None untuk gambar yang
+        harus dikirim ulang sendiri; "stopped" jika dihentikan; dictionary {"error": ...}
+        jika seluruh request paket gagal.
+    """
+    cache = RESPONSE_CACHE
+    prompt_variant = f"{priority}:{'png' if use_png_prompt else 'default'}"
+    model_key = selected_model_input or "Auto Rotasi"
+    cache_keys = [compute_cache_key(path, prompt_variant, model_key, keyword_count) if cache is not None else None for path in image_paths]
+    results = [cache.get(key) if key is not None else None for key in cache_keys]
+    for path, result in zip(image_paths, results):
+        if result is not None:
+            log_message(f"Metadata diambil dari cache untuk {os.path.basename(path)} (tanpa request API)", "success")
+    pending = [index for index, result in enumerate(results) if result is None]
+    if len(pending) < 2:
+        # Tidak ada yang perlu dipaketkan; sisa satu gambar dikirim lewat jalur biasa oleh pemanggil
+        return results
+
+    packed_results = _get_gemini_metadata_uncached(
+        [image_paths[index] for index in pending], api_key, stop_event, use_png_prompt, False,
+        selected_model_input, keyword_count, priority, reroute_key, packed=True
+    )
+    if not isinstance(packed_results, list):
+        return packed_results
+    for index, metadata in zip(pending, packed_results):
+        results[index] = metadata
+        if metadata is not None and cache is not None:
+            cache.put(cache_keys[index], metadata)
+    return results
+
+def _get_gemini_metadata_uncached(image_path, api_key, stop_event, use_png_prompt=False, use_video_prompt=False, selected_model_input=None, keyword_count="49", priority="Kualitas", reroute_key=None, packed=False):
     is_multi_image = isinstance(image_path, list)
     
-    if is_multi_image:
+    if packed:
+        image_basename = f"{os.path.basename(image_path[0])} (+{len(image_path)-1} gambar lainnya)"
+        log_message(f"Memulai get_gemini_metadata untuk paket {len(image_path)} gambar dengan prioritas: {priority}, model input: {selected_model_input}")
+    elif is_multi_image:
         image_basename = f"{os.path.basename(image_path[0])} (+{len(image_path)-1} frame lainnya)"
         log_message(f"Memulai get_gemini_metadata untuk {len(image_path)} frame video dengan prioritas: {priority}, model input: {selected_model_input}")
     else:
@@ -362,12 +733,35 @@ def get_gemini_metadata(image_path, api_key, stop_event, use_png_prompt=False, u
     if check_stop_event(stop_event, f"get_gemini_metadata dibatalkan sebelum loop retry: {image_basename}"):
         return "stopped"
 
-    wait_for_api_key_cooldown(api_key, stop_event)
-    if check_stop_event(stop_event, f"get_gemini_metadata dibatalkan setelah cooldown API Key: {image_basename}"):
-        return "stopped"
-
     current_retries = 0
+    # Upaya gagal karena jaringan; dikembalikan jika sirkuit sempat terbuka (file diantrekan ulang)
+    transport_retries = 0
+    max_attempts = API_MAX_RETRIES
+    fallback_model = None
+    tried_keys = [api_key]
     last_attempted_model = None
+    structured = STRUCTURED_OUTPUT
+    prompt_text = None
+    response_schema = None
+    image_labels = None
+    max_output_tokens = MAX_OUTPUT_TOKENS_PER_IMAGE
+    if structured:
+        prompt_text = to_json_prompt(_select_prompt_text(priority, use_png_prompt, use_video_prompt))
+        response_schema = METADATA_SCHEMA
+    if packed:
+        # Satu request untuk beberapa file: prompt meminta hasil berlabel per gambar
+        single_prompt = _select_prompt_text(priority, use_png_prompt, False)
+        if structured:
+            prompt_text = PROMPT_TEXT_PACKED_JSON.format(prompt=to_json_prompt(single_prompt).strip(), count=len(image_path))
+            response_schema = PACKED_METADATA_SCHEMA
+        else:
+            prompt_text = PROMPT_TEXT_PACKED.format(prompt=single_prompt.strip(), count=len(image_path))
+        image_labels = [f"Image {index + 1}" for index in range(len(image_path))]
+        max_output_tokens = MAX_OUTPUT_TOKENS_PER_IMAGE * len(image_path)
+    if prompt_text is None:
+        prompt_text = _select_prompt_text(priority, use_png_prompt, use_video_prompt)
+    image_count = len(image_path) if is_multi_image else 1
+    estimated_tokens = estimate_request_tokens(prompt_text, image_count, max_output_tokens)
     
     model_to_use = DEFAULT_MODEL
     is_auto_rotate_mode = (selected_model_input is None or selected_model_input == "Auto Rotasi")
@@ -380,35 +774,111 @@ def get_gemini_metadata(image_path, api_key, stop_event, use_png_prompt=False, u
             model_to_use = selected_model_input
             log_message(f"Menggunakan model tetap: {model_to_use} (user selected)", "info")
     
-    while current_retries < API_MAX_RETRIES:
+    while current_retries < max_attempts:
         if check_stop_event(stop_event, f"get_gemini_metadata loop retry ({current_retries + 1}) dibatalkan: {image_basename}"):
             return "stopped"
 
+        # Saat koneksi putus, tunggu di sini sampai request uji berhasil alih-alih menghabiskan retry
+        breaker = CIRCUIT_BREAKER
+        if breaker is not None:
+            gate = breaker.wait_until_closed(stop_event, should_stop=is_stop_requested)
+            if gate == "stopped":
+                return "stopped"
+            if gate == "waited" and transport_retries:
+                current_retries -= transport_retries
+                transport_retries = 0
+
         model_for_this_attempt = model_to_use
-        if is_auto_rotate_mode:
-            model_for_this_attempt = select_next_model() 
+        if fallback_model:
+            model_for_this_attempt = fallback_model
+        elif is_auto_rotate_mode:
+            model_for_this_attempt = select_next_model(api_key)
             log_message(f"Auto Rotasi: Model dipilih {model_for_this_attempt} untuk upaya {current_retries + 1}", "info")
         
         last_attempted_model = model_for_this_attempt
 
-        log_message(f"Upaya {current_retries + 1}/{API_MAX_RETRIES} menggunakan model: {model_for_this_attempt}", "info")
+        log_message(f"Upaya {current_retries + 1}/{max_attempts} menggunakan model: {model_for_this_attempt}", "info")
         
-        http_status, response_data, error_type, error_detail = _attempt_gemini_request(
-            image_path, api_key, model_for_this_attempt, stop_event,
-            use_png_prompt, use_video_prompt, priority, image_basename
-        )
+        # Prompt statis direferensikan lewat cachedContent jika cache untuk key+model ini tersedia
+        context_cache = CONTEXT_CACHE
+        cached_content = context_cache.handle(api_key, model_for_this_attempt, prompt_text, stop_event) if context_cache is not None else None
+        attempt_tokens = estimate_request_tokens(None, image_count, max_output_tokens) if cached_content else estimated_tokens
+
+        # Request hanya dikirim jika kuota (key, model) tersedia; jika belum, tunggu sebentar
+        limiter = RATE_LIMITER
+        admission = "ok"
+        if limiter is not None:
+            admission = limiter.acquire(api_key, model_for_this_attempt, attempt_tokens, stop_event=stop_event, should_stop=is_stop_requested)
+            if admission == "stopped":
+                return "stopped"
+
+        if admission == "ok":
+            controller = CONCURRENCY_CONTROLLER
+            if controller is not None and not controller.acquire_model(model_for_this_attempt, should_stop=lambda: check_stop_event(stop_event)):
+                return "stopped"
+            attempt_started = time.monotonic()
+            try:
+                http_status, response_data, error_type, error_detail = _attempt_gemini_request(
+                    image_path, api_key, model_for_this_attempt, stop_event,
+                    use_png_prompt, use_video_prompt, priority, image_basename,
+                    prompt_text=prompt_text, image_labels=image_labels, max_output_tokens=max_output_tokens,
+                    response_schema=response_schema, cached_content=cached_content
+                )
+            finally:
+                if controller is not None:
+                    controller.release_model(model_for_this_attempt)
+            attempt_latency = time.monotonic() - attempt_started
+            if controller is not None:
+                controller.record(api_key, model_for_this_attempt, http_status, attempt_latency)
+            registry = KEY_HEALTH
+            if registry is not None and error_type != "stopped":
+                registry.record(api_key, http_status, attempt_latency, error_type, error_detail)
+            if limiter is not None:
+                if http_status == 429:
+                    # Hormati retryDelay/QuotaFailure dari server: karantina berlaku untuk semua worker
+                    quota = parse_quota_error(response_data)
+                    limiter.on_rate_limited(api_key, model_for_this_attempt, retry_delay=quota["retry_delay"], per_day=quota["per_day"])
+                elif http_status == 200 and isinstance(response_data, dict):
+                    usage = response_data.get("usageMetadata") or {}
+                    actual_tokens = usage.get("totalTokenCount")
+                    if actual_tokens is not None:
+                        # Token prompt dari cachedContent dihitung terpisah dari input request
+                        actual_tokens -= usage.get("cachedContentTokenCount") or 0
+                    limiter.settle(api_key, model_for_this_attempt, attempt_tokens, actual_tokens)
+        else:
+            log_message(f"Rate limiter: kuota API key ...{api_key[-5:]} untuk {model_for_this_attempt} habis, request tidak dikirim ({image_basename})", "warning")
+            http_status, response_data, error_type, error_detail = 429, None, "local_rate_limit", "Local quota exhausted"
 
+        if breaker is not None:
+            breaker.record(http_status if admission == "ok" else None, error_type)
     
         if http_status == 200 and error_type is None:
             if response_data and "candidates" in response_data and response_data["candidates"]:
                 candidate = response_data["candidates"][0]
                 content = candidate.get("content", {})
                 parts = content.get("parts", [])
-                if parts and parts[0].get("text"):
-                    generated_text = parts[0].get("text", "")
-                    extracted_metadata = _extract_metadata_from_text(generated_text, keyword_count)
+                if parts and parts[0].get("text") and packed:
+                    generated_text = "".join(part.get("text", "") for part in parts)
+                    if structured:
+                        packed_results = _extract_structured_metadata(generated_text, keyword_count, len(image_path))
+                    else:
+                        packed_results = _extract_packed_metadata(generated_text, len(image_path), keyword_count)
+                    parsed_count = sum(1 for result in packed_results if result is not None)
+                    if parsed_count:
+                        _record_model_attempt(model_for_this_attempt, http_status, attempt_latency, True, response_data)
+                        log_message(f"Metadata {parsed_count}/{len(image_path)} gambar berhasil diekstrak dari {model_for_this_attempt} untuk paket {image_basename}", "success")
+                        return packed_results
+                    log_message(f"Gagal memecah jawaban paket dari {model_for_this_attempt} ({image_basename}).", "warning")
+                    error_type = "extraction_failed"
+                elif parts and parts[0].get("text"):
+                    generated_text = "".join(part.get("text", "") for part in parts)
+                    if structured:
+                        extracted_metadata = _extract_structured_metadata(generated_text, keyword_count)
+                    else:
+                        extracted_metadata = _extract_metadata_from_text(generated_text, keyword_count)
                     
                     if extracted_metadata:
+                        _record_model_attempt(model_for_this_attempt, http_status, attempt_latency, True, response_data)
                         log_message(f"Metadata berhasil diekstrak dari {model_for_this_attempt} untuk {image_basename}", "success")
                         return extracted_metadata
                     else:
@@ -421,36 +891,155 @@ def get_gemini_metadata(image_path, api_key, stop_event, use_png_prompt=False, u
                 log_message(f"Respons sukses (200) tapi tidak ada 'candidates' dari {model_for_this_attempt} ({image_basename}).", "warning")
                 error_type = "success_no_candidates_data"
         
+        if admission == "ok" and error_type not in ("stopped", "blocked"):
+            _record_model_attempt(model_for_this_attempt, http_status, attempt_latency, False, response_data)
         if error_type == "stopped":
             log_message(f"Pemrosesan dihentikan selama upaya API untuk {image_basename}. Detail: {error_detail}", "warning")
             return "stopped"
         elif error_type == "blocked":
             log_message(f"Konten diblokir untuk {image_basename} oleh {model_for_this_attempt}. Alasan: {error_detail}. Tidak ada retry.", "error")
             return {"error": f"Content blocked by {model_for_this_attempt}: {error_detail}"}
-        elif http_status == 429 or (error_type == "api_error" and response_data and response_data.get("error", {}).get("code") == 429):
+        error_class = classify_attempt(http_status, error_type, error_detail)
+        is_rate_limited = http_status == 429 or (error_type == "api_error" and response_data and response_data.get("error", {}).get("code") == 429)
+        if is_rate_limited:
+            error_class = "rate_limit"
             log_message(f"Rate limit (429) diterima untuk model {model_for_this_attempt} / API key ...{api_key[-4:]} pada {image_basename}.", "warning")
-            if not is_auto_rotate_mode:
+            if not is_auto_rotate_mode and reroute_key is None:
                 log_message(f"Peringatan: Model yang Anda pilih ({model_for_this_attempt}) sedang mencapai batas kuota. Coba gunakan model lain atau mode Auto Rotasi.", "warning")
         elif http_status in [400, 401, 403] or (error_type == "api_error" and response_data and response_data.get("error",{}).get("code",0) in [400,401,403]):
             err_msg = error_detail if error_detail else "Bad request/Auth error"
-            log_message(f"Error klien (HTTP {http_status}) untuk {image_basename} dengan {model_for_this_attempt}: {err_msg}. Tidak ada retry.", "error")
-            return {"error": f"{err_msg} (HTTP {http_status}, Model {model_for_this_attempt})"}
+            if error_class != "auth" or reroute_key is None:
+                log_message(f"Error klien (HTTP {http_status}) untuk {image_basename} dengan {model_for_this_attempt}: {err_msg}. Tidak ada retry.", "error")
+                return {"error": f"{err_msg} (HTTP {http_status}, Model {model_for_this_attempt})"}
+            # Key ditolak (dicabut/tidak valid): file ini sendiri tidak bermasalah, coba key lain
+            log_message(f"API key ...{api_key[-5:]} ditolak (HTTP {http_status}) untuk {image_basename}: {err_msg}", "warning")
 
         current_retries += 1
-        if current_retries < API_MAX_RETRIES:
+        if error_type in TRANSPORT_ERRORS:
+            transport_retries += 1
+            if breaker is not None and breaker.is_open():
+                # Gagal karena koneksi putus: upaya ini tidak dihitung, file menunggu sirkuit tertutup
+                log_message(f"{image_basename} diantrekan ulang sampai koneksi ke Gemini pulih", "info")
+                current_retries -= transport_retries
+                transport_retries = 0
+                continue
+        # Retry karena kuota/key/server dialihkan ke key lain yang paling lapang lewat scheduler
+        switched_key = False
+        if current_retries < max_attempts and reroute_key is not None and error_class in ("rate_limit", "auth", "server"):
+            new_key = reroute_key(api_key, list(tried_keys), fallback_model or model_for_this_attempt, wait=error_class == "auth")
+            if new_key and new_key != api_key:
+                log_message(f"Retry ({current_retries + 1}/{max_attempts}) untuk {image_basename} dialihkan dari API key ...{api_key[-5:]} ke ...{new_key[-5:]}", "info")
+                api_key = new_key
+                tried_keys.append(new_key)
+                switched_key = True
+            elif error_class == "auth":
+                log_message(f"Tidak ada API key lain untuk {image_basename} setelah key ditolak. Tidak ada retry.", "error")
+                return {"error": f"{error_detail or 'API key ditolak'} (HTTP {http_status}, Model {model_for_this_attempt})"}
+
+        if switched_key:
+            # Key baru punya kuota sendiri: langsung dicoba tanpa jeda
+            continue
+        if is_rate_limited and not is_auto_rotate_mode and fallback_model is None:
+            # Tidak ada key lain yang lapang untuk model pilihan pengguna: fallback terakhir
+            # ke model yang kuotanya paling cepat tersedia
+            fallback_model = select_best_fallback_model(FALLBACK_MODELS, excluded_model_name=model_for_this_attempt, api_key=api_key)
+            if fallback_model:
+                if current_retries >= max_attempts:
+                    max_attempts += 1
+                log_message(f"Model {model_for_this_attempt} terkena rate limit, mencoba model fallback {fallback_model} untuk {image_basename}", "warning")
+        if current_retries < max_attempts and http_status == 429 and RATE_LIMITER is not None:
+            # Tidak perlu jeda buta: rate limiter menjadwalkan upaya berikutnya saat kuota terisi
+            log_message(f"Retry ({current_retries + 1}/{max_attempts}) untuk {image_basename} dijadwalkan oleh rate limiter", "info")
+        elif current_retries < max_attempts:
             base_delay = API_RETRY_DELAY * (2 ** (current_retries -1 if current_retries > 0 else 0))
             jitter = random.uniform(0, 0.5 * base_delay)
             actual_delay = base_delay + jitter
-            log_message(f"Menunggu {actual_delay:.1f} detik sebelum retry ({current_retries + 1}/{API_MAX_RETRIES}) untuk {image_basename} (Model terakhir: {model_for_this_attempt}, Error: {error_type or 'N/A'}) ...")
+            log_message(f"Menunggu {actual_delay:.1f} detik sebelum retry ({current_retries + 1}/{max_attempts}) untuk {image_basename} (Model terakhir: {model_for_this_attempt}, Error: {error_type or 'N/A'}) ...")
             
             wait_start_time = time.time()
             while time.time() - wait_start_time < actual_delay:
                 if check_stop_event(stop_event, f"Retry delay dihentikan untuk {image_basename}"):
                     return "stopped"
+                if breaker is not None and error_type in TRANSPORT_ERRORS and breaker.is_open():
+                    # Sirkuit terbuka selama jeda: langsung menunggu request uji di awal loop
+                    break
                 time.sleep(0.1)
 
     if is_auto_rotate_mode and last_attempted_model and http_status == 429:
         log_message(f"Model terakhir '{last_attempted_model}' gagal karena rate limit setelah semua retry. Tidak mencoba fallback karena Auto Rotasi sudah digunakan.", "warning")
     
     log_message(f"Semua upaya ({current_retries}) gagal untuk {image_basename}. Model terakhir dicoba: {last_attempted_model}", "error")
-    return {"error": f"Maximum retries exceeded for {image_basename}. Last model: {last_attempted_model}"}
\ No newline at end of file
+    return {"error": f"Maximum retries exceeded for {image_basename}. Last model: {last_attempted_model}"}
+
+def get_gemini_text_variation(metadata, api_key, stop_event, selected_model_input=None, label="file"):
+    """
+    Meminta variasi judul dan deskripsi lewat request teks saja (tanpa gambar), untuk
+    metadata yang dipakai ulang dari gambar yang nyaris sama. Hanya satu upaya tanpa retry.
+
+    Args:
+        metadata: Dictionary metadata sumber (title, description, tags, ...)
+        api_key: API key yang dipakai untuk request ini
+        stop_event: Event threading untuk menghentikan proses
+        selected_model_input: Model pilihan pengguna, None/"Auto Rotasi" = rotasi
+        label: Nama file untuk log
+    Returns:
+        Dictionary metadata baru (keyword dan kategori tetap), atau None jika gagal
+    """
+    if selected_model_input in GEMINI_MODELS:
+        model_to_use = selected_model_input
+    else:
+        model_to_use = select_next_model(api_key)
+    prompt_text = PROMPT_TEXT_VARIATION.format(
+        title=metadata.get("title", ""),
+        description=metadata.get("description", "")
+    )
+    structured = STRUCTURED_OUTPUT
+    if structured:
+        prompt_text = to_json_prompt(prompt_text, "Return the result as JSON that follows the response schema: title and description.")
+    limiter = RATE_LIMITER
+    if limiter is not None and limiter.acquire(api_key, model_to_use, estimate_request_tokens(prompt_text, 0), stop_event=stop_event, should_stop=is_stop_requested) != "ok":
+        return None
+    http_status, response_data, error_type, error_detail = _attempt_gemini_request(
+        [], api_key, model_to_use, stop_event, False, False, "Cepat", label, prompt_text=prompt_text,
+        response_schema=VARIATION_SCHEMA if structured else None
+    )
+    if http_status != 200 or error_type is not None:
+        return None
+    try:
+        generated_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    variation = None
+    if structured:
+        data = parse_json_response(generated_text)
+        if isinstance(data, dict) and isinstance(data.get("title"), str):
+            variation = {"title": data["title"].strip(), "description": str(data.get("description") or "").strip()}
+    if variation is None:
+        variation = _extract_metadata_from_text(generated_text, "49")
+    if not variation or not variation.get("title"):
+        return None
+    new_metadata = dict(metadata)
+    new_metadata["title"] = variation["title"]
+    if variation.get("description"):
+        new_metadata["description"] = variation["description"]
+    return new_metadata
+
+def interpret_metadata_result(metadata_result):
+    """
+    Menerjemahkan hasil get_gemini_metadata menjadi status pemrosesan file.
+
+    Returns:
+        Tuple (status, metadata):
+            - ("ok", dict) jika metadata berhasil didapat
+            - ("stopped", None) jika proses dihentikan
+            - ("failed_api", None) jika API gagal atau hasil tidak valid
+    """
+    if metadata_result == "stopped":
+        return "stopped", None
+    elif isinstance(metadata_result, dict) and "error" in metadata_result:
+        log_message(f"  API Error detail: {metadata_result['error']}")
+        return "failed_api", None
+    elif isinstance(metadata_result, dict):
+        return "ok", metadata_result
+    log_message(f"  API call gagal mendapatkan metadata (hasil tidak valid).")
+    return "failed_api", None
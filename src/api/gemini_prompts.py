@@ -545,4 +545,36 @@ Description: [Generated Description Here]
 Keywords: [keyword1, keyword2, keyword3, ..., keywordN]
 AdobeStockCategory: [number. name]
 ShutterstockCategory: [name]
-''' 
\ No newline at end of file
+''' 
+# --- VARIASI TEKS (tanpa gambar, untuk gambar yang nyaris sama dengan gambar sebelumnya) ---
+PROMPT_TEXT_VARIATION = '''
+The following stock photo metadata was written for an almost identical image from the same series.
+Rewrite the title and description so they are unique while keeping the same meaning, subject and level of detail.
+Do not invent details that are not implied by the original text. Do not use any special characters or numbers in the title.
+
+Original Title: {title}
+Original Description: {description}
+
+Provide the output STRICTLY in the following format, with each item on a new line and no extra text before or after:
+
+Title: [Rewritten Title Here]
+Description: [Rewritten Description Here]
+'''
+
+# --- PAKET (beberapa gambar dalam satu request; {prompt} = prompt gambar tunggal sesuai prioritas) ---
+PROMPT_TEXT_PACKED = '''
+{prompt}
+
+IMPORTANT: This request contains {count} separate, unrelated images. Each image is preceded by its label, from "Image 1" to "Image {count}".
+Apply all of the instructions above to EACH image independently. Never mix subjects, keywords or categories between images.
+Output exactly {count} blocks, in image order. Start each block with a header line exactly like "=== Image N ===", followed by the Title, Description, Keywords, AdobeStockCategory and ShutterstockCategory lines for that image only.
+'''
+
+# --- PAKET JSON (dipakai bersama responseSchema; {prompt} = prompt gambar tunggal versi JSON) ---
+PROMPT_TEXT_PACKED_JSON = '''
+{prompt}
+
+IMPORTANT: This request contains {count} separate, unrelated images. Each image is preceded by its label, from "Image 1" to "Image {count}".
+Apply all of the instructions above to EACH image independently. Never mix subjects, keywords or categories between images.
+Return a JSON array with exactly {count} objects, in image order, and set "image" in each object to the number of the image it describes.
+'''
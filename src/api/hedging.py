@@ -0,0 +1,108 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/hedging.py
+import threading
+from collections import defaultdict, deque
+
+from src.api.concurrency import percentile
+
+# Request cadangan maksimum sebagai fraksi dari request utama
+DEFAULT_HEDGE_BUDGET = 0.05
+HEDGE_LATENCY_WINDOW = 100
+# Jumlah latensi sukses per model sebelum p95-nya dipercaya untuk hedging
+HEDGE_MIN_SAMPLES = 20
+# Batas bawah jeda hedge, agar jawaban yang memang cepat tidak pernah diduplikasi
+HEDGE_MIN_DELAY = 2.0
+
+class HedgePolicy:
+    """
+    Kebijakan hedged request: jika request belum dijawab setelah p95 latensi bergulir
+    untuk modelnya, satu request cadangan dikirim lewat API key lain yang masih punya
+    kuota. Jawaban yang datang lebih dulu dipakai dan request lainnya dibatalkan.
+
+    Jumlah request cadangan dibatasi oleh budget (fraksi dari request utama), sehingga
+    kuota yang terbuang untuk duplikat tidak pernah lebih dari, misalnya, 5%.
+    """
+    def __init__(self, select_key, budget=DEFAULT_HEDGE_BUDGET, min_samples=HEDGE_MIN_SAMPLES, min_delay=HEDGE_MIN_DELAY):
+        """
+        Args:
+            select_key: Callable(primary_key, model, tokens) -> API key cadangan yang kuotanya
+                sudah dipotong, atau None jika tidak ada key lain yang siap
+            budget: Fraksi maksimum request cadangan terhadap request utama
+            min_samples: Jumlah latensi sukses per model sebelum hedging aktif untuk model itu
+            min_delay: Jeda minimum sebelum request cadangan dikirim (detik)
+        """
+        self._select_key = select_key
+        self.budget = max(0.0, float(budget))
+        self._min_samples = max(1, int(min_samples))
+        self._min_delay = max(0.0, float(min_delay))
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=HEDGE_LATENCY_WINDOW))
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self, model):
+        """
+        Mencatat satu request utama dan mengembalikan jeda hedge-nya.
+
+        Returns:
+            Detik menunggu sebelum request cadangan, atau None jika model ini belum punya
+            cukup data latensi (request dikirim tanpa hedging).
+        """
+        with self._lock:
+            self.requests += 1
+            latencies = self._latencies.get(model)
+            if latencies is None or len(latencies) < self._min_samples:
+                return None
+            return max(self._min_delay, percentile(latencies, 0.95))
+
+    def record_latency(self, model, latency):
+        """
+        Mencatat latensi request sukses (HTTP 200) untuk p95 bergulir per model.
+        """
+        with self._lock:
+            self._latencies[model].append(max(0.0, float(latency)))
+
+    def start_hedge(self, primary_key, model, tokens):
+        """
+        Mengambil jatah budget dan API key cadangan.
+
+        Returns:
+            API key cadangan, atau None jika budget habis atau tidak ada key lain yang siap.
+        """
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.requests:
+                return None
+            self.hedged += 1
+        key = self._select_key(primary_key, model, tokens)
+        if key is None:
+            with self._lock:
+                self.hedged -= 1
+        return key
+
+    def record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def summary(self):
+        """
+        Returns:
+            Dictionary jumlah request utama, request cadangan, dan cadangan yang menang.
+        """
+        with self._lock:
+            return {"requests": self.requests, "hedged": self.hedged, "hedge_wins": self.hedge_wins}
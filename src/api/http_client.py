@@ -0,0 +1,216 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/http_client.py
+import threading
+
+import requests
+
+from src.utils.logging import log_message
+
+try:
+    import httpx
+    try:
+        import h2  # noqa: F401  (httpx butuh paket h2 untuk HTTP/2)
+        HTTP2_AVAILABLE = True
+    except ImportError:
+        HTTP2_AVAILABLE = False
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+DEFAULT_POOL_SIZE = 10
+# Koneksi yang dibuka di awal proses; sisanya dibuka saat dibutuhkan
+HTTP_WARMUP_MAX = 8
+WARMUP_TIMEOUT = 10
+
+_CLIENT_LOCK = threading.Lock()
+_CLIENT = None
+_CLIENT_POOL_SIZE = 0
+_CLIENT_HTTP2 = False
+
+def _build_requests_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_size,
+        max_retries=requests.adapters.Retry(total=1, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], allowed_methods=["POST"], respect_retry_after_header=True)
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def _build_httpx_client(pool_size):
+    # Dengan HTTP/2 ratusan request bersamaan berbagi beberapa socket (multiplexing)
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    transport = httpx.HTTPTransport(http2=True, retries=1, limits=limits)
+    return httpx.Client(transport=transport, http2=True)
+
+def configure_http_pool(pool_size=DEFAULT_POOL_SIZE, http2=False):
+    """
+    Menyiapkan pool koneksi HTTP keep-alive untuk seluruh proses. Pool dibuat ulang
+    hanya jika perlu diperbesar atau transport berubah, sehingga koneksi yang sudah
+    hangat tetap dipakai antar batch (dan antar file di mode watch).
+
+    Args:
+        pool_size: Jumlah koneksi maksimum (sebaiknya sama dengan batas request bersamaan)
+        http2: Jika True dan httpx[http2] terpasang, pakai transport HTTP/2
+    """
+    global _CLIENT, _CLIENT_POOL_SIZE, _CLIENT_HTTP2
+    use_http2 = bool(http2) and HTTP2_AVAILABLE
+    if http2 and not HTTP2_AVAILABLE:
+        log_message("Warning: HTTP/2 diminta tetapi paket httpx[http2] tidak terpasang, memakai HTTP/1.1.", "warning")
+    pool_size = max(1, int(pool_size))
+    old_client = None
+    with _CLIENT_LOCK:
+        if _CLIENT is not None and _CLIENT_HTTP2 == use_http2 and _CLIENT_POOL_SIZE >= pool_size:
+            return
+        old_client = _CLIENT
+        _CLIENT = _build_httpx_client(pool_size) if use_http2 else _build_requests_session(pool_size)
+        _CLIENT_POOL_SIZE = pool_size
+        _CLIENT_HTTP2 = use_http2
+    if old_client is not None:
+        try:
+            old_client.close()
+        except Exception:
+            pass
+    log_message(f"Pool HTTP: {pool_size} koneksi keep-alive ({'HTTP/2' if use_http2 else 'HTTP/1.1'})", "info")
+
+def get_http_client():
+    """
+    Returns:
+        requests.Session atau httpx.Client bersama; keduanya punya post(url, headers=, json=, timeout=)
+        dengan response yang punya status_code, json() dan text.
+    """
+    with _CLIENT_LOCK:
+        client = _CLIENT
+    if client is None:
+        configure_http_pool()
+        with _CLIENT_LOCK:
+            client = _CLIENT
+    return client
+
+def get_http_pool_settings():
+    """
+    Returns:
+        Tuple (ukuran pool, http2) dari konfigurasi pool saat ini.
+    """
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            return DEFAULT_POOL_SIZE, False
+        return _CLIENT_POOL_SIZE, _CLIENT_HTTP2
+
+def http_post(url, headers=None, json=None, timeout=None):
+    return get_http_client().post(url, headers=headers, json=json, timeout=timeout)
+
+def http_request(method, url, headers=None, json=None, content=None, timeout=None):
+    """
+    Request umum lewat pool bersama (misal upload/GET Batch API).
+
+    Args:
+        content: Body mentah (bytes atau file biner yang sudah dibuka), alternatif json
+    Returns:
+        Response dengan status_code, headers, json() dan text.
+    """
+    client = get_http_client()
+    if httpx is not None and isinstance(client, httpx.Client):
+        return client.request(method, url, headers=headers, json=json, content=content, timeout=timeout)
+    return client.request(method, url, headers=headers, json=json, data=content, timeout=timeout)
+
+def http_download(url, dest_path, timeout=None, chunk_size=1024 * 1024):
+    """
+    Mengunduh response ke file secara streaming (tanpa menampung seluruh isi di memori).
+
+    Returns:
+        Status HTTP; file hanya ditulis jika status 200.
+    """
+    client = get_http_client()
+    if httpx is not None and isinstance(client, httpx.Client):
+        with client.stream("GET", url, timeout=timeout) as response:
+            if response.status_code != 200:
+                return response.status_code
+            with open(dest_path, "wb") as f:
+                for chunk in response.iter_bytes(chunk_size):
+                    f.write(chunk)
+            return 200
+    response = client.get(url, timeout=timeout, stream=True)
+    try:
+        if response.status_code != 200:
+            return response.status_code
+        with open(dest_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+        return 200
+    finally:
+        response.close()
+
+def classify_request_error(error):
+    """
+    Mengelompokkan exception dari requests/httpx menjadi "timeout", "connection_error"
+    atau "request_exception".
+    """
+    if isinstance(error, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.SSLError)):
+        return "connection_error"
+    if httpx is not None:
+        if isinstance(error, httpx.TimeoutException):
+            return "timeout"
+        if isinstance(error, (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError)):
+            return "connection_error"
+    return "request_exception"
+
+def warm_up_http_pool(connections, base_url=GEMINI_BASE_URL):
+    """
+    Membuka beberapa koneksi TLS ke endpoint Gemini secara paralel sebelum request
+    pertama, agar file pertama tidak menanggung handshake TCP+TLS. Dengan HTTP/2 satu
+    koneksi sudah cukup. Kegagalan diabaikan (hanya optimasi).
+
+    Returns:
+        Jumlah koneksi yang berhasil dibuka.
+    """
+    client = get_http_client()
+    with _CLIENT_LOCK:
+        count = 1 if _CLIENT_HTTP2 else max(1, min(int(connections), _CLIENT_POOL_SIZE, HTTP_WARMUP_MAX))
+    opened = []
+
+    def open_one():
+        try:
+            # Tanpa API key: server menjawab 404 dengan cepat, koneksinya kembali ke pool
+            client.head(f"{base_url}/", timeout=WARMUP_TIMEOUT)
+            opened.append(True)
+        except Exception:
+            pass
+
+    threads = [threading.Thread(target=open_one, name="http-warmup", daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(WARMUP_TIMEOUT + 1)
+    return len(opened)
+
+def close_http_pool():
+    global _CLIENT, _CLIENT_POOL_SIZE
+    with _CLIENT_LOCK:
+        client = _CLIENT
+        _CLIENT = None
+        _CLIENT_POOL_SIZE = 0
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
@@ -0,0 +1,188 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/key_health.py
+import threading
+
+from src.utils.logging import log_message
+
+# Bobot EWMA latensi (semakin besar, semakin cepat mengikuti latensi terbaru)
+LATENCY_EWMA_ALPHA = 0.2
+# Key dikeluarkan setelah sekian kegagalan beruntun tanpa satu pun sukses
+EVICT_CONSECUTIVE_FAILURES = 10
+# Bobot minimum key yang masih aktif, agar key yang sedang buruk tetap sesekali dicoba
+MIN_KEY_WEIGHT = 0.05
+# Pesan error Gemini untuk key yang tidak valid/dicabut (dikirim sebagai HTTP 400)
+INVALID_KEY_MARKERS = ("api_key_invalid", "api key not valid", "api key expired", "permission_denied")
+# Kelas error yang bukan kesalahan key (jaringan lokal, isi file) dan tidak dihitung untuk eviksi
+NON_KEY_ERRORS = ("timeout", "connection_error", "request_exception", "bad_request", "blocked", "file_read", "stopped")
+
+def classify_attempt(http_status, error_type=None, error_detail=None):
+    """
+    Mengelompokkan hasil satu upaya request menjadi kelas error untuk registry.
+
+    Returns:
+        None untuk sukses, atau salah satu: "auth", "rate_limit", "server", "bad_request",
+        "blocked", "invalid_response", atau error_type transport ("timeout", ...).
+    """
+    if http_status == 200:
+        if error_type is None:
+            return None
+        if error_type == "blocked":
+            return "blocked"
+        return "invalid_response"
+    if http_status == 429:
+        return "rate_limit"
+    if http_status in (401, 403):
+        return "auth"
+    if http_status == 400:
+        detail = str(error_detail or "").lower()
+        return "auth" if any(marker in detail for marker in INVALID_KEY_MARKERS) else "bad_request"
+    if isinstance(http_status, int) and 500 <= http_status < 600:
+        return "server"
+    return error_type or "request_exception"
+
+class _KeyStats:
+    def __init__(self):
+        self.success = 0
+        self.failure = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.last_error = None
+        self.evicted_reason = None
+
+class KeyHealthRegistry:
+    """
+    Registry kesehatan API key yang dipakai bersama semua worker: jumlah sukses/gagal,
+    EWMA latensi, kelas error terakhir, dan status eviksi. Scheduler memakai weight()
+    untuk mengutamakan key yang sehat; key yang ditolak server (dicabut/tidak valid)
+    atau gagal terus-menerus dikeluarkan di tengah run.
+    """
+    def __init__(self, api_keys):
+        self._lock = threading.Lock()
+        self._keys = list(dict.fromkeys(api_keys))
+        self._stats = {key: _KeyStats() for key in self._keys}
+
+    def record(self, api_key, http_status, latency, error_type=None, error_detail=None):
+        """
+        Mencatat hasil satu upaya request.
+
+        Returns:
+            True jika key ini baru saja dikeluarkan.
+        """
+        error_class = classify_attempt(http_status, error_type, error_detail)
+        evicted_now = None
+        with self._lock:
+            stats = self._stats.get(api_key)
+            if stats is None:
+                return False
+            if error_class is None or error_class == "blocked":
+                # Konten diblokir tetap berarti key berfungsi
+                stats.success += 1
+                stats.consecutive_failures = 0
+                if latency is not None:
+                    latency = max(0.0, float(latency))
+                    stats.latency_ewma = latency if stats.latency_ewma is None else (
+                        LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * stats.latency_ewma
+                    )
+                if error_class is None:
+                    return False
+            else:
+                stats.failure += 1
+                stats.last_error = error_class
+                if error_class not in NON_KEY_ERRORS and error_class != "rate_limit":
+                    stats.consecutive_failures += 1
+            if stats.evicted_reason is None:
+                if error_class == "auth":
+                    stats.evicted_reason = f"ditolak server (HTTP {http_status})"
+                elif stats.success == 0 and stats.consecutive_failures >= EVICT_CONSECUTIVE_FAILURES:
+                    stats.evicted_reason = f"{stats.consecutive_failures} kegagalan beruntun ({error_class})"
+                if stats.evicted_reason is not None:
+                    evicted_now = stats.evicted_reason
+            remaining = len([k for k in self._keys if self._stats[k].evicted_reason is None])
+        if evicted_now:
+            log_message(f"API key ...{api_key[-5:]} dikeluarkan: {evicted_now}, tersisa {remaining} API key", "warning")
+            return True
+        return False
+
+    def is_evicted(self, api_key):
+        with self._lock:
+            stats = self._stats.get(api_key)
+            return stats is not None and stats.evicted_reason is not None
+
+    def all_evicted(self):
+        with self._lock:
+            return bool(self._keys) and all(self._stats[k].evicted_reason is not None for k in self._keys)
+
+    def usable_keys(self, api_keys):
+        with self._lock:
+            return [k for k in api_keys if k not in self._stats or self._stats[k].evicted_reason is None]
+
+    def weight(self, api_key):
+        """
+        Bobot pemilihan key: tingkat sukses (dihaluskan) dibagi latensi relatif terhadap
+        key tercepat. Key yang dikeluarkan berbobot 0.
+        """
+        with self._lock:
+            stats = self._stats.get(api_key)
+            if stats is None:
+                return 1.0
+            if stats.evicted_reason is not None:
+                return 0.0
+            success_rate = (stats.success + 1.0) / (stats.success + stats.failure + 2.0)
+            latencies = [s.latency_ewma for s in self._stats.values() if s.latency_ewma and s.evicted_reason is None]
+            latency_factor = 1.0
+            if stats.latency_ewma and latencies:
+                latency_factor = min(latencies) / stats.latency_ewma
+            return max(MIN_KEY_WEIGHT, success_rate * success_rate * latency_factor)
+
+    def snapshot(self, quota_state=None):
+        """
+        Args:
+            quota_state: Callable(api_key) -> "ok"/"quarantined"/"daily_exhausted" opsional
+        Returns:
+            List dictionary per key (key disamarkan) untuk UI, CLI, dan ringkasan.
+        """
+        weights = {key: self.weight(key) for key in self._keys}
+        with self._lock:
+            rows = []
+            for key in self._keys:
+                stats = self._stats[key]
+                total = stats.success + stats.failure
+                rows.append({
+                    "key": f"...{key[-5:]}",
+                    "success": stats.success,
+                    "failure": stats.failure,
+                    "success_rate": round(stats.success / total, 3) if total else None,
+                    "latency_ewma": round(stats.latency_ewma, 2) if stats.latency_ewma is not None else None,
+                    "last_error": stats.last_error,
+                    "quota": quota_state(key) if quota_state else "ok",
+                    "evicted": stats.evicted_reason,
+                    "weight": round(weights[key], 3),
+                })
+        return rows
+
+def format_key_health(row):
+    """
+    Satu baris ringkasan kesehatan key untuk log/GUI.
+    """
+    latency = f"{row['latency_ewma']:.1f}s" if row.get("latency_ewma") is not None else "-"
+    text = f"    - {row['key']}: {row['success']} ok / {row['failure']} gagal, latensi {latency}, kuota {row['quota']}"
+    if row.get("last_error"):
+        text += f", error terakhir {row['last_error']}"
+    if row.get("evicted"):
+        text += f", dikeluarkan ({row['evicted']})"
+    return text
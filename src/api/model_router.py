@@ -0,0 +1,169 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/model_router.py
+import time
+import random
+import threading
+from collections import deque
+
+from src.api.concurrency import percentile
+
+# Jumlah upaya terakhir per model yang dipakai untuk statistik bergulir
+ROUTER_WINDOW = 50
+# Model dengan upaya lebih sedikit dari ini dicoba lebih dulu (eksplorasi awal)
+ROUTER_MIN_SAMPLES = 3
+# Peluang memilih model yang paling lama tidak dicoba, agar statistiknya tetap segar
+DEFAULT_EXPLORATION = 0.1
+
+class _ModelStats:
+    def __init__(self):
+        # (berhasil, kena 429) per upaya
+        self.outcomes = deque(maxlen=ROUTER_WINDOW)
+        self.latencies = deque(maxlen=ROUTER_WINDOW)
+        self.output_tokens = deque(maxlen=ROUTER_WINDOW)
+        self.total_tokens = deque(maxlen=ROUTER_WINDOW)
+        self.last_tried = 0.0
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+class ModelRouter:
+    """
+    Pemilih model untuk mode Auto Rotasi. Per model disimpan statistik bergulir: latensi
+    (p50/p95) jawaban 200, rasio 429, rasio metadata berhasil diekstrak, dan token output
+    serta total per request. Model dipilih berdasarkan perkiraan file berhasil per detik:
+
+        peluang berhasil / (latensi yang diharapkan + tunggu kuota key untuk model itu)
+
+    Tunggu kuota dihitung rate limiter dengan rata-rata token per request model tersebut,
+    sehingga model yang boros token lebih cepat kehabisan TPM. Sebagian kecil pilihan
+    (eksplorasi) jatuh ke model yang paling lama tidak dicoba.
+    """
+    def __init__(self, models, exploration=DEFAULT_EXPLORATION, rng=None):
+        self._lock = threading.Lock()
+        self._stats = {model: _ModelStats() for model in models}
+        self.exploration = min(1.0, max(0.0, float(exploration)))
+        self._rng = rng or random.Random()
+
+    def record(self, model, http_status, latency, succeeded, usage=None):
+        """
+        Mencatat satu upaya request.
+
+        Args:
+            model: Model yang dipakai
+            http_status: Status HTTP upaya tersebut
+            latency: Lama upaya dalam detik
+            succeeded: True jika metadata berhasil diekstrak dari jawaban
+            usage: usageMetadata dari jawaban 200 (opsional)
+        """
+        with self._lock:
+            stats = self._stats.setdefault(model, _ModelStats())
+            stats.outcomes.append((bool(succeeded), http_status == 429))
+            if http_status == 200 and latency is not None:
+                stats.latencies.append(max(0.0, float(latency)))
+            if usage:
+                if usage.get("candidatesTokenCount") is not None:
+                    stats.output_tokens.append(usage["candidatesTokenCount"])
+                if usage.get("totalTokenCount") is not None:
+                    stats.total_tokens.append(usage["totalTokenCount"])
+
+    def average_tokens(self, model):
+        """
+        Returns:
+            Rata-rata total token per request model ini, atau None jika belum ada data.
+        """
+        with self._lock:
+            stats = self._stats.get(model)
+            return _mean(stats.total_tokens) if stats is not None else None
+
+    def _expected_latency_locked(self, stats):
+        if not stats.latencies:
+            return None
+        # Median untuk request biasa, ditambah sebagian ekor (p95) yang ikut menahan worker
+        return 0.5 * (percentile(stats.latencies, 0.5) + percentile(stats.latencies, 0.95))
+
+    def _throughput_locked(self, stats, wait_seconds):
+        successes = sum(1 for ok, _ in stats.outcomes if ok)
+        # Dihaluskan (Laplace) agar satu kegagalan awal tidak langsung mematikan model
+        success_rate = (successes + 1.0) / (len(stats.outcomes) + 2.0)
+        latency = self._expected_latency_locked(stats)
+        if latency is None:
+            return 0.0
+        return success_rate / max(0.05, latency + max(0.0, wait_seconds))
+
+    def choose(self, models, quota_wait=None):
+        """
+        Args:
+            models: Model kandidat (sudah disaring kapasitas konkurensinya)
+            quota_wait: Callable(model, tokens) -> detik sampai kuota key tersedia (opsional)
+        Returns:
+            Model terpilih.
+        """
+        if not models:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for model in models:
+                self._stats.setdefault(model, _ModelStats())
+            tokens = {model: _mean(self._stats[model].total_tokens) or 0 for model in models}
+        waits = {model: quota_wait(model, tokens[model]) if quota_wait else 0.0 for model in models}
+        with self._lock:
+            # Saat eksplorasi, hindari model yang kuotanya sedang habis jika masih ada pilihan lain
+            ready = [model for model in models if waits[model] <= 0] or list(models)
+            stale_first = sorted(ready, key=lambda m: self._stats[m].last_tried)
+            undersampled = [m for m in stale_first if len(self._stats[m].outcomes) < ROUTER_MIN_SAMPLES]
+            if undersampled:
+                selected = undersampled[0]
+            elif self._rng.random() < self.exploration:
+                selected = stale_first[0]
+            else:
+                selected = max(models, key=lambda m: (self._throughput_locked(self._stats[m], waits[m]), -self._stats[m].last_tried))
+            self._stats[selected].last_tried = now
+        return selected
+
+    def snapshot(self):
+        """
+        Returns:
+            Dictionary {model: statistik} untuk ringkasan run dan hasil batch_process_files.
+        """
+        with self._lock:
+            rows = {}
+            for model, stats in self._stats.items():
+                attempts = len(stats.outcomes)
+                if not attempts:
+                    continue
+                output_tokens = _mean(stats.output_tokens)
+                rows[model] = {
+                    "attempts": attempts,
+                    "p50_latency": round(percentile(stats.latencies, 0.5), 2) if stats.latencies else None,
+                    "p95_latency": round(percentile(stats.latencies, 0.95), 2) if stats.latencies else None,
+                    "rate_limited": round(sum(1 for _, limited in stats.outcomes if limited) / attempts, 3),
+                    "success_rate": round(sum(1 for ok, _ in stats.outcomes if ok) / attempts, 3),
+                    "output_tokens": round(output_tokens) if output_tokens is not None else None,
+                    "files_per_second": round(self._throughput_locked(stats, 0.0), 3),
+                }
+            return rows
+
+def format_model_stats(model, row):
+    """
+    Satu baris ringkasan statistik model untuk log/GUI.
+    """
+    latency = f"p50 {row['p50_latency']:.1f}s / p95 {row['p95_latency']:.1f}s" if row.get("p50_latency") is not None else "latensi -"
+    return (
+        f"    - {model}: {row['attempts']} upaya, {latency}, 429 {row['rate_limited']:.0%}, "
+        f"berhasil {row['success_rate']:.0%}"
+    )
@@ -0,0 +1,401 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/rate_limiter.py
+import time
+import datetime
+import threading
+
+from src.utils.logging import log_message
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    # Tanpa data zona waktu (Windows tanpa paket tzdata): pakai UTC-8
+    _QUOTA_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-8))
+
+# Batas free tier per model (RPM = request/menit, TPM = token/menit, RPD = request/hari).
+# Bisa ditimpa per model lewat "engine": {"rate_limits": {...}} di config.json.
+DEFAULT_MODEL_LIMITS = {
+    "gemini-2.0-flash": {"rpm": 15, "tpm": 1000000, "rpd": 1500},
+    "gemini-2.0-flash-lite": {"rpm": 30, "tpm": 1000000, "rpd": 1500},
+    "gemini-1.5-flash-8b": {"rpm": 15, "tpm": 250000, "rpd": 500},
+    "gemini-1.5-flash": {"rpm": 15, "tpm": 250000, "rpd": 500},
+}
+LIMIT_DIMENSIONS = ("rpm", "tpm", "rpd")
+DIMENSION_WINDOWS = {"rpm": 60.0, "tpm": 60.0, "rpd": 86400.0}
+
+# Perkiraan token per request sebelum usageMetadata diketahui
+TOKENS_PER_IMAGE = 258
+CHARS_PER_TOKEN = 4
+# Batas token output per gambar (maxOutputTokens); JSON sedikit lebih panjang dari format
+# teks dan jawaban yang terpotong di 500 token dulu memicu retry dengan upload gambar penuh
+MAX_OUTPUT_TOKENS_PER_IMAGE = 1024
+# Penantian lebih lama dari ini dianggap kuota pasangan (key, model) habis; pemanggil
+# sebaiknya memilih model/key lain daripada menunggu
+MAX_ADMISSION_WAIT = 65.0
+# Jeda maksimum per pemeriksaan stop saat menunggu token
+ADMISSION_CHECK_INTERVAL = 1.0
+# Karantina (key, model) setelah 429 tanpa RetryInfo dari server
+DEFAULT_QUARANTINE_SECONDS = 10.0
+
+def _parse_duration(value):
+    # google.protobuf.Duration dalam JSON: "37s" / "1.5s", atau {"seconds": .., "nanos": ..}
+    try:
+        if isinstance(value, str) and value.endswith("s"):
+            return float(value[:-1])
+        if isinstance(value, dict):
+            return float(value.get("seconds", 0)) + float(value.get("nanos", 0)) / 1e9
+        if value is not None:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def parse_quota_error(response_data):
+    """
+    Membaca detail error 429 Gemini: RetryInfo.retryDelay dan QuotaFailure.violations.
+
+    Returns:
+        Dictionary {"retry_delay": detik atau None, "per_day": bool, "quota_id": str}
+    """
+    info = {"retry_delay": None, "per_day": False, "quota_id": ""}
+    error = response_data.get("error") if isinstance(response_data, dict) else None
+    if not isinstance(error, dict):
+        return info
+    for detail in error.get("details") or []:
+        if not isinstance(detail, dict):
+            continue
+        type_url = detail.get("@type", "")
+        if type_url.endswith("google.rpc.RetryInfo"):
+            info["retry_delay"] = _parse_duration(detail.get("retryDelay"))
+        elif type_url.endswith("google.rpc.QuotaFailure"):
+            for violation in detail.get("violations") or []:
+                quota_id = str(violation.get("quotaId") or violation.get("quotaMetric") or "")
+                if "perday" in quota_id.lower():
+                    info["per_day"] = True
+                if quota_id and not info["quota_id"]:
+                    info["quota_id"] = quota_id
+    return info
+
+def seconds_until_daily_reset():
+    """
+    Kuota harian Gemini direset tengah malam waktu Pasifik.
+    """
+    now = datetime.datetime.now(_QUOTA_TIMEZONE)
+    next_midnight = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(60.0, (next_midnight - now).total_seconds())
+
+def estimate_request_tokens(prompt_text, image_count, max_output_tokens=None):
+    """
+    Perkiraan kasar token satu request generateContent: prompt (~4 karakter per token),
+    258 token per gambar, ditambah batas token output.
+
+    Args:
+        prompt_text: Teks prompt yang dikirim inline (None jika lewat cachedContent)
+        image_count: Jumlah gambar/frame dalam request
+        max_output_tokens: maxOutputTokens request; None = MAX_OUTPUT_TOKENS_PER_IMAGE per
+            gambar (request paket meminta jawaban untuk setiap gambar)
+    """
+    image_count = max(0, int(image_count))
+    if max_output_tokens is None:
+        max_output_tokens = MAX_OUTPUT_TOKENS_PER_IMAGE * max(1, image_count)
+    return len(prompt_text or "") // CHARS_PER_TOKEN + TOKENS_PER_IMAGE * image_count + int(max_output_tokens)
+
+def resolve_model_limits(overrides=None, models=None):
+    """
+    Menggabungkan tabel batas bawaan dengan override dari config.
+
+    Args:
+        overrides: Dictionary {model: {"rpm": n, "tpm": n, "rpd": n}}; nilai 0/None = tanpa batas
+        models: Daftar model yang dipakai (model tanpa entri tidak dibatasi)
+    Returns:
+        Dictionary {model: {dimensi: batas}} hanya berisi batas positif
+    """
+    table = {model: dict(limits) for model, limits in DEFAULT_MODEL_LIMITS.items()}
+    for model, limits in (overrides or {}).items():
+        if not isinstance(limits, dict):
+            log_message(f"Warning: rate_limits untuk '{model}' harus berupa objek, diabaikan.", "warning")
+            continue
+        table.setdefault(model, {}).update(limits)
+    if models is not None:
+        table = {model: table.get(model, {}) for model in models}
+    resolved = {}
+    for model, limits in table.items():
+        clean = {}
+        for dimension in LIMIT_DIMENSIONS:
+            try:
+                value = float(limits.get(dimension) or 0)
+            except (TypeError, ValueError):
+                value = 0.0
+            if value > 0:
+                clean[dimension] = value
+        resolved[model] = clean
+    return resolved
+
+class TokenBucket:
+    """
+    Token bucket klasik: kapasitas = batas per jendela, terisi ulang merata sepanjang
+    jendela. Token boleh dipinjam (saldo negatif) saat koreksi pemakaian aktual.
+    """
+    def __init__(self, capacity, window_seconds):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(window_seconds)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        # Request yang lebih besar dari kapasitas tetap boleh lewat saat bucket penuh
+        needed = min(float(amount), self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= float(amount)
+
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+class RateLimiter:
+    """
+    Pembatas laju sisi klien: satu set token bucket (RPM, TPM, RPD) per pasangan
+    (API key, model). Request hanya dikirim jika semua bucket pasangan tersebut punya
+    kapasitas, sehingga 429 berganti menjadi penantian singkat yang terjadwal.
+
+    Pasangan yang menerima 429 dikarantina untuk semua worker sampai waktu dari server
+    (retryDelay), atau sampai reset harian jika yang habis kuota per hari. Key yang kuota
+    hariannya habis di semua model yang dipakai tidak dialokasikan lagi.
+    """
+    def __init__(self, api_keys, model_limits, models=None):
+        self._lock = threading.Lock()
+        self._limits = dict(model_limits)
+        self._models = list(models) if models is not None else list(self._limits)
+        self._buckets = {}
+        # (key, model) -> (monotonic sampai kapan, karena kuota harian)
+        self._quarantine = {}
+        self._dropped_keys = set()
+        self._keys = list(dict.fromkeys(api_keys))
+        for key in self._keys:
+            for model, limits in self._limits.items():
+                self._buckets[(key, model)] = {
+                    dimension: TokenBucket(limit, DIMENSION_WINDOWS[dimension])
+                    for dimension, limit in limits.items()
+                }
+
+    def _wait_locked(self, api_key, model, tokens, now):
+        waits = [0.0]
+        quarantined = self._quarantine.get((api_key, model))
+        if quarantined is not None:
+            if quarantined[0] > now:
+                waits.append(quarantined[0] - now)
+            else:
+                del self._quarantine[(api_key, model)]
+                self._dropped_keys.discard(api_key)
+        buckets = self._buckets.get((api_key, model))
+        if not buckets:
+            return max(waits)
+        for dimension, bucket in buckets.items():
+            waits.append(bucket.wait_time(tokens if dimension == "tpm" else 1, now))
+        return max(waits)
+
+    def time_until_ready(self, api_key, model, tokens=0):
+        """
+        Returns:
+            Detik sampai pasangan (key, model) bisa menerima request sebesar `tokens`.
+        """
+        with self._lock:
+            return self._wait_locked(api_key, model, tokens, time.monotonic())
+
+    def has_capacity(self, api_key, models, tokens=0):
+        """
+        Returns:
+            True jika key masih bisa menerima request sekarang untuk salah satu model.
+        """
+        with self._lock:
+            now = time.monotonic()
+            return any(self._wait_locked(api_key, model, tokens, now) <= 0 for model in models)
+
+    def try_reserve(self, api_key, model, tokens):
+        """
+        Mengambil kapasitas satu request jika tersedia.
+
+        Returns:
+            0.0 jika request diterima (token sudah dipotong), atau lama tunggu dalam detik.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = self._wait_locked(api_key, model, tokens, now)
+            if wait_seconds > 0:
+                return wait_seconds
+            for dimension, bucket in self._buckets.get((api_key, model), {}).items():
+                bucket.consume(tokens if dimension == "tpm" else 1, now)
+            return 0.0
+
+    def acquire(self, api_key, model, tokens, stop_event=None, should_stop=None, max_wait=MAX_ADMISSION_WAIT):
+        """
+        Menunggu sampai pasangan (key, model) punya kapasitas, lalu memotong token.
+
+        Returns:
+            "ok" jika request boleh dikirim, "stopped" jika stop diminta saat menunggu,
+            "exhausted" jika penantian akan melebihi max_wait (kuota pasangan ini habis).
+        """
+        waited = 0.0
+        while True:
+            if (stop_event is not None and stop_event.is_set()) or (should_stop and should_stop()):
+                return "stopped"
+            wait_seconds = self.try_reserve(api_key, model, tokens)
+            if wait_seconds <= 0:
+                if waited > 0:
+                    log_message(f"Rate limiter: ...{api_key[-5:]} / {model} menunggu {waited:.1f} detik sebelum request", "info")
+                return "ok"
+            if waited + wait_seconds > max_wait:
+                return "exhausted"
+            step = min(wait_seconds, ADMISSION_CHECK_INTERVAL)
+            if stop_event is not None:
+                if stop_event.wait(step):
+                    return "stopped"
+            else:
+                time.sleep(step)
+            waited += step
+
+    def settle(self, api_key, model, estimated_tokens, actual_tokens):
+        """
+        Mengoreksi bucket TPM dengan jumlah token aktual dari usageMetadata.
+        """
+        if actual_tokens is None:
+            return
+        with self._lock:
+            bucket = self._buckets.get((api_key, model), {}).get("tpm")
+            if bucket is not None:
+                bucket.consume(float(actual_tokens) - float(estimated_tokens), time.monotonic())
+
+    def on_rate_limited(self, api_key, model, retry_delay=None, per_day=False):
+        """
+        Server menolak dengan 429: kosongkan bucket per menit pasangan ini dan karantina
+        pasangan tersebut untuk semua worker.
+
+        Args:
+            retry_delay: Detik dari RetryInfo.retryDelay, None = DEFAULT_QUARANTINE_SECONDS
+            per_day: True jika pelanggaran kuota adalah kuota harian
+        Returns:
+            True jika key ini baru saja kehabisan kuota harian di semua model yang dipakai.
+        """
+        key_label = f"...{api_key[-5:]}"
+        with self._lock:
+            now = time.monotonic()
+            for dimension, bucket in self._buckets.get((api_key, model), {}).items():
+                if dimension in ("rpm", "tpm") or per_day:
+                    bucket.drain(now)
+            seconds = seconds_until_daily_reset() if per_day else max(1.0, retry_delay if retry_delay is not None else DEFAULT_QUARANTINE_SECONDS)
+            current = self._quarantine.get((api_key, model))
+            if current is None or current[0] < now + seconds:
+                self._quarantine[(api_key, model)] = (now + seconds, per_day)
+            newly_dropped = False
+            if per_day and api_key not in self._dropped_keys:
+                exhausted = all(
+                    (q := self._quarantine.get((api_key, m))) is not None and q[1] and q[0] > now
+                    for m in self._models
+                )
+                if exhausted:
+                    self._dropped_keys.add(api_key)
+                    newly_dropped = True
+            remaining_keys = len([k for k in self._keys if k not in self._dropped_keys])
+        if per_day:
+            log_message(f"Kuota harian API key {key_label} untuk {model} habis, pasangan ini tidak dipakai sampai reset kuota ({seconds / 3600:.1f} jam lagi)", "warning")
+        else:
+            log_message(f"API key {key_label} / {model} dikarantina {seconds:.0f} detik (429{', retryDelay dari server' if retry_delay is not None else ''})", "warning")
+        if newly_dropped:
+            log_message(f"API key {key_label} dikeluarkan: kuota harian habis di semua model, tersisa {remaining_keys} API key", "warning")
+        return newly_dropped
+
+    def headroom(self, api_key, models):
+        """
+        Returns:
+            Fraksi kapasitas tersisa (0..1) pada model paling lapang untuk key ini; pasangan
+            yang dikarantina bernilai 0, pasangan tanpa batas bernilai 1.
+        """
+        with self._lock:
+            now = time.monotonic()
+            best = 0.0
+            for model in models:
+                quarantined = self._quarantine.get((api_key, model))
+                if quarantined is not None and quarantined[0] > now:
+                    continue
+                buckets = self._buckets.get((api_key, model))
+                if not buckets:
+                    return 1.0
+                fractions = []
+                for bucket in buckets.values():
+                    bucket._refill(now)
+                    fractions.append(max(0.0, bucket.tokens) / bucket.capacity)
+                best = max(best, min(fractions))
+            return best
+
+    def key_quota_state(self, api_key):
+        """
+        Returns:
+            "daily_exhausted", "quarantined" (salah satu model sedang dikarantina) atau "ok".
+        """
+        with self._lock:
+            if api_key in self._dropped_keys:
+                return "daily_exhausted"
+            now = time.monotonic()
+            for (key, _model), (until, _per_day) in self._quarantine.items():
+                if key == api_key and until > now:
+                    return "quarantined"
+            return "ok"
+
+    def is_key_dropped(self, api_key):
+        with self._lock:
+            return api_key in self._dropped_keys
+
+    def all_keys_dropped(self):
+        """
+        Returns:
+            True jika semua API key sudah kehabisan kuota harian (tidak ada yang bisa dipakai lagi).
+        """
+        with self._lock:
+            now = time.monotonic()
+            # Karantina yang sudah lewat (reset harian) mengembalikan key
+            for key in list(self._dropped_keys):
+                for model in self._models:
+                    self._wait_locked(key, model, 0, now)
+            return bool(self._keys) and all(key in self._dropped_keys for key in self._keys)
+
+    def snapshot(self):
+        """
+        Returns:
+            Dictionary {"...key/model": {dimensi: sisa kapasitas}} untuk log dan UI.
+        """
+        with self._lock:
+            now = time.monotonic()
+            result = {}
+            for (key, model), buckets in self._buckets.items():
+                remaining = {}
+                for dimension, bucket in buckets.items():
+                    bucket._refill(now)
+                    remaining[dimension] = int(max(0.0, bucket.tokens))
+                result[f"...{key[-5:]}/{model}"] = remaining
+            return result
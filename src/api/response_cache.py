@@ -0,0 +1,212 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/response_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from src.utils.logging import log_message
+
+RESPONSE_CACHE_FILE_NAME = "response_cache.sqlite"
+DEFAULT_CACHE_MAX_MB = 256
+DEFAULT_CACHE_TTL_DAYS = 30
+# Setelah eviksi, ukuran cache diturunkan ke fraksi ini dari batas maksimum
+EVICTION_TARGET_RATIO = 0.9
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+def compute_cache_key(image_paths, prompt_variant, model, keyword_count):
+    """
+    Membuat kunci cache dari isi file yang benar-benar dikirim ke API (setelah
+    kompresi/konversi), varian prompt, model, dan jumlah keyword.
+
+    Returns:
+        String hex SHA-256, atau None jika salah satu file tidak bisa dibaca.
+    """
+    if isinstance(image_paths, str):
+        image_paths = [image_paths]
+    digest = hashlib.sha256()
+    try:
+        for path in image_paths:
+            file_digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                    file_digest.update(chunk)
+            digest.update(file_digest.digest())
+    except OSError:
+        return None
+    digest.update(f"|{prompt_variant}|{model}|{keyword_count}".encode("utf-8"))
+    return digest.hexdigest()
+
+class ResponseCache:
+    """
+    Cache hasil metadata Gemini di disk (SQLite) dengan eviksi LRU berbasis ukuran dan TTL.
+
+    Juga menyediakan single-flight dalam satu proses: jika beberapa worker meminta
+    kunci yang sama bersamaan, hanya satu yang memanggil API dan sisanya menunggu hasilnya.
+    """
+    def __init__(self, db_path, max_size_mb=DEFAULT_CACHE_MAX_MB, ttl_days=DEFAULT_CACHE_TTL_DAYS):
+        self.db_path = db_path
+        self.max_size_bytes = int(float(max_size_mb) * 1024 * 1024)
+        self.ttl_seconds = float(ttl_days) * 86400
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " metadata TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self._conn.commit()
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """
+        Returns:
+            Dictionary metadata (salinan) jika ada dan belum kedaluwarsa, atau None.
+        """
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT metadata, size, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[2] < now - self.ttl_seconds:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self._total_size -= row[1]
+                    return None
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                log_message(f"Warning: Gagal membaca response cache: {e}", "warning")
+                return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def put(self, key, metadata):
+        if key is None or not isinstance(metadata, dict):
+            return
+        data = json.dumps(metadata, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            try:
+                old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, metadata, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, data, size, now, now)
+                )
+                self._total_size += size - (old[0] if old else 0)
+                if self._total_size > self.max_size_bytes:
+                    self._evict_locked()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                log_message(f"Warning: Gagal menulis response cache: {e}", "warning")
+
+    def _evict_locked(self):
+        target = int(self.max_size_bytes * EVICTION_TARGET_RATIO)
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        removed = []
+        for key, size in rows:
+            if self._total_size <= target:
+                break
+            removed.append((key,))
+            self._total_size -= size
+        if removed:
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", removed)
+
+    def get_or_fetch(self, key, fetch, should_stop=None):
+        """
+        Mengambil metadata dari cache, atau memanggil `fetch()` sekali per kunci.
+
+        Args:
+            key: Kunci dari compute_cache_key (None = tanpa cache, langsung fetch)
+            fetch: Callable tanpa argumen yang memanggil API dan mengembalikan hasil get_gemini_metadata
+            should_stop: Callable untuk menghentikan penantian pada request yang sama
+
+        Returns:
+            Tuple (result, from_cache)
+        """
+        if key is None:
+            return fetch(), False
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                return cached, True
+            with self._inflight_lock:
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    waiter = threading.Event()
+                    self._inflight[key] = waiter
+                    is_leader = True
+                else:
+                    is_leader = False
+            if is_leader:
+                try:
+                    result = fetch()
+                    if isinstance(result, dict) and "error" not in result:
+                        self.put(key, result)
+                    return result, False
+                finally:
+                    with self._inflight_lock:
+                        self._inflight.pop(key, None)
+                    waiter.set()
+            # Tunggu request yang sama selesai; jika gagal, coba sendiri sebagai leader baru
+            while not waiter.wait(0.25):
+                if should_stop and should_stop():
+                    return "stopped", False
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+
+def open_response_cache(db_path, max_size_mb=DEFAULT_CACHE_MAX_MB, ttl_days=DEFAULT_CACHE_TTL_DAYS):
+    """
+    Membuka response cache; mengembalikan None jika gagal agar proses tetap jalan tanpa cache.
+    """
+    if not db_path:
+        return None
+    try:
+        return ResponseCache(db_path, max_size_mb, ttl_days)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        log_message(f"Warning: Response cache tidak bisa dibuka ({e}), cache dinonaktifkan.", "warning")
+        return None
@@ -0,0 +1,240 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/api/response_schema.py
+import json
+import re
+
+# Daftar kategori yang sama dengan prompt (Adobe Stock ditulis "nomor. nama")
+ADOBE_STOCK_CATEGORIES = [
+    "1. Animals", "2. Buildings and Architecture", "3. Business", "4. Drinks", "5. The Environment",
+    "6. States of Mind", "7. Food", "8. Graphic Resources", "9. Hobbies and Leisure", "10. Industry",
+    "11. Landscapes", "12. Lifestyle", "13. People", "14. Plants and Flowers", "15. Culture and Religion",
+    "16. Science", "17. Social Issues", "18. Sports", "19. Technology", "20. Transport", "21. Travel"
+]
+SHUTTERSTOCK_CATEGORIES = [
+    "Abstract", "Animals/Wildlife", "Arts", "Backgrounds/Textures", "Beauty/Fashion", "Buildings/Landmarks",
+    "Business/Finance", "Celebrities", "Education", "Food and drink", "Healthcare/Medical", "Holidays",
+    "Industrial", "Interiors", "Miscellaneous", "Nature", "Objects", "Parks/Outdoor", "People", "Religion",
+    "Science", "Signs/Symbols", "Sports/Recreation", "Technology", "Transportation", "Vintage"
+]
+
+# Skema responseSchema Gemini (subset OpenAPI) untuk metadata satu gambar
+METADATA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "keywords": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "adobe_stock_category": {"type": "STRING", "enum": ADOBE_STOCK_CATEGORIES},
+        "shutterstock_category": {"type": "STRING", "enum": SHUTTERSTOCK_CATEGORIES}
+    },
+    "required": ["title", "description", "keywords", "adobe_stock_category", "shutterstock_category"],
+    "propertyOrdering": ["title", "description", "keywords", "adobe_stock_category", "shutterstock_category"]
+}
+
+# Request paket: satu objek per gambar, dengan nomor label gambarnya
+PACKED_METADATA_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": dict({"image": {"type": "INTEGER"}}, **METADATA_SCHEMA["properties"]),
+        "required": ["image"] + METADATA_SCHEMA["required"],
+        "propertyOrdering": ["image"] + METADATA_SCHEMA["propertyOrdering"]
+    }
+}
+
+# Variasi judul/deskripsi (request teks saja)
+VARIATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"}
+    },
+    "required": ["title", "description"],
+    "propertyOrdering": ["title", "description"]
+}
+
+# Bagian akhir prompt teks yang meminta format "Title: ..."; diganti instruksi JSON
+_TEXT_FORMAT_MARKER = "Provide the output STRICTLY in the following format"
+JSON_FORMAT_INSTRUCTION = (
+    "Return the result as JSON that follows the response schema: title, description, "
+    "keywords (an array with one single-word keyword per item), adobe_stock_category and "
+    "shutterstock_category (each exactly one value from the lists above)."
+)
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+
+def to_json_prompt(prompt_text, instruction=JSON_FORMAT_INSTRUCTION):
+    """
+    Mengganti instruksi format teks di akhir prompt dengan instruksi JSON.
+    """
+    head, marker, _ = prompt_text.partition(_TEXT_FORMAT_MARKER)
+    if not marker:
+        return f"{prompt_text.rstrip()}\n\n{instruction}\n"
+    return f"{head.rstrip()}\n\n{instruction}\n"
+
+def _scan_json(text):
+    """
+    Returns:
+        Tuple (penutup yang masih dibutuhkan, masih di dalam string, posisi pemisah terakhir).
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    last_separator = -1
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append("]" if char == "[" else "}")
+        elif char in "]}" and stack:
+            stack.pop()
+        if char in ",[{":
+            last_separator = index
+    return "".join(reversed(stack)), in_string, last_separator
+
+def _loads_lenient(text):
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", text))
+    except ValueError:
+        return None
+
+def _close_truncated_json(text):
+    """
+    Menutup JSON yang terpotong (misal karena batas token output): string yang belum
+    ditutup dan kurung/kurawal yang masih terbuka. Jika elemen terakhir setengah jadi
+    (misal key tanpa nilai), elemen itu dibuang.
+    """
+    closers, in_string, last_separator = _scan_json(text)
+    repaired = _loads_lenient(text + ('"' if in_string else "") + closers)
+    if repaired is not None or last_separator < 0:
+        return repaired
+    cut = text[:last_separator + 1].rstrip().rstrip(",")
+    closers, in_string, _ = _scan_json(cut)
+    return _loads_lenient(cut + ('"' if in_string else "") + closers)
+
+def parse_json_response(text):
+    """
+    Decode JSON jawaban Gemini. Jika gagal, satu kali perbaikan toleran: buang pagar
+    markdown dan teks di luar JSON, hapus koma berlebih, dan tutup JSON yang terpotong.
+
+    Returns:
+        Objek hasil decode, atau None jika tetap tidak bisa dibaca.
+    """
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    cleaned = _FENCE_RE.sub("", text.strip())
+    starts = [pos for pos in (cleaned.find("{"), cleaned.find("[")) if pos != -1]
+    if not starts:
+        return None
+    cleaned = cleaned[min(starts):]
+    closing = max(cleaned.rfind("}"), cleaned.rfind("]"))
+    if closing != -1:
+        repaired = _loads_lenient(cleaned[:closing + 1])
+        if repaired is not None:
+            return repaired
+    return _close_truncated_json(cleaned)
+
+def _match_choice(value, choices):
+    if not isinstance(value, str) or not value.strip():
+        return ""
+    value = value.strip()
+    lowered = value.lower()
+    for choice in choices:
+        if choice.lower() == lowered:
+            return choice
+    # Adobe Stock: cukup nomornya, atau namanya saja
+    number = re.match(r"(\d+)", value)
+    for choice in choices:
+        if number and choice.startswith(f"{number.group(1)}. "):
+            return choice
+        if choice.lower().split(". ", 1)[-1] == lowered:
+            return choice
+    return ""
+
+def metadata_from_json(data, keyword_count="49"):
+    """
+    Memvalidasi satu objek JSON hasil responseSchema dan mengubahnya ke format metadata
+    aplikasi (title, description, tags, as_category, ss_category).
+
+    Returns:
+        Dictionary metadata, atau None jika judul atau keyword tidak ada.
+    """
+    if not isinstance(data, dict):
+        return None
+    title = data.get("title")
+    title = title.strip() if isinstance(title, str) else ""
+    description = data.get("description")
+    description = description.strip() if isinstance(description, str) else ""
+    raw_keywords = data.get("keywords")
+    if isinstance(raw_keywords, str):
+        raw_keywords = [raw_keywords]
+    tags = []
+    for keyword in raw_keywords if isinstance(raw_keywords, list) else []:
+        if isinstance(keyword, str):
+            # Model kadang tetap menulis beberapa keyword dalam satu item
+            tags.extend(part.strip() for part in keyword.split(",") if part.strip())
+    tags = list(dict.fromkeys(tags))
+    try:
+        max_kw = int(keyword_count)
+        if max_kw < 1: max_kw = 49
+    except Exception:
+        max_kw = 49
+    tags = tags[:max_kw]
+    if not title or not tags:
+        return None
+    return {
+        "title": title,
+        "description": description,
+        "tags": tags,
+        "as_category": _match_choice(data.get("adobe_stock_category"), ADOBE_STOCK_CATEGORIES),
+        "ss_category": _match_choice(data.get("shutterstock_category"), SHUTTERSTOCK_CATEGORIES)
+    }
+
+def packed_metadata_from_json(data, image_count, keyword_count="49"):
+    """
+    Returns:
+        List sepanjang image_count berisi metadata per gambar, None untuk gambar yang
+        objeknya tidak ada atau tidak valid.
+    """
+    results = [None] * image_count
+    if isinstance(data, dict):
+        data = data.get("images") if isinstance(data.get("images"), list) else [data]
+    if not isinstance(data, list):
+        return results
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        index = item.get("image")
+        # Tanpa nomor gambar yang jelas, urutan objek dipakai
+        index = int(index) - 1 if isinstance(index, (int, float)) or (isinstance(index, str) and index.isdigit()) else position
+        if 0 <= index < image_count and results[index] is None:
+            results[index] = metadata_from_json(item, keyword_count)
+    return results
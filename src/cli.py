@@ -0,0 +1,302 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/cli.py
+# Entry point tanpa GUI: tidak boleh mengimpor tkinter/customtkinter atau modul src.ui
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+
+from src.utils.logging import log_message, set_log_handler, set_log_echo
+from src.utils.file_utils import read_api_keys
+from src.api.gemini_api import GEMINI_MODELS, get_key_health_snapshot
+from src.metadata.exif_writer import check_exiftool_exists
+from src.processing.batch_processing import batch_process_files, bulk_ignored_options, ENGINE_OPTION_DEFAULTS
+from src.processing.job_journal import JOURNAL_FILE_NAME
+from src.api.response_cache import RESPONSE_CACHE_FILE_NAME
+from src.processing.similarity_index import SIMILARITY_INDEX_FILE_NAME
+from src.processing.cost_model import COST_MODEL_FILE_NAME
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_FATAL = 3
+EXIT_STOPPED = 130
+
+PRIORITY_CHOICES = ("Kualitas", "Seimbang", "Cepat")
+MODEL_CHOICES = ("Auto Rotasi",) + tuple(GEMINI_MODELS)
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".rj_auto_metadata")
+
+class JsonLineWriter:
+    """
+    Menulis satu objek JSON per baris ke stdout (progres yang bisa dibaca mesin).
+    """
+    def __init__(self, stream=None):
+        self._stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {"event": event, "time": round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+def _load_config(config_path):
+    if not config_path:
+        return {}
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+        return settings if isinstance(settings, dict) else {}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Gagal membaca config '{config_path}': {e}")
+
+def _parse_engine_overrides(items):
+    overrides = {}
+    for item in items or []:
+        if "=" not in item:
+            raise ValueError(f"Format --engine harus KEY=VALUE: {item}")
+        key, raw_value = item.split("=", 1)
+        key = key.strip()
+        if key not in ENGINE_OPTION_DEFAULTS:
+            raise ValueError(f"Opsi engine tidak dikenal: {key} (tersedia: {', '.join(sorted(ENGINE_OPTION_DEFAULTS))})")
+        try:
+            overrides[key] = json.loads(raw_value)
+        except ValueError:
+            overrides[key] = raw_value
+    return overrides
+
+def _clamp_int(value, default, minimum, maximum):
+    try:
+        number = int(str(value).strip() or default)
+    except (TypeError, ValueError):
+        number = int(default)
+    return max(minimum, min(maximum, number))
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="rj-auto-metadata",
+        description="RJ Auto Metadata tanpa GUI: memproses folder input lewat pipeline batch dan "
+                    "menulis progres sebagai JSON lines ke stdout (log ke stderr)."
+    )
+    parser.add_argument("-i", "--input", dest="input_dir", help="Folder input")
+    parser.add_argument("-o", "--output", dest="output_dir", help="Folder output")
+    parser.add_argument("-k", "--api-keys", dest="api_keys_file", help="File teks berisi API key (satu per baris)")
+    parser.add_argument("--api-key", dest="api_keys", action="append", default=[], help="API key Gemini (bisa diulang)")
+    parser.add_argument("-c", "--config", help="config.json dari aplikasi GUI sebagai nilai default")
+    parser.add_argument("-w", "--workers", type=int, help="Jumlah worker (default 3)")
+    parser.add_argument("-d", "--delay", type=int, help="Jarak minimum antar request per API key, detik (default 10)")
+    parser.add_argument("-m", "--model", choices=MODEL_CHOICES, help="Model Gemini (default Auto Rotasi)")
+    parser.add_argument("-p", "--priority", choices=PRIORITY_CHOICES, help="Prioritas prompt (default Kualitas)")
+    parser.add_argument("-n", "--keywords", type=int, help="Jumlah keyword, 8-49 (default 49)")
+    parser.add_argument("--rename", action=argparse.BooleanOptionalAction, default=None, help="Rename file sesuai judul")
+    parser.add_argument("--auto-kategori", action=argparse.BooleanOptionalAction, default=None, help="Tentukan kategori otomatis")
+    parser.add_argument("--auto-foldering", action=argparse.BooleanOptionalAction, default=None, help="Pisahkan output ke Images/Videos/Vectors")
+    parser.add_argument("--paid", action=argparse.BooleanOptionalAction, default=None, help="Mode API key berbayar: worker tidak dibatasi jumlah key")
+    parser.add_argument("--ghostscript", help="Path executable Ghostscript (default: dicari otomatis)")
+    parser.add_argument("--state-dir", help=f"Folder journal/cache/index (default: folder config atau {DEFAULT_STATE_DIR})")
+    parser.add_argument("--watch", action="store_true", default=None, help="Pantau folder input terus-menerus dan proses file baru sampai dihentikan (Ctrl+C/SIGTERM)")
+    parser.add_argument("--queue", dest="work_queue_path", help="File SQLite antrean kerja di volume bersama: jalankan beberapa proses/host dengan --queue yang sama untuk berbagi satu folder input")
+    parser.add_argument("--node-id", dest="work_queue_node_id", help="ID node di antrean kerja (default: hostname-PID)")
+    parser.add_argument("--bulk", action="store_true", default=None, help="Mode bulk: kirim semua file sebagai batch job Gemini Batch API dan tulis hasilnya setelah batch selesai")
+    parser.add_argument("--bulk-job", dest="bulk_job_id", help="Lanjutkan bulk job dengan ID ini (atau nama batch \"batches/...\"); menyalakan --bulk")
+    parser.add_argument("--engine", action="append", default=[], metavar="KEY=VALUE", help="Opsi engine lanjutan, nilai dalam JSON (bisa diulang)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Jangan tulis log ke stderr")
+    return parser
+
+def resolve_options(args):
+    """
+    Menggabungkan argumen CLI dengan config.json (argumen CLI menang).
+
+    Returns:
+        Dictionary argumen untuk batch_process_files (tanpa callback dan stop_event)
+    """
+    settings = _load_config(args.config)
+
+    input_dir = args.input_dir or settings.get("input_dir", "")
+    output_dir = args.output_dir or settings.get("output_dir", "")
+    if not input_dir or not output_dir:
+        raise ValueError("Folder input dan output wajib diisi (--input/--output atau config).")
+    if os.path.normpath(input_dir) == os.path.normpath(output_dir):
+        raise ValueError("Folder input dan output tidak boleh sama.")
+    if not os.path.isdir(input_dir):
+        raise ValueError(f"Folder input tidak valid: {input_dir}")
+
+    api_keys = list(args.api_keys)
+    if args.api_keys_file:
+        keys = read_api_keys(args.api_keys_file)
+        if keys is None:
+            raise ValueError(f"File API key tidak bisa dibaca: {args.api_keys_file}")
+        api_keys.extend(keys)
+    if not api_keys:
+        api_keys = list(settings.get("api_keys", []))
+    api_keys = list(dict.fromkeys(key for key in api_keys if key))
+    if not api_keys:
+        raise ValueError("Harap berikan setidaknya satu API key (--api-keys/--api-key atau config).")
+
+    paid = args.paid if args.paid is not None else bool(settings.get("api_key_paid", False))
+    workers = args.workers if args.workers is not None else settings.get("workers", "3")
+    if paid:
+        num_workers = _clamp_int(workers, 3, 1, 100)
+    else:
+        num_workers = _clamp_int(workers, 3, 1, min(25, len(api_keys)))
+    delay = args.delay if args.delay is not None else settings.get("delay", "10")
+    keyword_count = args.keywords if args.keywords is not None else settings.get("keyword_count", "49")
+
+    engine_settings = dict(ENGINE_OPTION_DEFAULTS)
+    config_engine = settings.get("engine", {})
+    if isinstance(config_engine, dict):
+        engine_settings.update({k: v for k, v in config_engine.items() if k in ENGINE_OPTION_DEFAULTS})
+    engine_settings.update(_parse_engine_overrides(args.engine))
+    if args.watch:
+        engine_settings["watch"] = True
+    if args.work_queue_path:
+        engine_settings["work_queue_path"] = os.path.abspath(args.work_queue_path)
+    if args.work_queue_node_id:
+        engine_settings["work_queue_node_id"] = args.work_queue_node_id
+    if args.bulk or args.bulk_job_id:
+        engine_settings["bulk_mode"] = True
+    if args.bulk_job_id:
+        engine_settings["bulk_job_id"] = args.bulk_job_id
+    if engine_settings["bulk_mode"]:
+        ignored = bulk_ignored_options(engine_settings)
+        if ignored:
+            raise ValueError(f"Opsi berikut tidak bisa dipakai bersama mode bulk (--bulk/--bulk-job): {', '.join(ignored)}")
+
+    state_dir = args.state_dir or (os.path.dirname(os.path.abspath(args.config)) if args.config else DEFAULT_STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+
+    ghostscript_path = args.ghostscript
+    if not ghostscript_path:
+        from src.utils import system_checks
+        system_checks.check_ghostscript()
+        ghostscript_path = system_checks.GHOSTSCRIPT_PATH
+    if not check_exiftool_exists():
+        log_message("Warning: exiftool tidak ditemukan, metadata tidak akan ditulis ke file.", "warning")
+
+    options = {
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "api_keys": api_keys,
+        "ghostscript_path": ghostscript_path,
+        "rename_enabled": args.rename if args.rename is not None else bool(settings.get("rename", False)),
+        "delay_seconds": _clamp_int(delay, 10, 0, 300),
+        "num_workers": num_workers,
+        "auto_kategori_enabled": args.auto_kategori if args.auto_kategori is not None else bool(settings.get("auto_kategori", True)),
+        "auto_foldering_enabled": args.auto_foldering if args.auto_foldering is not None else bool(settings.get("auto_foldering", False)),
+        "selected_model": args.model or settings.get("model", "Auto Rotasi"),
+        "keyword_count": str(_clamp_int(keyword_count, 49, 8, 49)),
+        "priority": args.priority or settings.get("priority", "Kualitas"),
+        "bypass_api_key_limit": paid,
+        "journal_path": os.path.join(state_dir, JOURNAL_FILE_NAME),
+        "response_cache_path": os.path.join(state_dir, RESPONSE_CACHE_FILE_NAME),
+        "similarity_index_path": os.path.join(state_dir, SIMILARITY_INDEX_FILE_NAME),
+        "cost_model_path": os.path.join(state_dir, COST_MODEL_FILE_NAME),
+    }
+    options.update(engine_settings)
+    return options
+
+def _exit_code(result, stop_event, watch=False):
+    if result.get("error"):
+        return EXIT_FATAL
+    if stop_event.is_set():
+        # Mode watch hanya berakhir lewat stop, itu bukan pembatalan
+        return EXIT_OK if watch else EXIT_STOPPED
+    if result.get("failed_count", 0) > 0:
+        return EXIT_FAILURES
+    return EXIT_OK
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    writer = JsonLineWriter()
+
+    # stdout khusus JSON lines; log manusia ke stderr
+    set_log_echo(False)
+    if args.quiet:
+        set_log_handler(None)
+    else:
+        set_log_handler(lambda message, tag=None: print(message, file=sys.stderr, flush=True))
+
+    try:
+        options = resolve_options(args)
+    except ValueError as e:
+        writer.emit("error", message=str(e))
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    os.makedirs(options["output_dir"], exist_ok=True)
+    stop_event = threading.Event()
+
+    def handle_interrupt(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        print("Menerima permintaan berhenti...", file=sys.stderr, flush=True)
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_interrupt)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handle_interrupt)
+
+    def handle_key_health_query(signum, frame):
+        # Ditulis dari thread lain: handler sinyal bisa menyela emit() yang sedang memegang lock
+        threading.Thread(target=lambda: writer.emit("key_health", keys=get_key_health_snapshot() or []), daemon=True).start()
+
+    if hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid>: tulis kesehatan API key saat ini sebagai event "key_health"
+        signal.signal(signal.SIGUSR1, handle_key_health_query)
+
+    def on_progress(completed, total):
+        writer.emit("progress", completed=completed, total=total)
+
+    def on_result(input_path, result):
+        result = result or {}
+        writer.emit(
+            "file",
+            input=input_path,
+            status=result.get("status"),
+            output=result.get("output"),
+            new_filename=result.get("new_filename"),
+        )
+
+    writer.emit(
+        "start",
+        input_dir=options["input_dir"],
+        output_dir=options["output_dir"],
+        api_keys=len(options["api_keys"]),
+        workers=options["num_workers"],
+        model=options["selected_model"],
+        priority=options["priority"],
+        watch=bool(options.get("watch")),
+    )
+    result = batch_process_files(
+        progress_callback=on_progress,
+        stop_event=stop_event,
+        result_callback=on_result,
+        **options
+    )
+    exit_code = _exit_code(result, stop_event, watch=bool(options.get("watch")))
+    writer.emit("summary", exit_code=exit_code, **result)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,11 +17,15 @@
 # src/metadata/csv_exporter.py
 import os
 import re
+import threading
 from src.utils.logging import log_message
 from src.utils.file_utils import sanitize_csv_field, write_to_csv
 from src.metadata.categories.for_adobestock import map_to_adobe_stock_category
 from src.metadata.categories.for_shutterstock import map_to_shutterstock_category
 
+# Serialisasi penulisan CSV antar worker output (menggantikan jeda sleep antar platform)
+_CSV_WRITE_LOCK = threading.Lock()
+
 def sanitize_adobe_stock_title(title):
     """
     Sanitize title untuk Adobe Stock:
@@ -270,45 +274,43 @@ def write_to_platform_csvs(csv_dir, filename, title, description, keywords, auto
             ss_category = ""
             log_message(f"  Auto Kategori: Tidak Aktif")
         
-        # Tulis data ke CSV AdobeStock (dengan sanitization khusus)
+        # Data untuk CSV AdobeStock (dengan sanitization khusus)
         as_csv_path = os.path.join(csv_dir, "adobe_stock_export.csv")
         as_header = ["Filename", "Title", "Keywords", "Category", "Releases"]
         # Apply Adobe Stock specific sanitization
         as_title_clean = sanitize_adobe_stock_title(safe_title)
         as_keywords_clean = sanitize_adobe_stock_keywords(keywords if isinstance(keywords, list) else as_keywords)
         as_data_row = [safe_filename, as_title_clean, as_keywords_clean, as_category, ""]
-        import time
-        time.sleep(0.5)  # Jeda kecil untuk menghindari konflik file
-        as_success = write_to_csv(as_csv_path, as_header, as_data_row)
         
-        # Tulis data ke CSV ShutterStock
+        # Data untuk CSV ShutterStock
         ss_csv_path = os.path.join(csv_dir, "shutterstock_export.csv")
         ss_header = ["Filename", "Description", "Keywords", "Categories", "Editorial", "Mature content", "illustration"]
         # Set illustration to "yes" if is_vector is True, otherwise empty string
         illustration_value = "yes" if is_vector else ""
         ss_data_row = [safe_filename, safe_description or safe_title, ss_keywords, ss_category, "no", "", illustration_value]
-        time.sleep(0.5)  # Jeda kecil untuk menghindari konflik file
-        ss_success = write_to_csv(ss_csv_path, ss_header, ss_data_row)
         
-        # Tulis data ke CSV 123RF (dengan format header khusus)
+        # Data untuk CSV 123RF (dengan format header khusus)
         rf_csv_path = os.path.join(csv_dir, "123rf_export.csv")
-        rf_success = write_123rf_csv(rf_csv_path, safe_filename, safe_description or safe_title, as_keywords)
-        time.sleep(0.5)  # Jeda kecil untuk menghindari konflik file
         
-        # Tulis data ke CSV Vecteezy (dengan format khusus tanpa quotes di filename)
+        # Data untuk CSV Vecteezy (dengan format khusus tanpa quotes di filename)
         vz_csv_path = os.path.join(csv_dir, "vecteezy_export.csv")
         # Apply Vecteezy specific sanitization
         vz_title_clean = sanitize_vecteezy_title(safe_title)
         vz_keywords_clean = sanitize_vecteezy_keywords(keywords if isinstance(keywords, list) else as_keywords)
-        vz_success = write_vecteezy_csv(vz_csv_path, safe_filename, vz_title_clean, safe_description or safe_title, vz_keywords_clean)
-        time.sleep(0.5)  # Jeda kecil untuk menghindari konflik file
         
-        # Tulis data ke CSV Depositphotos
+        # Data untuk CSV Depositphotos
         dp_csv_path = os.path.join(csv_dir, "depositphotos_export.csv")
         dp_header = ["Filename", "description", "Keywords", "Nudity", "Editorial"]
         dp_data_row = [safe_filename, safe_description or safe_title, as_keywords, "no", "no"]
-        time.sleep(0.5)  # Jeda kecil untuk menghindari konflik file
-        dp_success = write_to_csv(dp_csv_path, dp_header, dp_data_row)
+        
+        # Satu baris per platform ditulis dalam satu critical section agar
+        # baris dari worker lain tidak saling menyela
+        with _CSV_WRITE_LOCK:
+            as_success = write_to_csv(as_csv_path, as_header, as_data_row)
+            ss_success = write_to_csv(ss_csv_path, ss_header, ss_data_row)
+            rf_success = write_123rf_csv(rf_csv_path, safe_filename, safe_description or safe_title, as_keywords)
+            vz_success = write_vecteezy_csv(vz_csv_path, safe_filename, vz_title_clean, safe_description or safe_title, vz_keywords_clean)
+            dp_success = write_to_csv(dp_csv_path, dp_header, dp_data_row)
         
         # Return True jika semua platform berhasil
         all_success = as_success and ss_success and rf_success and vz_success and dp_success
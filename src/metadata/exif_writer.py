@@ -18,7 +18,10 @@
 import os
 import time
 import sys
+import platform
 import subprocess
+import threading
+import queue
 from src.utils.logging import log_message
 from src.api.gemini_api import check_stop_event, is_stop_requested
 
@@ -31,7 +34,7 @@ def check_exiftool_exists():
     """
     try:
         # Try running exiftool directly first
-        result = subprocess.run(["exiftool", "-ver"], check=True, capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
+        result = subprocess.run(["exiftool", "-ver"], check=True, capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0)
         log_message(f"Exiftool ditemukan (versi: {result.stdout.strip()}).")
         global EXIFTOOL_PATH # Set global path if found directly
         EXIFTOOL_PATH = "exiftool"
@@ -71,7 +74,7 @@ def check_exiftool_exists():
                 if os.path.exists(normalized_path):
                     # Verify it's executable (simple check)
                     try:
-                         test_result = subprocess.run([normalized_path, "-ver"], check=True, capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
+                         test_result = subprocess.run([normalized_path, "-ver"], check=True, capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0)
                          log_message(f"Exiftool ditemukan dan valid di: {normalized_path} (versi: {test_result.stdout.strip()})")
                          EXIFTOOL_PATH = normalized_path # Set the found path
                          return True
@@ -88,6 +91,179 @@ def check_exiftool_exists():
 # Menyimpan path exiftool saat ditemukan
 EXIFTOOL_PATH = None
 
+# Batas waktu satu perintah di sesi exiftool -stay_open (detik)
+EXIFTOOL_SESSION_TIMEOUT = 120
+
+class ExifToolSession:
+    """
+    Satu proses exiftool yang tetap hidup (-stay_open True -@ -): argumen dikirim lewat
+    stdin dan setiap perintah diakhiri -execute, sehingga biaya start Perl/exiftool
+    (ratusan milidetik, lebih lama di Windows) hanya dibayar sekali per worker.
+    """
+    def __init__(self, exiftool_path):
+        self._counter = 0
+        self._lines = queue.Queue()
+        self.process = subprocess.Popen(
+            [exiftool_path, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding='utf-8',
+            errors='replace',
+            creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0
+        )
+        self._reader = threading.Thread(target=self._read_output, name="exiftool-reader", daemon=True)
+        self._reader.start()
+
+    def _read_output(self):
+        try:
+            for line in self.process.stdout:
+                self._lines.put(line)
+        except (OSError, ValueError):
+            pass
+        self._lines.put(None)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def execute(self, args, stop_event=None, timeout=EXIFTOOL_SESSION_TIMEOUT):
+        """
+        Menjalankan satu perintah exiftool di sesi ini.
+
+        Args:
+            args: List argumen exiftool (tanpa path executable)
+            stop_event: Event threading untuk menghentikan proses
+            timeout: Batas waktu perintah dalam detik
+
+        Returns:
+            Tuple (status, output): status "ok", "failed", "stopped" atau "dead"
+        """
+        self._counter += 1
+        marker = f"{{ready{self._counter}}}"
+        try:
+            payload = ["-charset", "filename=utf8"]
+            payload.extend(str(arg).replace("\r", " ").replace("\n", " ") for arg in args)
+            payload.append(f"-execute{self._counter}")
+            self.process.stdin.write("\n".join(payload) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            return "dead", ""
+
+        output = []
+        deadline = time.monotonic() + timeout
+        while True:
+            if (stop_event is not None and stop_event.is_set()) or is_stop_requested():
+                # Perintah tidak bisa dibatalkan di tengah jalan, sesi dimatikan
+                self.close(force=True)
+                return "stopped", "".join(output)
+            if time.monotonic() > deadline:
+                self.close(force=True)
+                return "failed", "timeout"
+            try:
+                line = self._lines.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if line is None:
+                return "dead", "".join(output)
+            if line.strip() == marker:
+                break
+            output.append(line)
+
+        text = "".join(output)
+        if "Error" in text or ("files updated" not in text and "files unchanged" not in text):
+            return "failed", text
+        return "ok", text
+
+    def close(self, force=False):
+        if self.process.poll() is not None:
+            return
+        try:
+            if force:
+                self.process.kill()
+            else:
+                self.process.stdin.write("-stay_open\nFalse\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+        except Exception:
+            try:
+                self.process.kill()
+            except Exception:
+                pass
+
+_SESSION_LOCK = threading.Lock()
+_SESSION_IDLE = []
+_SESSION_LIMIT = 0
+_SESSION_COUNT = 0
+
+def start_exiftool_sessions(count):
+    """
+    Mengaktifkan pool sesi exiftool -stay_open. Sesi dibuat saat pertama dibutuhkan,
+    maksimal count sesi (sebaiknya sama dengan jumlah worker output).
+    """
+    global _SESSION_LIMIT
+    with _SESSION_LOCK:
+        _SESSION_LIMIT = max(0, int(count))
+
+def stop_exiftool_sessions():
+    """
+    Menutup semua sesi exiftool yang menganggur dan menonaktifkan pool.
+    """
+    global _SESSION_LIMIT, _SESSION_COUNT
+    with _SESSION_LOCK:
+        sessions = list(_SESSION_IDLE)
+        _SESSION_IDLE.clear()
+        _SESSION_LIMIT = 0
+        _SESSION_COUNT = max(0, _SESSION_COUNT - len(sessions))
+    for session in sessions:
+        session.close()
+
+def _acquire_exiftool_session():
+    global _SESSION_COUNT
+    with _SESSION_LOCK:
+        while _SESSION_IDLE:
+            session = _SESSION_IDLE.pop()
+            if session.is_alive():
+                return session
+            _SESSION_COUNT -= 1
+        if not EXIFTOOL_PATH or _SESSION_COUNT >= _SESSION_LIMIT:
+            return None
+        _SESSION_COUNT += 1
+    try:
+        return ExifToolSession(EXIFTOOL_PATH)
+    except Exception as e:
+        log_message(f"  Warning: Gagal membuka sesi exiftool: {e}", "warning")
+        with _SESSION_LOCK:
+            _SESSION_COUNT -= 1
+        return None
+
+def _release_exiftool_session(session):
+    global _SESSION_COUNT
+    with _SESSION_LOCK:
+        if session.is_alive() and _SESSION_LIMIT > 0:
+            _SESSION_IDLE.append(session)
+            return
+        _SESSION_COUNT = max(0, _SESSION_COUNT - 1)
+    session.close()
+
+def run_exiftool_pooled(args, stop_event):
+    """
+    Menjalankan argumen exiftool di sesi -stay_open bila pool aktif.
+
+    Returns:
+        Tuple (status, output) seperti ExifToolSession.execute, atau None jika pool
+        tidak aktif/penuh sehingga pemanggil harus memakai proses exiftool biasa
+    """
+    session = _acquire_exiftool_session()
+    if session is None:
+        return None
+    try:
+        status, output = session.execute(args, stop_event)
+    finally:
+        _release_exiftool_session(session)
+    if status == "dead":
+        return None
+    return status, output
+
 def write_exif_with_exiftool(image_path, output_path, metadata, stop_event):
     """
     Menulis metadata EXIF ke file gambar menggunakan exiftool.
@@ -161,14 +337,25 @@ def write_exif_with_exiftool(image_path, output_path, metadata, stop_event):
             log_message("  Proses dihentikan sebelum membersihkan metadata.")
             return False, "stopped"
 
-        result = subprocess.run(clear_command, check=False, capture_output=True, text=True, # check=False
-                                encoding='utf-8', errors='replace', timeout=30,
-                                creationflags=subprocess.CREATE_NO_WINDOW)
-        if result.returncode == 0:
-            log_message("  Metadata lama dibersihkan dari file")
+        pooled = run_exiftool_pooled(clear_command[1:], stop_event)
+        if pooled is not None:
+            pooled_status, pooled_output = pooled
+            if pooled_status == "stopped":
+                log_message("  Proses dihentikan saat membersihkan metadata.")
+                return False, "stopped"
+            if pooled_status == "ok":
+                log_message("  Metadata lama dibersihkan dari file")
+            else:
+                log_message(f"  Warning: Gagal membersihkan metadata lama. Error: {pooled_output.strip()}", "warning")
         else:
-             log_message(f"  Warning: Gagal membersihkan metadata lama (Kode: {result.returncode}). Error: {result.stderr.strip()}", "warning")
-             # Continue even if clearing fails
+            result = subprocess.run(clear_command, check=False, capture_output=True, text=True, # check=False
+                                    encoding='utf-8', errors='replace', timeout=30,
+                                    creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0)
+            if result.returncode == 0:
+                log_message("  Metadata lama dibersihkan dari file")
+            else:
+                 log_message(f"  Warning: Gagal membersihkan metadata lama (Kode: {result.returncode}). Error: {result.stderr.strip()}", "warning")
+                 # Continue even if clearing fails
 
     except subprocess.TimeoutExpired:
          log_message(f"  Warning: Timeout saat membersihkan metadata lama.", "warning")
@@ -214,6 +401,21 @@ def write_exif_with_exiftool(image_path, output_path, metadata, stop_event):
             log_message("  Proses dihentikan sebelum menulis metadata baru.")
             return False, "stopped"
 
+        # Sesi exiftool -stay_open (mode batch/watch), proses baru hanya sebagai cadangan
+        pooled = run_exiftool_pooled(command[1:], stop_event)
+        if pooled is not None:
+            pooled_status, pooled_output = pooled
+            if pooled_status == "stopped":
+                log_message("  Menghentikan proses exiftool yang sedang berjalan.")
+                return False, "stopped"
+            if pooled_status == "ok":
+                log_message(f"  ✓ Metadata EXIF berhasil ditulis ke {os.path.basename(output_path)}")
+                return True, "exif_ok"
+            log_message(f"  ✗ Gagal menulis EXIF pada {os.path.basename(output_path)}")
+            if pooled_output:
+                log_message(f"  Exiftool output (gagal): {pooled_output.strip()}")
+            return True, "exif_failed"
+
         # Use Popen for better control and stop handling
         exiftool_process = subprocess.Popen(
             command,
@@ -221,7 +423,7 @@ def write_exif_with_exiftool(image_path, output_path, metadata, stop_event):
             stderr=subprocess.PIPE,
             encoding='utf-8', # Specify encoding
             errors='replace', # Handle potential encoding errors
-            creationflags=subprocess.CREATE_NO_WINDOW # Hide console window on Windows
+            creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0 # Hide console window on Windows
         )
 
         # Wait for process completion or stop signal
@@ -374,13 +576,25 @@ def write_exif_to_video(input_path, output_path, metadata, stop_event):
             log_message("  Proses dihentikan sebelum menulis metadata video.")
             return False, "stopped"
 
+        pooled = run_exiftool_pooled(command[1:], stop_event)
+        if pooled is not None:
+            pooled_status, pooled_output = pooled
+            if pooled_status == "stopped":
+                log_message("  Menghentikan proses exiftool untuk video.")
+                return False, "stopped"
+            if pooled_status == "ok":
+                log_message(f"  ✓ Metadata berhasil ditulis ke file video {os.path.basename(output_path)}")
+                return True, "exif_ok"
+            log_message(f"  ✗ Gagal menulis metadata video pada {os.path.basename(output_path)}")
+            return True, "exif_failed"
+
         exiftool_process = subprocess.Popen(
             command,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             encoding='utf-8',
             errors='replace',
-            creationflags=subprocess.CREATE_NO_WINDOW
+            creationflags=subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0
         )
 
         while exiftool_process.poll() is None:
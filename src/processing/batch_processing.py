@@ -16,44 +16,139 @@
 
 # src/processing/batch_processing.py
 import os
+import math
 import shutil
 import time
-import random
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+from contextlib import contextmanager
 
 from src.utils.logging import log_message
-from src.utils.file_utils import ensure_unique_title, sanitize_filename
-from src.utils.file_utils import SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_VIDEO_EXTENSIONS, ALL_SUPPORTED_EXTENSIONS
-from src.utils.compression import cleanup_temp_compression_folder, manage_temp_folders
-from src.processing.image_processing.format_jpg_jpeg_processing import process_jpg_jpeg
-from src.processing.image_processing.format_png_processing import process_png
+from src.utils.file_utils import sanitize_filename
+from src.utils.file_utils import SUPPORTED_VIDEO_EXTENSIONS, iter_input_files
+from src.processing.watch_folder import iter_watched_files, WATCH_SETTLE_SECONDS, WATCH_POLL_INTERVAL
+from src.processing.work_queue import open_work_queue, queue_key, DEFAULT_LEASE_SECONDS, HEARTBEAT_FRACTION, QUEUE_POLL_INTERVAL
+from src.utils.compression import cleanup_temp_compression_folder, manage_temp_folders, remove_temp_files
+from src.processing.image_processing.format_jpg_jpeg_processing import prepare_jpg_jpeg, finalize_jpg_jpeg
+from src.processing.image_processing.format_png_processing import prepare_png, finalize_png
 from src.processing.vector_processing.format_eps_ai_processing import convert_eps_to_jpg
 from src.processing.vector_processing.format_svg_processing import convert_svg_to_jpg
-from src.processing.video_processing import process_video
+from src.processing.video_processing import prepare_video, finalize_video
 from src.api.gemini_api import check_stop_event, is_stop_requested, select_smart_api_key
+from src.api.gemini_api import get_gemini_metadata, get_gemini_metadata_packed, get_gemini_text_variation, interpret_metadata_result, set_response_cache
+from src.api.gemini_api import GEMINI_MODELS, set_concurrency_controller, set_rate_limiter, set_structured_output, set_context_cache, set_hedge_policy, set_model_router, set_circuit_breaker
+from src.api.gemini_api import set_key_health_registry, get_key_health_snapshot, format_key_health_snapshot
+from src.api.key_health import KeyHealthRegistry
+from src.api.rate_limiter import RateLimiter, resolve_model_limits
+from src.api.context_cache import ContextCache, DEFAULT_CONTEXT_CACHE_TTL
+from src.api.hedging import HedgePolicy, DEFAULT_HEDGE_BUDGET
+from src.api.circuit_breaker import CircuitBreaker, DEFAULT_FAILURE_THRESHOLD, DEFAULT_PROBE_SECONDS
+from src.api.model_router import ModelRouter, DEFAULT_EXPLORATION, format_model_stats
+from src.api.http_client import configure_http_pool
+from src.api.async_client import warm_up_request_pool, release_stop_event
+from src.api.concurrency import ConcurrencyController, DEFAULT_MAX_INFLIGHT_PER_KEY, DEFAULT_LATENCY_TARGET
+from src.api.response_cache import open_response_cache, DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_TTL_DAYS
 from src.metadata.csv_exporter import write_to_platform_csvs
-from src.metadata.exif_writer import write_exif_with_exiftool
+from src.metadata.exif_writer import write_exif_with_exiftool, start_exiftool_sessions, stop_exiftool_sessions
+from src.processing.scheduler import KeyPacer, FailureThrottle, LongestFirstBuffer, compute_key_interval, wait_with_stop
+from src.processing.cost_model import CostEstimator
+from src.processing.pipeline import PipelineStage
+from src.processing.request_packer import RequestPacker, DEFAULT_PACK_SIZE, DEFAULT_PACK_WINDOW_SECONDS, DEFAULT_PACK_MAX_IMAGE_KB
+from src.processing.job_journal import open_job_journal, job_fingerprint
+from src.processing.similarity_index import open_similarity_index, compute_dhash, DEFAULT_MAX_DISTANCE
+from src.utils.cpu_pool import run_cpu_task, start_cpu_pool, shutdown_cpu_pool
 
-def process_vector_file(input_path, output_dir, selected_api_key: str, ghostscript_path, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+SUCCESS_STATUSES = ("processed_exif", "processed_no_exif", "processed_exif_failed", "processed_unknown_exif_status")
+SKIPPED_STATUSES = ("skipped_exists", "skipped_journal", "skipped_lease_lost")
+
+# Mode bulk: interval pengecekan status batch job (detik)
+DEFAULT_BULK_POLL_SECONDS = 30
+
+# Opsi engine lanjutan yang bisa diatur lewat config.json (key "engine")
+ENGINE_OPTION_DEFAULTS = {
+    "prep_workers": None,
+    "output_workers": None,
+    "prep_processes": 0,
+    "recursive": False,
+    "include_patterns": [],
+    "exclude_patterns": [],
+    "resume": True,
+    "response_cache": True,
+    "response_cache_max_mb": DEFAULT_CACHE_MAX_MB,
+    "response_cache_ttl_days": DEFAULT_CACHE_TTL_DAYS,
+    "similarity_reuse": True,
+    "similarity_max_distance": DEFAULT_MAX_DISTANCE,
+    "similarity_variation": False,
+    "longest_first": True,
+    "adaptive_concurrency": True,
+    "max_inflight_per_key": DEFAULT_MAX_INFLIGHT_PER_KEY,
+    "latency_target_seconds": DEFAULT_LATENCY_TARGET,
+    "exiftool_stay_open": True,
+    "watch": False,
+    "watch_settle_seconds": WATCH_SETTLE_SECONDS,
+    "watch_poll_interval": WATCH_POLL_INTERVAL,
+    "work_queue_path": "",
+    "work_queue_node_id": "",
+    "work_queue_lease_seconds": DEFAULT_LEASE_SECONDS,
+    "http2": False,
+    "rate_limiter": None,
+    "rate_limits": {},
+    "pack_size": DEFAULT_PACK_SIZE,
+    "pack_window_seconds": DEFAULT_PACK_WINDOW_SECONDS,
+    "pack_max_image_kb": DEFAULT_PACK_MAX_IMAGE_KB,
+    "structured_output": True,
+    "context_cache": True,
+    "context_cache_ttl_seconds": DEFAULT_CONTEXT_CACHE_TTL,
+    "hedge_requests": False,
+    "hedge_budget": DEFAULT_HEDGE_BUDGET,
+    "model_router": True,
+    "model_exploration": DEFAULT_EXPLORATION,
+    "circuit_breaker": True,
+    "circuit_breaker_threshold": DEFAULT_FAILURE_THRESHOLD,
+    "circuit_breaker_probe_seconds": DEFAULT_PROBE_SECONDS,
+    "bulk_mode": False,
+    "bulk_job_id": "",
+    "bulk_poll_seconds": DEFAULT_BULK_POLL_SECONDS,
+    "batch_base_url": "",
+}
+
+# Opsi engine yang tidak berlaku di mode bulk: hasil datang dari batch job sekali jalan,
+# bukan dari request per file (tanpa watch, antrean kerja, response cache, atau reuse similarity)
+BULK_IGNORED_OPTIONS = (
+    "watch", "work_queue_path", "work_queue_node_id", "response_cache_max_mb", "response_cache_ttl_days",
+    "similarity_max_distance", "similarity_variation"
+)
+
+# Batas atas jumlah thread API saat konkurensi adaptif aktif
+ADAPTIVE_MAX_API_WORKERS = 32
+
+# Mode watch: simpan model biaya setiap N file selesai
+WATCH_CHECKPOINT_EVERY = 25
+
+# Batas waktu (detik) menunggu pekerjaan yang sedang berjalan selesai setelah stop
+STOP_DRAIN_TIMEOUT = 30
+# Batas waktu (detik) menunggu worker pipeline berhenti setelah error fatal
+ABORT_JOIN_TIMEOUT = 5
+
+class CsvExportError(Exception):
+    """Baris CSV satu file tidak tertulis; pekerjaan tidak boleh dianggap selesai."""
+
+# Rename di tahap output harus atomik karena beberapa worker bisa memakai judul yang sama
+_RENAME_LOCK = threading.Lock()
+
+def prepare_vector_file(input_path, output_dir, ghostscript_path, stop_event):
     """
-    Memproses file vektor (EPS, AI, SVG).
+    Tahap persiapan file vektor: konversi EPS/AI/SVG ke JPG sementara untuk API.
     
     Args:
         input_path: Path file sumber
         output_dir: Direktori output
-        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
         ghostscript_path: Full path to the Ghostscript executable
         stop_event: Event threading untuk menghentikan proses
-        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
-        selected_model: Selected model for processing
-        keyword_count: Number of keywords to use for processing
-        priority: Priority for processing
     Returns:
-        Tuple (status, metadata, output_path):
-            - status: String status pemrosesan
-            - metadata: Dictionary metadata hasil API, atau None jika gagal
-            - output_path: Path file output, atau None jika gagal
+        Tuple (status, prepared):
+            - status: "prepared", "skipped_exists", "stopped" atau status gagal
+            - prepared: Dictionary berisi api_input, temp_files, flag prompt dan initial_output_path
     """
     filename = os.path.basename(input_path)
     _, ext = os.path.splitext(filename)
@@ -68,11 +163,11 @@ def process_vector_file(input_path, output_dir, selected_api_key: str, ghostscri
     conversion_needed = is_eps_original or is_ai_original or is_svg_original
     
     if check_stop_event(stop_event): 
-        return "stopped", None, None
+        return "stopped", None
     
     # Periksa apakah file output sudah ada
     if os.path.exists(initial_output_path):
-        return "skipped_exists", None, initial_output_path
+        return "skipped_exists", {"initial_output_path": initial_output_path}
     
     # Dapatkan folder kompresi sementara
     chosen_temp_folder = os.path.join(output_dir, "temp_compressed")
@@ -90,63 +185,52 @@ def process_vector_file(input_path, output_dir, selected_api_key: str, ghostscri
             conversion_func = convert_svg_to_jpg
             target_format = "JPG"
         else:
-            return "failed_unknown", None, None
+            return "failed_unknown", None
         
         if check_stop_event(stop_event):
-            return "stopped", None, None
+            return "stopped", None
         
         log_message(f"  Memulai konversi {ext_lower.upper()} ke {target_format}...")
         # Pass ghostscript_path only if it's needed (i.e., for convert_eps_to_jpg)
         if conversion_func == convert_eps_to_jpg:
              conversion_success, error_msg = conversion_func(input_path, temp_raster_path, ghostscript_path, stop_event)
         else: # For SVG conversion or others that might be added
-             conversion_success, error_msg = conversion_func(input_path, temp_raster_path, stop_event)
+             # Render SVG murni Python (berat di CPU), jalankan di process pool jika aktif
+             conversion_success, error_msg = run_cpu_task(
+                 conversion_func, input_path, temp_raster_path, stop_event=stop_event,
+                 stopped_result=(False, "Dihentikan")
+             )
         
         if not conversion_success:
+            if check_stop_event(stop_event):
+                return "stopped", None
             log_message(f"  Gagal konversi {ext_lower.upper()}: {error_msg}")
             if temp_raster_path and os.path.exists(temp_raster_path):
                 try: os.remove(temp_raster_path)
                 except Exception: pass
-            return "failed_conversion", None, None
+            return "failed_conversion", None
         
         log_message(f"  Konversi {ext_lower.upper()} ke {target_format} selesai.")
         
         # Jangan lakukan apa-apa dengan raster hasil konversi di sini
         # Kita hanya gunakan untuk dapatkan metadata dari API
     
-    # Memproses seperti file raster dan mendapatkan metadata
-    api_key_to_use = selected_api_key
-    
-    # Gunakan file hasil konversi untuk mendapatkan metadata
-    from src.api.gemini_api import get_gemini_metadata
-    metadata_result = get_gemini_metadata(
-        temp_raster_path if temp_raster_path else input_path, 
-        api_key_to_use, 
-        stop_event, 
-        use_png_prompt=True,  # Gunakan prompt PNG untuk semua file vektor
-        selected_model_input=selected_model,
-        keyword_count=keyword_count,
-        priority=priority
-    )
+    return "prepared", {
+        "api_input": temp_raster_path if temp_raster_path else input_path,
+        "temp_files": [temp_raster_path] if temp_raster_path else [],
+        "use_png_prompt": True,  # Gunakan prompt PNG untuk semua file vektor
+        "use_video_prompt": False,
+        "initial_output_path": initial_output_path
+    }
+
+def finalize_vector_file(input_path, initial_output_path, metadata, keyword_count, stop_event):
+    """
+    Tahap output file vektor: menyalin file ke output dan menulis metadata dengan exiftool.
     
-    # Bersihkan file sementara
-    if temp_raster_path and os.path.exists(temp_raster_path):
-        try:
-            os.remove(temp_raster_path)
-            log_message(f"  File konversi sementara dihapus: {os.path.basename(temp_raster_path)}")
-        except Exception as e:
-            log_message(f"  Warning: Gagal hapus file konversi: {e}")
-    
-    if metadata_result == "stopped":
-        return "stopped", None, None
-    elif isinstance(metadata_result, dict) and "error" in metadata_result:
-        log_message(f"  API Error detail: {metadata_result['error']}")
-        return "failed_api", None, None
-    elif isinstance(metadata_result, dict):
-        metadata = metadata_result
-    else:
-        log_message(f"  API call gagal mendapatkan metadata (hasil tidak valid).")
-        return "failed_api", None, None
+    Returns:
+        Tuple (status, metadata, output_path)
+    """
+    filename = os.path.basename(input_path)
     
     if check_stop_event(stop_event):
         return "stopped", metadata, None
@@ -170,6 +254,50 @@ def process_vector_file(input_path, output_dir, selected_api_key: str, ghostscri
         log_message(f"  Gagal menyalin {filename}: {e}")
         return "failed_copy", metadata, None
 
+def process_vector_file(input_path, output_dir, selected_api_key: str, ghostscript_path, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+    """
+    Memproses file vektor (EPS, AI, SVG).
+    
+    Args:
+        input_path: Path file sumber
+        output_dir: Direktori output
+        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
+        ghostscript_path: Full path to the Ghostscript executable
+        stop_event: Event threading untuk menghentikan proses
+        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
+        selected_model: Selected model for processing
+        keyword_count: Number of keywords to use for processing
+        priority: Priority for processing
+    Returns:
+        Tuple (status, metadata, output_path):
+            - status: String status pemrosesan
+            - metadata: Dictionary metadata hasil API, atau None jika gagal
+            - output_path: Path file output, atau None jika gagal
+    """
+    status, prepared = prepare_vector_file(input_path, output_dir, ghostscript_path, stop_event)
+    if status != "prepared":
+        return status, None, (prepared or {}).get("initial_output_path")
+    
+    # Gunakan file hasil konversi untuk mendapatkan metadata
+    metadata_result = get_gemini_metadata(
+        prepared["api_input"], 
+        selected_api_key, 
+        stop_event, 
+        use_png_prompt=True,  # Gunakan prompt PNG untuk semua file vektor
+        selected_model_input=selected_model,
+        keyword_count=keyword_count,
+        priority=priority
+    )
+    
+    # Bersihkan file sementara
+    remove_temp_files(prepared["temp_files"], log_removed=True)
+    
+    status, metadata = interpret_metadata_result(metadata_result)
+    if status != "ok":
+        return status, None, None
+    
+    return finalize_vector_file(input_path, prepared["initial_output_path"], metadata, keyword_count, stop_event)
+
 def process_image(input_path, output_dir, selected_api_key: str, ghostscript_path, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
     """
     Memproses file gambar.
@@ -217,9 +345,657 @@ def process_image(input_path, output_dir, selected_api_key: str, ghostscript_pat
         log_message(f"  Format file tidak didukung: {ext_lower}")
         return "failed_format", None, None
 
+def _build_job_context(output_dir, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled, selected_model, keyword_count, priority, stop_event, journal=None, resume=False, similarity_index=None, similarity_variation=False, work_queue=None, input_dir=None):
+    """
+    Mengumpulkan pengaturan proses yang dibutuhkan oleh setiap tahap pipeline.
+    """
+    return {
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "ghostscript_path": ghostscript_path,
+        "rename_enabled": rename_enabled,
+        "auto_kategori_enabled": auto_kategori_enabled,
+        "auto_foldering_enabled": auto_foldering_enabled,
+        "selected_model": selected_model,
+        "keyword_count": keyword_count,
+        "priority": priority,
+        "stop_event": stop_event,
+        "journal": journal,
+        "resume": resume,
+        "similarity_index": similarity_index,
+        "similarity_variation": similarity_variation,
+        "work_queue": work_queue,
+        # Folder target bersubfolder yang dipakai run ini (folder temp-nya dibersihkan di akhir)
+        "target_dirs": set(),
+    }
+
+@contextmanager
+def _waiting(job):
+    """
+    Mencatat lama menunggu (jarak API key, slot konkurensi, gambar mirip yang sedang
+    diproses) di job["wait_seconds"], agar tidak ikut terhitung sebagai biaya file.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        job["wait_seconds"] = job.get("wait_seconds", 0.0) + time.monotonic() - started
+
+def _work_seconds(job):
+    """
+    Returns:
+        Lama kerja nyata semua tahap (detik), tanpa waktu menunggu giliran di dalam tahap.
+    """
+    return max(0.0, sum(job.get("stage_seconds", {}).values()) - job.get("wait_seconds", 0.0))
+
+def _journal_record(job, ctx, state, **kwargs):
+    journal = ctx.get("journal")
+    if journal is not None and job.get("fingerprint"):
+        journal.record(job["input"], job["fingerprint"], state, **kwargs)
+
+def _move_no_replace(src, dst):
+    """
+    Memindahkan file tanpa pernah menimpa tujuan, juga terhadap proses/host lain yang
+    menulis ke folder output yang sama.
+
+    Raises:
+        FileExistsError jika dst sudah ada
+    """
+    if os.name == "nt":
+        # Di Windows os.rename gagal jika tujuan sudah ada
+        os.rename(src, dst)
+        return
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        # File system tanpa hard link (sebagian share SMB/exFAT)
+        if os.path.exists(dst):
+            raise FileExistsError(dst)
+        shutil.move(src, dst)
+        return
+    os.remove(src)
+
+def _job_stop_requested(ctx):
+    stop_event = ctx.get("stop_event")
+    return bool(stop_event and stop_event.is_set()) or is_stop_requested()
+
+def _discard_job(job):
+    """
+    Membersihkan file sementara milik pekerjaan yang tidak dilanjutkan.
+    """
+    prepared = job.get("prepared")
+    if prepared:
+        remove_temp_files(prepared.get("temp_files"))
+        prepared["temp_files"] = []
+
+def _relative_input_dir(input_path, input_dir):
+    """
+    Returns:
+        Subfolder file input relatif terhadap folder input ("" untuk file di akar folder input
+        atau jika folder input tidak diketahui).
+    """
+    if not input_path or not input_dir:
+        return ""
+    try:
+        rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(input_path)), os.path.abspath(input_dir))
+    except ValueError:
+        # Drive berbeda (Windows)
+        return ""
+    if rel_dir == os.curdir or rel_dir == os.pardir or rel_dir.startswith(os.pardir + os.sep):
+        return ""
+    return rel_dir
+
+def _target_output_dir(ext_lower, ctx, input_path=None):
+    """
+    Menentukan (dan membuat) folder target output berdasarkan auto_foldering. Subfolder
+    file di dalam folder input dipertahankan di bawah folder target, sehingga file bernama
+    sama di subfolder berbeda tidak saling menimpa (termasuk baris CSV-nya).
+    """
+    output_dir = ctx["output_dir"]
+    if not ctx["auto_foldering_enabled"]:
+        target_output_dir = output_dir
+    elif ext_lower in SUPPORTED_VIDEO_EXTENSIONS:
+        target_output_dir = os.path.join(output_dir, "Videos")
+    elif ext_lower in ('.eps', '.ai', '.svg'):
+        target_output_dir = os.path.join(output_dir, "Vectors")
+    else:
+        target_output_dir = os.path.join(output_dir, "Images")
+    rel_dir = _relative_input_dir(input_path, ctx.get("input_dir"))
+    if rel_dir:
+        target_output_dir = os.path.join(target_output_dir, rel_dir)
+        ctx["target_dirs"].add(target_output_dir)
+    
+    if not os.path.exists(target_output_dir):
+        try:
+            os.makedirs(target_output_dir, exist_ok=True)
+        except Exception as e:
+            log_message(f"Error membuat subfolder '{os.path.basename(target_output_dir)}': {e}", "error")
+            target_output_dir = output_dir
+    return target_output_dir
+
+def _resume_from_journal(job, entry):
+    """
+    Melanjutkan pekerjaan dari state journal run sebelumnya. Job harus sudah berisi
+    "input", "original_filename" dan "target_output_dir".
+
+    Returns:
+        True jika pekerjaan selesai ("result") atau langsung ke tahap output ("metadata").
+    """
+    input_path = job["input"]
+    original_filename = job["original_filename"]
+    state = entry["state"]
+    if state == "exported":
+        job["result"] = _build_result(input_path, "skipped_journal", entry.get("output"), entry.get("metadata"), original_filename)
+        return True
+    if state in ("api_done", "written") and entry.get("metadata"):
+        job["prepared"] = {"initial_output_path": os.path.join(job["target_output_dir"], original_filename), "temp_files": []}
+        job["metadata"] = entry["metadata"]
+        if state == "written" and entry.get("output") and os.path.exists(entry["output"]):
+            job["written_output"] = entry["output"]
+            job["written_status"] = entry.get("status") if entry.get("status") in SUCCESS_STATUSES else "processed_unknown_exif_status"
+        job["api_skipped"] = True
+        log_message(f"  Resume {original_filename} dari state '{state}' (journal)")
+        return True
+    return False
+
+def _prepare_job(job, ctx):
+    """
+    Tahap 1 (CPU/disk): menentukan folder target lalu kompresi, konversi vektor,
+    atau ekstraksi frame video sebelum file dikirim ke API.
+    
+    Args:
+        job: Dictionary pekerjaan, minimal berisi "input"
+        ctx: Dictionary pengaturan dari _build_job_context
+    Returns:
+        Dictionary pekerjaan yang sama; berisi "result" jika pekerjaan selesai di tahap ini
+    """
+    input_path = job["input"]
+    original_filename = os.path.basename(input_path)
+    stop_event = ctx["stop_event"]
+    job["original_filename"] = original_filename
+    
+    if _job_stop_requested(ctx):
+        job["result"] = {"status": "stopped", "input": input_path}
+        return job
+    
+    _, ext = os.path.splitext(input_path)
+    ext_lower = ext.lower()
+    is_video = ext_lower in SUPPORTED_VIDEO_EXTENSIONS
+    is_vector = ext_lower in ('.eps', '.ai', '.svg')
+    job["ext"] = ext_lower
+    target_output_dir = _target_output_dir(ext_lower, ctx, input_path)
+    job["target_output_dir"] = target_output_dir
+    
+    try:
+        if not os.path.exists(input_path):
+            log_message(f"⨯ File input {original_filename} hilang sebelum diproses.", "error")
+            job["result"] = {"status": "failed_input_missing", "input": input_path}
+            return job
+    except Exception as e_info:
+        log_message(f"Warning: Gagal mendapatkan info awal {original_filename}: {e_info}", "warning")
+    
+    # Resume dari journal: lewati tahap yang sudah selesai pada run sebelumnya
+    entry = job.get("journal_entry") if ctx.get("resume") else None
+    if entry and _resume_from_journal(job, entry):
+        return job
+    
+    # Persiapan berdasarkan jenis file
+    if is_video:
+        status, prepared = prepare_video(input_path, target_output_dir, stop_event)
+    elif is_vector:
+        status, prepared = prepare_vector_file(input_path, target_output_dir, ctx["ghostscript_path"], stop_event)
+    elif ext_lower in ['.jpg', '.jpeg']:
+        status, prepared = prepare_jpg_jpeg(input_path, target_output_dir, stop_event)
+    elif ext_lower == '.png':
+        status, prepared = prepare_png(input_path, target_output_dir, stop_event)
+    else:
+        log_message(f"  Format file tidak didukung untuk API: {ext_lower}")
+        status, prepared = "failed_format", None
+    
+    if status != "prepared":
+        job["result"] = _build_result(input_path, status)
+        return job
+    
+    job["prepared"] = prepared
+    # Perceptual hash hanya untuk gambar tunggal (JPG/PNG/vektor hasil konversi), bukan frame video
+    if ctx.get("similarity_index") is not None and not prepared.get("use_video_prompt"):
+        job["phash"] = run_cpu_task(compute_dhash, prepared["api_input"], stop_event=stop_event, stopped_result=None)
+    _journal_record(job, ctx, "prepared")
+    return job
+
+def _request_job(job, ctx, api_key):
+    """
+    Tahap 2 (jaringan): meminta metadata ke API Gemini dengan API key yang sudah dialokasikan.
+    
+    Args:
+        job: Dictionary pekerjaan hasil _prepare_job
+        ctx: Dictionary pengaturan dari _build_job_context
+        api_key: API key yang dipakai untuk request ini
+    Returns:
+        Dictionary pekerjaan yang sama; berisi "metadata" jika berhasil atau "result" jika gagal
+    """
+    input_path = job["input"]
+    prepared = job["prepared"]
+    
+    # Metadata sudah ada dari journal (resume), tidak perlu request ulang
+    if "metadata" in job:
+        return job
+    
+    if _job_stop_requested(ctx):
+        _discard_job(job)
+        job["result"] = {"status": "stopped", "input": input_path}
+        return job
+    
+    if prepared.get("use_video_prompt"):
+        log_message(f"  Mengirim {len(prepared['api_input'])} frame ke API Gemini untuk analisis video...")
+    metadata_result = get_gemini_metadata(
+        prepared["api_input"],
+        api_key,
+        ctx["stop_event"],
+        use_png_prompt=prepared.get("use_png_prompt", False),
+        use_video_prompt=prepared.get("use_video_prompt", False),
+        selected_model_input=ctx["selected_model"],
+        keyword_count=ctx["keyword_count"],
+        priority=ctx["priority"],
+        reroute_key=_job_reroute(job, ctx)
+    )
+    
+    # Bersihkan file sementara setelah API call
+    remove_temp_files(prepared.get("temp_files"), log_removed=not prepared.get("use_video_prompt"))
+    prepared["temp_files"] = []
+    
+    status, metadata = interpret_metadata_result(metadata_result)
+    if status != "ok":
+        job["result"] = _build_result(input_path, status)
+        return job
+    
+    job["metadata"] = metadata
+    _journal_record(job, ctx, "api_done", metadata=metadata)
+    return job
+
+def _job_reroute(job, ctx):
+    reroute = ctx.get("reroute_key")
+    if reroute is None:
+        return None
+    return lambda failed_key, tried_keys, model, wait=False: reroute(job, failed_key, tried_keys, model, wait)
+
+def _fetch_job_metadata(job, ctx, acquire_key):
+    """
+    Meminta metadata satu pekerjaan: lewat paket request jika aktif dan gambarnya cocok,
+    atau lewat request sendiri dengan API key dari acquire_key.
+    """
+    packer = ctx.get("request_packer")
+    if packer is not None and packer.accepts(job):
+        return _request_job_packed(job, ctx, packer, acquire_key)
+    api_key = acquire_key(job)
+    if api_key is None:
+        return job
+    return _request_job(job, ctx, api_key)
+
+def _request_job_packed(job, ctx, packer, acquire_key):
+    """
+    Tahap 2 dalam mode paket: gambar menunggu dikirim bersama gambar lain dalam satu
+    request. File yang bloknya gagal diparse (atau paketnya gagal) dikirim ulang sendiri.
+    """
+    # Waktu request paket dibagi beberapa gambar: tidak dipakai untuk belajar estimasi biaya
+    job["packed"] = True
+    result = packer.submit(job)
+    if result == "stopped" or _job_stop_requested(ctx):
+        _discard_job(job)
+        job["result"] = {"status": "stopped", "input": job["input"]}
+        return job
+    if result is None:
+        log_message(f"  {job['original_filename']} dikirim ulang sendiri (hasil paket tidak tersedia)")
+        api_key = acquire_key(job)
+        if api_key is None:
+            return job
+        return _request_job(job, ctx, api_key)
+
+    prepared = job["prepared"]
+    remove_temp_files(prepared.get("temp_files"), log_removed=True)
+    prepared["temp_files"] = []
+    job["metadata"] = result
+    _journal_record(job, ctx, "api_done", metadata=result)
+    return job
+
+def _send_pack(jobs, ctx, acquire_key, release_key_slots):
+    """
+    Mengirim satu paket gambar dengan satu API key. Slot key dipegang oleh paket itu
+    sendiri dan dilepas begitu request selesai, agar file yang harus dikirim ulang
+    sendiri tidak menunggu slot yang masih dipegang worker-nya.
+
+    Returns:
+        Hasil get_gemini_metadata_packed, "stopped", atau None jika tidak ada API key.
+    """
+    leader = jobs[0]
+    pack_slot = {"input": leader["input"]}
+    try:
+        api_key = acquire_key(pack_slot)
+        if api_key is None:
+            return "stopped" if _job_stop_requested(ctx) else None
+        names = ", ".join(job["original_filename"] for job in jobs)
+        log_message(f"  Mengirim {len(jobs)} gambar dalam satu request API: {names}")
+        return get_gemini_metadata_packed(
+            [job["prepared"]["api_input"] for job in jobs],
+            api_key,
+            ctx["stop_event"],
+            use_png_prompt=leader["prepared"].get("use_png_prompt", False),
+            selected_model_input=ctx["selected_model"],
+            keyword_count=ctx["keyword_count"],
+            priority=ctx["priority"],
+            reroute_key=_job_reroute(pack_slot, ctx)
+        )
+    finally:
+        release_key_slots(pack_slot)
+
+def _request_job_with_similarity(job, ctx, acquire_key):
+    """
+    Tahap 2 dengan similarity index: gambar yang nyaris sama dengan gambar yang sudah
+    pernah diproses memakai ulang metadata-nya tanpa mengirim gambar ke API.
+    
+    Args:
+        job: Dictionary pekerjaan hasil _prepare_job
+        ctx: Dictionary pengaturan dari _build_job_context
+        acquire_key: Callable(job) yang mengembalikan API key, atau None jika dihentikan
+            (dan sudah mengisi "result" pada job)
+    Returns:
+        Dictionary pekerjaan yang sama; berisi "metadata" jika berhasil atau "result" jika gagal
+    """
+    if "metadata" in job:
+        return job
+    index = ctx.get("similarity_index")
+    image_hash = job.get("phash")
+    if index is None or image_hash is None:
+        return _fetch_job_metadata(job, ctx, acquire_key)
+    
+    with _waiting(job):
+        kind, value = index.lookup_or_reserve(image_hash, should_stop=lambda: _job_stop_requested(ctx))
+    if kind == "stopped":
+        _discard_job(job)
+        job["result"] = {"status": "stopped", "input": job["input"]}
+        return job
+    if kind == "hit":
+        return _reuse_similar_metadata(job, ctx, value, acquire_key)
+    
+    # Gambar baru: panggil API lalu simpan hasilnya ke index (gambar mirip lain menunggu hasil ini)
+    token = value
+    try:
+        job = _fetch_job_metadata(job, ctx, acquire_key)
+        if "metadata" in job and "result" not in job:
+            index.complete(token, job["metadata"], source=job.get("original_filename"))
+        return job
+    finally:
+        index.release(token)
+
+def _reuse_similar_metadata(job, ctx, match, acquire_key):
+    metadata, source, distance = match
+    prepared = job["prepared"]
+    remove_temp_files(prepared.get("temp_files"), log_removed=True)
+    prepared["temp_files"] = []
+    job["api_skipped"] = True
+    log_message(f"  Metadata dipakai ulang dari {source} untuk {job['original_filename']} (jarak hash {distance}, tanpa request API)")
+    
+    if ctx.get("similarity_variation"):
+        api_key = acquire_key(job)
+        if api_key is None:
+            return job
+        variation = get_gemini_text_variation(metadata, api_key, ctx["stop_event"], ctx["selected_model"], label=job["original_filename"])
+        if variation is not None:
+            metadata = variation
+        elif _job_stop_requested(ctx):
+            job["result"] = {"status": "stopped", "input": job["input"]}
+            return job
+        else:
+            log_message(f"  Warning: Variasi judul gagal untuk {job['original_filename']}, memakai metadata asli.", "warning")
+    
+    job["metadata"] = metadata
+    _journal_record(job, ctx, "api_done", metadata=metadata)
+    return job
+
+def _output_job(job, ctx):
+    """
+    Tahap 3 (disk): menyalin file ke output, menulis EXIF, rename, dan ekspor CSV.
+    
+    Args:
+        job: Dictionary pekerjaan hasil _request_job
+        ctx: Dictionary pengaturan dari _build_job_context
+    Returns:
+        Dictionary pekerjaan yang sama dengan key "result" terisi
+    """
+    input_path = job["input"]
+    original_filename = job["original_filename"]
+    target_output_dir = job["target_output_dir"]
+    initial_output_path = job["prepared"]["initial_output_path"]
+    metadata = job["metadata"]
+    ext_lower = job["ext"]
+    stop_event = ctx["stop_event"]
+    keyword_count = ctx["keyword_count"]
+    rename_enabled = ctx["rename_enabled"]
+    
+    if _job_stop_requested(ctx):
+        job["result"] = {"status": "stopped", "input": input_path}
+        return job
+    
+    # Salin file dan tulis metadata berdasarkan jenis file
+    if job.get("written_output"):
+        # Resume: file sudah tersalin dan metadata tertulis pada run sebelumnya
+        status, processed_metadata, initial_output_path = job["written_status"], metadata, job["written_output"]
+    elif ext_lower in SUPPORTED_VIDEO_EXTENSIONS:
+        status, processed_metadata, initial_output_path = finalize_video(input_path, initial_output_path, metadata, keyword_count, stop_event)
+    elif ext_lower in ['.eps', '.ai', '.svg']:
+        status, processed_metadata, initial_output_path = finalize_vector_file(input_path, initial_output_path, metadata, keyword_count, stop_event)
+    elif ext_lower in ['.jpg', '.jpeg']:
+        status, processed_metadata, initial_output_path = finalize_jpg_jpeg(input_path, initial_output_path, metadata, stop_event)
+    else:
+        status, processed_metadata, initial_output_path = finalize_png(input_path, initial_output_path, metadata, stop_event)
+    
+    # Setelah file tersalin, selesaikan rename/CSV walaupun stop diminta agar output tidak setengah jadi
+    final_output_path = None
+    new_filename = None
+
+    # Mode antrean kerja: jangan lanjut rename/CSV jika lease sudah diambil alih node lain
+    work_queue = ctx.get("work_queue")
+    if status in SUCCESS_STATUSES and work_queue is not None and job.get("lease") and not work_queue.renew(job["lease"]):
+        log_message(f"  Lease {original_filename} sudah diambil node lain, output node ini dibuang.", "warning")
+        if initial_output_path and os.path.exists(initial_output_path) and not job.get("written_output"):
+            try:
+                os.remove(initial_output_path)
+            except OSError:
+                pass
+        job["result"] = _build_result(input_path, "skipped_lease_lost", None, processed_metadata, original_filename)
+        return job
+    
+    # Check if processing was generally successful (metadata obtained, file copied/renamed)
+    # even if EXIF writing specifically failed.
+    if status in SUCCESS_STATUSES:
+        final_output_path = initial_output_path
+        if not job.get("written_output"):
+            _journal_record(job, ctx, "written", status=status, output=final_output_path)
+        
+        # Rename file jika diperlukan
+        if rename_enabled and processed_metadata and processed_metadata.get("title"):
+            current_output_path = final_output_path
+            _, file_ext = os.path.splitext(original_filename)
+            title_for_rename = processed_metadata.get("title", "").strip()
+            
+            if title_for_rename:
+                sanitized_title = sanitize_filename(title_for_rename)
+                if not sanitized_title:
+                    sanitized_title = f"untitled_{os.path.splitext(original_filename)[0]}"
+                
+                new_base_filename = f"{sanitized_title}{file_ext}"
+                new_path = os.path.join(target_output_dir, new_base_filename)
+                
+                if new_path.lower() != initial_output_path.lower():
+                    # Worker output berjalan paralel: cek-dan-pindah harus atomik
+                    with _RENAME_LOCK:
+                        counter = 0
+                        max_rename_attempts = 50
+                        
+                        while counter < max_rename_attempts:
+                            if counter:
+                                new_base_filename = f"{sanitized_title} ({counter}){file_ext}"
+                                new_path = os.path.join(target_output_dir, new_base_filename)
+                            if os.path.exists(new_path):
+                                counter += 1
+                                continue
+                            try:
+                                # Node lain (antrean kerja) bisa membuat nama yang sama di antara cek dan pindah
+                                _move_no_replace(initial_output_path, new_path)
+                                final_output_path = new_path
+                                new_filename = new_base_filename
+                                _journal_record(job, ctx, "written", status=status, output=final_output_path)
+                                break
+                            except FileExistsError:
+                                counter += 1
+                            except Exception as e_rename:
+                                log_message(f"  ERROR: Gagal rename: {e_rename}")
+                                final_output_path = current_output_path
+                                break
+                        
+                        if counter >= max_rename_attempts:
+                            log_message(f"  Error: Gagal menemukan nama unik untuk rename.")
+        
+        # Tulis metadata ke CSV setelah rename (jika ada) dan proses berhasil
+        def export():
+            if processed_metadata and final_output_path:
+                if not _export_csv(processed_metadata, final_output_path, target_output_dir, original_filename, new_filename, ctx):
+                    raise CsvExportError(f"baris CSV untuk {os.path.basename(final_output_path)} tidak tertulis")
+
+        try:
+            if work_queue is not None and job.get("lease"):
+                # Baris CSV ditulis dan pekerjaan ditandai selesai dalam satu transaksi antrean,
+                # jadi tiap file masuk CSV bersama tepat sekali walaupun ada node yang mati.
+                # Jika penulisan CSV gagal, transaksi dibatalkan dan pekerjaan tidak ditandai selesai
+                completed = work_queue.complete_with(job["lease"], export, status=status, output=final_output_path)
+                if completed is False:
+                    log_message(f"  Lease {original_filename} sudah diambil node lain, output node ini dibuang.", "warning")
+                    if final_output_path and os.path.exists(final_output_path):
+                        try:
+                            os.remove(final_output_path)
+                        except OSError:
+                            pass
+                    job["result"] = _build_result(input_path, "skipped_lease_lost", None, processed_metadata, original_filename)
+                    return job
+                if completed is None:
+                    # Tanpa kunci antrean, CSV bersama bisa mendapat baris ganda dari node lain
+                    raise CsvExportError("antrean kerja tidak bisa dikunci")
+                job["queue_completed"] = True
+            else:
+                export()
+        except CsvExportError as e_export:
+            # File input tidak dihapus dan output dibuang, agar percobaan berikutnya menulis ulang
+            # output dan baris CSV-nya (metadata diambil dari journal, tanpa request API lagi)
+            log_message(f"  ERROR: {original_filename} belum selesai, {e_export}; file input tidak dihapus", "error")
+            if final_output_path and os.path.exists(final_output_path):
+                try:
+                    os.remove(final_output_path)
+                except OSError:
+                    pass
+            job["result"] = _build_result(input_path, "failed_csv", None, processed_metadata, original_filename)
+            return job
+        _journal_record(job, ctx, "exported", status=status, output=final_output_path)
+        
+        # Hapus file input paling akhir, setelah CSV tercatat, agar crash tidak menghilangkan baris CSV
+        if os.path.exists(input_path):
+            try:
+                os.remove(input_path)
+            except OSError as e_remove:
+                log_message(f"  WARNING: Gagal menghapus file asli '{original_filename}': {e_remove}")
+    
+    job["result"] = _build_result(input_path, status, final_output_path, processed_metadata, original_filename, new_filename)
+    return job
+
+def _export_csv(processed_metadata, final_output_path, target_output_dir, original_filename, new_filename, ctx):
+    """
+    Menulis baris metadata satu file ke CSV semua platform.
+
+    Returns:
+        True jika baris tertulis di semua CSV platform, False jika gagal.
+    """
+    final_filename_for_csv = os.path.basename(final_output_path)
+    try:
+        # Tentukan direktori CSV (gunakan target_output_dir karena file sudah dipindah ke sana)
+        csv_subfolder = os.path.join(target_output_dir, "metadata_csv")
+        if not os.path.exists(csv_subfolder):
+            os.makedirs(csv_subfolder, exist_ok=True)
+        
+        # Tentukan judul untuk kolom Title/Description
+        # Jika di-rename, gunakan nama file baru (tanpa ekstensi) sebagai judul
+        # Jika tidak, gunakan judul dari metadata
+        title_for_csv = processed_metadata.get('title', '')
+        if ctx["rename_enabled"] and new_filename:
+            title_for_csv = os.path.splitext(new_filename)[0]
+        
+        # Determine if the original file was a vector
+        is_vector_file = original_filename.lower().endswith(('.eps', '.ai', '.svg'))
+        
+        # Pastikan keyword_count dipakai untuk limit
+        try:
+            max_keywords = int(ctx["keyword_count"])
+            if max_keywords < 1: max_keywords = 49
+        except Exception:
+            max_keywords = 49
+        return write_to_platform_csvs(
+            csv_subfolder,
+            final_filename_for_csv,
+            title_for_csv,
+            processed_metadata.get('description', ''), # Deskripsi tetap dari metadata
+            processed_metadata.get('tags', []), # Keywords tetap dari metadata
+            auto_kategori_enabled=ctx["auto_kategori_enabled"], # Flag kategori
+            is_vector=is_vector_file, # Pass the vector flag
+            max_keywords=max_keywords # Limit keyword
+        )
+    except Exception as e_csv:
+        log_message(f"  Warning: Gagal menulis metadata ke CSV untuk {final_filename_for_csv}: {e_csv}")
+        return False
+
+def _cleanup_temp_folders(temp_folders, output_dir, auto_foldering_enabled, target_dirs=()):
+    """
+    Membersihkan folder kompresi sementara di akhir proses, termasuk yang dibuat di
+    folder target bersubfolder (target_dirs).
+    """
+    try:
+        for folder_type, folder_path in temp_folders.items():
+            if os.path.exists(folder_path):
+                cleanup_temp_compression_folder(folder_path)
+        
+        if auto_foldering_enabled:
+            possible_subfolders = [
+                os.path.join(output_dir, "Images"),
+                os.path.join(output_dir, "Videos"),
+                os.path.join(output_dir, "Vectors")
+            ]
+            
+            for subfolder in possible_subfolders:
+                if os.path.exists(subfolder) and os.path.isdir(subfolder):
+                    temp_subfolder = os.path.join(subfolder, "temp_compressed")
+                    if os.path.exists(temp_subfolder):
+                        log_message(f"Membersihkan folder kompresi di {os.path.basename(subfolder)}", "info")
+                        cleanup_temp_compression_folder(temp_subfolder)
+        
+        for target_dir in target_dirs:
+            temp_subfolder = os.path.join(target_dir, "temp_compressed")
+            if os.path.isdir(temp_subfolder):
+                cleanup_temp_compression_folder(temp_subfolder)
+    except Exception as e:
+        log_message(f"Error saat membersihkan folder temp akhir: {e}", "warning")
+
+def _build_result(input_path, status, output_path=None, metadata=None, original_filename=None, new_filename=None):
+    return {
+        "status": status,
+        "input": input_path,
+        "output": output_path,
+        "metadata": metadata,
+        "original_filename": original_filename or os.path.basename(input_path),
+        "new_filename": new_filename
+    }
+
 def process_single_file(input_path, output_dir, api_keys_list, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled, selected_model=None, keyword_count="49", priority="Kualitas", stop_event=None):
     """
-    Memproses satu file, menentukan tipe dan memanggil fungsi pemrosesan yang sesuai.
+    Memproses satu file secara berurutan melalui tahap persiapan, API, dan output.
     
     Args:
         input_path: Path file sumber
@@ -240,208 +1016,141 @@ def process_single_file(input_path, output_dir, api_keys_list, ghostscript_path,
     if stop_event is None:
         import threading
         stop_event = threading.Event()
-        
+    
+    ctx = _build_job_context(output_dir, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled, selected_model, keyword_count, priority, stop_event)
+    job = {"input": input_path}
     original_filename = os.path.basename(input_path)
-    final_output_path = None
-    processed_metadata = None
-    status = "failed"
-    new_filename = None
     
-    if is_stop_requested() or stop_event.is_set():
+    if _job_stop_requested(ctx):
         return {"status": "stopped", "input": input_path}
     
-    original_file_size = None
-    original_file_mtime = None
+    if not api_keys_list:
+        log_message(f"⨯ Tidak ada API Key tersedia dalam daftar untuk {original_filename}", "error")
+        return {"status": "failed_api_list_empty", "input": input_path}
+    
+    selected_api_key = select_smart_api_key(api_keys_list)
+    if not selected_api_key:
+        log_message(f"⨯ Gagal memilih API Key cerdas untuk {original_filename} (daftar mungkin kosong atau error internal).", "error")
+        return {"status": "failed_api_selection", "input": input_path}
     
     try:
-        if stop_event.is_set() or is_stop_requested():
-            return {"status": "stopped", "input": input_path}
-        
-        _, ext = os.path.splitext(input_path)
-        ext_lower = ext.lower()
-        is_video = ext_lower in SUPPORTED_VIDEO_EXTENSIONS
-        is_vector = ext_lower in ('.eps', '.ai', '.svg')
-        is_image = not is_video and not is_vector
-        
-        # Tentukan target output berdasarkan auto_foldering
-        target_output_dir = output_dir
-        if auto_foldering_enabled:
-            if is_video:
-                target_output_dir = os.path.join(output_dir, "Videos")
-            elif is_vector:
-                target_output_dir = os.path.join(output_dir, "Vectors")
-            else:
-                target_output_dir = os.path.join(output_dir, "Images")
-            
-            if not os.path.exists(target_output_dir):
-                try:
-                    os.makedirs(target_output_dir, exist_ok=True)
-                except Exception as e:
-                    log_message(f"Error membuat subfolder '{os.path.basename(target_output_dir)}': {e}", "error")
-                    target_output_dir = output_dir
-        
-        try:
-            if os.path.exists(input_path):
-                original_file_size = os.path.getsize(input_path)
-                original_file_mtime = os.path.getmtime(input_path)
-            else:
-                log_message(f"⨯ File input {original_filename} hilang sebelum diproses.", "error")
-                return {"status": "failed_input_missing", "input": input_path}
-        except Exception as e_info:
-            log_message(f"Warning: Gagal mendapatkan info awal {original_filename}: {e_info}", "warning")
-        
-        if not api_keys_list:
-            log_message(f"⨯ Tidak ada API Key tersedia dalam daftar untuk {original_filename}", "error")
-            return {"status": "failed_api_list_empty", "input": input_path}
-        
-        selected_api_key = select_smart_api_key(api_keys_list)
-        
-        if not selected_api_key:
-            log_message(f"⨯ Gagal memilih API Key cerdas untuk {original_filename} (daftar mungkin kosong atau error internal).", "error")
-            return {"status": "failed_api_selection", "input": input_path}
-        
-        if stop_event.is_set() or is_stop_requested():
-            return {"status": "stopped", "input": input_path}
-        
-        # Proses file berdasarkan jenisnya
-        if is_video:
-            status, processed_metadata, initial_output_path = process_video(
-                input_path, target_output_dir, selected_api_key, stop_event, auto_kategori_enabled, selected_model, keyword_count, priority
-            )
-        elif ext_lower in ['.eps', '.ai', '.svg']:
-            status, processed_metadata, initial_output_path = process_vector_file(
-                input_path, target_output_dir, selected_api_key, ghostscript_path, stop_event, auto_kategori_enabled, selected_model, keyword_count, priority
-            )
-        elif ext_lower in ['.jpg', '.jpeg']:
-            status, processed_metadata, initial_output_path = process_jpg_jpeg(
-                input_path, target_output_dir, selected_api_key, stop_event, auto_kategori_enabled, selected_model, keyword_count, priority
-            )
-        elif ext_lower == '.png':
-            status, processed_metadata, initial_output_path = process_png(
-                input_path, target_output_dir, selected_api_key, stop_event, auto_kategori_enabled, selected_model, keyword_count, priority
-            )
-        else:
-            log_message(f"  Format file tidak didukung untuk API: {ext_lower}")
-            status, processed_metadata, initial_output_path = "failed_format", None, None
-        
-        if stop_event.is_set() or is_stop_requested():
-            return {"status": "stopped", "input": input_path}
-        
-        # Check if processing was generally successful (metadata obtained, file copied/renamed)
-        # even if EXIF writing specifically failed.
-        processed_statuses = ["processed_exif", "processed_no_exif", 
-                              "processed_exif_failed", "processed_unknown_exif_status"]
-        if status in processed_statuses:
-            final_output_path = initial_output_path
-            
-            # Rename file jika diperlukan
-            if rename_enabled and processed_metadata and processed_metadata.get("title"):
-                current_output_path = final_output_path
-                rename_success = True
-                _, file_ext = os.path.splitext(original_filename)
-                title_for_rename = processed_metadata.get("title", "").strip()
-                
-                if title_for_rename:
-                    sanitized_title = sanitize_filename(title_for_rename)
-                    if not sanitized_title:
-                        sanitized_title = f"untitled_{os.path.splitext(original_filename)[0]}"
-                    
-                    new_base_filename = f"{sanitized_title}{file_ext}"
-                    new_path = os.path.join(target_output_dir, new_base_filename)
-                    
-                    if new_path.lower() != initial_output_path.lower():
-                        counter = 0
-                        max_rename_attempts = 50
-                        
-                        while os.path.exists(new_path) and counter < max_rename_attempts:
-                            counter += 1
-                            new_base_filename = f"{sanitized_title} ({counter}){file_ext}"
-                            new_path = os.path.join(target_output_dir, new_base_filename)
-                        
-                        if counter >= max_rename_attempts:
-                            log_message(f"  Error: Gagal menemukan nama unik untuk rename.")
-                            rename_success = False
-                        else:
-                            try:
-                                shutil.move(initial_output_path, new_path)
-                                # log_message(f"  -> Berhasil di-rename menjadi: {new_base_filename}")
-                                final_output_path = new_path
-                                new_filename = new_base_filename
-                            except Exception as e_rename:
-                                log_message(f"  ERROR: Gagal rename: {e_rename}")
-                                rename_success = False
-                                final_output_path = current_output_path
-            
-            # Hapus file input jika berhasil diproses
-            if status != "failed_copy" and status != "skipped_exists" and os.path.exists(input_path):
-                try:
-                    os.remove(input_path)
-                except OSError as e_remove:
-                    log_message(f"  WARNING: Gagal menghapus file asli '{original_filename}': {e_remove}")
-
-            # Tulis metadata ke CSV setelah rename (jika ada) dan proses berhasil
-            # Use the same check for processed statuses here
-            if status in processed_statuses and processed_metadata and final_output_path:
-                try:
-                    # Tentukan direktori CSV (gunakan target_output_dir karena file sudah dipindah ke sana)
-                    csv_subfolder = os.path.join(target_output_dir, "metadata_csv")
-                    if not os.path.exists(csv_subfolder):
-                        os.makedirs(csv_subfolder, exist_ok=True)
-
-                    # Dapatkan nama file akhir untuk kolom Filename
-                    final_filename_for_csv = os.path.basename(final_output_path)
-
-                    # Tentukan judul untuk kolom Title/Description
-                    # Jika di-rename, gunakan nama file baru (tanpa ekstensi) sebagai judul
-                    # Jika tidak, gunakan judul dari metadata
-                    title_for_csv = processed_metadata.get('title', '')
-                    if rename_enabled and new_filename:
-                        title_for_csv = os.path.splitext(new_filename)[0]
-
-                    # Determine if the original file was a vector
-                    is_vector_file = original_filename.lower().endswith(('.eps', '.ai', '.svg'))
-                    
-                    # Tulis ke CSV menggunakan nama file akhir dan judul yang sesuai
-                    # Pastikan keyword_count dipakai untuk limit
-                    try:
-                        max_keywords = int(keyword_count)
-                        if max_keywords < 1: max_keywords = 49
-                    except Exception:
-                        max_keywords = 49
-                    write_to_platform_csvs(
-                        csv_subfolder,
-                        final_filename_for_csv,
-                        title_for_csv,
-                        processed_metadata.get('description', ''), # Deskripsi tetap dari metadata
-                        processed_metadata.get('tags', []), # Keywords tetap dari metadata
-                        auto_kategori_enabled=auto_kategori_enabled, # Flag kategori
-                        is_vector=is_vector_file, # Pass the vector flag
-                        max_keywords=max_keywords # Limit keyword
-                    )
-                except Exception as e_csv:
-                    log_message(f"  Warning: Gagal menulis metadata ke CSV untuk {final_filename_for_csv}: {e_csv}")
-        
+        for stage in (_prepare_job, lambda j, c: _request_job(j, c, selected_api_key), _output_job):
+            job = stage(job, ctx)
+            if "result" in job:
+                break
     except Exception as e:
         log_message(f"Error processing {original_filename}: {e}", "error")
         import traceback
         log_message(f"Detail error: {traceback.format_exc()}", "error")
-        status = "failed_worker"
+        _discard_job(job)
+        job["result"] = _build_result(input_path, "failed_worker")
     
-    if stop_event.is_set() or is_stop_requested():
+    if _job_stop_requested(ctx):
         return {"status": "stopped", "input": input_path}
     
-    return {
-        "status": status,
-        "input": input_path,
-        "output": final_output_path,
-        "metadata": processed_metadata,
-        "original_filename": original_filename,
-        "new_filename": new_filename
+    return job["result"]
+
+def _tally_result(result, input_path, stats):
+    """
+    Mencatat hasil satu pekerjaan ke statistik dan menulis baris log ringkasnya.
+
+    Args:
+        result: Dictionary hasil dari process_single_file
+        input_path: Path file yang dikirim ke worker
+        stats: Dictionary counter (processed_count, failed_count, skipped_count, stopped_count)
+    """
+    if not result:
+        log_message(f"⨯ Hasil tidak valid diterima", "error")
+        stats["failed_count"] += 1
+        return
+
+    status = result.get("status", "failed")
+    input_path_result = result.get("input", "") or input_path
+    filename = os.path.basename(input_path_result) if input_path_result else "unknown file"
+
+    if status == "processed_exif" or status == "processed_no_exif":
+        stats["processed_count"] += 1
+        new_name = result.get("new_filename")
+        log_msg = f"✓ {filename}" + (f" → {new_name}" if new_name else "")
+        log_message(log_msg)
+    elif status == "processed_exif_failed" or status == "processed_unknown_exif_status": # Handle specific EXIF failure status
+        stats["processed_count"] += 1 # Count as processed because CSV/move happened
+        new_name = result.get("new_filename")
+        log_msg = f"⚠ {filename}" + (f" → {new_name}" if new_name else "") + " (exif_write_failed, proceeding)"
+        log_message(log_msg, "warning")
+    elif status == "skipped_exists":
+        stats["skipped_count"] += 1
+        log_message(f"⋯ {filename} (sudah ada)", "info")
+    elif status == "skipped_journal":
+        stats["skipped_count"] += 1
+        log_message(f"⋯ {filename} (sudah selesai menurut journal)", "info")
+    elif status == "skipped_lease_lost":
+        stats["skipped_count"] += 1
+        log_message(f"⋯ {filename} (diambil alih node lain)", "info")
+    elif status == "stopped":
+        stats["stopped_count"] += 1
+        log_message(f"⊘ {filename} (dihentikan internal)", "warning")
+    else:
+        stats["failed_count"] += 1
+        if status == "failed_api":
+            log_message(f"✗ {filename} (API Error/Limit)", "error")
+        elif status == "failed_copy":
+            log_message(f"✗ {filename} (gagal copy)", "error")
+        elif status == "failed_format":
+            log_message(f"✗ {filename} (format/file error)", "error")
+        elif status == "failed_empty":
+            log_message(f"✗ {filename} (file kosong)", "error")
+        elif status == "failed_input_missing":
+            log_message(f"✗ {filename} (input hilang)", "error")
+        else:
+            log_message(f"✗ {filename} ({status})", "error")
+
+def bulk_ignored_options(options):
+    """
+    Returns:
+        List nama opsi engine yang diisi (berbeda dari ENGINE_OPTION_DEFAULTS) tetapi
+        diabaikan di mode bulk.
+    """
+    return [key for key in BULK_IGNORED_OPTIONS if key in options and options[key] != ENGINE_OPTION_DEFAULTS[key]]
+
+def _log_run_summary(total_files, stats, extra_lines=()):
+    """
+    Menulis blok "Ringkasan Proses" di akhir run (format barisnya dikenali filter log GUI).
+
+    Args:
+        total_files: Jumlah file yang ditemukan pada run ini
+        stats: Dictionary hitungan hasil dari _tally_result
+        extra_lines: Baris tambahan sebelum penutup blok (konkurensi, statistik model, bulk job, ...)
+    """
+    log_message("", None)
+    log_message("============= Ringkasan Proses =============", "bold")
+    log_message(f"Total file: {total_files}", None)
+    log_message(f"Berhasil diproses: {stats['processed_count']}", "success")
+    log_message(f"Gagal: {stats['failed_count']}", "error")
+    log_message(f"Dilewati: {stats['skipped_count']}", "info")
+    log_message(f"Dihentikan: {stats['stopped_count']}", "warning")
+    for line in extra_lines:
+        log_message(line, None)
+    log_message("=========================================", None)
+
+def _run_result(total_files, stats, **extra):
+    """
+    Returns:
+        Dictionary hasil run (hitungan per status dan total_files) ditambah kunci di extra.
+    """
+    result = {
+        "processed_count": stats["processed_count"],
+        "failed_count": stats["failed_count"],
+        "skipped_count": stats["skipped_count"],
+        "stopped_count": stats["stopped_count"],
+        "total_files": total_files
     }
+    result.update(extra)
+    return result
 
-def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, rename_enabled, delay_seconds, num_workers, auto_kategori_enabled, auto_foldering_enabled, progress_callback=None, stop_event=None, selected_model=None, keyword_count="49", priority="Kualitas", bypass_api_key_limit=False):
+def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, rename_enabled, delay_seconds, num_workers, auto_kategori_enabled, auto_foldering_enabled, progress_callback=None, stop_event=None, selected_model=None, keyword_count="49", priority="Kualitas", bypass_api_key_limit=False, prep_workers=None, output_workers=None, prep_processes=0, recursive=False, include_patterns=None, exclude_patterns=None, journal_path=None, resume=True, response_cache_path=None, response_cache=True, response_cache_max_mb=DEFAULT_CACHE_MAX_MB, response_cache_ttl_days=DEFAULT_CACHE_TTL_DAYS, similarity_index_path=None, similarity_reuse=True, similarity_max_distance=DEFAULT_MAX_DISTANCE, similarity_variation=False, cost_model_path=None, longest_first=True, adaptive_concurrency=True, max_inflight_per_key=DEFAULT_MAX_INFLIGHT_PER_KEY, latency_target_seconds=DEFAULT_LATENCY_TARGET, exiftool_stay_open=True, watch=False, watch_settle_seconds=WATCH_SETTLE_SECONDS, watch_poll_interval=WATCH_POLL_INTERVAL, work_queue_path="", work_queue_node_id="", work_queue_lease_seconds=DEFAULT_LEASE_SECONDS, http2=False, rate_limiter=None, rate_limits=None, pack_size=DEFAULT_PACK_SIZE, pack_window_seconds=DEFAULT_PACK_WINDOW_SECONDS, pack_max_image_kb=DEFAULT_PACK_MAX_IMAGE_KB, structured_output=True, context_cache=True, context_cache_ttl_seconds=DEFAULT_CONTEXT_CACHE_TTL, hedge_requests=False, hedge_budget=DEFAULT_HEDGE_BUDGET, model_router=True, model_exploration=DEFAULT_EXPLORATION, circuit_breaker=True, circuit_breaker_threshold=DEFAULT_FAILURE_THRESHOLD, circuit_breaker_probe_seconds=DEFAULT_PROBE_SECONDS, bulk_mode=False, bulk_job_id="", bulk_poll_seconds=DEFAULT_BULK_POLL_SECONDS, batch_base_url="", result_callback=None):
     """
-    Memproses batch file dari direktori input.
+    Memproses batch file dari direktori input melalui pipeline persiapan → API → output.
     
     Args:
         input_dir: Direktori sumber file
@@ -449,7 +1158,7 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
         api_keys: List API key Gemini
         ghostscript_path: Full path to the Ghostscript executable
         rename_enabled: Flag untuk mengaktifkan rename otomatis
-        delay_seconds: Delay dalam detik antara batch
+        delay_seconds: Jarak minimum (detik) antar pekerjaan pada API key yang sama
         num_workers: Jumlah worker paralel
         auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
         auto_foldering_enabled: Flag untuk menempatkan file dalam subfolder berdasarkan tipe
@@ -459,6 +1168,67 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
         keyword_count: Number of keywords to use for processing
         priority: Priority for processing
         bypass_api_key_limit: Jika True, tidak membatasi worker ke jumlah API key
+        prep_workers: Jumlah worker tahap persiapan (kompresi/konversi/frame), None = otomatis
+        output_workers: Jumlah worker tahap output (copy/EXIF/rename/CSV), None = otomatis
+        prep_processes: Jumlah proses untuk kompresi/ekstraksi frame/render SVG, 0 = pakai thread saja
+        recursive: Jika True, subfolder di dalam folder input ikut diproses
+        include_patterns: List glob file yang diproses (kosong = semua file yang didukung)
+        exclude_patterns: List glob file/folder yang dilewati
+        journal_path: Path database job journal SQLite, None = tanpa journal
+        resume: Jika True, file yang tercatat di journal dilanjutkan dari tahap terakhirnya
+        response_cache_path: Path database response cache SQLite, None = tanpa cache
+        response_cache: Flag untuk mengaktifkan response cache
+        response_cache_max_mb: Ukuran maksimum response cache sebelum eviksi LRU
+        response_cache_ttl_days: Umur maksimum entri response cache
+        similarity_index_path: Path database similarity index SQLite, None = tanpa reuse metadata
+        similarity_reuse: Flag untuk memakai ulang metadata gambar yang nyaris sama (perceptual hash)
+        similarity_max_distance: Jarak Hamming maksimum dHash 64-bit agar dua gambar dianggap sama
+        similarity_variation: Jika True, judul/deskripsi hasil reuse divariasikan lewat request teks saja
+        cost_model_path: Path file JSON tempat estimasi biaya per jenis file dipelajari, None = tidak disimpan
+        longest_first: Jika True, file dengan perkiraan biaya terbesar (video/vektor besar) dikirim lebih dulu
+        adaptive_concurrency: Jika True, jumlah request bersamaan per API key dan per model diatur AIMD
+            (mulai dari num_workers, naik saat sehat, turun setengah saat 429/5xx)
+        max_inflight_per_key: Batas atas request bersamaan per API key untuk konkurensi adaptif
+        latency_target_seconds: Batas p95 latensi; di atas ini batas konkurensi tidak dinaikkan
+        exiftool_stay_open: Jika True, worker output memakai proses exiftool -stay_open yang tetap hidup
+        watch: Jika True, folder input terus dipantau dan file baru langsung diproses sampai stop diminta
+            (pool worker, sesi exiftool, cache, dan journal tetap hangat di antara file)
+        watch_settle_seconds: Mode watch: lama ukuran/mtime file harus stabil sebelum diproses
+        watch_poll_interval: Mode watch: interval pemindaian ulang jika watchdog tidak terpasang
+        work_queue_path: Path SQLite antrean kerja di volume bersama; jika diisi, beberapa proses/host
+            berbagi folder input yang sama dan setiap file diproses tepat satu node (kosong = nonaktif)
+        work_queue_node_id: ID node di antrean kerja (kosong = hostname-PID)
+        work_queue_lease_seconds: Masa lease satu file sebelum dianggap ditinggalkan node yang mati
+        http2: Jika True dan httpx[http2] terpasang, request Gemini berbagi koneksi HTTP/2 (multiplexing)
+        rate_limiter: Token bucket RPM/TPM/RPD per (API key, model) sebelum setiap request;
+            None = aktif kecuali mode API key berbayar
+        rate_limits: Override batas per model, misal {"gemini-2.0-flash": {"rpm": 2000, "tpm": 4000000, "rpd": 0}}
+        pack_size: Jumlah gambar JPG/PNG kecil per request generateContent (1 = satu gambar per request)
+        pack_window_seconds: Lama maksimum menunggu paket terisi sebelum dikirim
+        pack_max_image_kb: Gambar hasil persiapan yang lebih besar dari ini tidak dipaketkan
+        structured_output: Jika True, jawaban diminta sebagai JSON (responseMimeType + responseSchema)
+            dan dibaca dengan satu decode JSON; False = format teks lama yang dibaca dengan regex
+        context_cache: Jika True, teks prompt dikirim sekali sebagai cachedContent per (API key, model,
+            varian prompt) dan setiap request hanya mereferensikannya; jika gagal, prompt dikirim inline
+        context_cache_ttl_seconds: Umur cachedContent sebelum dibuat ulang
+        hedge_requests: Jika True, request yang belum dijawab setelah p95 latensi modelnya
+            diduplikasi lewat API key lain; jawaban pertama dipakai, yang kalah dibatalkan
+        hedge_budget: Fraksi maksimum request cadangan terhadap request utama (0.05 = 5%)
+        model_router: Jika True, Auto Rotasi memilih model dari statistik bergulir (latensi, 429,
+            ekstraksi berhasil, token) dan kuota key; False = model yang paling lama tidak dipakai
+        model_exploration: Fraksi pilihan Auto Rotasi yang dipakai untuk mencoba model yang paling
+            lama tidak dicoba
+        circuit_breaker: Jika True, setelah circuit_breaker_threshold error transport beruntun
+            (timeout/gagal koneksi) pengiriman ke API dijeda untuk semua worker sampai satu
+            request uji berhasil; file yang sedang berjalan menunggu, tidak ditandai gagal
+        circuit_breaker_threshold: Jumlah error transport beruntun sebelum sirkuit terbuka
+        circuit_breaker_probe_seconds: Jeda awal sebelum request uji (digandakan sampai 30 detik)
+        bulk_mode: Jika True, file dikirim sebagai batch job Gemini Batch API (file request JSONL,
+            tanpa latensi interaktif) dan hasilnya ditulis setelah batch selesai; lihat bulk_mode.py
+        bulk_job_id: Mode bulk: ID bulk job atau nama batch yang dilanjutkan (kosong = otomatis)
+        bulk_poll_seconds: Mode bulk: interval pengecekan status batch
+        batch_base_url: Mode bulk: base URL Batch API (kosong = endpoint Gemini, misal server tiruan lokal)
+        result_callback: Callback(input_path, result) yang dipanggil setiap satu file selesai
         
     Returns:
         Dictionary dengan statistik hasil pemrosesan
@@ -469,6 +1239,15 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
     from src.api.gemini_api import reset_force_stop
     reset_force_stop()
     
+    work_queue = None
+    journal = cache = similarity_index = None
+    cost_estimator = None
+    prompt_cache = None
+    hedge_policy = None
+    router = None
+    breaker = None
+    stages = []
+    heartbeat_stop = threading.Event()
     try:
         # Check for stop request immediately at start
         if stop_event and stop_event.is_set() or is_stop_requested():
@@ -480,17 +1259,45 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
                 "stopped_count": 0,
                 "total_files": 0
             }
+
+        if bulk_mode:
+            from src.processing.bulk_mode import bulk_process_files
+            # Opsi engine diteruskan sebagai satu dictionary; kunci yang tidak diisi di sini
+            # memakai nilai ENGINE_OPTION_DEFAULTS di bulk_process_files
+            options = {
+                "prep_workers": prep_workers, "output_workers": output_workers, "prep_processes": prep_processes,
+                "recursive": recursive, "include_patterns": include_patterns or [], "exclude_patterns": exclude_patterns or [],
+                "resume": resume, "response_cache": response_cache, "response_cache_max_mb": response_cache_max_mb,
+                "response_cache_ttl_days": response_cache_ttl_days, "similarity_reuse": similarity_reuse,
+                "similarity_max_distance": similarity_max_distance, "similarity_variation": similarity_variation,
+                "longest_first": longest_first, "adaptive_concurrency": adaptive_concurrency,
+                "max_inflight_per_key": max_inflight_per_key, "latency_target_seconds": latency_target_seconds,
+                "exiftool_stay_open": exiftool_stay_open, "watch": watch, "watch_settle_seconds": watch_settle_seconds,
+                "watch_poll_interval": watch_poll_interval, "work_queue_path": work_queue_path,
+                "work_queue_node_id": work_queue_node_id, "work_queue_lease_seconds": work_queue_lease_seconds,
+                "http2": http2, "rate_limiter": rate_limiter, "rate_limits": rate_limits or {}, "pack_size": pack_size,
+                "pack_window_seconds": pack_window_seconds, "pack_max_image_kb": pack_max_image_kb,
+                "structured_output": structured_output, "context_cache": context_cache,
+                "context_cache_ttl_seconds": context_cache_ttl_seconds, "hedge_requests": hedge_requests,
+                "hedge_budget": hedge_budget, "model_router": model_router, "model_exploration": model_exploration,
+                "circuit_breaker": circuit_breaker, "circuit_breaker_threshold": circuit_breaker_threshold,
+                "circuit_breaker_probe_seconds": circuit_breaker_probe_seconds, "bulk_mode": bulk_mode,
+                "bulk_job_id": bulk_job_id, "bulk_poll_seconds": bulk_poll_seconds, "batch_base_url": batch_base_url,
+            }
+            ignored = bulk_ignored_options(options)
+            if ignored:
+                log_message(f"Warning: Mode bulk mengabaikan opsi {', '.join(ignored)} (tidak berlaku untuk Batch API)", "warning")
+            return bulk_process_files(
+                input_dir, output_dir, api_keys, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled,
+                progress_callback=progress_callback, stop_event=stop_event, selected_model=selected_model, keyword_count=keyword_count,
+                priority=priority, journal_path=journal_path, options=options, result_callback=result_callback
+            )
             
         # Siapkan folder sementara untuk kompresi
         temp_folders = manage_temp_folders(input_dir, output_dir)
         
-        # Cari file yang bisa diproses
-        processable_extensions = ALL_SUPPORTED_EXTENSIONS
-        
-        try:
-            dir_list = os.listdir(input_dir)
-        except Exception as e:
-            log_message(f"Error membaca direktori input: {e}", "error")
+        if not os.path.isdir(input_dir):
+            log_message(f"Error membaca direktori input: {input_dir}", "error")
             return {
                 "processed_count": 0,
                 "failed_count": 0,
@@ -498,56 +1305,6 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
                 "stopped_count": 0
             }
         
-        files_to_process = []
-        for filename in dir_list:
-            # Check for stop in the file enumeration loop
-            if stop_event and stop_event.is_set() or is_stop_requested():
-                log_message("Proses dihentikan saat mengenumerasi file.", "warning")
-                return {
-                    "processed_count": 0,
-                    "failed_count": 0,
-                    "skipped_count": 0,
-                    "stopped_count": 0,
-                    "total_files": 0
-                }
-                
-            if filename.lower().endswith(processable_extensions) and not filename.startswith('.'):
-                full_path = os.path.join(input_dir, filename)
-                if os.path.isfile(full_path):
-                    files_to_process.append(full_path)
-        
-        files_to_process = [f for f in files_to_process if os.path.exists(f)]
-        total_files = len(files_to_process)
-        
-        if total_files == 0:
-            log_message("Tidak ada file baru/valid yang dapat diproses di folder input.", "warning")
-            return {
-                "status": "no_files", # Tambahkan status ini
-                "processed_count": 0,
-                "failed_count": 0,
-                "skipped_count": 0,
-                "stopped_count": 0,
-                "total_files": 0 # Sertakan total_files juga
-            }
-        
-        log_message(f"Ditemukan {total_files} file untuk diproses", "success")
-        
-        if progress_callback:
-            progress_callback(0, total_files)
-        
-        if stop_event and stop_event.is_set() or is_stop_requested():
-            log_message("Proses dihentikan sebelum mulai (deteksi awal)", "warning")
-            return {
-                "processed_count": 0,
-                "failed_count": 0,
-                "skipped_count": 0,
-                "stopped_count": total_files
-            }
-        
-        processed_count = 0
-        failed_count = 0
-        skipped_count = 0
-        stopped_count = 0
         completed_count = 0
         
         # Siapkan folder CSV di output utama jika auto_foldering dinonaktifkan
@@ -567,223 +1324,466 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
             effective_num_workers = len(api_keys)
             log_message(f"Menyesuaikan jumlah worker menjadi {effective_num_workers} agar sesuai dengan jumlah API key yang tersedia.", "warning")
         
-        futures = []
-        processed_files = set()
-        # Track current API key index for assignment
-        current_api_key_index = 0
-        
-        with ThreadPoolExecutor(max_workers=effective_num_workers) as executor:
-            log_message(f"Mengirim {total_files} pekerjaan ke {effective_num_workers} worker...", "warning")
-            
-            batch_index = 0
-            while batch_index < len(files_to_process) and not (stop_event and stop_event.is_set() or is_stop_requested()):
-                # Minimal delay between batches
-                if batch_index > 0 and delay_seconds > 0 and not (stop_event and stop_event.is_set() or is_stop_requested()):
-                    # Restore cooldown message
-                    cooldown_msg = f"Cool-down {delay_seconds} detik dulu ngabbbb..."
-                    log_message(cooldown_msg, "cooldown")
-                    
-                    # Apply user-defined delay between batches with stop check
-                    cooldown_start = time.time()
-                    while time.time() - cooldown_start < delay_seconds:
-                        if stop_event and stop_event.is_set() or is_stop_requested():
-                            log_message("Proses dihentikan selama cooldown.", "warning")
-                            break
-                        time.sleep(0.1)  # Check for stop every 100ms
-                
-                # Check for stop again after cooldown
-                if stop_event and stop_event.is_set() or is_stop_requested():
-                    log_message("Proses dihentikan setelah cooldown.", "warning")
+        # Pacing per API key (menggantikan cooldown global antar batch)
+        key_interval = compute_key_interval(delay_seconds, effective_num_workers, len(api_keys))
+        key_pacer = KeyPacer(api_keys, key_interval)
+        failure_throttle = FailureThrottle()
+        stats = {
+            "processed_count": 0,
+            "failed_count": 0,
+            "skipped_count": 0,
+            "stopped_count": 0,
+        }
+
+        def stop_requested():
+            return bool(stop_event and stop_event.is_set()) or is_stop_requested()
+
+        if work_queue_path:
+            work_queue = open_work_queue(work_queue_path, work_queue_node_id or None, work_queue_lease_seconds)
+            if work_queue is None:
+                # Tanpa antrean, node ini akan memproses ulang file milik node lain
+                return {
+                    "processed_count": 0,
+                    "failed_count": 0,
+                    "skipped_count": 0,
+                    "stopped_count": 0,
+                    "error": f"Antrean kerja tidak bisa dibuka: {work_queue_path}"
+                }
+            log_message(f"Antrean kerja aktif: node {work_queue.node_id}, lease {work_queue.lease_seconds:g} detik", "warning")
+
+            def heartbeat_loop():
+                while not heartbeat_stop.wait(work_queue.lease_seconds / HEARTBEAT_FRACTION):
+                    work_queue.heartbeat()
+
+            threading.Thread(target=heartbeat_loop, name="work-queue-heartbeat", daemon=True).start()
+
+        journal = open_job_journal(journal_path)
+        cache = open_response_cache(response_cache_path, response_cache_max_mb, response_cache_ttl_days) if response_cache else None
+        set_response_cache(cache)
+        set_structured_output(structured_output)
+        prompt_cache = ContextCache(context_cache_ttl_seconds) if context_cache and api_keys else None
+        set_context_cache(prompt_cache)
+        similarity_index = open_similarity_index(similarity_index_path, similarity_max_distance) if similarity_reuse else None
+        ctx = _build_job_context(
+            output_dir, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled, selected_model, keyword_count, priority, stop_event,
+            journal=journal, resume=resume, similarity_index=similarity_index, similarity_variation=similarity_variation,
+            work_queue=work_queue, input_dir=input_dir
+        )
+
+        # Konkurensi adaptif: mulai dari jumlah worker pengguna, lalu diatur oleh AIMD per key/model
+        concurrency = None
+        num_api_workers = effective_num_workers
+        if adaptive_concurrency and api_keys:
+            initial_per_key = max(1, math.ceil(effective_num_workers / len(api_keys)))
+            max_per_key = max(initial_per_key, int(max_inflight_per_key))
+            concurrency = ConcurrencyController(api_keys, GEMINI_MODELS, initial_per_key, max_per_key, latency_target_seconds)
+            num_api_workers = max(effective_num_workers, min(max_per_key * len(api_keys), ADAPTIVE_MAX_API_WORKERS))
+        if pack_size > 1:
+            # Setiap gambar dalam paket menahan satu worker API selama menunggu hasil paket
+            num_api_workers = max(num_api_workers, min(effective_num_workers * int(pack_size), ADAPTIVE_MAX_API_WORKERS))
+        set_concurrency_controller(concurrency)
+
+        # Kuota per (key, model): key yang belum punya kapasitas dilewati scheduler dan request
+        # menunggu token alih-alih menerima 429. Tanpa tabel batas (mode berbayar) limiter tetap
+        # dipakai untuk karantina 429 dari server.
+        limiter = None
+        limiter_models = [selected_model] if selected_model in GEMINI_MODELS else GEMINI_MODELS
+        if rate_limiter is None:
+            rate_limiter = not bypass_api_key_limit or bool(rate_limits)
+        if api_keys:
+            model_limits = resolve_model_limits(rate_limits, GEMINI_MODELS) if rate_limiter else {}
+            limiter = RateLimiter(api_keys, model_limits, limiter_models)
+            if rate_limiter:
+                log_message("Rate limiter aktif: kuota RPM/TPM/RPD per API key dan model", "warning")
+        set_rate_limiter(limiter)
+
+        # Kesehatan per key: scheduler mengutamakan key yang sehat dan melewati key yang dikeluarkan
+        key_health = KeyHealthRegistry(api_keys)
+        set_key_health_registry(key_health)
+
+        def no_usable_keys():
+            return key_health.all_evicted() or (limiter is not None and limiter.all_keys_dropped())
+
+        # Pool koneksi keep-alive seukuran jumlah request bersamaan; koneksi pertama dibuka
+        # di latar belakang selagi file pertama disiapkan
+        configure_http_pool(num_api_workers, http2=http2)
+        threading.Thread(target=warm_up_request_pool, args=(num_api_workers,), name="http-warmup", daemon=True).start()
+
+        def claim_key(key, models=None):
+            if key_health.is_evicted(key):
+                return False
+            if limiter is not None and not limiter.has_capacity(key, models or limiter_models):
+                return False
+            return concurrency is None or concurrency.try_acquire_key(key)
+
+        def headroom_weight(key):
+            weight = key_health.weight(key)
+            if limiter is not None:
+                weight *= 0.1 + limiter.headroom(key, limiter_models)
+            return weight
+
+        def acquire_paced_key(job):
+            # Ambil API key yang sudah melewati jarak minimumnya (dan masih punya slot konkurensi)
+            with _waiting(job):
+                return wait_for_paced_key(job)
+
+        def wait_for_paced_key(job):
+            while True:
+                if failure_throttle.is_throttled():
+                    key_pacer.set_interval(max(key_interval, failure_throttle.cooldown_seconds))
+                elif key_pacer.interval != key_interval:
+                    key_pacer.set_interval(key_interval)
+                assigned_api_key, wait_for_key = key_pacer.try_acquire(claim_key, headroom_weight)
+                if assigned_api_key is not None:
                     break
-                
-                # Ambil batch file berikutnya
-                current_batch_paths = files_to_process[batch_index:batch_index + effective_num_workers]
-                current_batch = [f for f in current_batch_paths
-                                 if os.path.exists(f) and f not in processed_files]
-                
-                if not current_batch:
-                    batch_index += effective_num_workers
-                    continue
-                
-                batch_futures = []
-                for idx, input_path in enumerate(current_batch):
-                    if stop_event and stop_event.is_set() or is_stop_requested():
+                if no_usable_keys():
+                    # Semua key dikeluarkan atau kehabisan kuota harian: file gagal cepat, tidak menunggu berjam-jam
+                    _discard_job(job)
+                    job["result"] = _build_result(job["input"], "failed_api")
+                    log_message(f"  Tidak ada API key yang masih bisa dipakai untuk {os.path.basename(job['input'])}", "error")
+                    return None
+                if wait_with_stop(min(wait_for_key, 1.0), stop_event, is_stop_requested):
+                    _discard_job(job)
+                    job["result"] = {"status": "stopped", "input": job["input"]}
+                    return None
+            if concurrency is not None:
+                job.setdefault("held_keys", []).append(assigned_api_key)
+            return assigned_api_key
+
+        def reroute_key(job, failed_key, tried_keys, model=None, wait=False):
+            # Retry file ini di key lain dengan kuota paling lapang untuk model berikutnya.
+            # Tanpa wait, hanya key yang siap sekarang (jika tidak ada, retry tetap di key yang
+            # sama); dengan wait (key ditolak), tunggu selama masih ada key lain yang bisa dipakai
+            def claim_other(key):
+                return key not in tried_keys and claim_key(key, [model] if model else None)
+
+            with _waiting(job):
+                while True:
+                    new_key, wait_for_key = key_pacer.try_acquire(claim_other, headroom_weight, greedy=True)
+                    if new_key is not None:
                         break
-                    
-                    if not os.path.exists(input_path) or input_path in processed_files:
+                    if not wait:
+                        return None
+                    other_keys = [k for k in key_health.usable_keys(api_keys) if k not in tried_keys]
+                    if limiter is not None:
+                        other_keys = [k for k in other_keys if not limiter.is_key_dropped(k)]
+                    if not other_keys or wait_with_stop(min(wait_for_key, 1.0), stop_event, is_stop_requested):
+                        return None
+            if concurrency is not None:
+                held_keys = job.setdefault("held_keys", [])
+                held_keys.append(new_key)
+                if failed_key in held_keys:
+                    held_keys.remove(failed_key)
+                    concurrency.release_key(failed_key)
+            return new_key
+
+        ctx["reroute_key"] = reroute_key
+
+        def select_hedge_key(primary_key, model, tokens):
+            # Key cadangan: key sehat lain dengan kuota paling lapang untuk model ini; kuotanya
+            # langsung dipotong karena request cadangan tidak lewat scheduler
+            candidates = [k for k in key_health.usable_keys(api_keys) if k != primary_key]
+            if limiter is not None:
+                candidates = [k for k in candidates if not limiter.is_key_dropped(k)]
+                candidates.sort(key=lambda k: key_health.weight(k) * (0.1 + limiter.headroom(k, [model])), reverse=True)
+            else:
+                candidates.sort(key=key_health.weight, reverse=True)
+            for candidate in candidates:
+                if limiter is None or limiter.try_reserve(candidate, model, tokens) == 0.0:
+                    return candidate
+            return None
+
+        if model_router and (selected_model is None or selected_model == "Auto Rotasi"):
+            router = ModelRouter(GEMINI_MODELS, model_exploration)
+            set_model_router(router)
+
+        if hedge_requests and len(api_keys) > 1:
+            hedge_policy = HedgePolicy(select_hedge_key, hedge_budget)
+            set_hedge_policy(hedge_policy)
+            log_message(f"Hedged request aktif: request cadangan setelah p95 latensi, maksimum {hedge_policy.budget:.0%} request tambahan", "warning")
+
+        if circuit_breaker:
+            breaker = CircuitBreaker(circuit_breaker_threshold, circuit_breaker_probe_seconds)
+            set_circuit_breaker(breaker)
+
+        def release_key_slots(job):
+            for held_key in job.pop("held_keys", []):
+                concurrency.release_key(held_key)
+
+        def request_with_paced_key(job):
+            try:
+                return _request_job_with_similarity(job, ctx, acquire_paced_key)
+            finally:
+                release_key_slots(job)
+
+        if pack_size > 1:
+            packer = RequestPacker(
+                lambda jobs: _send_pack(jobs, ctx, acquire_paced_key, release_key_slots),
+                pack_size, pack_window_seconds, pack_max_image_kb, should_stop=stop_requested
+            )
+            ctx["request_packer"] = packer
+            log_message(f"Paket request aktif: hingga {packer.pack_size} gambar per request API", "warning")
+
+        # Ukuran pool per tahap: persiapan dibatasi jumlah CPU, output dibatasi I/O disk
+        num_prep_workers = prep_workers or max(1, min(effective_num_workers, os.cpu_count() or 1))
+        num_output_workers = output_workers or max(1, min(effective_num_workers, 4))
+
+        # Pekerjaan CPU berat dipindah ke proses terpisah agar tidak berebut GIL dengan thread API
+        start_cpu_pool(prep_processes)
+        if exiftool_stay_open:
+            start_exiftool_sessions(num_output_workers)
+
+        cost_estimator = CostEstimator(cost_model_path)
+
+        results_queue = queue.Queue()
+        output_stage = PipelineStage(
+            "output", lambda job: _output_job(job, ctx), num_output_workers, num_output_workers * 2,
+            results_queue, should_stop=stop_requested, on_discard=_discard_job
+        )
+        api_stage = PipelineStage(
+            "api", request_with_paced_key, num_api_workers, num_api_workers * 2,
+            results_queue, next_stage=output_stage, should_stop=stop_requested, on_discard=_discard_job
+        )
+        prep_stage = PipelineStage(
+            "prep", lambda job: _prepare_job(job, ctx), num_prep_workers, num_prep_workers * 2,
+            results_queue, next_stage=api_stage, should_stop=stop_requested, on_discard=_discard_job
+        )
+        stages = [prep_stage, api_stage, output_stage]
+        for stage in reversed(stages):
+            stage.start()
+
+        log_message(f"Pipeline: {num_prep_workers} worker persiapan, {num_api_workers} worker API, {num_output_workers} worker output", "warning")
+        if concurrency is not None:
+            log_message(f"Konkurensi adaptif aktif: batas awal {concurrency.total_key_limit()} request, maksimum {max_per_key} per API key", "warning")
+
+        # Penelusuran folder berjalan di thread sendiri dan langsung mengisi tahap persiapan,
+        # jadi file pertama sudah diproses sebelum enumerasi selesai. File yang sudah ditemukan
+        # tapi belum muat di antrian persiapan menunggu di buffer, dikirim dari biaya terbesar.
+        discovery = {"found": 0, "submitted": 0, "scanned": False, "done": False}
+        pending_jobs = LongestFirstBuffer()
+
+        def attach_journal(job):
+            if journal is not None:
+                job["fingerprint"] = job_fingerprint(job)
+                job["journal_entry"] = journal.get(job["input"], job["fingerprint"])
+                if job["journal_entry"] is None:
+                    journal.record(job["input"], job["fingerprint"], "queued")
+
+        def claim_from_queue():
+            # Mode antrean kerja: ambil satu file hanya saat ada slot, agar node lain kebagian
+            if work_queue is None or stop_requested():
+                return False
+            lease = work_queue.claim_next()
+            if lease is None:
+                return False
+            job = {
+                "input": os.path.join(input_dir, *lease["path"].split("/")),
+                "size": lease["size"],
+                "mtime": lease["mtime"],
+                "lease": lease,
+            }
+            attach_journal(job)
+            pending_jobs.push(job, lease["cost"])
+            discovery["found"] += 1
+            return True
+
+        def dispatch_pending(block):
+            while len(pending_jobs) > 0 or claim_from_queue():
+                job = pending_jobs.peek()
+                if not prep_stage.offer(job, timeout=0.25 if block else 0):
+                    if not block or stop_requested():
+                        return
+                    continue
+                pending_jobs.pop()
+                log_message(f" → Memproses {os.path.basename(job['input'])}...", "info")
+                discovery["submitted"] += 1
+
+        def discover_files():
+            source_kwargs = {
+                "recursive": recursive,
+                "include_patterns": include_patterns,
+                "exclude_patterns": exclude_patterns,
+                "skip_paths": [output_dir],
+                "should_stop": stop_requested,
+            }
+            try:
+                if watch:
+                    source = iter_watched_files(input_dir, settle_seconds=watch_settle_seconds, poll_interval=watch_poll_interval, **source_kwargs)
+                else:
+                    source = iter_input_files(input_dir, **source_kwargs)
+                for job in source:
+                    if job is None:
+                        # Mode watch sedang menunggu file baru: kirim sisa buffer ke pipeline
+                        dispatch_pending(block=False)
                         continue
-                    
-                    original_filename = os.path.basename(input_path)
-                    log_message(f" → Memproses {original_filename}...", "info") 
-                    
-                    try:
-                        # NEW: Assign a specific API key to each worker instead of passing the full list
-                        # This ensures each worker gets a dedicated API key in rotation
-                        assigned_api_key = api_keys[current_api_key_index % len(api_keys)]
-                        current_api_key_index = (current_api_key_index + 1) % len(api_keys)
-                        
-                        future = executor.submit(
-                            process_single_file,
-                            input_path,
-                            output_dir,
-                            [assigned_api_key],  # Pass a list with just one API key
-                            ghostscript_path,
-                            rename_enabled,
-                            auto_kategori_enabled,
-                            auto_foldering_enabled,
-                            selected_model,
-                            keyword_count,
-                            priority,
-                            stop_event  # Pass the stop_event to the worker
-                        )
-                        batch_futures.append(future)
-                        futures.append(future)
-                        processed_files.add(input_path)
-                    except Exception as e:
-                        log_message(f"Error submit job untuk {original_filename}: {e}", "error")
-                        failed_count += 1
-                        completed_count += 1
-                
-                current_batch_size = len(batch_futures)
-                comp_count = completed_count + current_batch_size
-                
-                if batch_futures:
-                    log_message(f"Batch {batch_index//effective_num_workers + 1} ({comp_count}/{total_files}): Menunggu hasil {len(batch_futures)} file...", "warning")
-                    
-                    for future in concurrent.futures.as_completed(batch_futures):
-                        if stop_event and stop_event.is_set() or is_stop_requested():
-                            # Cancel all remaining futures when stop is requested
-                            for remaining_future in batch_futures:
-                                if not remaining_future.done():
-                                    remaining_future.cancel()
-                            log_message("Proses dihentikan saat menunggu hasil batch.", "warning")
-                            break
-                        
-                        try:
-                            result = future.result(timeout=120)
-                            completed_count += 1 # Increment total completed count only after successful result retrieval
-                            
-                            if not result:
-                                log_message(f"⨯ Hasil tidak valid diterima", "error")
-                                failed_count += 1
-                                continue
-                            
-                            status = result.get("status", "failed")
-                            input_path_result = result.get("input", "")
-                            filename = os.path.basename(input_path_result) if input_path_result else "unknown file"
-                            
-                            # Logika penanganan status lainnya (processed, skipped, stopped, other fails)
-                            if status == "processed_exif" or status == "processed_no_exif":
-                                processed_count += 1
-                                new_name = result.get("new_filename")
-                                log_msg = f"✓ {filename}" + (f" → {new_name}" if new_name else "")
-                                log_message(log_msg)
-                            elif status == "processed_exif_failed" or status == "processed_unknown_exif_status": # Handle specific EXIF failure status
-                                processed_count += 1 # Count as processed because CSV/move happened
-                                new_name = result.get("new_filename")
-                                log_msg = f"⚠ {filename}" + (f" → {new_name}" if new_name else "") + " (exif_write_failed, proceeding)"
-                                log_message(log_msg, "warning") # Log as warning
-                            elif status == "skipped_exists":
-                                skipped_count += 1
-                                log_message(f"⋯ {filename} (sudah ada)", "info")
-                            elif status == "stopped":
-                                stopped_count += 1
-                                log_message(f"⊘ {filename} (dihentikan internal)", "warning")
-                            else: 
-                                failed_count += 1
-                                if status == "failed_api":
-                                     log_message(f"✗ {filename} (API Error/Limit)", "error")
-                                elif status == "failed_copy":
-                                     log_message(f"✗ {filename} (gagal copy)", "error")
-                                elif status == "failed_format":
-                                     log_message(f"✗ {filename} (format/file error)", "error")
-                                elif status == "failed_empty":
-                                    log_message(f"✗ {filename} (file kosong)", "error")
-                                elif status == "failed_input_missing":
-                                     log_message(f"✗ {filename} (input hilang)", "error")
-                                else: 
-                                     log_message(f"✗ {filename} ({status})", "error")
-                            
-                        except concurrent.futures.TimeoutError:
-                            completed_count += 1 # Update total count
-                            log_message(f"⨯ Timeout menunggu hasil pekerjaan untuk {filename if 'filename' in locals() else 'unknown file'}", "error")
-                            failed_count += 1
-                        except concurrent.futures.CancelledError:
-                            log_message(f"Pekerjaan dibatalkan.", "warning")
-                            stopped_count += 1
-                        except Exception as e:
-                            log_message(f"Error saat memproses hasil: {e}", "error")
-                            failed_count += 1
-                        
-                        # Update progres
-                        if progress_callback:
-                            progress_callback(completed_count, total_files)
-                
-                if stop_event and stop_event.is_set() or is_stop_requested():
-                    log_message("Stop terdeteksi setelah memproses hasil batch.", "warning")
+                    cost = cost_estimator.estimate(job)
+                    if work_queue is not None:
+                        # File didaftarkan ke antrean bersama; node mana pun yang punya slot mengklaimnya
+                        work_queue.enqueue(queue_key(job["input"], input_dir), job_fingerprint(job), job.get("size"), job.get("mtime"), cost if longest_first else 0.0)
+                    else:
+                        attach_journal(job)
+                        pending_jobs.push(job, cost if longest_first else 0.0)
+                        discovery["found"] += 1
+                    dispatch_pending(block=False)
+            except Exception as e:
+                log_message(f"Error membaca direktori input: {e}", "error")
+            try:
+                discovery["scanned"] = True
+                dispatch_pending(block=True)
+                # Tunggu pekerjaan yang dipegang node lain: jika node itu mati, lease-nya
+                # kedaluwarsa dan diklaim di sini
+                while work_queue is not None and not stop_requested() and work_queue.outstanding():
+                    time.sleep(QUEUE_POLL_INTERVAL)
+                    dispatch_pending(block=True)
+            finally:
+                discovery["done"] = True
+                prep_stage.close()
+
+        discovery_thread = threading.Thread(target=discover_files, name="discovery", daemon=True)
+        discovery_thread.start()
+
+        def current_total():
+            return discovery["found"]
+
+        def handle_result(job):
+            nonlocal completed_count
+            completed_count += 1
+            result = job.get("result")
+            _tally_result(result, job.get("input"), stats)
+            if result_callback:
+                result_callback(job.get("input"), result)
+            if result is not None and result.get("status") in SUCCESS_STATUSES and not job.get("api_skipped") and not job.get("packed"):
+                cost_estimator.record(job, _work_seconds(job))
+            lease = job.get("lease")
+            if work_queue is not None and lease is not None:
+                status = result.get("status") if result is not None else "failed"
+                if status == "stopped":
+                    work_queue.release(lease)
+                elif status != "skipped_lease_lost" and not job.get("queue_completed"):
+                    output_path = result.get("output") if result is not None else None
+                    if not work_queue.complete(lease, status in SUCCESS_STATUSES + SKIPPED_STATUSES, status, output_path):
+                        log_message(f"Warning: Lease {lease['path']} hilang sebelum selesai dicatat di antrean kerja.", "warning")
+            # Mode watch bisa berjalan berhari-hari: simpan model biaya secara berkala
+            if watch and completed_count % WATCH_CHECKPOINT_EVERY == 0:
+                cost_estimator.save()
+            if journal is not None and result is not None and job.get("fingerprint"):
+                if result.get("status") not in SUCCESS_STATUSES + SKIPPED_STATUSES:
+                    journal.record_status(job["input"], job["fingerprint"], result.get("status"))
+            if result is not None:
+                failed = result.get("status", "failed") not in SUCCESS_STATUSES + SKIPPED_STATUSES + ("stopped",)
+                if failure_throttle.record(failed):
+                    log_message(f"Cool-down {failure_throttle.cooldown_seconds} detik dulu ngabbbb...", "cooldown")
+            if progress_callback:
+                progress_callback(completed_count, current_total())
+
+        total_announced = False
+        while not stop_requested():
+            if (discovery["scanned"] or discovery["done"]) and not total_announced:
+                total_announced = True
+                if discovery["found"] > 0 and work_queue is None:
+                    log_message(f"Ditemukan {discovery['found']} file untuk diproses", "success")
+                    if progress_callback:
+                        progress_callback(completed_count, current_total())
+            if discovery["done"] and completed_count >= discovery["submitted"]:
+                break
+
+            # Kumpulkan hasil yang sudah selesai dari tahap mana pun
+            try:
+                handle_result(results_queue.get(timeout=0.25))
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    handle_result(results_queue.get_nowait())
+                except queue.Empty:
                     break
-                
-                batch_index += effective_num_workers
-            
-            # Batalkan pekerjaan yang tersisa jika dihentikan
-            if stop_event and stop_event.is_set() or is_stop_requested():
-                log_message("Membatalkan pekerjaan yang tersisa...", "warning")
-                # Set global force stop to ensure all subprocesses stop
-                from src.api.gemini_api import set_force_stop
-                set_force_stop()
-                
-                # Try to cancel all futures that aren't done yet
-                remaining_submitted = 0
-                for f in futures:
-                    if not f.done():
-                        f.cancel()
-                        remaining_submitted += 1
-                        
-                # Count all remaining jobs as stopped
-                if remaining_submitted > 0:
-                    log_message(f"Membatalkan {remaining_submitted} pekerjaan yang sedang berjalan.", "warning")
-                    stopped_count += remaining_submitted
-                    completed_count += remaining_submitted 
-        
+
+        # Hentikan pipeline dan kumpulkan sisa pekerjaan jika dihentikan
+        if stop_requested():
+            log_message("Membatalkan pekerjaan yang tersisa...", "warning")
+            # Set global force stop to ensure all subprocesses stop
+            from src.api.gemini_api import set_force_stop
+            set_force_stop()
+            prep_stage.close()
+            discovery_thread.join(timeout=5)
+
+            deadline = time.monotonic() + STOP_DRAIN_TIMEOUT
+            while completed_count < discovery["submitted"] and time.monotonic() < deadline:
+                try:
+                    handle_result(results_queue.get(timeout=0.25))
+                except queue.Empty:
+                    continue
+
+            remaining_submitted = discovery["submitted"] - completed_count
+            if remaining_submitted > 0:
+                log_message(f"Membatalkan {remaining_submitted} pekerjaan yang sedang berjalan.", "warning")
+                stats["stopped_count"] += remaining_submitted
+                completed_count += remaining_submitted
+            # File yang sudah ditemukan tapi belum sempat masuk pipeline
+            stats["stopped_count"] += max(0, discovery["found"] - discovery["submitted"])
+        else:
+            for stage in stages:
+                stage.join()
+
+        if work_queue is not None:
+            heartbeat_stop.set()
+            released = work_queue.release_owned()
+            if released:
+                log_message(f"Antrean kerja: {released} file dikembalikan ke antrean untuk node lain", "warning")
+            queue_counts = work_queue.counts()
+        key_health_snapshot = get_key_health_snapshot()
+        model_stats = router.snapshot() if router is not None else None
+        prompt_cache_summary = prompt_cache.summary() if prompt_cache is not None else None
+        total_files = discovery["found"]
+
+        if total_files == 0 and not stop_requested():
+            log_message("Tidak ada file baru/valid yang dapat diproses di folder input.", "warning")
+            return {
+                "status": "no_files", # Tambahkan status ini
+                "processed_count": 0,
+                "failed_count": 0,
+                "skipped_count": 0,
+                "stopped_count": 0,
+                "total_files": 0 # Sertakan total_files juga
+            }
+
         # Bersihkan folder sementara
-        try:
-            for folder_type, folder_path in temp_folders.items():
-                if os.path.exists(folder_path):
-                    cleanup_temp_compression_folder(folder_path)
-            
-            if auto_foldering_enabled:
-                possible_subfolders = [
-                    os.path.join(output_dir, "Images"),
-                    os.path.join(output_dir, "Videos"),
-                    os.path.join(output_dir, "Vectors")
-                ]
-                
-                for subfolder in possible_subfolders:
-                    if os.path.exists(subfolder) and os.path.isdir(subfolder):
-                        temp_subfolder = os.path.join(subfolder, "temp_compressed")
-                        if os.path.exists(temp_subfolder):
-                            log_message(f"Membersihkan folder kompresi di {os.path.basename(subfolder)}", "info")
-                            cleanup_temp_compression_folder(temp_subfolder)
-        except Exception as e:
-            log_message(f"Error saat membersihkan folder temp akhir: {e}", "warning")
+        _cleanup_temp_folders(temp_folders, output_dir, auto_foldering_enabled, ctx["target_dirs"])
         
         # Statistik akhir
-        log_message("", None)
-        log_message("============= Ringkasan Proses =============", "bold")
-        log_message(f"Total file: {total_files}", None)
-        log_message(f"Berhasil diproses: {processed_count}", "success")
-        log_message(f"Gagal: {failed_count}", "error")
-        log_message(f"Dilewati: {skipped_count}", "info")
-        log_message(f"Dihentikan: {stopped_count}", "warning")
-        log_message("=========================================", None)
+        summary_lines = []
+        if concurrency is not None:
+            summary_lines.append(f"Batas konkurensi akhir: {concurrency.total_key_limit()} request")
+        if model_stats:
+            summary_lines.append("Statistik model Auto Rotasi:")
+            summary_lines.extend(format_model_stats(model_name, row) for model_name, row in model_stats.items())
+        if hedge_policy is not None:
+            hedge_summary = hedge_policy.summary()
+            summary_lines.append(f"Hedged request: {hedge_summary['hedged']} request cadangan dari {hedge_summary['requests']} request, {hedge_summary['hedge_wins']} menjawab lebih dulu")
+        breaker_summary = breaker.summary() if breaker is not None else None
+        if breaker_summary and breaker_summary["opened"]:
+            summary_lines.append(f"Sirkuit API terbuka {breaker_summary['opened']} kali, pengiriman dijeda total {breaker_summary['paused_seconds']:.0f} detik")
+        if prompt_cache_summary and prompt_cache_summary["hits"]:
+            summary_lines.append(f"Context cache: {prompt_cache_summary['hits']} request memakai prompt ter-cache ({prompt_cache_summary['created']} cache dibuat, {prompt_cache_summary['fallbacks']} fallback inline)")
+        if key_health_snapshot:
+            summary_lines.append("Kesehatan API key:")
+            summary_lines.extend(format_key_health_snapshot(key_health_snapshot))
+        if work_queue is not None:
+            summary_lines.append(f"Antrean kerja: {queue_counts.get('done', 0)} selesai, {queue_counts.get('failed', 0)} gagal, {queue_counts.get('pending', 0) + queue_counts.get('leased', 0)} tersisa (semua node)")
+        _log_run_summary(total_files, stats, summary_lines)
         
-        return {
-            "processed_count": processed_count,
-            "failed_count": failed_count,
-            "skipped_count": skipped_count,
-            "stopped_count": stopped_count,
-            "total_files": total_files
-        }
+        result = _run_result(total_files, stats)
+        if concurrency is not None:
+            result["concurrency"] = concurrency.snapshot()
+        if key_health_snapshot:
+            result["key_health"] = key_health_snapshot
+        if model_stats:
+            result["model_stats"] = model_stats
+        if breaker_summary and breaker_summary["opened"]:
+            result["circuit_breaker"] = breaker_summary
+        if work_queue is not None:
+            result["work_queue"] = queue_counts
+        return result
     
     except Exception as e:
         log_message(f"Error fatal dalam processing thread: {e}", "error")
@@ -798,3 +1798,37 @@ def batch_process_files(input_dir, output_dir, api_keys, ghostscript_path, renam
             "stopped_count": 0,
             "error": str(e)
         }
+    finally:
+        # Satu jalur pembersihan untuk semua cara keluar: selesai, stop, return awal, error fatal
+        if any(stage.is_alive() for stage in stages):
+            # Error fatal di tengah run: hentikan worker sebelum journal/cache yang dipakainya ditutup
+            from src.api.gemini_api import set_force_stop
+            set_force_stop()
+            deadline = time.monotonic() + ABORT_JOIN_TIMEOUT
+            for stage in stages:
+                stage.close()
+            for stage in stages:
+                stage.join(max(0.0, deadline - time.monotonic()))
+        heartbeat_stop.set()
+        release_stop_event(stop_event)
+        shutdown_cpu_pool(wait=not (stop_event and stop_event.is_set()) and not is_stop_requested())
+        stop_exiftool_sessions()
+        if work_queue is not None:
+            work_queue.release_owned()
+            work_queue.close()
+        set_concurrency_controller(None)
+        set_key_health_registry(None)
+        set_rate_limiter(None)
+        set_context_cache(None)
+        set_hedge_policy(None)
+        set_model_router(None)
+        set_circuit_breaker(None)
+        set_structured_output(True)
+        if prompt_cache is not None:
+            prompt_cache.close()
+        if cost_estimator is not None:
+            cost_estimator.save()
+        set_response_cache(None)
+        for resource in (journal, cache, similarity_index):
+            if resource is not None:
+                resource.close()
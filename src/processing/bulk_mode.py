@@ -0,0 +1,607 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/bulk_mode.py
+import os
+import json
+import time
+import queue
+import threading
+
+from src.utils.logging import log_message
+from src.utils.file_utils import iter_input_files
+from src.utils.compression import manage_temp_folders, remove_temp_files
+from src.utils.cpu_pool import start_cpu_pool, shutdown_cpu_pool
+from src.api.gemini_api import is_stop_requested, select_smart_api_key, set_structured_output, set_force_stop
+from src.api.gemini_api import build_metadata_request, metadata_from_response, GEMINI_MODELS, DEFAULT_MODEL
+from src.api.batch_api import BatchClient, BatchApiError, batch_request_line, iter_batch_results
+from src.api.batch_api import BATCH_STATE_SUCCEEDED, BATCH_TERMINAL_STATES, MAX_BATCH_FILE_BYTES
+from src.api.http_client import GEMINI_BASE_URL
+from src.metadata.exif_writer import start_exiftool_sessions, stop_exiftool_sessions
+from src.processing.pipeline import PipelineStage, QUEUE_POLL_INTERVAL
+from src.processing.job_journal import open_job_journal, job_fingerprint
+from src.processing.work_queue import queue_key
+from src.processing.batch_processing import (
+    ENGINE_OPTION_DEFAULTS, SUCCESS_STATUSES, SKIPPED_STATUSES, STOP_DRAIN_TIMEOUT, ABORT_JOIN_TIMEOUT,
+    _build_job_context, _prepare_job, _output_job, _discard_job, _tally_result, _build_result, _log_run_summary, _run_result,
+    _target_output_dir, _resume_from_journal, _journal_record, _cleanup_temp_folders
+)
+
+BULK_JOBS_DIR_NAME = "bulk_jobs"
+# Upload/pembuatan batch yang gagal karena jaringan/429/5xx dicoba ulang sebelum ditunda ke run berikutnya
+SUBMIT_RETRIES = 3
+SUBMIT_RETRY_SECONDS = 10
+
+class BulkJob:
+    """
+    State satu bulk job di file JSON: model, API key (akhiran saja), dan daftar batch
+    beserta key request (path relatif file input) dan sidik jarinya. Disimpan setelah
+    setiap perubahan, sehingga proses yang dihentikan bisa dilanjutkan dengan ID yang sama.
+    """
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def create(cls, state_dir, input_dir, output_dir, model, api_key):
+        job_id = time.strftime("bulk-%Y%m%d-%H%M%S")
+        path = os.path.join(state_dir, f"{job_id}.json")
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(state_dir, f"{job_id}-{suffix}.json")
+        data = {
+            "id": os.path.splitext(os.path.basename(path))[0],
+            "input_dir": os.path.abspath(input_dir),
+            "output_dir": os.path.abspath(output_dir),
+            "model": model,
+            "api_key_suffix": api_key[-5:],
+            "created": time.time(),
+            "completed": False,
+            "batches": [],
+        }
+        job = cls(path, data)
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log_message(f"Warning: State bulk job '{os.path.basename(path)}' tidak bisa dibaca: {e}", "warning")
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("batches"), list):
+            return None
+        return cls(path, data)
+
+    @property
+    def job_id(self):
+        return self.data["id"]
+
+    @property
+    def batches(self):
+        return self.data["batches"]
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            log_message(f"Warning: Gagal menyimpan state bulk job {self.job_id}: {e}", "warning")
+
+    def in_flight_keys(self):
+        """
+        Returns:
+            Set key yang masih menunggu hasil batch (tidak boleh dikirim ulang).
+        """
+        return {key for batch in self.batches if not batch["processed"] for key in batch["keys"]}
+
+    def request_file_path(self):
+        return os.path.join(os.path.dirname(self.path), f"{self.job_id}-{len(self.batches) + 1}.jsonl")
+
+def find_bulk_job(state_dir, job_id=None, input_dir=None, output_dir=None):
+    """
+    Mencari state bulk job.
+
+    Args:
+        job_id: ID bulk job (nama file state) atau nama batch ("batches/..."); kosong =
+            bulk job terbaru yang belum selesai untuk folder input/output yang sama
+    Returns:
+        BulkJob atau None.
+    """
+    if not os.path.isdir(state_dir):
+        return None
+    if job_id:
+        direct_path = os.path.join(state_dir, f"{job_id}.json")
+        if os.path.exists(direct_path):
+            return BulkJob.load(direct_path)
+    candidates = []
+    for name in os.listdir(state_dir):
+        if not name.endswith(".json"):
+            continue
+        bulk_job = BulkJob.load(os.path.join(state_dir, name))
+        if bulk_job is None:
+            continue
+        if job_id:
+            if any(batch.get("name") == job_id for batch in bulk_job.batches):
+                return bulk_job
+        elif not bulk_job.data.get("completed") \
+                and os.path.normcase(bulk_job.data.get("input_dir", "")) == os.path.normcase(os.path.abspath(input_dir)) \
+                and os.path.normcase(bulk_job.data.get("output_dir", "")) == os.path.normcase(os.path.abspath(output_dir)):
+            candidates.append(bulk_job)
+    if not candidates:
+        return None
+    return max(candidates, key=lambda bulk_job: bulk_job.data.get("created", 0))
+
+def _prepare_bulk_job(job, ctx):
+    """
+    Tahap persiapan mode bulk: persiapan biasa (kompresi/konversi/frame) lalu request
+    generateContent diserialisasi menjadi satu baris JSONL; file sementara langsung dihapus.
+    """
+    job = _prepare_job(job, ctx)
+    if "result" in job or "metadata" in job:
+        return job
+    prepared = job["prepared"]
+    try:
+        request = build_metadata_request(
+            prepared["api_input"],
+            use_png_prompt=prepared.get("use_png_prompt", False),
+            use_video_prompt=prepared.get("use_video_prompt", False),
+            priority=ctx["priority"]
+        )
+        job["bulk_line"] = batch_request_line(job["bulk_key"], request)
+    except OSError as e:
+        log_message(f"Error membaca file hasil persiapan ({job['original_filename']}): {e}", "error")
+        job["result"] = _build_result(job["input"], "failed_format")
+    finally:
+        remove_temp_files(prepared.get("temp_files"), log_removed=False)
+        prepared["temp_files"] = []
+    return job
+
+def _result_job(key, fingerprint, metadata, input_dir, ctx):
+    """
+    Membangun pekerjaan tahap output dari satu hasil batch.
+    """
+    input_path = os.path.join(input_dir, *key.split("/"))
+    original_filename = os.path.basename(input_path)
+    ext_lower = os.path.splitext(input_path)[1].lower()
+    job = {
+        "input": input_path,
+        "original_filename": original_filename,
+        "ext": ext_lower,
+        "fingerprint": fingerprint,
+    }
+    if metadata is None:
+        return job
+    job["target_output_dir"] = _target_output_dir(ext_lower, ctx, input_path)
+    journal = ctx.get("journal")
+    entry = journal.get(input_path, fingerprint) if journal is not None and fingerprint else None
+    # Hasil batch yang sudah ditulis pada run sebelumnya (misal proses dihentikan saat output)
+    if entry and entry["state"] in ("written", "exported") and _resume_from_journal(job, entry):
+        return job
+    if not os.path.exists(input_path):
+        log_message(f"⨯ File input {original_filename} hilang sebelum hasil batch ditulis.", "error")
+        job["result"] = {"status": "failed_input_missing", "input": input_path}
+        return job
+    job["prepared"] = {"initial_output_path": os.path.join(job["target_output_dir"], original_filename), "temp_files": []}
+    job["metadata"] = metadata
+    _journal_record(job, ctx, "api_done", metadata=metadata)
+    return job
+
+def bulk_process_files(input_dir, output_dir, api_keys, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled, progress_callback=None, stop_event=None, selected_model=None, keyword_count="49", priority="Kualitas", journal_path=None, options=None, result_callback=None):
+    """
+    Mode bulk: file disiapkan seperti biasa, request-nya ditulis ke file JSONL dan dikirim
+    sebagai batch job Gemini Batch API (kuota lebih besar, biaya lebih rendah, tanpa
+    latensi interaktif). Setelah batch selesai, hasilnya dialirkan ke tahap output yang
+    sama (EXIF → rename → CSV).
+
+    State bulk job disimpan di folder "bulk_jobs" di samping journal. Jika dihentikan,
+    proses berikutnya dengan bulk_job_id yang sama (atau otomatis, bulk job terbaru yang
+    belum selesai untuk folder yang sama) tidak mengirim ulang file yang masih menunggu
+    hasil batch, melainkan langsung menunggu batch tersebut.
+
+    Args:
+        Sama seperti batch_process_files, kecuali opsi engine:
+        options: Dictionary opsi engine (kunci ENGINE_OPTION_DEFAULTS, yang tidak diisi memakai
+            default). Yang dipakai mode bulk: prep_workers, output_workers, prep_processes,
+            recursive, include_patterns, exclude_patterns, resume, structured_output,
+            exiftool_stay_open, bulk_job_id, bulk_poll_seconds, batch_base_url
+    Returns:
+        Dictionary dengan statistik hasil pemrosesan
+    """
+    options = dict(ENGINE_OPTION_DEFAULTS, **(options or {}))
+    bulk_job_id = options["bulk_job_id"]
+    resume = options["resume"]
+    empty_result = {"processed_count": 0, "failed_count": 0, "skipped_count": 0, "stopped_count": 0, "total_files": 0}
+
+    def stop_requested():
+        return bool(stop_event and stop_event.is_set()) or is_stop_requested()
+
+    if stop_requested():
+        log_message("Proses dihentikan sebelum dimulai.", "warning")
+        return empty_result
+    if not os.path.isdir(input_dir):
+        log_message(f"Error membaca direktori input: {input_dir}", "error")
+        return dict(empty_result, error=f"Folder input tidak valid: {input_dir}")
+    if not api_keys:
+        return dict(empty_result, error="Mode bulk membutuhkan setidaknya satu API key")
+
+    state_dir = os.path.join(os.path.dirname(journal_path) if journal_path else output_dir, BULK_JOBS_DIR_NAME)
+    os.makedirs(state_dir, exist_ok=True)
+
+    bulk_job = None
+    if bulk_job_id or resume:
+        bulk_job = find_bulk_job(state_dir, bulk_job_id or None, input_dir, output_dir)
+        if bulk_job_id and bulk_job is None:
+            log_message(f"Error: Bulk job '{bulk_job_id}' tidak ditemukan di {state_dir}", "error")
+            return dict(empty_result, error=f"Bulk job tidak ditemukan: {bulk_job_id}")
+    if bulk_job is not None:
+        suffix = bulk_job.data.get("api_key_suffix", "")
+        api_key = next((key for key in api_keys if key.endswith(suffix)), None)
+        if api_key is None:
+            # Batch dan file hasilnya hanya bisa dibaca dengan key (project) yang membuatnya
+            log_message(f"Error: API key ...{suffix} yang membuat bulk job {bulk_job.job_id} tidak ada di daftar API key", "error")
+            return dict(empty_result, error=f"API key ...{suffix} untuk bulk job {bulk_job.job_id} tidak tersedia")
+        model = bulk_job.data["model"]
+        input_dir = bulk_job.data.get("input_dir") or input_dir
+        log_message(f"Melanjutkan bulk job {bulk_job.job_id}: {len(bulk_job.in_flight_keys())} file masih menunggu hasil batch", "warning")
+    else:
+        api_key = select_smart_api_key(api_keys) or api_keys[0]
+        model = selected_model if selected_model in GEMINI_MODELS else DEFAULT_MODEL
+        if selected_model not in GEMINI_MODELS:
+            log_message(f"Auto Rotasi tidak berlaku untuk mode bulk (satu batch = satu model), memakai {model}", "warning")
+        bulk_job = BulkJob.create(state_dir, input_dir, output_dir, model, api_key)
+        log_message(f"Bulk job {bulk_job.job_id} dibuat (model {model}, API key ...{api_key[-5:]})", "warning")
+
+    client = BatchClient(api_key, options["batch_base_url"] or GEMINI_BASE_URL)
+    set_structured_output(options["structured_output"])
+    journal = None
+    stages = []
+    request_file = None
+    request_path = None
+    try:
+        temp_folders = manage_temp_folders(input_dir, output_dir)
+        journal = open_job_journal(journal_path)
+        ctx = _build_job_context(
+            output_dir, ghostscript_path, rename_enabled, auto_kategori_enabled, auto_foldering_enabled, model, keyword_count, priority, stop_event,
+            journal=journal, resume=resume, input_dir=input_dir
+        )
+
+        num_prep_workers = options["prep_workers"] or max(1, min(4, os.cpu_count() or 1))
+        num_output_workers = options["output_workers"] or 4
+        start_cpu_pool(options["prep_processes"])
+        if options["exiftool_stay_open"]:
+            start_exiftool_sessions(num_output_workers)
+
+        stats = {"processed_count": 0, "failed_count": 0, "skipped_count": 0, "stopped_count": 0}
+        counts = {"found": 0, "prepared": 0, "completed": 0, "submitted_files": 0, "batches_submitted": 0}
+        in_flight_at_start = len(bulk_job.in_flight_keys())
+        skip_keys = bulk_job.in_flight_keys()
+        prepared_queue = queue.Queue()
+        results_queue = queue.Queue()
+        output_stage = PipelineStage(
+            "output", lambda job: _output_job(job, ctx), num_output_workers, num_output_workers * 2,
+            results_queue, should_stop=stop_requested, on_discard=_discard_job
+        )
+        prep_stage = PipelineStage(
+            "prep", lambda job: _prepare_bulk_job(job, ctx), num_prep_workers, num_prep_workers * 2,
+            prepared_queue, should_stop=stop_requested, on_discard=_discard_job
+        )
+        stages = [prep_stage, output_stage]
+        for stage in reversed(stages):
+            stage.start()
+
+        def expected_total():
+            return counts["found"] + in_flight_at_start
+
+        def handle_result(job):
+            counts["completed"] += 1
+            result = job.get("result")
+            _tally_result(result, job.get("input"), stats)
+            if result_callback:
+                result_callback(job.get("input"), result)
+            if journal is not None and result is not None and job.get("fingerprint"):
+                if result.get("status") not in SUCCESS_STATUSES + SKIPPED_STATUSES:
+                    journal.record_status(job["input"], job["fingerprint"], result.get("status"))
+            if progress_callback:
+                progress_callback(counts["completed"], expected_total())
+
+        def drain_results(timeout=0.0):
+            try:
+                job = results_queue.get(timeout=timeout) if timeout else results_queue.get_nowait()
+            except queue.Empty:
+                return
+            handle_result(job)
+            while True:
+                try:
+                    handle_result(results_queue.get_nowait())
+                except queue.Empty:
+                    return
+
+        def send_to_output(job):
+            if "result" in job:
+                handle_result(job)
+                return
+            while not output_stage.offer(job, timeout=QUEUE_POLL_INTERVAL):
+                drain_results()
+                if stop_requested():
+                    _discard_job(job)
+                    job["result"] = {"status": "stopped", "input": job["input"]}
+                    handle_result(job)
+                    return
+
+        def wait_draining(seconds):
+            # Menunggu sambil menampung hasil tahap output; True jika stop diminta
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                if stop_requested():
+                    return True
+                drain_results(timeout=min(QUEUE_POLL_INTERVAL, max(0.01, deadline - time.monotonic())))
+            return stop_requested()
+
+        # File request yang gagal dikirim pada run ini tidak ditunggu lagi sampai run berikutnya
+        deferred = set()
+
+        def submit_request_file(path, keys, batch=None):
+            # Upload + batchGenerateContent; jika tetap gagal, file request disimpan untuk run berikutnya
+            batch = batch or {"name": None, "request_file": path, "keys": keys, "state": None, "processed": False}
+            display_name = f"rj-auto-metadata-{bulk_job.job_id}-{len(bulk_job.batches) + 1}"
+            for attempt in range(1, SUBMIT_RETRIES + 1):
+                try:
+                    file_name = client.upload_jsonl(path, display_name)
+                    batch["name"] = client.create_batch(model, file_name, display_name)
+                    break
+                except Exception as e:
+                    permanent = isinstance(e, BatchApiError) and e.http_status is not None and 400 <= e.http_status < 500 and e.http_status != 429
+                    log_message(f"Warning: Batch {display_name} gagal dikirim (upaya {attempt}/{SUBMIT_RETRIES}): {e}", "warning")
+                    if permanent or attempt == SUBMIT_RETRIES or wait_draining(SUBMIT_RETRY_SECONDS):
+                        break
+            if batch not in bulk_job.batches:
+                bulk_job.batches.append(batch)
+            if batch["name"]:
+                deferred.discard(path)
+                batch["request_file"] = None
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                counts["batches_submitted"] += 1
+                log_message(f"Batch {batch['name']} dikirim: {len(keys)} file (bulk job {bulk_job.job_id})", "success")
+            else:
+                deferred.add(path)
+                log_message(f"Batch {display_name} belum terkirim; file request disimpan dan dikirim ulang saat bulk job {bulk_job.job_id} dilanjutkan", "warning")
+            bulk_job.save()
+            return batch
+
+        def discover_files():
+            try:
+                for job in iter_input_files(input_dir, recursive=options["recursive"], include_patterns=options["include_patterns"], exclude_patterns=options["exclude_patterns"], skip_paths=[output_dir, state_dir], should_stop=stop_requested):
+                    key = queue_key(job["input"], input_dir)
+                    if key in skip_keys:
+                        continue
+                    job["bulk_key"] = key
+                    job["fingerprint"] = job_fingerprint(job)
+                    if journal is not None:
+                        job["journal_entry"] = journal.get(job["input"], job["fingerprint"])
+                        if job["journal_entry"] is None:
+                            journal.record(job["input"], job["fingerprint"], "queued")
+                    while not prep_stage.offer(job, timeout=QUEUE_POLL_INTERVAL):
+                        if stop_requested():
+                            return
+                    counts["found"] += 1
+            except Exception as e:
+                log_message(f"Error membaca direktori input: {e}", "error")
+            finally:
+                discovery_done.set()
+                prep_stage.close()
+
+        # Tahap 1: persiapan → file request JSONL → batch job (satu batch per ~1.9 GB request)
+        discovery_done = threading.Event()
+        threading.Thread(target=discover_files, name="discovery", daemon=True).start()
+        request_keys = {}
+        total_announced = False
+        while not stop_requested():
+            if discovery_done.is_set() and not total_announced:
+                total_announced = True
+                if counts["found"]:
+                    log_message(f"Ditemukan {counts['found']} file untuk dikirim lewat Batch API", "success")
+            if discovery_done.is_set() and counts["prepared"] >= counts["found"]:
+                break
+            try:
+                job = prepared_queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                drain_results()
+                continue
+            counts["prepared"] += 1
+            if "bulk_line" not in job:
+                send_to_output(job)
+                continue
+            if request_file is None:
+                request_path = bulk_job.request_file_path()
+                request_file = open(request_path, "w", encoding="utf-8")
+                request_keys = {}
+            request_file.write(job.pop("bulk_line"))
+            request_keys[job["bulk_key"]] = job["fingerprint"]
+            counts["submitted_files"] += 1
+            if request_file.tell() >= MAX_BATCH_FILE_BYTES:
+                request_file.close()
+                request_file = None
+                submit_request_file(request_path, request_keys)
+        if request_file is not None:
+            request_file.close()
+            request_file = None
+            if not stop_requested():
+                submit_request_file(request_path, request_keys)
+
+        last_states = {}
+
+        def collect_batch(batch):
+            """
+            Returns:
+                List key tanpa hasil jika batch sudah berakhir dan hasilnya sudah dialirkan,
+                atau None jika batch belum selesai (dicek lagi nanti).
+            """
+            if not batch["name"]:
+                if batch.get("request_file") and os.path.exists(batch["request_file"]):
+                    submit_request_file(batch["request_file"], batch["keys"], batch)
+                    return None
+                # File request hilang: file-filenya disiapkan dan dikirim ulang pada run berikutnya
+                log_message(f"Warning: File request {batch.get('request_file')} tidak ditemukan, {len(batch['keys'])} file dikirim ulang nanti", "warning")
+                return list(batch["keys"])
+            try:
+                info = client.get_batch(batch["name"])
+            except Exception as e:
+                log_message(f"Warning: Status {batch['name']} tidak bisa dibaca: {e}", "warning")
+                return None
+            state = info["state"]
+            if last_states.get(batch["name"]) != state:
+                last_states[batch["name"]] = state
+                log_message(f"Batch {batch['name']}: {state.replace('BATCH_STATE_', '').lower()} ({len(batch['keys'])} file)", "info")
+                if batch.get("state") != state:
+                    batch["state"] = state
+                    bulk_job.save()
+            if state not in BATCH_TERMINAL_STATES:
+                return None
+            if state != BATCH_STATE_SUCCEEDED or not info["responses_file"]:
+                log_message(f"Batch {batch['name']} berakhir dengan state {state}: {info.get('error') or 'tanpa hasil'}", "error")
+                return list(batch["keys"])
+
+            results_path = os.path.join(state_dir, f"{bulk_job.job_id}-{batch['name'].split('/')[-1]}-results.jsonl")
+            try:
+                client.download_file(info["responses_file"], results_path)
+            except Exception as e:
+                log_message(f"Warning: Hasil {batch['name']} gagal diunduh: {e}", "warning")
+                return None
+            seen = set()
+            for key, response, error in iter_batch_results(results_path):
+                if key not in batch["keys"] or key in seen:
+                    continue
+                if stop_requested():
+                    # Hasil yang belum ditulis diambil lagi dari batch saat bulk job dilanjutkan
+                    return None
+                seen.add(key)
+                metadata = metadata_from_response(response, keyword_count) if response is not None else {"error": error}
+                if "error" in metadata:
+                    job = _result_job(key, batch["keys"][key], None, input_dir, ctx)
+                    log_message(f"  Batch {batch['name']}: {job['original_filename']} gagal: {metadata['error']}", "warning")
+                    job["result"] = _build_result(job["input"], "failed_api")
+                else:
+                    job = _result_job(key, batch["keys"][key], metadata, input_dir, ctx)
+                send_to_output(job)
+            try:
+                os.remove(results_path)
+            except OSError:
+                pass
+            return [key for key in batch["keys"] if key not in seen]
+
+        # Tahap 2: tunggu batch selesai, lalu alirkan hasilnya ke tahap output
+        while not stop_requested():
+            pending = [batch for batch in bulk_job.batches if not batch["processed"] and batch.get("request_file") not in deferred]
+            if not pending:
+                break
+            for batch in pending:
+                if stop_requested():
+                    break
+                missing = collect_batch(batch)
+                if missing is None:
+                    continue
+                for key in missing:
+                    job = _result_job(key, batch["keys"][key], None, input_dir, ctx)
+                    job["result"] = _build_result(job["input"], "failed_api")
+                    handle_result(job)
+                batch["processed"] = True
+                bulk_job.save()
+            if any(not batch["processed"] and batch.get("request_file") not in deferred for batch in bulk_job.batches) \
+                    and wait_draining(max(1.0, float(options["bulk_poll_seconds"]))):
+                break
+
+        def drain_prepared():
+            # Setelah stop: pekerjaan persiapan yang belum masuk file request dihitung dihentikan
+            while True:
+                try:
+                    job = prepared_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if "result" not in job:
+                    _discard_job(job)
+                    job["result"] = {"status": "stopped", "input": job["input"]}
+                handle_result(job)
+
+        # Tunggu tahap output menyelesaikan sisa pekerjaan
+        output_stage.close()
+        deadline = time.monotonic() + STOP_DRAIN_TIMEOUT
+        while True:
+            drain_prepared()
+            unfinished = sum(len(batch["keys"]) for batch in bulk_job.batches if not batch["processed"])
+            if counts["completed"] >= expected_total() - unfinished:
+                break
+            if stop_requested() and time.monotonic() >= deadline:
+                break
+            drain_results(timeout=QUEUE_POLL_INTERVAL)
+        if not stop_requested():
+            for stage in stages:
+                stage.join()
+            drain_results()
+
+        stopped = stop_requested()
+        remaining = expected_total() - counts["completed"]
+        if remaining > 0:
+            # Dihentikan, atau batch belum terkirim: file yang belum selesai dilanjutkan pada run berikutnya
+            stats["stopped_count"] += remaining
+            log_message(f"Bulk job {bulk_job.job_id} disimpan: {remaining} file dilanjutkan saat proses dijalankan lagi (bulk_job_id={bulk_job.job_id})", "warning")
+        elif not any(not batch["processed"] for batch in bulk_job.batches):
+            bulk_job.data["completed"] = True
+            bulk_job.save()
+
+        _cleanup_temp_folders(temp_folders, output_dir, auto_foldering_enabled, ctx["target_dirs"])
+
+        total_files = expected_total()
+        if total_files == 0 and not stopped:
+            log_message("Tidak ada file baru/valid yang dapat diproses di folder input.", "warning")
+            return dict(empty_result, status="no_files", bulk_job=bulk_job.job_id)
+
+        _log_run_summary(total_files, stats, [
+            f"Bulk job {bulk_job.job_id}: {len(bulk_job.batches)} batch, {counts['submitted_files']} file dikirim pada run ini"
+        ])
+        return _run_result(
+            total_files, stats, bulk_job=bulk_job.job_id,
+            batches=[batch["name"] for batch in bulk_job.batches if batch["name"]]
+        )
+    finally:
+        if request_file is not None:
+            request_file.close()
+            # Dihentikan sebelum dikirim: file-file ini belum tercatat di bulk job dan disiapkan ulang nanti
+            try:
+                os.remove(request_path)
+            except OSError:
+                pass
+        if any(stage.is_alive() for stage in stages):
+            # Error fatal di tengah run: hentikan worker sebelum journal yang dipakainya ditutup
+            set_force_stop()
+            deadline = time.monotonic() + ABORT_JOIN_TIMEOUT
+            for stage in stages:
+                stage.close()
+            for stage in stages:
+                stage.join(max(0.0, deadline - time.monotonic()))
+        shutdown_cpu_pool(wait=not stop_requested())
+        stop_exiftool_sessions()
+        if journal is not None:
+            journal.close()
+        set_structured_output(True)
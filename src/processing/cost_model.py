@@ -0,0 +1,162 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/cost_model.py
+import os
+import json
+import threading
+
+from src.utils.logging import log_message
+from src.utils.file_utils import SUPPORTED_VIDEO_EXTENSIONS
+from src.processing.video_processing import probe_video_duration
+
+COST_MODEL_FILE_NAME = "cost_model.json"
+
+# Estimasi awal per jenis file: (detik tetap, detik per unit). Unit video = detik durasi,
+# unit jenis lain = MB ukuran file.
+DEFAULT_COST_PRIORS = {
+    "video": (20.0, 0.2),
+    "vector": (12.0, 0.5),
+    "svg": (8.0, 0.5),
+    "png": (8.0, 0.3),
+    "image": (6.0, 0.2),
+}
+# Perkiraan bitrate untuk video yang durasinya tidak bisa dibaca (MB per detik)
+VIDEO_FALLBACK_MB_PER_SECOND = 2.0
+# Jumlah maksimum video yang header-nya dibuka saat discovery per run; membuka demuxer
+# lambat di network share, sisanya diperkirakan dari ukuran
+MAX_DURATION_PROBES = 200
+# Bobot sampel lama dikalikan faktor ini setiap ada sampel baru
+LEARNING_DECAY = 0.95
+MIN_SAMPLES_FOR_FIT = 5
+
+def classify_cost_type(ext):
+    ext = (ext or "").lower()
+    if ext in SUPPORTED_VIDEO_EXTENSIONS:
+        return "video"
+    if ext in (".eps", ".ai"):
+        return "vector"
+    if ext == ".svg":
+        return "svg"
+    if ext == ".png":
+        return "png"
+    return "image"
+
+class CostEstimator:
+    """
+    Memperkirakan lama pemrosesan sebuah file (detik) dari jenis, ukuran, dan durasi video.
+
+    Untuk setiap jenis file, model linier `tetap + laju * unit` dipelajari dari waktu
+    tahap yang tercatat (regresi kuadrat terkecil dengan peluruhan), sehingga perkiraan
+    menyesuaikan dengan mesin dan API pengguna. Hasil belajar disimpan ke file JSON.
+    """
+    def __init__(self, path=None, max_probes=MAX_DURATION_PROBES):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._probes_left = max_probes
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for cost_type, stats in data.get("stats", {}).items():
+                    if cost_type in DEFAULT_COST_PRIORS:
+                        self._stats[cost_type] = {k: float(stats.get(k, 0.0)) for k in ("n", "sx", "sy", "sxx", "sxy")}
+            except (OSError, ValueError, AttributeError) as e:
+                log_message(f"Warning: Gagal memuat model estimasi biaya: {e}", "warning")
+                self._stats = {}
+
+    def _features(self, job):
+        cost_type = classify_cost_type(os.path.splitext(job["input"])[1])
+        size_mb = job.get("size", 0) / (1024 * 1024)
+        if cost_type == "video":
+            if "duration" not in job:
+                job["duration"] = self._probe_duration(job["input"])
+            duration = job["duration"]
+            units = duration if duration else size_mb / VIDEO_FALLBACK_MB_PER_SECOND
+        else:
+            units = size_mb
+        return cost_type, max(0.0, units)
+
+    def _probe_duration(self, path):
+        with self._lock:
+            if self._probes_left <= 0:
+                return None
+            self._probes_left -= 1
+        return probe_video_duration(path)
+
+    def _coefficients(self, cost_type):
+        fixed, rate = DEFAULT_COST_PRIORS[cost_type]
+        stats = self._stats.get(cost_type)
+        if not stats or stats["n"] < 1:
+            return fixed, rate
+        n = stats["n"]
+        mean_x = stats["sx"] / n
+        mean_y = stats["sy"] / n
+        var_x = stats["sxx"] / n - mean_x * mean_x
+        if n >= MIN_SAMPLES_FOR_FIT and var_x > 1e-6:
+            rate = max(0.0, (stats["sxy"] / n - mean_x * mean_y) / var_x)
+        return max(0.0, mean_y - rate * mean_x), rate
+
+    def estimate(self, job):
+        """
+        Mengisi job["cost_type"], job["cost_units"], dan job["cost_estimate"].
+
+        Returns:
+            Perkiraan lama pemrosesan dalam detik
+        """
+        cost_type, units = self._features(job)
+        with self._lock:
+            fixed, rate = self._coefficients(cost_type)
+        job["cost_type"] = cost_type
+        job["cost_units"] = units
+        job["cost_estimate"] = fixed + rate * units
+        return job["cost_estimate"]
+
+    def record(self, job, seconds):
+        """
+        Menambahkan satu sampel waktu pemrosesan nyata untuk pekerjaan yang sudah diestimasi.
+        Video tanpa durasi (perkiraan dari ukuran) tidak dipakai belajar, agar laju video
+        tetap dalam detik per detik durasi seperti saat dipakai memperkirakan.
+        """
+        cost_type = job.get("cost_type")
+        if cost_type not in DEFAULT_COST_PRIORS or seconds <= 0:
+            return
+        if cost_type == "video" and not job.get("duration"):
+            return
+        x = job.get("cost_units", 0.0)
+        with self._lock:
+            stats = self._stats.setdefault(cost_type, {"n": 0.0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "sxy": 0.0})
+            for key in stats:
+                stats[key] *= LEARNING_DECAY
+            stats["n"] += 1.0
+            stats["sx"] += x
+            stats["sy"] += seconds
+            stats["sxx"] += x * x
+            stats["sxy"] += x * seconds
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"stats": {k: dict(v) for k, v in self._stats.items()}}
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            log_message(f"Warning: Gagal menyimpan model estimasi biaya: {e}", "warning")
@@ -19,117 +19,70 @@ import os
 import shutil
 from src.utils.logging import log_message
 from src.api.gemini_api import check_stop_event, is_stop_requested
-from src.utils.compression import compress_image, get_temp_compression_folder
-from src.api.gemini_api import get_gemini_metadata
+from src.utils.compression import get_temp_compression_folder, prepare_image_for_api, remove_temp_files
+from src.api.gemini_api import get_gemini_metadata, interpret_metadata_result
 from src.metadata.exif_writer import write_exif_with_exiftool
 from src.metadata.csv_exporter import write_to_platform_csvs
 from src.utils.file_utils import ensure_unique_title
 
-def process_jpg_jpeg(input_path, output_dir, selected_api_key: str, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+def prepare_jpg_jpeg(input_path, output_dir, stop_event):
     """
-    Memproses file JPG/JPEG: mengompres jika perlu, mendapatkan metadata, dan menulis EXIF.
-    
+    Tahap persiapan JPG/JPEG: cek output, lalu kompres jika perlu sebelum dikirim ke API.
+
     Args:
         input_path: Path file sumber
         output_dir: Direktori output
-        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
         stop_event: Event threading untuk menghentikan proses
-        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
-        selected_model: Model pemrosesan gambar (None untuk auto-rotasi)
-        keyword_count: Jumlah kata kunci untuk diambil dari hasil API
-        priority: Prioritas pemrosesan
-        
+
     Returns:
-        Tuple (status, metadata, output_path):
-            - status: String status pemrosesan
-            - metadata: Dictionary metadata hasil API, atau None jika gagal
-            - output_path: Path file output, atau None jika gagal
+        Tuple (status, prepared):
+            - status: "prepared", "skipped_exists", "stopped" atau status gagal
+            - prepared: Dictionary berisi api_input, temp_files, flag prompt dan initial_output_path
     """
     filename = os.path.basename(input_path)
     initial_output_path = os.path.join(output_dir, filename)
-    temp_files_created = []
-    
-    if check_stop_event(stop_event): 
-        return "stopped", None, None
-    
+
+    if check_stop_event(stop_event):
+        return "stopped", None
+
     # Periksa apakah file output sudah ada
     if os.path.exists(initial_output_path):
-        return "skipped_exists", None, initial_output_path
-    
+        return "skipped_exists", {"initial_output_path": initial_output_path}
+
     # Dapatkan folder kompresi sementara
     chosen_temp_folder = get_temp_compression_folder(output_dir)
     if not chosen_temp_folder:
         log_message("  Error: Tidak dapat menemukan folder temporari yang bisa ditulis.")
-        return "failed_unknown", None, None
-    
+        return "failed_unknown", None
+
     # Kompresi gambar jika perlu
-    try:
-        file_size_mb = os.path.getsize(input_path) / (1024 * 1024)
-        if file_size_mb > 2:  # 2MB adalah batas ukuran file
-            log_message(f"  File {filename} ({file_size_mb:.2f}MB) perlu kompresi.")
-            compressed_path, is_compressed = compress_image(
-                input_path, chosen_temp_folder, stop_event=stop_event
-            )
-            
-            if is_compressed and compressed_path and os.path.exists(compressed_path):
-                log_message(f"  Kompresi berhasil: {os.path.basename(compressed_path)}")
-                path_for_api = compressed_path
-                temp_files_created.append(compressed_path)
-            else:
-                log_message(f"  Kompresi gagal. Menggunakan file asli: {filename}")
-                path_for_api = input_path
-        else:
-            log_message(f"  File {filename} ({file_size_mb:.2f}MB) tidak perlu kompresi.")
-            path_for_api = input_path
-    except Exception as e:
-        log_message(f"  Error saat memeriksa ukuran/kompresi: {e}")
-        path_for_api = input_path
-    
+    path_for_api, temp_files_created = prepare_image_for_api(input_path, chosen_temp_folder, stop_event=stop_event)
+
     if check_stop_event(stop_event):
         # Bersihkan file sementara jika dibatalkan
-        for temp_file in temp_files_created:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except Exception:
-                pass
-        return "stopped", None, None
-    
-    # Dapatkan metadata dari Gemini API
-    api_key_to_use = selected_api_key
-    metadata_result = get_gemini_metadata(
-        path_for_api,
-        api_key_to_use,
-        stop_event,
-        use_png_prompt=False,
-        selected_model_input=selected_model,
-        keyword_count=keyword_count,
-        priority=priority
-    )
-    
-    # Bersihkan file kompresi sementara
-    for temp_file in temp_files_created:
-        try:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
-                log_message(f"  File kompresi sementara dihapus: {os.path.basename(temp_file)}")
-        except Exception as e:
-            log_message(f"  Warning: Gagal hapus file sementara: {e}")
-    
-    if metadata_result == "stopped":
-        return "stopped", None, None
-    elif isinstance(metadata_result, dict) and "error" in metadata_result:
-        log_message(f"  API Error detail: {metadata_result['error']}")
-        return "failed_api", None, None
-    elif isinstance(metadata_result, dict):
-        metadata = metadata_result
-    else:
-        log_message(f"  API call gagal mendapatkan metadata (hasil tidak valid).")
-        return "failed_api", None, None
-    
+        remove_temp_files(temp_files_created)
+        return "stopped", None
+
+    return "prepared", {
+        "api_input": path_for_api,
+        "temp_files": temp_files_created,
+        "use_png_prompt": False,
+        "use_video_prompt": False,
+        "initial_output_path": initial_output_path
+    }
+
+def finalize_jpg_jpeg(input_path, initial_output_path, metadata, stop_event):
+    """
+    Tahap output JPG/JPEG: menyalin file ke output dan menulis metadata EXIF.
+
+    Returns:
+        Tuple (status, metadata, output_path)
+    """
+    filename = os.path.basename(input_path)
+
     if check_stop_event(stop_event):
         return "stopped", metadata, None
-    
+
     # Salin file ke output dan tulis metadata EXIF
     try:
         if not os.path.exists(initial_output_path):
@@ -140,15 +93,15 @@ def process_jpg_jpeg(input_path, output_dir, selected_api_key: str, stop_event,
     except Exception as e:
         log_message(f"  Gagal menyalin {filename}: {e}")
         return "failed_copy", metadata, None
-    
+
     if check_stop_event(stop_event):
         try: os.remove(initial_output_path)
         except Exception: pass
         return "stopped", metadata, None
-    
+
     # Tulis metadata EXIF
     proceed, exif_status = write_exif_with_exiftool(input_path, initial_output_path, metadata, stop_event)
-    
+
     if not proceed:
         # Handle critical failures during EXIF write attempt (e.g., stopped, copy_failed)
         log_message(f"  Proses dihentikan atau gagal kritis saat mencoba menulis EXIF untuk {filename} (Status: {exif_status})")
@@ -179,3 +132,47 @@ def process_jpg_jpeg(input_path, output_dir, selected_api_key: str, stop_event,
          # Handle any other unexpected status from exif_writer
          log_message(f"  Status EXIF tidak dikenal '{exif_status}' untuk {filename}", "warning")
          return "processed_unknown_exif_status", metadata, initial_output_path
+
+def process_jpg_jpeg(input_path, output_dir, selected_api_key: str, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+    """
+    Memproses file JPG/JPEG: mengompres jika perlu, mendapatkan metadata, dan menulis EXIF.
+    
+    Args:
+        input_path: Path file sumber
+        output_dir: Direktori output
+        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
+        stop_event: Event threading untuk menghentikan proses
+        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
+        selected_model: Model pemrosesan gambar (None untuk auto-rotasi)
+        keyword_count: Jumlah kata kunci untuk diambil dari hasil API
+        priority: Prioritas pemrosesan
+        
+    Returns:
+        Tuple (status, metadata, output_path):
+            - status: String status pemrosesan
+            - metadata: Dictionary metadata hasil API, atau None jika gagal
+            - output_path: Path file output, atau None jika gagal
+    """
+    status, prepared = prepare_jpg_jpeg(input_path, output_dir, stop_event)
+    if status != "prepared":
+        return status, None, (prepared or {}).get("initial_output_path")
+    
+    # Dapatkan metadata dari Gemini API
+    metadata_result = get_gemini_metadata(
+        prepared["api_input"],
+        selected_api_key,
+        stop_event,
+        use_png_prompt=False,
+        selected_model_input=selected_model,
+        keyword_count=keyword_count,
+        priority=priority
+    )
+    
+    # Bersihkan file kompresi sementara
+    remove_temp_files(prepared["temp_files"], log_removed=True)
+    
+    status, metadata = interpret_metadata_result(metadata_result)
+    if status != "ok":
+        return status, None, None
+    
+    return finalize_jpg_jpeg(input_path, prepared["initial_output_path"], metadata, stop_event)
@@ -19,108 +19,68 @@ import os
 import shutil
 from src.utils.logging import log_message
 from src.api.gemini_api import check_stop_event, is_stop_requested
-from src.utils.compression import compress_image, get_temp_compression_folder
-from src.api.gemini_api import get_gemini_metadata
+from src.utils.compression import get_temp_compression_folder, prepare_image_for_api, remove_temp_files
+from src.api.gemini_api import get_gemini_metadata, interpret_metadata_result
 from src.metadata.csv_exporter import write_to_platform_csvs
 
-def process_png(input_path, output_dir, selected_api_key: str, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+def prepare_png(input_path, output_dir, stop_event):
     """
-    Memproses file PNG: mengompres jika perlu, mendapatkan metadata dengan prompt khusus PNG.
-    
+    Tahap persiapan PNG: cek output, lalu kompres jika perlu sebelum dikirim ke API.
+
     Args:
         input_path: Path file sumber
         output_dir: Direktori output
-        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
         stop_event: Event threading untuk menghentikan proses
-        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
-        selected_model: Model pemrosesan gambar, atau None untuk auto-rotasi
-        keyword_count: Jumlah kata kunci untuk diambil dari hasil API
-        priority: Prioritas pemrosesan
-        
+
     Returns:
-        Tuple (status, metadata, output_path):
-            - status: String status pemrosesan
-            - metadata: Dictionary metadata hasil API, atau None jika gagal
-            - output_path: Path file output, atau None jika gagal
+        Tuple (status, prepared):
+            - status: "prepared", "skipped_exists", "stopped" atau status gagal
+            - prepared: Dictionary berisi api_input, temp_files, flag prompt dan initial_output_path
     """
     filename = os.path.basename(input_path)
     initial_output_path = os.path.join(output_dir, filename)
-    temp_files_created = []
-    
-    if check_stop_event(stop_event): 
-        return "stopped", None, None
-    
+
+    if check_stop_event(stop_event):
+        return "stopped", None
+
     # Periksa apakah file output sudah ada
     if os.path.exists(initial_output_path):
-        return "skipped_exists", None, initial_output_path
-    
+        return "skipped_exists", {"initial_output_path": initial_output_path}
+
     # Dapatkan folder kompresi sementara
     chosen_temp_folder = get_temp_compression_folder(output_dir)
     if not chosen_temp_folder:
         log_message("  Error: Tidak dapat menemukan folder temporari yang bisa ditulis.")
-        return "failed_unknown", None, None
-    
+        return "failed_unknown", None
+
     # Kompresi gambar jika perlu
-    try:
-        file_size_mb = os.path.getsize(input_path) / (1024 * 1024)
-        if file_size_mb > 2:  # 2MB adalah batas ukuran file
-            log_message(f"  File PNG {filename} ({file_size_mb:.2f}MB) perlu kompresi.")
-            compressed_path, is_compressed = compress_image(
-                input_path, chosen_temp_folder, stop_event=stop_event
-            )
-            
-            if is_compressed and compressed_path and os.path.exists(compressed_path):
-                log_message(f"  Kompresi berhasil: {os.path.basename(compressed_path)}")
-                path_for_api = compressed_path
-                temp_files_created.append(compressed_path)
-            else:
-                log_message(f"  Kompresi gagal. Menggunakan file asli: {filename}")
-                path_for_api = input_path
-        else:
-            log_message(f"  File {filename} ({file_size_mb:.2f}MB) tidak perlu kompresi.")
-            path_for_api = input_path
-    except Exception as e:
-        log_message(f"  Error saat memeriksa ukuran/kompresi: {e}")
-        path_for_api = input_path
-    
+    path_for_api, temp_files_created = prepare_image_for_api(input_path, chosen_temp_folder, stop_event=stop_event, label="File PNG")
+
     if check_stop_event(stop_event):
         # Bersihkan file sementara jika dibatalkan
-        for temp_file in temp_files_created:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except Exception:
-                pass
-        return "stopped", None, None
-    
-    # Dapatkan metadata dari API Gemini, gunakan prompt khusus PNG
-    api_key_to_use = selected_api_key
-    metadata_result = get_gemini_metadata(path_for_api, api_key_to_use, stop_event, use_png_prompt=True, selected_model_input=selected_model, keyword_count=keyword_count, priority=priority)
-    
-    # Bersihkan file kompresi sementara
-    for temp_file in temp_files_created:
-        try:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
-                log_message(f"  File kompresi sementara dihapus: {os.path.basename(temp_file)}")
-        except Exception as e:
-            log_message(f"  Warning: Gagal hapus file sementara: {e}")
-    
-    if metadata_result == "stopped":
-        return "stopped", None, None
-    elif isinstance(metadata_result, dict) and "error" in metadata_result:
-        log_message(f"  API Error detail: {metadata_result['error']}")
-        return "failed_api", None, None
-    elif isinstance(metadata_result, dict):
-        metadata = metadata_result
-    else:
-        log_message(f"  API call gagal mendapatkan metadata (hasil tidak valid).")
-        return "failed_api", None, None
-    
+        remove_temp_files(temp_files_created)
+        return "stopped", None
+
+    return "prepared", {
+        "api_input": path_for_api,
+        "temp_files": temp_files_created,
+        "use_png_prompt": True,
+        "use_video_prompt": False,
+        "initial_output_path": initial_output_path
+    }
+
+def finalize_png(input_path, initial_output_path, metadata, stop_event):
+    """
+    Tahap output PNG: menyalin file ke output (PNG tidak bisa menyimpan EXIF metadata).
+
+    Returns:
+        Tuple (status, metadata, output_path)
+    """
+    filename = os.path.basename(input_path)
+
     if check_stop_event(stop_event):
         return "stopped", metadata, None
-    
-    # Salin file ke output (PNG tidak bisa menyimpan EXIF metadata)
+
     try:
         if not os.path.exists(initial_output_path):
             shutil.copy2(input_path, initial_output_path)
@@ -130,10 +90,46 @@ def process_png(input_path, output_dir, selected_api_key: str, stop_event, auto_
     except Exception as e:
         log_message(f"  Gagal menyalin {filename}: {e}")
         return "failed_copy", metadata, None
-    
+
     if check_stop_event(stop_event):
         try: os.remove(initial_output_path)
         except Exception: pass
         return "stopped", metadata, None
+
+    return "processed_no_exif", metadata, initial_output_path
+
+def process_png(input_path, output_dir, selected_api_key: str, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+    """
+    Memproses file PNG: mengompres jika perlu, mendapatkan metadata dengan prompt khusus PNG.
+    
+    Args:
+        input_path: Path file sumber
+        output_dir: Direktori output
+        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
+        stop_event: Event threading untuk menghentikan proses
+        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
+        selected_model: Model pemrosesan gambar, atau None untuk auto-rotasi
+        keyword_count: Jumlah kata kunci untuk diambil dari hasil API
+        priority: Prioritas pemrosesan
+        
+    Returns:
+        Tuple (status, metadata, output_path):
+            - status: String status pemrosesan
+            - metadata: Dictionary metadata hasil API, atau None jika gagal
+            - output_path: Path file output, atau None jika gagal
+    """
+    status, prepared = prepare_png(input_path, output_dir, stop_event)
+    if status != "prepared":
+        return status, None, (prepared or {}).get("initial_output_path")
+    
+    # Dapatkan metadata dari API Gemini, gunakan prompt khusus PNG
+    metadata_result = get_gemini_metadata(prepared["api_input"], selected_api_key, stop_event, use_png_prompt=True, selected_model_input=selected_model, keyword_count=keyword_count, priority=priority)
+    
+    # Bersihkan file kompresi sementara
+    remove_temp_files(prepared["temp_files"], log_removed=True)
+    
+    status, metadata = interpret_metadata_result(metadata_result)
+    if status != "ok":
+        return status, None, None
     
-    return "processed_no_exif", metadata, initial_output_path
\ No newline at end of file
+    return finalize_png(input_path, prepared["initial_output_path"], metadata, stop_event)
@@ -0,0 +1,169 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/job_journal.py
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from src.utils.logging import log_message
+
+JOURNAL_FILE_NAME = "job_journal.sqlite"
+
+# Urutan state pekerjaan; state yang lebih besar tidak pernah diturunkan
+JOB_STATES = ("queued", "prepared", "api_done", "written", "exported")
+_STATE_RANK = {state: index for index, state in enumerate(JOB_STATES)}
+
+def file_fingerprint(size, mtime):
+    """
+    Sidik jari murah untuk mendeteksi file yang berubah tanpa membaca isinya.
+    """
+    return f"{int(size)}:{int(mtime * 1000)}"
+
+def job_fingerprint(job):
+    """
+    Mengambil sidik jari dari job dictionary (memakai size/mtime hasil scandir bila ada).
+    """
+    if "size" not in job or "mtime" not in job:
+        try:
+            stat_result = os.stat(job["input"])
+        except OSError:
+            return None
+        job["size"] = stat_result.st_size
+        job["mtime"] = stat_result.st_mtime
+    return file_fingerprint(job["size"], job["mtime"])
+
+def _journal_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+class JobJournal:
+    """
+    Journal SQLite (mode WAL) yang mencatat state setiap file: queued, prepared,
+    api_done, written, exported. Kunci-nya adalah path + sidik jari file, sehingga
+    file yang diganti dengan isi baru diperlakukan sebagai pekerjaan baru.
+
+    Satu koneksi dipakai bersama oleh semua worker dan dilindungi lock; setiap
+    transisi langsung di-commit agar tidak hilang saat aplikasi crash.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " path TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " status TEXT,"
+            " output TEXT,"
+            " metadata TEXT,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (path, fingerprint)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get(self, path, fingerprint):
+        """
+        Returns:
+            Dictionary {"state", "status", "output", "metadata"} atau None jika belum tercatat.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, status, output, metadata FROM jobs WHERE path = ? AND fingerprint = ?",
+                (_journal_key(path), fingerprint)
+            ).fetchone()
+        if row is None:
+            return None
+        metadata = None
+        if row[3]:
+            try:
+                metadata = json.loads(row[3])
+            except ValueError:
+                metadata = None
+        return {"state": row[0], "status": row[1], "output": row[2], "metadata": metadata}
+
+    def record(self, path, fingerprint, state, status=None, output=None, metadata=None):
+        """
+        Mencatat transisi state. State tidak pernah mundur; output dan metadata lama
+        dipertahankan jika tidak diberikan.
+        """
+        if fingerprint is None:
+            return
+        metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata is not None else None
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (path, fingerprint, state, status, output, metadata, updated)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(path, fingerprint) DO UPDATE SET"
+                    " state = CASE WHEN ? >= (" + self._rank_sql("jobs.state") + ") THEN excluded.state ELSE jobs.state END,"
+                    " status = excluded.status,"
+                    " output = COALESCE(excluded.output, jobs.output),"
+                    " metadata = COALESCE(excluded.metadata, jobs.metadata),"
+                    " updated = excluded.updated",
+                    (_journal_key(path), fingerprint, state, status, output, metadata_json, time.time(), _STATE_RANK[state])
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                log_message(f"Warning: Gagal menulis job journal: {e}", "warning")
+
+    def record_status(self, path, fingerprint, status):
+        """
+        Mencatat status akhir (misal failed_api) tanpa mengubah state terakhir yang tercapai.
+        """
+        if fingerprint is None:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated = ? WHERE path = ? AND fingerprint = ?",
+                    (status, time.time(), _journal_key(path), fingerprint)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                log_message(f"Warning: Gagal menulis job journal: {e}", "warning")
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+
+    @staticmethod
+    def _rank_sql(column):
+        cases = " ".join(f"WHEN '{state}' THEN {rank}" for state, rank in _STATE_RANK.items())
+        return f"CASE {column} {cases} ELSE -1 END"
+
+def open_job_journal(db_path):
+    """
+    Membuka journal; mengembalikan None (journal nonaktif) jika gagal, agar proses tetap jalan.
+    """
+    if not db_path:
+        return None
+    try:
+        return JobJournal(db_path)
+    except (sqlite3.Error, OSError) as e:
+        log_message(f"Warning: Job journal tidak bisa dibuka ({e}), resume dinonaktifkan.", "warning")
+        return None
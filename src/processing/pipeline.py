@@ -0,0 +1,153 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/pipeline.py
+import os
+import time
+import queue
+import threading
+import traceback
+
+from src.utils.logging import log_message
+
+# Interval polling antrian (detik) agar worker tetap responsif terhadap stop
+QUEUE_POLL_INTERVAL = 0.25
+
+class PipelineStage:
+    """
+    Satu tahap pipeline dengan antrian masukan terbatas dan pool worker sendiri.
+
+    Setiap pekerjaan adalah dictionary (minimal berisi "input"). Handler menerima
+    pekerjaan dan mengembalikannya kembali; jika handler mengisi key "result",
+    pekerjaan dianggap selesai dan dikirim ke antrian hasil, jika tidak maka
+    diteruskan ke tahap berikutnya. Lama kerja handler dicatat di
+    job["stage_seconds"]. Antrian yang terbatas membuat tahap yang cepat
+    tertahan (backpressure) ketika tahap berikutnya penuh.
+    """
+    def __init__(self, name, handler, num_workers, queue_size, results, next_stage=None, should_stop=None, on_discard=None):
+        self.name = name
+        self._handler = handler
+        self._num_workers = max(1, int(num_workers))
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._results = results
+        self._next_stage = next_stage
+        self._should_stop = should_stop or (lambda: False)
+        self._on_discard = on_discard
+        self._threads = []
+        self._closed = threading.Event()
+        self._alive_lock = threading.Lock()
+        self._alive = 0
+
+    @property
+    def num_workers(self):
+        return self._num_workers
+
+    def start(self):
+        with self._alive_lock:
+            self._alive = self._num_workers
+        for index in range(self._num_workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-{index + 1}",
+                daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def offer(self, job, timeout=None):
+        """
+        Memasukkan pekerjaan ke antrian tahap ini.
+
+        Returns:
+            True jika pekerjaan diterima, False jika antrian masih penuh setelah timeout.
+        """
+        try:
+            self._queue.put(job, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        """Menandai bahwa tidak ada pekerjaan baru; worker berhenti setelah antrian kosong."""
+        self._closed.set()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _worker_loop(self):
+        try:
+            while True:
+                try:
+                    job = self._queue.get(timeout=QUEUE_POLL_INTERVAL)
+                except queue.Empty:
+                    if self._closed.is_set():
+                        break
+                    continue
+                self._run_job(job)
+        finally:
+            with self._alive_lock:
+                self._alive -= 1
+                last_worker = self._alive == 0
+            # Worker terakhir yang keluar menutup tahap berikutnya (cascade)
+            if last_worker and self._next_stage is not None:
+                self._next_stage.close()
+
+    def _run_job(self, job):
+        if self._should_stop():
+            self._stop_job(job)
+            self._results.put(job)
+            return
+        started = time.monotonic()
+        try:
+            job = self._handler(job)
+        except Exception as e:
+            filename = os.path.basename(job.get("input") or "") or "unknown file"
+            log_message(f"Error processing {filename}: {e}", "error")
+            log_message(f"Detail error: {traceback.format_exc()}", "error")
+            self._discard(job)
+            job["result"] = {"status": "failed_worker", "input": job.get("input")}
+        # Lama kerja handler per tahap (tanpa waktu antri), dipakai untuk estimasi biaya
+        job.setdefault("stage_seconds", {})[self.name] = time.monotonic() - started
+        if "result" in job or self._next_stage is None:
+            self._results.put(job)
+            return
+        self._forward(job)
+
+    def _forward(self, job):
+        while True:
+            if self._should_stop():
+                self._stop_job(job)
+                self._results.put(job)
+                return
+            if self._next_stage.offer(job, timeout=QUEUE_POLL_INTERVAL):
+                return
+
+    def _stop_job(self, job):
+        if "result" not in job:
+            self._discard(job)
+            job["result"] = {"status": "stopped", "input": job.get("input")}
+
+    def _discard(self, job):
+        if self._on_discard is None:
+            return
+        try:
+            self._on_discard(job)
+        except Exception as e:
+            log_message(f"Warning: Gagal membersihkan pekerjaan yang dibatalkan: {e}", "warning")
@@ -0,0 +1,145 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/request_packer.py
+import os
+import time
+import threading
+
+from src.utils.logging import log_message
+
+DEFAULT_PACK_SIZE = 1
+MAX_PACK_SIZE = 8
+DEFAULT_PACK_WINDOW_SECONDS = 1.0
+DEFAULT_PACK_MAX_IMAGE_KB = 1024
+# Format hasil persiapan yang boleh dipaketkan (gambar tunggal, bukan frame video)
+PACKABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Interval pemeriksaan stop saat menunggu paket terisi atau hasil paket
+PACK_POLL_INTERVAL = 0.25
+
+class _PackEntry:
+    def __init__(self, job):
+        self.job = job
+        self.result = None
+        self.done = threading.Event()
+
+class _PackGroup:
+    def __init__(self):
+        self.entries = []
+        self.full = threading.Event()
+
+class RequestPacker:
+    """
+    Mengumpulkan beberapa gambar kecil yang sudah disiapkan dari worker API menjadi satu
+    request Gemini. Worker pertama yang masuk menjadi leader: ia menunggu sampai paket
+    berisi pack_size gambar atau jendela waktu habis, lalu mengirim paket. Worker lain
+    menunggu hasil untuk file mereka sendiri.
+
+    Hasil per file adalah dictionary metadata, "stopped", atau None jika file itu harus
+    dikirim ulang sendiri (bloknya gagal diparse atau seluruh request paket gagal).
+    """
+    def __init__(self, send, pack_size, window_seconds=DEFAULT_PACK_WINDOW_SECONDS, max_image_kb=DEFAULT_PACK_MAX_IMAGE_KB, should_stop=None):
+        """
+        Args:
+            send: Callable(list job) -> list hasil per job, "stopped", atau hasil lain (= gagal)
+            pack_size: Jumlah gambar maksimum per request
+            window_seconds: Lama maksimum leader menunggu paket terisi
+            max_image_kb: Gambar hasil persiapan yang lebih besar dari ini dikirim sendiri
+            should_stop: Callable yang mengembalikan True jika proses dihentikan
+        """
+        self._send = send
+        self.pack_size = max(1, min(int(pack_size), MAX_PACK_SIZE))
+        self._window = max(0.0, float(window_seconds))
+        self._max_bytes = max(1, int(max_image_kb)) * 1024
+        self._should_stop = should_stop or (lambda: False)
+        self._lock = threading.Lock()
+        self._open = {}
+
+    def accepts(self, job):
+        """
+        Returns:
+            True jika pekerjaan ini gambar tunggal JPG/PNG yang cukup kecil untuk dipaketkan.
+        """
+        prepared = job.get("prepared") or {}
+        api_input = prepared.get("api_input")
+        if self.pack_size < 2 or "metadata" in job or prepared.get("use_video_prompt") or not isinstance(api_input, str):
+            return False
+        if not api_input.lower().endswith(PACKABLE_EXTENSIONS):
+            return False
+        try:
+            return os.path.getsize(api_input) <= self._max_bytes
+        except OSError:
+            return False
+
+    def submit(self, job):
+        """
+        Memasukkan pekerjaan ke paket yang sedang dikumpulkan dan menunggu hasilnya.
+
+        Returns:
+            Dictionary metadata, "stopped", atau None (kirim ulang file ini sendiri).
+        """
+        # Gambar PNG transparan memakai prompt berbeda, jadi dipaketkan terpisah
+        group_key = bool(job["prepared"].get("use_png_prompt"))
+        entry = _PackEntry(job)
+        with self._lock:
+            group = self._open.get(group_key)
+            is_leader = group is None
+            if is_leader:
+                group = _PackGroup()
+                self._open[group_key] = group
+            group.entries.append(entry)
+            if len(group.entries) >= self.pack_size:
+                self._close_locked(group_key, group)
+
+        if not is_leader:
+            while not entry.done.wait(PACK_POLL_INTERVAL):
+                if self._should_stop():
+                    return "stopped"
+            return entry.result
+
+        deadline = time.monotonic() + self._window
+        while not group.full.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._should_stop():
+                break
+            group.full.wait(min(remaining, PACK_POLL_INTERVAL))
+        with self._lock:
+            self._close_locked(group_key, group)
+        self._run(group)
+        return entry.result
+
+    def _close_locked(self, group_key, group):
+        group.full.set()
+        if self._open.get(group_key) is group:
+            del self._open[group_key]
+
+    def _run(self, group):
+        entries = group.entries
+        results = None
+        if len(entries) > 1:
+            try:
+                results = self._send([entry.job for entry in entries])
+            except Exception as e:
+                log_message(f"Warning: Request paket gagal, file dikirim ulang satu per satu: {e}", "warning")
+                results = None
+        for index, entry in enumerate(entries):
+            if results == "stopped":
+                entry.result = "stopped"
+            elif isinstance(results, list) and index < len(results) and isinstance(results[index], dict) and "error" not in results[index]:
+                entry.result = results[index]
+            else:
+                entry.result = None
+            entry.done.set()
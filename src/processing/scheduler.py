@@ -0,0 +1,186 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/scheduler.py
+import math
+import time
+import heapq
+import random
+import threading
+from collections import deque
+
+# Konstanta throttle kegagalan tinggi
+HIGH_FAILURE_RATE_THRESHOLD = 0.5
+HIGH_FAILURE_WINDOW = 10
+HIGH_FAILURE_COOLDOWN = 60
+# Jeda coba ulang saat semua key yang siap sudah mencapai batas konkurensinya
+SLOT_RETRY_INTERVAL = 0.1
+
+class KeyPacer:
+    """
+    Mengatur jarak minimum antar pengiriman pekerjaan untuk setiap API key.
+
+    Pengganti cooldown global antar batch: setiap key punya jadwal "siap" sendiri,
+    sehingga key lain tetap bisa dipakai ketika satu key masih menunggu.
+    """
+    def __init__(self, api_keys, interval_seconds=0.0):
+        self._lock = threading.Lock()
+        self._keys = list(dict.fromkeys(api_keys))
+        self._next_ready = {key: 0.0 for key in self._keys}
+        self._interval = max(0.0, float(interval_seconds))
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def set_interval(self, interval_seconds):
+        with self._lock:
+            self._interval = max(0.0, float(interval_seconds))
+
+    def try_acquire(self, claim=None, weight=None, greedy=False):
+        """
+        Mengambil API key yang sudah siap dipakai.
+
+        Args:
+            claim: Callable(api_key) -> bool opsional untuk mengambil slot konkurensi key;
+                key yang slotnya penuh dilewati
+            weight: Callable(api_key) -> float opsional; di antara key yang siap, key berbobot
+                besar (sehat) lebih sering dipilih dan key berbobot 0 tidak dipakai
+            greedy: Jika True, key berbobot terbesar selalu dicoba lebih dulu (untuk retry)
+        Returns:
+            Tuple (api_key, wait_seconds):
+                - api_key: Key yang dipilih, atau None jika belum ada yang siap
+                - wait_seconds: Sisa waktu tunggu sampai key berikutnya siap (0 jika key didapat)
+        """
+        with self._lock:
+            if not self._keys:
+                return None, 0.0
+            now = time.monotonic()
+            ordered = sorted(self._keys, key=lambda k: self._next_ready[k])
+            ready = [key for key in ordered if self._next_ready[key] <= now]
+            candidates = ready
+            if weight is not None:
+                # Pengambilan sampel berbobot tanpa pengembalian (Efraimidis-Spirakis)
+                weights = {key: weight(key) for key in ready}
+                candidates = sorted(
+                    (key for key in ready if weights[key] > 0),
+                    key=lambda k: weights[k] if greedy else random.random() ** (1.0 / weights[k]),
+                    reverse=True
+                )
+            for key in candidates:
+                if claim is None or claim(key):
+                    self._next_ready[key] = now + self._interval
+                    return key, 0.0
+            if len(ready) < len(ordered):
+                return None, self._next_ready[ordered[len(ready)]] - now
+            # Semua key yang siap sedang penuh; coba lagi sebentar lagi
+            return None, SLOT_RETRY_INTERVAL
+
+def compute_key_interval(delay_seconds, num_workers, num_api_keys):
+    """
+    Menghitung jarak minimum per API key dari pengaturan 'Delay' UI.
+
+    Jika worker lebih banyak dari key (mode paid), satu key boleh menerima beberapa
+    pekerjaan per periode delay, sama seperti satu batch lama.
+    """
+    if delay_seconds <= 0 or num_api_keys <= 0:
+        return 0.0
+    jobs_per_key = max(1, math.ceil(num_workers / num_api_keys))
+    return float(delay_seconds) / jobs_per_key
+
+class FailureThrottle:
+    """
+    Memperlambat laju pengiriman saat persentase kegagalan terbaru tinggi.
+
+    Menggantikan cooldown adaptif 60 detik antar batch: pekerjaan yang sedang berjalan
+    tidak ditahan, hanya interval pengiriman per key yang dinaikkan sementara.
+    """
+    def __init__(self, window=HIGH_FAILURE_WINDOW, threshold=HIGH_FAILURE_RATE_THRESHOLD, cooldown_seconds=HIGH_FAILURE_COOLDOWN):
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=window)
+        self._threshold = threshold
+        self._cooldown = cooldown_seconds
+        self._throttled_until = 0.0
+
+    def record(self, failed):
+        """
+        Mencatat hasil satu pekerjaan.
+
+        Returns:
+            True jika pencatatan ini baru saja mengaktifkan throttle.
+        """
+        with self._lock:
+            self._results.append(bool(failed))
+            if len(self._results) < self._results.maxlen:
+                return False
+            failure_rate = sum(self._results) / len(self._results)
+            if failure_rate >= self._threshold and time.monotonic() >= self._throttled_until:
+                self._throttled_until = time.monotonic() + self._cooldown
+                self._results.clear()
+                return True
+            return False
+
+    def is_throttled(self):
+        with self._lock:
+            return time.monotonic() < self._throttled_until
+
+    @property
+    def cooldown_seconds(self):
+        return self._cooldown
+
+class LongestFirstBuffer:
+    """
+    Penampung pekerjaan yang sudah ditemukan tapi belum dikirim ke pipeline, dikeluarkan
+    dari perkiraan biaya terbesar (longest-processing-time-first). File yang berat
+    (video panjang, vektor besar) dimulai lebih awal sehingga tidak memperpanjang ekor run.
+    Pekerjaan dengan biaya sama keluar sesuai urutan ditemukan.
+    """
+    def __init__(self):
+        self._heap = []
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, job, cost=0.0):
+        heapq.heappush(self._heap, (-float(cost), self._sequence, job))
+        self._sequence += 1
+
+    def peek(self):
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2] if self._heap else None
+
+def wait_with_stop(seconds, stop_event=None, should_stop=None):
+    """
+    Menunggu selama `seconds` detik, berhenti lebih awal jika stop diminta.
+
+    Returns:
+        True jika penantian dihentikan oleh stop, False jika selesai normal.
+    """
+    deadline = time.monotonic() + max(0.0, seconds)
+    while True:
+        if should_stop and should_stop():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if stop_event is not None:
+            if stop_event.wait(min(remaining, 0.25)):
+                return True
+        else:
+            time.sleep(min(remaining, 0.25))
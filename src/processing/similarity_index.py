@@ -0,0 +1,245 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/similarity_index.py
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from PIL import Image
+from src.utils.logging import log_message
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SIMILARITY_INDEX_FILE_NAME = "similarity_index.sqlite"
+DEFAULT_MAX_DISTANCE = 4
+DHASH_SIZE = 8
+
+def compute_dhash(image_path, hash_size=DHASH_SIZE, stop_event=None):
+    """
+    Menghitung difference hash (dHash) 64-bit: gambar diubah ke grayscale
+    (hash_size+1)x(hash_size), lalu setiap piksel dibandingkan dengan tetangga kanannya.
+
+    Returns:
+        Integer hash, atau None jika gambar tidak bisa dibaca.
+    """
+    try:
+        with Image.open(image_path) as img:
+            small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+            if np is not None:
+                pixels = np.asarray(small, dtype=np.int16)
+                bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+            else:
+                data = list(small.getdata())
+                width = hash_size + 1
+                bits = [data[row * width + col + 1] > data[row * width + col]
+                        for row in range(hash_size) for col in range(hash_size)]
+        value = 0
+        for bit in bits:
+            value = (value << 1) | int(bool(bit))
+        return value
+    except Exception as e:
+        log_message(f"  Warning: Gagal menghitung perceptual hash {os.path.basename(str(image_path))}: {e}")
+        return None
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count("1")
+
+class BKTree:
+    """
+    BK-tree untuk pencarian hash berdasarkan jarak Hamming.
+    Setiap node: [hash, entry_id, {jarak: node_anak}].
+    """
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value, entry_id):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, entry_id, {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, entry_id, {}]
+                return
+            node = child
+
+    def find_nearest(self, value, max_distance):
+        """
+        Returns:
+            Tuple (entry_id, distance) terdekat dalam max_distance, atau None.
+        """
+        if self._root is None:
+            return None
+        best = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = (node[1], distance)
+                if distance == 0:
+                    break
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node[2].items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+        return best
+
+class SimilarityIndex:
+    """
+    Index perceptual hash persisten (SQLite) untuk memakai ulang metadata gambar yang
+    nyaris sama. BK-tree dibangun di memori saat dibuka.
+
+    Gambar yang sedang menunggu API didaftarkan sebagai "pending" sehingga gambar
+    mirip lain dalam batch yang sama menunggu hasilnya, bukan ikut memanggil API.
+    """
+    def __init__(self, db_path, max_distance=DEFAULT_MAX_DISTANCE):
+        self.db_path = db_path
+        self.max_distance = int(max_distance)
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._pending = {}
+        self._next_pending_id = 0
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " hash TEXT NOT NULL,"
+            " metadata TEXT NOT NULL,"
+            " source TEXT,"
+            " created REAL NOT NULL"
+            ")"
+        )
+        self._conn.commit()
+        for entry_id, hash_hex in self._conn.execute("SELECT id, hash FROM images"):
+            self._tree.add(int(hash_hex, 16), entry_id)
+
+    def __len__(self):
+        return len(self._tree)
+
+    def _load_entry(self, entry_id):
+        row = self._conn.execute("SELECT metadata, source FROM images WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            return None
+
+    def lookup_or_reserve(self, image_hash, should_stop=None):
+        """
+        Mencari gambar mirip. Jika ada gambar mirip yang sedang diproses API, tunggu hasilnya.
+
+        Returns:
+            Tuple (kind, value):
+                - ("hit", (metadata, source, distance)) jika metadata bisa dipakai ulang
+                - ("reserved", token) jika gambar ini baru; panggil complete()/release() setelah API
+                - ("stopped", None) jika stop diminta saat menunggu
+        """
+        while True:
+            with self._lock:
+                match = self._tree.find_nearest(image_hash, self.max_distance)
+                if match is not None:
+                    loaded = None
+                    try:
+                        loaded = self._load_entry(match[0])
+                    except sqlite3.Error as e:
+                        log_message(f"Warning: Gagal membaca similarity index: {e}", "warning")
+                    if loaded is not None:
+                        return "hit", (loaded[0], loaded[1], match[1])
+                waiter = None
+                for pending_hash, event in self._pending.values():
+                    if hamming_distance(image_hash, pending_hash) <= self.max_distance:
+                        waiter = event
+                        break
+                if waiter is None:
+                    token = self._next_pending_id
+                    self._next_pending_id += 1
+                    self._pending[token] = (image_hash, threading.Event())
+                    return "reserved", token
+            while not waiter.wait(0.25):
+                if should_stop and should_stop():
+                    return "stopped", None
+
+    def complete(self, token, metadata, source=None):
+        """
+        Menyimpan metadata hasil API untuk hash yang di-reserve dan membangunkan yang menunggu.
+        """
+        with self._lock:
+            pending = self._pending.pop(token, None)
+            if pending is None:
+                return
+            image_hash, event = pending
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO images (hash, metadata, source, created) VALUES (?, ?, ?, ?)",
+                    (format(image_hash, "016x"), json.dumps(metadata, ensure_ascii=False), source, time.time())
+                )
+                self._conn.commit()
+                self._tree.add(image_hash, cursor.lastrowid)
+            except sqlite3.Error as e:
+                log_message(f"Warning: Gagal menulis similarity index: {e}", "warning")
+        event.set()
+
+    def release(self, token):
+        """
+        Melepas reservasi tanpa hasil (API gagal/dihentikan); yang menunggu akan mencoba sendiri.
+        """
+        with self._lock:
+            pending = self._pending.pop(token, None)
+        if pending is not None:
+            pending[1].set()
+
+    def close(self):
+        with self._lock:
+            for _, event in self._pending.values():
+                event.set()
+            self._pending.clear()
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+
+def open_similarity_index(db_path, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Membuka similarity index; mengembalikan None jika gagal agar proses tetap jalan.
+    """
+    if not db_path:
+        return None
+    try:
+        index = SimilarityIndex(db_path, max_distance)
+        log_message(f"Similarity index dimuat: {len(index)} gambar", "info")
+        return index
+    except (sqlite3.Error, OSError, ValueError) as e:
+        log_message(f"Warning: Similarity index tidak bisa dibuka ({e}), reuse metadata dinonaktifkan.", "warning")
+        return None
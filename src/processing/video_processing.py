@@ -20,12 +20,36 @@ import time
 import shutil
 import cv2
 from src.utils.logging import log_message
-from src.api.gemini_api import check_stop_event, get_gemini_metadata
-from src.utils.compression import compress_image, get_temp_compression_folder
+from src.api.gemini_api import check_stop_event, get_gemini_metadata, interpret_metadata_result
+from src.utils.compression import compress_image, get_temp_compression_folder, remove_temp_files
+from src.utils.cpu_pool import run_cpu_task
 from src.metadata.exif_writer import write_exif_to_video # Corrected import
 from src.metadata.csv_exporter import write_to_platform_csvs
 from src.utils.file_utils import WRITABLE_METADATA_VIDEO_EXTENSIONS # Import the constant
 
+def probe_video_duration(video_path):
+    """
+    Membaca durasi video dari header (jumlah frame / fps) tanpa mendekode frame.
+
+    Returns:
+        Durasi dalam detik, atau None jika tidak bisa dibaca.
+    """
+    cap = None
+    try:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None
+        total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if total_frames <= 0 or fps <= 0:
+            return None
+        return total_frames / fps
+    except Exception:
+        return None
+    finally:
+        if cap is not None:
+            cap.release()
+
 def extract_frames_from_video(video_path, output_folder, num_frames=3, stop_event=None):
     """
     Mengekstrak beberapa frame dari file video.
@@ -127,55 +151,47 @@ def extract_frames_from_video(video_path, output_folder, num_frames=3, stop_even
         log_message(f"  Detail error: {traceback.format_exc()}")
         return None
 
-def process_video(input_path, output_dir, selected_api_key: str, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+def prepare_video(input_path, output_dir, stop_event):
     """
-    Memproses file video: mengekstrak frame, mendapatkan metadata, dan menulis metadata ke video.
+    Tahap persiapan video: mengekstrak frame dan mengompresnya jika perlu.
 
     Args:
         input_path: Path file sumber
         output_dir: Direktori output
-        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
         stop_event: Event threading untuk menghentikan proses
-        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
-        selected_model: Model yang dipilih untuk diproses, atau None untuk auto-rotasi
-        keyword_count: Jumlah kata kunci yang diambil dari hasil API
-        priority: Prioritas pemrosesan
 
     Returns:
-        Tuple (status, metadata, output_path):
-            - status: String status pemrosesan
-            - metadata: Dictionary metadata hasil API, atau None jika gagal
-            - output_path: Path file output, atau None jika gagal
+        Tuple (status, prepared):
+            - status: "prepared", "skipped_exists", "stopped" atau status gagal
+            - prepared: Dictionary berisi api_input (list frame), temp_files, flag prompt dan initial_output_path
     """
     filename = os.path.basename(input_path)
-    _, ext = os.path.splitext(filename)
-    ext_lower = ext.lower()
     initial_output_path = os.path.join(output_dir, filename)
     extracted_frames = []
     compressed_frames_to_clean = [] # Keep track of compressed frames specifically
 
     if check_stop_event(stop_event):
-        return "stopped", None, None
+        return "stopped", None
 
     # Periksa apakah file output sudah ada
     if os.path.exists(initial_output_path):
-        return "skipped_exists", None, initial_output_path
+        return "skipped_exists", {"initial_output_path": initial_output_path}
 
     # Dapatkan folder kompresi sementara untuk frame yang diekstrak
     chosen_temp_folder = get_temp_compression_folder(output_dir)
     if not chosen_temp_folder:
         log_message("  Error: Tidak dapat menemukan folder temporari yang bisa ditulis.")
-        return "failed_unknown", None, None
+        return "failed_unknown", None
 
     # Ekstrak frame dari video
     try:
-        extracted_frames = extract_frames_from_video(input_path, chosen_temp_folder, num_frames=3, stop_event=stop_event)
+        extracted_frames = run_cpu_task(extract_frames_from_video, input_path, chosen_temp_folder, num_frames=3, stop_event=stop_event)
         if not extracted_frames:
             log_message(f"  Gagal mengekstrak frame dari video: {filename}")
-            return "failed_frames", None, None
+            return "failed_frames", None
     except Exception as e:
         log_message(f"  Error saat ekstraksi frame: {e}")
-        return "failed_frames", None, None
+        return "failed_frames", None
 
     if check_stop_event(stop_event):
         # Clean up extracted frames if stopped
@@ -183,7 +199,7 @@ def process_video(input_path, output_dir, selected_api_key: str, stop_event, aut
             try:
                 if os.path.exists(frame): os.remove(frame)
             except Exception: pass
-        return "stopped", None, None
+        return "stopped", None
 
     # Kompres frame jika perlu
     frames_for_api = []
@@ -195,8 +211,9 @@ def process_video(input_path, output_dir, selected_api_key: str, stop_event, aut
             frame_size_mb = os.path.getsize(frame_path) / (1024 * 1024)
             if frame_size_mb > 2:  # 2MB adalah batas ukuran file
                 log_message(f"  Frame {frame_filename} ({frame_size_mb:.2f}MB) perlu kompresi.")
-                compressed_path, is_compressed = compress_image(
-                    frame_path, chosen_temp_folder, stop_event=stop_event
+                compressed_path, is_compressed = run_cpu_task(
+                    compress_image, frame_path, chosen_temp_folder, stop_event=stop_event,
+                    stopped_result=(frame_path, False)
                 )
 
                 if is_compressed and compressed_path and os.path.exists(compressed_path):
@@ -224,7 +241,7 @@ def process_video(input_path, output_dir, selected_api_key: str, stop_event, aut
             try:
                 if os.path.exists(frame): os.remove(frame)
             except Exception: pass
-        return "stopped", None, None
+        return "stopped", None
 
     # Pilih frame terbaik untuk dikirim ke API
     best_frame = None
@@ -244,38 +261,28 @@ def process_video(input_path, output_dir, selected_api_key: str, stop_event, aut
              try:
                  if os.path.exists(frame): os.remove(frame)
              except Exception: pass
-        return "failed_frames", None, None
+        return "failed_frames", None
 
-    # Dapatkan metadata dari API Gemini, gunakan prompt khusus video
-    # Kirim semua frame ke API dalam satu request
-    log_message(f"  Mengirim {len(frames_for_api)} frame ke API Gemini untuk analisis video...")
-    metadata_result = get_gemini_metadata(frames_for_api, selected_api_key, stop_event, use_video_prompt=True, selected_model_input=selected_model, keyword_count=keyword_count, priority=priority)
+    return "prepared", {
+        "api_input": frames_for_api,
+        "temp_files": list(set(extracted_frames + compressed_frames_to_clean)),
+        "use_png_prompt": False,
+        "use_video_prompt": True,
+        "initial_output_path": initial_output_path
+    }
 
-    # Bersihkan SEMUA frame (original yang tidak terkompres + hasil kompresi) setelah API call
-    # extracted_frames might contain originals if compression failed or wasn't needed
-    # compressed_frames_to_clean contains only successfully compressed files
-    all_frames_to_clean = list(set(extracted_frames + compressed_frames_to_clean))
-    for frame in all_frames_to_clean:
-        try:
-            if os.path.exists(frame):
-                os.remove(frame)
-                # log_message(f"  File frame sementara dihapus: {os.path.basename(frame)}") # Optional: reduce log verbosity
-        except Exception as e_clean:
-            log_message(f"  Warning: Gagal hapus file frame sementara {os.path.basename(frame)}: {e_clean}")
-
-    # Handle API result
-    if metadata_result == "stopped":
-        return "stopped", None, None
-    elif isinstance(metadata_result, dict) and "error" in metadata_result:
-        log_message(f"  API Error detail: {metadata_result['error']}")
-        return "failed_api", None, None
-    elif isinstance(metadata_result, dict):
-        metadata = metadata_result
-        # Pastikan keyword_count ikut dikirim ke metadata
-        metadata['keyword_count'] = keyword_count
-    else:
-        log_message(f"  API call gagal mendapatkan metadata (hasil tidak valid).")
-        return "failed_api", None, None
+def finalize_video(input_path, initial_output_path, metadata, keyword_count, stop_event):
+    """
+    Tahap output video: menyalin video ke output dan menulis metadata jika formatnya mendukung.
+
+    Returns:
+        Tuple (status, metadata, output_path)
+    """
+    filename = os.path.basename(input_path)
+    _, ext = os.path.splitext(filename)
+    ext_lower = ext.lower()
+    # Pastikan keyword_count ikut dikirim ke metadata
+    metadata['keyword_count'] = keyword_count
 
     if check_stop_event(stop_event):
         return "stopped", metadata, None
@@ -337,3 +344,42 @@ def process_video(input_path, output_dir, selected_api_key: str, stop_event, aut
 
     # Return the final status and path
     return final_status, metadata, output_path
+
+def process_video(input_path, output_dir, selected_api_key: str, stop_event, auto_kategori_enabled=True, selected_model=None, keyword_count="49", priority="Kualitas"):
+    """
+    Memproses file video: mengekstrak frame, mendapatkan metadata, dan menulis metadata ke video.
+
+    Args:
+        input_path: Path file sumber
+        output_dir: Direktori output
+        selected_api_key: API key Gemini yang sudah dipilih secara cerdas
+        stop_event: Event threading untuk menghentikan proses
+        auto_kategori_enabled: Flag untuk mengaktifkan penentuan kategori otomatis
+        selected_model: Model yang dipilih untuk diproses, atau None untuk auto-rotasi
+        keyword_count: Jumlah kata kunci yang diambil dari hasil API
+        priority: Prioritas pemrosesan
+
+    Returns:
+        Tuple (status, metadata, output_path):
+            - status: String status pemrosesan
+            - metadata: Dictionary metadata hasil API, atau None jika gagal
+            - output_path: Path file output, atau None jika gagal
+    """
+    status, prepared = prepare_video(input_path, output_dir, stop_event)
+    if status != "prepared":
+        return status, None, (prepared or {}).get("initial_output_path")
+
+    # Dapatkan metadata dari API Gemini, gunakan prompt khusus video
+    # Kirim semua frame ke API dalam satu request
+    frames_for_api = prepared["api_input"]
+    log_message(f"  Mengirim {len(frames_for_api)} frame ke API Gemini untuk analisis video...")
+    metadata_result = get_gemini_metadata(frames_for_api, selected_api_key, stop_event, use_video_prompt=True, selected_model_input=selected_model, keyword_count=keyword_count, priority=priority)
+
+    # Bersihkan SEMUA frame (original yang tidak terkompres + hasil kompresi) setelah API call
+    remove_temp_files(prepared["temp_files"])
+
+    status, metadata = interpret_metadata_result(metadata_result)
+    if status != "ok":
+        return status, None, None
+
+    return finalize_video(input_path, prepared["initial_output_path"], metadata, keyword_count, stop_event)
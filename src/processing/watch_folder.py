@@ -0,0 +1,200 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/watch_folder.py
+import os
+import time
+import threading
+
+from src.utils.logging import log_message
+from src.utils.file_utils import iter_input_files, is_input_file, ALL_SUPPORTED_EXTENSIONS
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+# File dianggap selesai ditulis jika ukuran dan mtime tidak berubah selama ini (detik)
+WATCH_SETTLE_SECONDS = 2.0
+# Interval pemindaian ulang folder saat watchdog tidak tersedia
+WATCH_POLL_INTERVAL = 2.0
+# Pemindaian ulang berkala walaupun watchdog aktif, untuk event yang terlewat
+# (share jaringan, folder yang di-mount ulang, buffer inotify penuh)
+WATCH_RESCAN_INTERVAL = 60.0
+# Jeda antar pemeriksaan stabilitas kandidat
+WATCH_TICK_SECONDS = 0.25
+
+class _CandidateHandler(FileSystemEventHandler):
+    """
+    Meneruskan path dari event created/modified/deleted/moved ke fungsi callback.
+    """
+    def __init__(self, on_path):
+        super().__init__()
+        self._on_path = on_path
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._on_path(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._on_path(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._on_path(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._on_path(event.dest_path)
+
+def _stat_signature(path):
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_size, stat_result.st_mtime
+
+def iter_watched_files(input_dir, recursive=True, include_patterns=None, exclude_patterns=None, extensions=ALL_SUPPORTED_EXTENSIONS, skip_paths=None, should_stop=None, settle_seconds=WATCH_SETTLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL, use_watchdog=True):
+    """
+    Memantau folder input tanpa henti dan menghasilkan file yang sudah selesai ditulis.
+
+    File yang ada saat mulai ikut diproses. Setelah itu file baru/berubah dideteksi lewat
+    watchdog (inotify/FSEvents/ReadDirectoryChangesW) bila terpasang, atau lewat pemindaian
+    ulang berkala. Setiap kandidat baru dihasilkan setelah ukuran dan mtime-nya tidak berubah
+    selama settle_seconds; event baru pada file yang sama mengulang hitungan (debounce),
+    sehingga salinan yang masih berjalan tidak ikut diproses setengah jadi.
+
+    Args:
+        input_dir: Folder yang dipantau
+        recursive, include_patterns, exclude_patterns, extensions, skip_paths: Sama seperti iter_input_files
+        should_stop: Callable yang mengembalikan True jika pemantauan harus berhenti
+        settle_seconds: Lama ukuran/mtime harus stabil sebelum file diproses
+        poll_interval: Interval pemindaian ulang saat watchdog tidak dipakai
+        use_watchdog: False untuk memaksa mode polling
+
+    Yields:
+        Dictionary {"input", "size", "mtime"} seperti iter_input_files, atau None secara
+        berkala saat tidak ada file baru (kesempatan bagi pemanggil untuk mengurus antrean)
+    """
+    should_stop = should_stop or (lambda: False)
+    settle_seconds = max(0.0, float(settle_seconds))
+    poll_interval = max(WATCH_TICK_SECONDS, float(poll_interval))
+    filter_kwargs = {
+        "recursive": recursive,
+        "include_patterns": include_patterns,
+        "exclude_patterns": exclude_patterns,
+        "extensions": extensions,
+        "skip_paths": skip_paths,
+    }
+
+    lock = threading.Lock()
+    event_paths = set()
+    # path -> {"signature": (size, mtime), "since": waktu terakhir berubah}
+    candidates = {}
+    # path -> signature saat terakhir dihasilkan; file yang sama tidak dihasilkan ulang
+    # sampai isinya berubah (file gagal tidak diulang terus-menerus)
+    emitted = {}
+
+    def on_event_path(path):
+        with lock:
+            event_paths.add(path)
+
+    observer = None
+    if use_watchdog and WATCHDOG_AVAILABLE:
+        try:
+            observer = Observer()
+            observer.schedule(_CandidateHandler(on_event_path), input_dir, recursive=bool(recursive))
+            observer.start()
+            rescan_interval = WATCH_RESCAN_INTERVAL
+            log_message(f"Mode watch aktif: memantau {input_dir} (watchdog)", "info")
+        except Exception as e:
+            log_message(f"Warning: watchdog gagal dijalankan ({e}), beralih ke polling.", "warning")
+            observer = None
+    if observer is None:
+        rescan_interval = poll_interval
+        log_message(f"Mode watch aktif: memantau {input_dir} (polling tiap {poll_interval:g} detik)", "info")
+
+    def add_candidate(path, signature, now, touched):
+        if emitted.get(path) == signature:
+            return
+        current = candidates.get(path)
+        if current is None or current["signature"] != signature or touched:
+            candidates[path] = {"signature": signature, "since": now}
+
+    try:
+        last_scan = None
+        while not should_stop():
+            now = time.monotonic()
+            if last_scan is None or now - last_scan >= rescan_interval:
+                last_scan = now
+                present = set()
+                for entry in iter_input_files(input_dir, should_stop=should_stop, **filter_kwargs):
+                    present.add(entry["input"])
+                    add_candidate(entry["input"], (entry["size"], entry["mtime"]), now, touched=False)
+                # File yang sudah dipindah/dihapus tidak perlu diingat lagi
+                for path in [p for p in emitted if p not in present]:
+                    del emitted[path]
+                for path in [p for p in candidates if p not in present]:
+                    del candidates[path]
+
+            with lock:
+                touched_paths = list(event_paths)
+                event_paths.clear()
+            for path in touched_paths:
+                if not is_input_file(path, input_dir, **filter_kwargs):
+                    continue
+                signature = _stat_signature(path)
+                if signature is None:
+                    emitted.pop(path, None)
+                    candidates.pop(path, None)
+                    continue
+                add_candidate(path, signature, now, touched=True)
+
+            ready = []
+            for path, state in list(candidates.items()):
+                signature = _stat_signature(path)
+                if signature is None:
+                    del candidates[path]
+                    continue
+                if signature != state["signature"]:
+                    state["signature"] = signature
+                    state["since"] = now
+                    continue
+                if now - state["since"] >= settle_seconds:
+                    ready.append((path, signature))
+
+            for path, signature in sorted(ready):
+                if should_stop():
+                    return
+                del candidates[path]
+                emitted[path] = signature
+                yield {"input": path, "size": signature[0], "mtime": signature[1]}
+
+            if not ready:
+                yield None
+            time.sleep(WATCH_TICK_SECONDS)
+    finally:
+        if observer is not None:
+            try:
+                observer.stop()
+                observer.join(timeout=5)
+            except Exception:
+                pass
@@ -0,0 +1,337 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/processing/work_queue.py
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from src.utils.logging import log_message
+
+DEFAULT_LEASE_SECONDS = 60
+# Lease diperpanjang beberapa kali dalam satu masa lease agar satu heartbeat yang telat tidak fatal
+HEARTBEAT_FRACTION = 3
+# File yang lease-nya sudah kedaluwarsa sebanyak ini (node crash saat memprosesnya) ditandai gagal
+MAX_LEASE_ATTEMPTS = 3
+# Interval menunggu saat semua pekerjaan tersisa sedang dipegang node lain
+QUEUE_POLL_INTERVAL = 1.0
+
+def default_node_id():
+    """
+    ID node yang unik per proses: hostname + PID + sufiks acak pendek.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+
+def queue_key(path, input_dir):
+    """
+    Kunci antrean adalah path relatif terhadap folder input (dengan "/"), sehingga
+    host yang me-mount share yang sama di lokasi berbeda tetap sepakat.
+    """
+    rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(input_dir))
+    return rel_path.replace(os.sep, "/")
+
+class WorkQueue:
+    """
+    Antrean kerja bersama di file SQLite pada volume bersama, untuk beberapa proses atau
+    host yang memproses satu folder input.
+
+    Setiap node memindai folder dan mendaftarkan file (idempoten), lalu mengklaim satu
+    file per slot kosong di pipeline-nya dengan lease yang diperpanjang lewat heartbeat.
+    Lease node yang mati kedaluwarsa dan diambil alih node lain. Penyelesaian hanya
+    tercatat jika token lease masih milik node tersebut (exactly-once completion).
+
+    Memakai rollback journal, bukan WAL: WAL butuh shared memory yang tidak aman di
+    share jaringan (NFS/SMB). Jam antar host diasumsikan sinkron (NTP) untuk lease.
+    """
+    def __init__(self, db_path, node_id=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.db_path = db_path
+        self.node_id = node_id or default_node_id()
+        self.lease_seconds = max(5.0, float(lease_seconds))
+        self.started = time.time()
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_items ("
+            " path TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " size INTEGER,"
+            " mtime REAL,"
+            " cost REAL NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL,"
+            " owner TEXT,"
+            " token TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT,"
+            " output TEXT,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (path, fingerprint)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS work_items_state ON work_items (state, cost)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+
+    def enqueue(self, path, fingerprint, size=None, mtime=None, cost=0.0):
+        """
+        Mendaftarkan file ke antrean. File yang sudah terdaftar tidak berubah, kecuali
+        yang gagal sebelum node ini mulai: itu dikembalikan ke pending untuk dicoba lagi.
+        """
+        if fingerprint is None:
+            return
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO work_items (path, fingerprint, size, mtime, cost, state, updated)"
+                    " VALUES (?, ?, ?, ?, ?, 'pending', ?)"
+                    " ON CONFLICT(path, fingerprint) DO UPDATE SET"
+                    " state = 'pending', owner = NULL, token = NULL, attempts = 0, status = NULL, updated = excluded.updated"
+                    " WHERE work_items.state = 'failed' AND work_items.updated < ?",
+                    (path, fingerprint, size, mtime, float(cost or 0.0), now, self.started)
+                )
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal mendaftarkan file ke antrean kerja: {e}", "warning")
+
+    def claim_next(self):
+        """
+        Mengklaim pekerjaan pending (atau yang lease-nya kedaluwarsa) dengan biaya terbesar.
+
+        Returns:
+            Dictionary {"path", "fingerprint", "size", "mtime", "cost", "token"} atau None
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        try:
+            with self._transaction() as conn:
+                while True:
+                    row = conn.execute(
+                        "SELECT path, fingerprint, size, mtime, cost, state, owner, attempts FROM work_items"
+                        " WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)"
+                        " ORDER BY cost DESC LIMIT 1",
+                        (now,)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    path, fingerprint, size, mtime, cost, state, owner, attempts = row
+                    if state == "leased" and attempts >= MAX_LEASE_ATTEMPTS:
+                        conn.execute(
+                            "UPDATE work_items SET state = 'failed', status = 'failed_lease_expired', owner = NULL, token = NULL, updated = ?"
+                            " WHERE path = ? AND fingerprint = ?",
+                            (now, path, fingerprint)
+                        )
+                        log_message(f"Antrean kerja: {path} gagal setelah {attempts} lease kedaluwarsa", "warning")
+                        continue
+                    conn.execute(
+                        "UPDATE work_items SET state = 'leased', owner = ?, token = ?, lease_expires = ?, attempts = attempts + 1, updated = ?"
+                        " WHERE path = ? AND fingerprint = ?",
+                        (self.node_id, token, now + self.lease_seconds, now, path, fingerprint)
+                    )
+                    break
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal mengklaim pekerjaan dari antrean kerja: {e}", "warning")
+            return None
+        if state == "leased":
+            log_message(f"Antrean kerja: lease {path} milik {owner} kedaluwarsa, diambil alih", "warning")
+        return {"path": path, "fingerprint": fingerprint, "size": size, "mtime": mtime, "cost": cost, "token": token}
+
+    def renew(self, lease):
+        """
+        Memperpanjang satu lease.
+
+        Returns:
+            True jika lease masih milik node ini (boleh lanjut menulis output).
+        """
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE work_items SET lease_expires = ? WHERE path = ? AND fingerprint = ? AND token = ? AND state = 'leased'",
+                    (time.time() + self.lease_seconds, lease["path"], lease["fingerprint"], lease["token"])
+                )
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal memperpanjang lease {lease['path']}: {e}", "warning")
+            return False
+
+    def heartbeat(self):
+        """
+        Memperpanjang semua lease milik node ini.
+
+        Returns:
+            Jumlah lease yang diperpanjang, atau None jika gagal.
+        """
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE work_items SET lease_expires = ? WHERE owner = ? AND state = 'leased'",
+                    (time.time() + self.lease_seconds, self.node_id)
+                )
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            log_message(f"Warning: Heartbeat antrean kerja gagal: {e}", "warning")
+            return None
+
+    def complete(self, lease, succeeded, status=None, output=None):
+        """
+        Menandai pekerjaan selesai (done/failed) hanya jika token lease masih berlaku.
+
+        Returns:
+            True jika penyelesaian tercatat; False jika lease sudah diambil node lain.
+        """
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE work_items SET state = ?, status = ?, output = ?, lease_expires = NULL, updated = ?"
+                    " WHERE path = ? AND fingerprint = ? AND token = ? AND state = 'leased'",
+                    ("done" if succeeded else "failed", status, output, time.time(), lease["path"], lease["fingerprint"], lease["token"])
+                )
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal menandai pekerjaan selesai di antrean kerja: {e}", "warning")
+            return False
+
+    def complete_with(self, lease, action, status=None, output=None):
+        """
+        Menjalankan action() (misal menulis baris CSV ke file bersama) di bawah kunci tulis
+        lintas node, lalu menandai pekerjaan selesai dalam transaksi yang sama. Hanya
+        dijalankan jika lease masih milik node ini, sehingga baris tidak pernah ditulis dua
+        kali oleh dua node dan penulisan dari node yang berbeda tidak saling menyela.
+        Jika action() melempar exception (misal CSV gagal ditulis), transaksi dibatalkan,
+        pekerjaan tidak ditandai selesai, dan exception diteruskan ke pemanggil.
+
+        Returns:
+            True jika action dijalankan dan pekerjaan tercatat selesai, False jika lease sudah
+            diambil node lain, None jika database antrean tidak bisa dipakai.
+        """
+        try:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT 1 FROM work_items WHERE path = ? AND fingerprint = ? AND token = ? AND state = 'leased'",
+                    (lease["path"], lease["fingerprint"], lease["token"])
+                ).fetchone()
+                if row is None:
+                    return False
+                action()
+                conn.execute(
+                    "UPDATE work_items SET state = 'done', status = ?, output = ?, lease_expires = NULL, updated = ?"
+                    " WHERE path = ? AND fingerprint = ?",
+                    (status, output, time.time(), lease["path"], lease["fingerprint"])
+                )
+                return True
+        except sqlite3.Error as e:
+            log_message(f"Warning: Antrean kerja tidak bisa dikunci untuk {lease['path']}: {e}", "warning")
+            return None
+
+    def release(self, lease):
+        """
+        Mengembalikan pekerjaan ke pending (misal saat dihentikan) agar node lain mengambilnya.
+        """
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "UPDATE work_items SET state = 'pending', owner = NULL, token = NULL, lease_expires = NULL,"
+                    " attempts = MAX(0, attempts - 1), updated = ?"
+                    " WHERE path = ? AND fingerprint = ? AND token = ? AND state = 'leased'",
+                    (time.time(), lease["path"], lease["fingerprint"], lease["token"])
+                )
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal melepas lease {lease['path']}: {e}", "warning")
+
+    def release_owned(self):
+        """
+        Melepas semua lease yang masih dipegang node ini.
+
+        Returns:
+            Jumlah lease yang dilepas.
+        """
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE work_items SET state = 'pending', owner = NULL, token = NULL, lease_expires = NULL,"
+                    " attempts = MAX(0, attempts - 1), updated = ?"
+                    " WHERE owner = ? AND state = 'leased'",
+                    (time.time(), self.node_id)
+                )
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal melepas lease node ini: {e}", "warning")
+            return 0
+
+    def outstanding(self):
+        """
+        Returns:
+            Jumlah pekerjaan yang masih pending atau sedang dipegang node lain
+            (None jika database tidak bisa dibaca).
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM work_items WHERE state = 'pending' OR (state = 'leased' AND owner != ?)",
+                    (self.node_id,)
+                ).fetchone()
+            return row[0]
+        except sqlite3.Error as e:
+            log_message(f"Warning: Gagal membaca antrean kerja: {e}", "warning")
+            return None
+
+    def counts(self):
+        """
+        Returns:
+            Dictionary jumlah pekerjaan per state (pending, leased, done, failed).
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT state, COUNT(*) FROM work_items GROUP BY state").fetchall()
+            return {state: count for state, count in rows}
+        except sqlite3.Error:
+            return {}
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+
+def open_work_queue(db_path, node_id=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Membuka antrean kerja bersama; mengembalikan None jika gagal.
+    """
+    if not db_path:
+        return None
+    try:
+        return WorkQueue(db_path, node_id=node_id, lease_seconds=lease_seconds)
+    except (sqlite3.Error, OSError) as e:
+        log_message(f"Error: Antrean kerja '{db_path}' tidak bisa dibuka: {e}", "error")
+        return None
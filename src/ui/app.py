@@ -38,7 +38,11 @@ from src.utils.logging import log_message
 from src.utils.file_utils import read_api_keys, is_writable_directory
 from src.utils.analytics import send_analytics_event
 from src.config.config import MEASUREMENT_ID, API_SECRET, ANALYTICS_URL
-from src.processing.batch_processing import batch_process_files
+from src.processing.batch_processing import batch_process_files, ENGINE_OPTION_DEFAULTS
+from src.processing.job_journal import JOURNAL_FILE_NAME
+from src.api.response_cache import RESPONSE_CACHE_FILE_NAME
+from src.processing.similarity_index import SIMILARITY_INDEX_FILE_NAME
+from src.processing.cost_model import COST_MODEL_FILE_NAME
 # from src.metadata.exif_writer import check_exiftool_exists # Moved check inside __init__
 from src.ui.widgets import ToolTip
 from src.ui.dialogs import CompletionMessageManager
@@ -49,6 +53,7 @@ from src.utils.system_checks import (
 )
 from src.metadata.exif_writer import check_exiftool_exists # Keep this import for the check
 from src.api.api_key_checker import check_api_keys_status
+from src.api.gemini_api import get_key_health_snapshot, format_key_health_snapshot
 
 # Konstanta aplikasi
 APP_VERSION = "3.5.0" # Updated version
@@ -149,6 +154,7 @@ class MetadataApp(ctk.CTk):
         self.delay_var = tk.StringVar(value="10")
         self.workers_var = tk.StringVar(value="1")
         self._actual_api_keys = [] # Store the real keys internally
+        self._engine_settings = dict(ENGINE_OPTION_DEFAULTS) # Opsi engine lanjutan (hanya lewat config.json)
         self.show_api_keys_var = tk.BooleanVar(value=False) # Variable for the toggle checkbox
         self.console_visible_var = tk.BooleanVar(value=True) # Variable for console visibility toggle
         # self.progress_text_var = tk.StringVar(value="Proses: Siap memulai")  # HAPUS
@@ -173,8 +179,11 @@ class MetadataApp(ctk.CTk):
 
         # Load konfigurasi
         self.config_path = self._get_config_path()
-        self.processed_cache = {}
-        self.cache_file = os.path.join(os.path.dirname(self.config_path), "processed_cache.json")
+        # Job journal (SQLite) menggantikan processed_cache.json untuk resume
+        self.journal_path = os.path.join(os.path.dirname(self.config_path), JOURNAL_FILE_NAME)
+        self.response_cache_path = os.path.join(os.path.dirname(self.config_path), RESPONSE_CACHE_FILE_NAME)
+        self.similarity_index_path = os.path.join(os.path.dirname(self.config_path), SIMILARITY_INDEX_FILE_NAME)
+        self.cost_model_path = os.path.join(os.path.dirname(self.config_path), COST_MODEL_FILE_NAME)
 
         # Auto kategori dan foldering
         self.auto_kategori_var = tk.BooleanVar(value=False)
@@ -198,7 +207,6 @@ class MetadataApp(ctk.CTk):
         self._process_log_queue()
         self._load_settings()
         self._init_analytics() # This might set _needs_initial_save
-        self._load_cache()
 
         # Perform initial save if needed after loading and analytics init
         if self._needs_initial_save:
@@ -468,8 +476,23 @@ Semakin banyak API key, semakin cepat proses batch.
         self.clear_button = ctk.CTkButton(process_buttons_frame, text="Clear Log", command=self._clear_log, font=self.font_medium, height=35, fg_color="#079183")
         self.clear_button.pack(pady=7, fill=tk.X)
 
+    def _log_key_health(self, title):
+        snapshot = get_key_health_snapshot()
+        if not snapshot:
+            return False
+        self._log(title, "info")
+        for row, line in zip(snapshot, format_key_health_snapshot(snapshot)):
+            tag = "error" if row.get("evicted") or row.get("quota") == "daily_exhausted" else "warning" if row.get("quota") != "ok" else "info"
+            self._log(line, tag)
+        return True
+
     def _cek_api_keys(self):
         """Cek semua API key yang sudah diinputkan dan log hasilnya ke bawah."""
+        if self.processing_thread and self.processing_thread.is_alive():
+            # Saat proses berjalan, tampilkan kesehatan key dari registry (tanpa request tambahan)
+            if not self._log_key_health("Kesehatan API key (proses berjalan):"):
+                self._log("Data kesehatan API key belum tersedia.", "info")
+            return
         api_keys = self._actual_api_keys
         if not api_keys:
             self._log("Tidak ada API key untuk dicek.", "warning")
@@ -488,6 +511,7 @@ Semakin banyak API key, semakin cepat proses batch.
                     self._log(f"    - ...{k[-5:]}: {s} - {msg}", "error")
         except Exception as e:
             self._log(f"Error saat cek API key: {e}", "error")
+        self._log_key_health("Kesehatan API key (proses terakhir):")
         self.cek_api_button.configure(state=tk.NORMAL)
 
     def _create_options_frame(self, parent):
@@ -740,31 +764,6 @@ Konfigurasi perilaku aplikasi:
                 return
             self.output_dir.set(directory)
 
-    def _load_cache(self):
-        """Memuat cache file yang telah diproses."""
-        try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.processed_cache = json.load(f)
-        except Exception as e:
-            self._log(f"Error memuat cache: {e}", "error")
-            self.processed_cache = {}
-
-    def _save_cache(self):
-        """Menyimpan cache file yang telah diproses."""
-        try:
-            if len(self.processed_cache) > 1000:
-                # Simpan hanya 1000 entri terbaru
-                cache_items = sorted(self.processed_cache.items(),
-                                key=lambda x: x[1].get('timestamp', 0),
-                                reverse=True)
-                self.processed_cache = dict(cache_items[:1000])
-
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.processed_cache, f, indent=4)
-        except Exception as e:
-            self._log(f"Error menyimpan cache: {e}", "error")
-
     # --- API Key Management Methods ---
     def _load_api_keys(self):
         """Dialog untuk memuat API key dari file."""
@@ -1021,6 +1020,10 @@ Konfigurasi perilaku aplikasi:
                         self.console_visible_var.set(settings.get("console_visible", True))
                         # Load API key paid checkbox state
                         self.extra_settings_var.set(settings.get("api_key_paid", False))
+                        # Load opsi engine lanjutan (tidak punya widget, diatur manual di config.json)
+                        engine_settings = settings.get("engine", {})
+                        if isinstance(engine_settings, dict):
+                            self._engine_settings.update({k: v for k, v in engine_settings.items() if k in ENGINE_OPTION_DEFAULTS})
 
                         # Load tema
                         loaded_theme = settings.get("theme", "dark")
@@ -1103,6 +1106,7 @@ Konfigurasi perilaku aplikasi:
             "keyword_count": self.keyword_count_var.get(),
             "priority": self.priority_var.get(),
             "api_key_paid": self.extra_settings_var.get(), # Save API key paid checkbox
+            "engine": self._engine_settings, # Save opsi engine lanjutan
         }
 
         try:
@@ -1406,7 +1410,12 @@ Konfigurasi perilaku aplikasi:
                 selected_model=selected_model,
                 keyword_count=keyword_count,
                 priority=priority,
-                bypass_api_key_limit=bypass_api_key_limit
+                bypass_api_key_limit=bypass_api_key_limit,
+                journal_path=self.journal_path,
+                response_cache_path=self.response_cache_path,
+                similarity_index_path=self.similarity_index_path,
+                cost_model_path=self.cost_model_path,
+                **self._engine_settings
             )
 
             self.processed_count = result.get("processed_count", 0)
@@ -1547,7 +1556,6 @@ Konfigurasi perilaku aplikasi:
             self.start_time = None
             self.stop_event.clear()
             self.update_idletasks()
-            self._save_cache()
             self._save_settings()
             self.start_button.configure(state=tk.NORMAL)
             self.clear_button.configure(state=tk.NORMAL)
@@ -1610,6 +1618,23 @@ Konfigurasi perilaku aplikasi:
             r"^Memulai proses \(\d+ worker, delay \d+s\)$",
             r"^Ditemukan \d+ file untuk diproses$",
             r"^Output CSV akan disimpan di subfolder: metadata_csv$",
+            r"^Pipeline: \d+ worker persiapan, \d+ worker API, \d+ worker output$",
+            r"^Konkurensi adaptif aktif: batas awal \d+ request, maksimum \d+ per API key$",
+            r"^Rate limiter aktif: .+$",
+            r"^Paket request aktif: hingga \d+ gambar per request API$",
+            r"^Kuota harian API key .+$",
+            r"^API key \.\.\.\S+ dikeluarkan: .+$",
+            r"^Model \S+ terkena rate limit, mencoba model fallback \S+ untuk .+$",
+            r"^Context cache tidak dipakai untuk \S+ .+$",
+            r"^Context cache: \d+ request memakai prompt ter-cache .+$",
+            r"^Hedged request aktif: .+$",
+            r"^Statistik model Auto Rotasi:$",
+            r"^    - gemini-\S+: \d+ upaya, .+$",
+            r"^Hedged request: \d+ request cadangan dari \d+ request, \d+ menjawab lebih dulu$",
+            r"^Kesehatan API key.*:$",
+            r"^    - \.\.\.\S{5}: \d+ ok / \d+ gagal, .+$",
+            r"^Data kesehatan API key belum tersedia\.$",
+            r"^Batas konkurensi .+: \d+ → \d+ \(.+\)$",
             r"^ → Memproses .+\.\w+\.\.\.$",
             r"^Batch \d+: Menunggu hasil \d+ file\.\.\.$",
             r"^Batch \d+ \(\d+/\d+\): Menunggu hasil \d+ file\.\.\.$",  # Tambahkan pola baru agar log batch counting muncul
@@ -1649,6 +1674,24 @@ Konfigurasi perilaku aplikasi:
             r"^Gagal: \d+$",
             r"^Dilewati: \d+$",
             r"^Dihentikan: \d+$",
+            r"^Batas konkurensi akhir: \d+ request$",
+            r"^Mode watch aktif: memantau .+$",
+            r"^Antrean kerja aktif: node .+$",
+            r"^Antrean kerja: .+$",
+            r"^Bulk job \S+ dibuat .+$",
+            r"^Melanjutkan bulk job \S+: .+$",
+            r"^Ditemukan \d+ file untuk dikirim lewat Batch API$",
+            r"^Auto Rotasi tidak berlaku untuk mode bulk.+$",
+            r"^Warning: Mode bulk mengabaikan opsi .+$",
+            r"^Batch batches/\S+ dikirim: \d+ file .+$",
+            r"^Batch batches/\S+: \w+ \(\d+ file\)$",
+            r"^Batch \S+ belum terkirim.+$",
+            r"^Batch \S+ berakhir dengan state .+$",
+            r"^Bulk job \S+ disimpan: .+$",
+            r"^Bulk job \S+: \d+ batch, .+$",
+            r"^Sirkuit API .+$",
+            r"^Request uji gagal .+$",
+            r"^Pool HTTP: \d+ koneksi keep-alive \(.+\)$",
             r"^=========================================$",
             r"^Semua API key OK \(\d+/\d+\)$",
             r"^\d+ API key OK, \d+ API key error:$",
@@ -1735,7 +1778,6 @@ Konfigurasi perilaku aplikasi:
         """Callback saat window ditutup."""
         try:
             self._save_settings()
-            self._save_cache()
 
             if self.processing_thread and self.processing_thread.is_alive():
                 if tk.messagebox.askyesno("Keluar",
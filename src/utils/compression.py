@@ -21,6 +21,7 @@ import random
 from PIL import Image
 from src.utils.logging import log_message
 from src.api.gemini_api import check_stop_event, is_stop_requested
+from src.utils.cpu_pool import run_cpu_task
 
 # Konstanta
 TEMP_COMPRESSION_FOLDER_NAME = "temp_compressed"
@@ -346,4 +347,54 @@ def manage_temp_folders(input_dir, output_dir):
         temp_folders['system'] = system_temp
         log_message(f"Menggunakan folder temp sistem: {system_temp}")
     
-    return temp_folders
\ No newline at end of file
+    return temp_folders
+
+def prepare_image_for_api(input_path, temp_folder, stop_event=None, max_size_mb=MAX_IMAGE_SIZE_MB, label="File"):
+    """
+    Menyiapkan gambar untuk dikirim ke API: mengompres jika ukurannya melebihi batas.
+
+    Args:
+        input_path: Path gambar sumber
+        temp_folder: Folder untuk hasil kompresi sementara
+        stop_event: Event threading untuk menghentikan proses
+        max_size_mb: Batas ukuran file sebelum dikompres
+        label: Label jenis file untuk pesan log (misal "File" atau "File PNG")
+
+    Returns:
+        Tuple (path_for_api, temp_files_created)
+    """
+    filename = os.path.basename(input_path)
+    temp_files_created = []
+    try:
+        file_size_mb = os.path.getsize(input_path) / (1024 * 1024)
+        if file_size_mb > max_size_mb:
+            log_message(f"  {label} {filename} ({file_size_mb:.2f}MB) perlu kompresi.")
+            compressed_path, is_compressed = run_cpu_task(
+                compress_image, input_path, temp_folder, stop_event=stop_event,
+                stopped_result=(input_path, False)
+            )
+
+            if is_compressed and compressed_path and os.path.exists(compressed_path):
+                log_message(f"  Kompresi berhasil: {os.path.basename(compressed_path)}")
+                temp_files_created.append(compressed_path)
+                return compressed_path, temp_files_created
+            log_message(f"  Kompresi gagal. Menggunakan file asli: {filename}")
+            return input_path, temp_files_created
+        log_message(f"  File {filename} ({file_size_mb:.2f}MB) tidak perlu kompresi.")
+        return input_path, temp_files_created
+    except Exception as e:
+        log_message(f"  Error saat memeriksa ukuran/kompresi: {e}")
+        return input_path, temp_files_created
+
+def remove_temp_files(temp_files, log_removed=False):
+    """
+    Menghapus daftar file sementara (hasil kompresi, frame, raster konversi).
+    """
+    for temp_file in temp_files or []:
+        try:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+                if log_removed:
+                    log_message(f"  File kompresi sementara dihapus: {os.path.basename(temp_file)}")
+        except Exception as e:
+            log_message(f"  Warning: Gagal hapus file sementara: {e}")
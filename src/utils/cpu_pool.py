@@ -0,0 +1,141 @@
+# RJ Auto Metadata
+# Copyright (C) 2025 Riiicil
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# src/utils/cpu_pool.py
+import threading
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils.logging import log_message, set_log_handler, set_log_echo
+
+# Interval polling hasil proses (detik) agar stop tetap responsif
+POOL_POLL_INTERVAL = 0.25
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+# Log dari proses anak dikumpulkan di sini lalu diputar ulang di proses utama
+_child_logs = []
+
+def _init_child_process():
+    def collect(message, tag=None):
+        _child_logs.append((message, tag))
+    # Log anak hanya diputar ulang oleh proses utama, tidak dicetak dua kali
+    set_log_echo(False)
+    set_log_handler(collect)
+
+def _run_in_child(func, args, kwargs):
+    del _child_logs[:]
+    try:
+        return func(*args, **kwargs), list(_child_logs)
+    finally:
+        del _child_logs[:]
+
+def start_cpu_pool(num_processes):
+    """
+    Menyalakan process pool untuk pekerjaan persiapan yang berat di CPU
+    (decode/resize/encode gambar, decode frame video).
+
+    Args:
+        num_processes: Jumlah proses; 0 atau kurang berarti tetap memakai thread
+
+    Returns:
+        True jika process pool aktif setelah pemanggilan ini.
+    """
+    global _pool, _pool_size
+    try:
+        num_processes = int(num_processes or 0)
+    except (TypeError, ValueError):
+        num_processes = 0
+    with _pool_lock:
+        if num_processes <= 0:
+            return False
+        if _pool is not None and _pool_size == num_processes:
+            return True
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        try:
+            _pool = ProcessPoolExecutor(max_workers=num_processes, initializer=_init_child_process)
+            _pool_size = num_processes
+            log_message(f"Process pool persiapan aktif: {num_processes} proses", "info")
+            return True
+        except Exception as e:
+            _pool = None
+            _pool_size = 0
+            log_message(f"Warning: Gagal membuat process pool, persiapan tetap memakai thread: {e}", "warning")
+            return False
+
+def shutdown_cpu_pool(wait=True):
+    global _pool, _pool_size
+    with _pool_lock:
+        pool, _pool, _pool_size = _pool, None, 0
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+def is_cpu_pool_active():
+    return _pool is not None
+
+def run_cpu_task(func, *args, stop_event=None, stopped_result=None, **kwargs):
+    """
+    Menjalankan fungsi persiapan di process pool jika aktif, atau langsung di thread pemanggil.
+
+    Fungsi harus berada di level modul (bisa di-pickle) dan menerima `stop_event`.
+    Di proses anak `stop_event` selalu None; pembatalan ditangani di sini dengan
+    berhenti menunggu hasil.
+
+    Args:
+        func: Fungsi yang dijalankan (misal compress_image, extract_frames_from_video)
+        stop_event: Event threading untuk menghentikan proses
+        stopped_result: Nilai yang dikembalikan jika stop diminta sebelum hasil tersedia
+
+    Returns:
+        Hasil fungsi, sama seperti jika dipanggil langsung.
+    """
+    pool = _pool
+    if pool is None:
+        return func(*args, stop_event=stop_event, **kwargs)
+
+    from src.api.gemini_api import is_stop_requested
+    kwargs["stop_event"] = None
+    try:
+        future = pool.submit(_run_in_child, func, args, kwargs)
+    except Exception as e:
+        # Pool rusak/dimatikan: jangan gagalkan file, jalankan di thread ini saja
+        log_message(f"Warning: Process pool tidak tersedia ({e}), menjalankan di thread.", "warning")
+        kwargs["stop_event"] = stop_event
+        return func(*args, **kwargs)
+
+    while True:
+        if (stop_event is not None and stop_event.is_set()) or is_stop_requested():
+            future.cancel()
+            return stopped_result
+        try:
+            result, child_logs = future.result(timeout=POOL_POLL_INTERVAL)
+            break
+        except concurrent.futures.TimeoutError:
+            continue
+        except concurrent.futures.CancelledError:
+            return stopped_result
+        except Exception as e:
+            log_message(f"  Error di process pool: {e}", "error")
+            kwargs["stop_event"] = stop_event
+            return func(*args, **kwargs)
+
+    for message, tag in child_logs:
+        log_message(message, tag)
+    return result
@@ -22,6 +22,7 @@ import csv
 import portalocker
 import hashlib
 import shutil
+import fnmatch
 from src.utils.logging import log_message
 
 # Konstanta
@@ -142,6 +143,113 @@ def write_to_csv(csv_path, header, data_row):
         log_message(f"  Error: Gagal menulis ke file CSV '{os.path.basename(csv_path)}': {e}")
         return False
 
+# Folder buatan aplikasi yang tidak boleh ikut dipindai sebagai input
+DISCOVERY_SKIP_DIRS = ("temp_compressed", "metadata_csv")
+
+def _matches_any(rel_path, name, patterns):
+    for pattern in patterns:
+        if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+def iter_input_files(input_dir, recursive=True, include_patterns=None, exclude_patterns=None, extensions=ALL_SUPPORTED_EXTENSIONS, skip_paths=None, should_stop=None):
+    """
+    Menelusuri folder input secara bertahap dengan os.scandir dan menghasilkan file
+    yang bisa diproses satu per satu, sehingga pemrosesan bisa dimulai sebelum
+    seluruh folder selesai dienumerasi.
+
+    Args:
+        input_dir: Folder input
+        recursive: Jika True, subfolder ikut ditelusuri
+        include_patterns: Glob (misal "*.jpg", "shoot1/*"); jika diisi, hanya file yang cocok yang diproses
+        exclude_patterns: Glob untuk file/folder yang dilewati (dicocokkan ke path relatif dan nama)
+        extensions: Tuple ekstensi yang didukung
+        skip_paths: Path folder yang tidak boleh dimasuki (misal folder output di dalam input)
+        should_stop: Callable yang mengembalikan True jika penelusuran harus berhenti
+
+    Yields:
+        Dictionary {"input": path, "size": bytes, "mtime": detik} per file
+    """
+    include_patterns = [p for p in (include_patterns or []) if p]
+    exclude_patterns = [p for p in (exclude_patterns or []) if p]
+    skip_paths = {os.path.normcase(os.path.abspath(p)) for p in (skip_paths or []) if p}
+    pending_dirs = [(input_dir, "")]
+
+    while pending_dirs:
+        current_dir, rel_dir = pending_dirs.pop()
+        try:
+            entries = os.scandir(current_dir)
+        except OSError as e:
+            log_message(f"Warning: Gagal membaca folder '{current_dir}': {e}", "warning")
+            continue
+
+        subdirs = []
+        with entries:
+            for entry in entries:
+                if should_stop and should_stop():
+                    return
+                name = entry.name
+                if name.startswith('.'):
+                    continue
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not recursive or name in DISCOVERY_SKIP_DIRS:
+                            continue
+                        if os.path.normcase(os.path.abspath(entry.path)) in skip_paths:
+                            continue
+                        if _matches_any(rel_path, name, exclude_patterns):
+                            continue
+                        subdirs.append((entry.path, rel_path))
+                        continue
+                    if not name.lower().endswith(extensions) or not entry.is_file():
+                        continue
+                    if include_patterns and not _matches_any(rel_path, name, include_patterns):
+                        continue
+                    if _matches_any(rel_path, name, exclude_patterns):
+                        continue
+                    # DirEntry.stat() memakai data cache dari scandir bila tersedia (Windows)
+                    stat_result = entry.stat()
+                except OSError:
+                    continue
+                yield {"input": entry.path, "size": stat_result.st_size, "mtime": stat_result.st_mtime}
+
+        # Telusuri subfolder sesuai urutan nama agar hasil stabil antar run
+        pending_dirs.extend(sorted(subdirs, reverse=True))
+
+def is_input_file(path, input_dir, recursive=True, include_patterns=None, exclude_patterns=None, extensions=ALL_SUPPORTED_EXTENSIONS, skip_paths=None):
+    """
+    Memeriksa satu path dengan aturan yang sama seperti iter_input_files (untuk event
+    file system dari mode watch), tanpa menelusuri folder.
+
+    Returns:
+        True jika file akan ikut diproses bila ditemukan oleh iter_input_files.
+    """
+    rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(input_dir)).replace(os.sep, "/")
+    if rel_path == "." or rel_path.startswith("../"):
+        return False
+    parts = rel_path.split("/")
+    if not recursive and len(parts) > 1:
+        return False
+    name = parts[-1]
+    if any(part.startswith('.') for part in parts):
+        return False
+    if not name.lower().endswith(extensions):
+        return False
+    skip_paths = {os.path.normcase(os.path.abspath(p)) for p in (skip_paths or []) if p}
+    exclude_patterns = [p for p in (exclude_patterns or []) if p]
+    include_patterns = [p for p in (include_patterns or []) if p]
+    current_dir = input_dir
+    for index, part in enumerate(parts[:-1]):
+        current_dir = os.path.join(current_dir, part)
+        if part in DISCOVERY_SKIP_DIRS or os.path.normcase(os.path.abspath(current_dir)) in skip_paths:
+            return False
+        if _matches_any("/".join(parts[:index + 1]), part, exclude_patterns):
+            return False
+    if include_patterns and not _matches_any(rel_path, name, include_patterns):
+        return False
+    return not _matches_any(rel_path, name, exclude_patterns)
+
 def read_api_keys(file_path):
     try:
         with open(file_path, "r", encoding='utf-8') as f:
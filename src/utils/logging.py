@@ -18,12 +18,19 @@
 
 # Global handler untuk fungsi log
 _log_handler = None
+# Jika False, pesan tidak dicetak ke stdout (misal CLI yang memakai stdout untuk JSON)
+_echo_stdout = True
 
 def set_log_handler(handler):
     global _log_handler
     _log_handler = handler
 
+def set_log_echo(enabled):
+    global _echo_stdout
+    _echo_stdout = bool(enabled)
+
 def log_message(message, tag=None):
-    print(message)
+    if _echo_stdout:
+        print(message)
     if _log_handler is not None:
         _log_handler(message, tag)
\ No newline at end of file